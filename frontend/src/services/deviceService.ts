@@ -1,4 +1,5 @@
 import api from './api';
+import { CompactTrack, decodeCompactTrack } from '../utils/compactTrack';
 import { Device, DeviceEvent, DeviceData, NetworkEvent, DeviceStats, ServerSMS, GPRSSession, UDPSession } from '../types';
 
 export const deviceService = {
@@ -23,6 +24,19 @@ export const deviceService = {
     return response.data;
   },
 
+  getHistoryCompact: async (
+    imei: number,
+    startTime?: string,
+    endTime?: string
+  ): Promise<CompactTrack> => {
+    const params = { start_time: startTime, end_time: endTime, format: 'compact' };
+    const response = await api.get(`/api/gps/devices/${imei}/history/`, {
+      params,
+      responseType: 'arraybuffer',
+    });
+    return decodeCompactTrack(response.data);
+  },
+
   getEvents: async (imei: number, type?: string): Promise<DeviceEvent[]> => {
     const params = { type };
     const response = await api.get(`/api/gps/devices/${imei}/events/`, { params });
@@ -143,13 +143,14 @@ export interface GeofenceEventFilters {
   from_date?: string;
   to_date?: string;
   days?: number;
-  page?: number;
+  cursor?: string;
   page_size?: number;
+  count?: 'exact' | 'estimate';
 }
 
-// Resultado de eventos de geocerca con paginación
+// Resultado de eventos de geocerca con paginación por cursor
 export interface GeofenceEventsResult {
-  count: number;
+  count: number | null;
   next: string | null;
   previous: string | null;
   results: GeofenceEvent[];
@@ -0,0 +1,72 @@
+/**
+ * Decoder for compact binary tracks (`format=compact` on history endpoints).
+ *
+ * Mirrors `decode_track` in skyguard/apps/gps/services/compact.py:
+ * magic "SGT1", varint point count, then five columns (time, latitude,
+ * longitude, speed, course), each a varint byte length followed by
+ * zigzag-encoded delta varints.
+ */
+
+export interface CompactTrack {
+  time: Float64Array;      // epoch seconds
+  latitude: Float64Array;  // degrees
+  longitude: Float64Array; // degrees
+  speed: Float64Array;     // km/h
+  course: Float64Array;    // degrees
+}
+
+export const COMPACT_TRACK_MEDIA_TYPE = 'application/vnd.skyguard.track';
+
+const COLUMNS: Array<[keyof CompactTrack, number]> = [
+  ['time', 1],
+  ['latitude', 1e6],
+  ['longitude', 1e6],
+  ['speed', 10],
+  ['course', 10],
+];
+
+// Varints are read with arithmetic instead of bitwise operators, which
+// truncate to 32 bits; values stay exact up to 2^53.
+const readVarint = (bytes: Uint8Array, offset: number): [number, number] => {
+  let value = 0;
+  let scale = 1;
+  for (;;) {
+    if (offset >= bytes.length) {
+      throw new Error('Truncated compact track');
+    }
+    const byte = bytes[offset++];
+    value += (byte & 0x7f) * scale;
+    scale *= 128;
+    if (byte < 0x80) {
+      return [value, offset];
+    }
+  }
+};
+
+export const decodeCompactTrack = (buffer: ArrayBuffer): CompactTrack => {
+  const bytes = new Uint8Array(buffer);
+  if (String.fromCharCode(bytes[0], bytes[1], bytes[2], bytes[3]) !== 'SGT1') {
+    throw new Error('Not a compact track');
+  }
+  let [count, offset] = readVarint(bytes, 4);
+  const track = {} as CompactTrack;
+
+  for (const [name, scale] of COLUMNS) {
+    let length: number;
+    [length, offset] = readVarint(bytes, offset);
+    const end = offset + length;
+    const column = new Float64Array(count);
+    let previous = 0;
+    for (let i = 0; i < count; i++) {
+      let raw: number;
+      [raw, offset] = readVarint(bytes, offset);
+      previous += raw % 2 ? -(raw + 1) / 2 : raw / 2;
+      column[i] = previous / scale;
+    }
+    if (offset !== end) {
+      throw new Error(`Column ${name} does not match its length`);
+    }
+    track[name] = column;
+  }
+  return track;
+};
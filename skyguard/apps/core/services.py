@@ -123,8 +123,10 @@ class LocationService(BaseService, ILocationService):
     def __init__(self, repository: IDeviceRepository):
         super().__init__()
         self.repository = repository
+        from ..gps.models import GPSLocation
         from ..gps.models.location import Location
         self.Location = Location
+        self.GPSLocation = GPSLocation
     
     def process_location(self, device: 'GPSDevice', location_data: Dict[str, Any]) -> None:
         """Process and store location data."""
@@ -185,6 +187,21 @@ class LocationService(BaseService, ILocationService):
         except Exception as e:
             self._log_error(f"Error getting history for device {imei}", e)
             return []
+    
+    def get_device_track(self, imei: int, start_time: Any, end_time: Any) -> bytes:
+        """Get device location history in the compact track format."""
+        from ..gps.services.compact import encode_track, track_columns
+        try:
+            # A queryset in time order: the repository returns a list, newest first
+            locations = self.GPSLocation.objects.filter(device__imei=imei)
+            if start_time:
+                locations = locations.filter(timestamp__gte=start_time)
+            if end_time:
+                locations = locations.filter(timestamp__lte=end_time)
+            return encode_track(**track_columns(locations.order_by('timestamp')))
+        except Exception as e:
+            self._log_error(f"Error getting track for device {imei}", e)
+            return encode_track([], [], [])
 
 
 class EventService(BaseService, IEventService):
@@ -3,6 +3,7 @@ Admin configuration for GPS app.
 """
 from django.contrib import admin
 from django.contrib.gis.admin import GISModelAdmin
+from .admin_mixins import TelemetryAdminMixin
 from .models import (
     # Core device models
     GPSDevice, SimCard, DeviceHarness, ServerSMS, DeviceStats,
@@ -77,11 +78,12 @@ class LocationAdmin(GISModelAdmin):
 
 
 @admin.register(GPSLocation)
-class GPSLocationAdmin(GISModelAdmin):
+class GPSLocationAdmin(TelemetryAdminMixin, GISModelAdmin):
     """Admin configuration for GPSLocation model."""
     list_display = ('device', 'timestamp', 'speed', 'course', 'satellites')
     list_filter = ('timestamp', 'device')
     search_fields = ('device__imei', 'device__name')
+    date_hierarchy = 'timestamp'
 
 
 @admin.register(NetworkEvent)
@@ -94,11 +96,12 @@ class NetworkEventAdmin(admin.ModelAdmin):
 
 
 @admin.register(GPSEvent)
-class GPSEventAdmin(admin.ModelAdmin):
+class GPSEventAdmin(TelemetryAdminMixin, admin.ModelAdmin):
     """Admin configuration for GPSEvent model."""
     list_display = ('device', 'type', 'timestamp', 'source')
     list_filter = ('type', 'timestamp', 'source')
     search_fields = ('device__imei', 'device__name', 'type')
+    date_hierarchy = 'timestamp'
 
 
 @admin.register(GeoFence)
@@ -128,19 +131,21 @@ class PressureSensorCalibrationAdmin(admin.ModelAdmin):
 
 
 @admin.register(PressureWeightLog)
-class PressureWeightLogAdmin(admin.ModelAdmin):
+class PressureWeightLogAdmin(TelemetryAdminMixin, admin.ModelAdmin):
     """Admin configuration for PressureWeightLog model."""
     list_display = ('device', 'sensor', 'date', 'psi1', 'psi2')
     list_filter = ('device', 'date')
     search_fields = ('device__name', 'sensor')
+    date_hierarchy = 'date'
 
 
 @admin.register(AlarmLog)
-class AlarmLogAdmin(admin.ModelAdmin):
+class AlarmLogAdmin(TelemetryAdminMixin, admin.ModelAdmin):
     """Admin configuration for AlarmLog model."""
     list_display = ('device', 'sensor', 'date', 'comment')
     list_filter = ('device', 'date')
     search_fields = ('device__name', 'sensor', 'comment')
+    date_hierarchy = 'date'
 
 
 # Driver Models
@@ -0,0 +1,121 @@
+"""
+Admin helpers for telemetry tables.
+
+The stock changelist is written for small tables: it counts the filtered
+rows, counts the whole table again for the "N total" link and builds the
+date hierarchy with ``SELECT DISTINCT date_trunc(...)`` over every row. On
+tables with hundreds of millions of fixes each of those is a full scan.
+``TelemetryAdminMixin`` replaces them with planner estimates and index probes.
+"""
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Iterator, List, Union
+
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from skyguard.apps.gps.pagination import EstimatedCountPaginator
+
+DateValue = Union[date, datetime]
+
+
+def bucket_start(value: DateValue, kind: str) -> DateValue:
+    """Start of the year, month or day containing ``value``."""
+    if isinstance(value, datetime):
+        value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if kind == 'year':
+        return value.replace(month=1, day=1)
+    if kind == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def next_bucket(value: DateValue, kind: str) -> DateValue:
+    """Start of the bucket after the one starting at ``value``."""
+    if kind == 'year':
+        return value.replace(year=value.year + 1)
+    if kind == 'month':
+        return value.replace(year=value.year + value.month // 12, month=value.month % 12 + 1)
+    return value + timedelta(days=1)
+
+
+def date_buckets(first: DateValue, last: DateValue, kind: str) -> Iterator[DateValue]:
+    """Starts of every ``kind`` bucket between ``first`` and ``last`` inclusive."""
+    start = bucket_start(first, kind)
+    while start <= last:
+        yield start
+        start = next_bucket(start, kind)
+
+
+class IndexedDatesQuerySetMixin:
+    """
+    ``dates()``/``datetimes()`` answered with index probes.
+
+    Instead of a ``DISTINCT`` over every row, the range is read with
+    ``MIN``/``MAX`` and each candidate year, month or day is checked with an
+    ``EXISTS`` on a range of the field, so the cost is one index probe per
+    bucket. This is what the admin date hierarchy calls; other kinds fall
+    back to the default implementation.
+    """
+    indexed_kinds = ('year', 'month', 'day')
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in self.indexed_kinds:
+            return super().dates(field_name, kind, order)
+        return self._indexed_buckets(field_name, kind, order)
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None, **kwargs):
+        if kind not in self.indexed_kinds:
+            return super().datetimes(field_name, kind, order, tzinfo, **kwargs)
+        return self._indexed_buckets(field_name, kind, order, tzinfo=tzinfo or timezone.get_current_timezone())
+
+    def _indexed_buckets(self, field_name, kind, order, tzinfo=None) -> List[DateValue]:
+        bounds = self.order_by().aggregate(first=Min(field_name), last=Max(field_name))
+        first, last = bounds['first'], bounds['last']
+        if first is None:
+            return []
+        if tzinfo is not None:
+            first, last = timezone.localtime(first, tzinfo), timezone.localtime(last, tzinfo)
+
+        buckets = [
+            start for start in date_buckets(first, last, kind)
+            if self.filter(**{
+                f'{field_name}__gte': start,
+                f'{field_name}__lt': next_bucket(start, kind),
+            }).exists()
+        ]
+        if order == 'DESC':
+            buckets.reverse()
+        return buckets
+
+
+@lru_cache(maxsize=None)
+def _indexed_dates_class(queryset_class):
+    return type(f'IndexedDates{queryset_class.__name__}', (IndexedDatesQuerySetMixin, queryset_class), {})
+
+
+def with_indexed_dates(queryset):
+    """The queryset with ``IndexedDatesQuerySetMixin`` mixed into its class."""
+    if not isinstance(queryset, IndexedDatesQuerySetMixin):
+        queryset = queryset._chain()
+        queryset.__class__ = _indexed_dates_class(queryset.__class__)
+    return queryset
+
+
+class TelemetryAdminMixin:
+    """
+    ModelAdmin mixin for large time-series tables.
+
+    - page counts come from ``EstimatedCountPaginator``
+    - the unfiltered total is not counted (``show_full_result_count``)
+    - the ``date_hierarchy`` drilldown is built with index probes
+    - device foreign keys use raw id widgets instead of a full ``<select>``
+
+    Subclasses set ``date_hierarchy`` to the indexed time field.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ('device',)
+
+    def get_queryset(self, request):
+        return with_indexed_dates(super().get_queryset(request))
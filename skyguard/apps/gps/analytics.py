@@ -20,6 +20,7 @@ import warnings
 warnings.filterwarnings('ignore')
 
 from .models import GPSDevice, GPSLocation, GPSEvent
+from .services.rollups import telemetry_rollup_service
 from .serializers import GPSDeviceSerializer
 
 logger = logging.getLogger(__name__)
@@ -157,14 +158,9 @@ class GPSAnalyticsEngine:
             if not locations.exists():
                 return self._get_default_device_analytics(device_imei)
             
-            # Calculate metrics
-            speed_stats = locations.aggregate(
-                avg_speed=Avg('speed'),
-                max_speed=Max('speed')
-            )
-            
-            # Distance calculation
-            distance_traveled = self._calculate_device_distance(locations)
+            # Speed and distance metrics from the hourly/daily rollups
+            summary = telemetry_rollup_service.summarize_device(device.imei, start_time, end_time)
+            distance_traveled = round(summary['distance'] / 1000.0, 2)  # km
             
             # Uptime calculation
             uptime_percentage = self._calculate_uptime(device, start_time, end_time)
@@ -186,9 +182,9 @@ class GPSAnalyticsEngine:
             
             return DeviceAnalytics(
                 device_imei=device_imei,
-                total_locations=locations.count(),
-                avg_speed=speed_stats['avg_speed'] or 0.0,
-                max_speed=speed_stats['max_speed'] or 0.0,
+                total_locations=summary['point_count'],
+                avg_speed=summary['avg_speed'],
+                max_speed=summary['max_speed'],
                 distance_traveled=distance_traveled,
                 uptime_percentage=uptime_percentage,
                 battery_health=battery_health,
@@ -397,10 +393,6 @@ class GPSAnalyticsEngine:
         )
     
     # Additional helper methods for device-specific analytics
-    def _calculate_device_distance(self, locations) -> float:
-        """Calculate distance for a specific device."""
-        return self._calculate_total_distance(locations)
-    
     def _calculate_uptime(self, device: GPSDevice, start_time: datetime, 
                          end_time: datetime) -> float:
         """Calculate device uptime percentage."""
@@ -8,12 +8,17 @@ from django.contrib.gis.geos import Polygon, GEOSGeometry
 from django.core.exceptions import ValidationError, PermissionDenied
 from django.db.models import Q
 from django.utils import timezone
+from celery.result import AsyncResult
 from rest_framework import status, viewsets, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 
+from skyguard.apps.gps.fast_serializers import FastGeoFenceEventSerializer, FastGeoFenceSerializer
 from skyguard.apps.gps.models import GPSDevice, GeoFence, GeoFenceEvent
+from skyguard.apps.gps.pagination import KeysetPagination
+from skyguard.apps.gps.response_cache import cache_response
 from skyguard.apps.gps.serializers import GeoFenceSerializer, GeoFenceEventSerializer
 from skyguard.apps.gps.services.geofence_manager import advanced_geofence_manager
 from skyguard.apps.gps.services.geofence_service import geofence_detection_service
@@ -28,6 +33,12 @@ class GeofencePagination(PageNumberPagination):
     max_page_size = 100
 
 
+class GeofenceEventPagination(KeysetPagination):
+    """Keyset pagination for geofence events, newest first."""
+    page_size = 20
+    max_page_size = 100
+
+
 class GeofenceViewSet(viewsets.ModelViewSet):
     """Enhanced ViewSet for Geofence management."""
     
@@ -37,25 +48,42 @@ class GeofenceViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Get geofences for the current user."""
-        user = self.request.user
-        
+        return self._user_geofences().select_related('owner').prefetch_related('devices', 'notify_owners')
+    
+    def _user_geofences(self):
+        """The current user's geofences with the query parameter filters applied."""
         # Use advanced manager for permission-aware queries
-        geofences = advanced_geofence_manager.get_user_geofences(
-            user, 
+        geofences = advanced_geofence_manager.user_geofences_queryset(
+            self.request.user, 
             include_inactive=self.request.query_params.get('include_inactive', 'false').lower() == 'true'
         )
         
         # Apply filters
         name = self.request.query_params.get('name')
         if name:
-            geofences = [g for g in geofences if name.lower() in g.name.lower()]
+            geofences = geofences.filter(name__icontains=name)
         
         device_imei = self.request.query_params.get('device')
         if device_imei:
-            geofences = [g for g in geofences if g.devices.filter(imei=device_imei).exists()]
+            geofences = geofences.filter(devices__imei=device_imei)
         
         return geofences
     
+    @cache_response('geofences', tags=('geofences:user:{user}',), timeout=60)
+    def list(self, request, *args, **kwargs):
+        """
+        List geofences with the values()-based serializer.
+
+        Cached per user. Device changes do not invalidate the entry (devices
+        report constantly), so embedded device positions may lag by up to the
+        one-minute timeout.
+        """
+        rows = FastGeoFenceSerializer.rows(self._user_geofences().order_by('name'))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(FastGeoFenceSerializer.serialize(page))
+        return Response(FastGeoFenceSerializer.serialize(rows))
+    
     def create(self, request, *args, **kwargs):
         """Create a new geofence with enhanced validation."""
         try:
@@ -137,7 +165,9 @@ class GeofenceViewSet(viewsets.ModelViewSet):
                 geofence.notify_owners.set(notify_owners)
             
             serializer = self.get_serializer(geofence)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            data = dict(serializer.data)
+            data['initial_check'] = self._initial_check_status(geofence.initial_check_task_id)
+            return Response(data, status=status.HTTP_201_CREATED)
             
         except ValidationError as e:
             return Response(
@@ -156,6 +186,55 @@ class GeofenceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    def perform_update(self, serializer):
+        """Save and, if the polygon changed, re-check the assigned devices."""
+        geofence = serializer.save()
+        self.initial_check_task_id = None
+        if 'geometry' in serializer.validated_data:
+            self.initial_check_task_id = advanced_geofence_manager.check_initial_device_positions(geofence)
+    
+    def update(self, request, *args, **kwargs):
+        """Update a geofence; the response reports the queued device check, if any."""
+        response = super().update(request, *args, **kwargs)
+        task_id = getattr(self, 'initial_check_task_id', None)
+        if task_id:
+            response.data['initial_check'] = self._initial_check_status(task_id)
+        return response
+    
+    @staticmethod
+    def _initial_check_status(task_id: str) -> Dict[str, Any]:
+        """Progress of a ``populate_geofence_devices`` task."""
+        result = AsyncResult(task_id)
+        status_data = {'task_id': task_id, 'state': result.state}
+        if result.state == 'PROGRESS' and isinstance(result.info, dict):
+            status_data.update(result.info)
+        elif result.successful() and isinstance(result.result, dict):
+            status_data.update(result.result)
+        return status_data
+    
+    @action(detail=True, methods=['get'])
+    def initial_check(self, request, pk=None):
+        """Progress of the device check queued when the geofence was created or edited."""
+        task_id = request.query_params.get('task_id')
+        if not task_id:
+            return Response(
+                {'error': 'task_id is required'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            geofence = self.get_object()
+            return Response({
+                'geofence_id': geofence.id,
+                **self._initial_check_status(task_id)
+            })
+        except Exception as e:
+            logger.error(f"Error getting initial check status for geofence {pk}: {e}")
+            return Response(
+                {'error': 'Failed to get initial check status'}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
     def destroy(self, request, *args, **kwargs):
         """Delete a geofence with permission checking."""
         try:
@@ -188,6 +267,8 @@ class GeofenceViewSet(viewsets.ModelViewSet):
             )
     
     @action(detail=False, methods=['get'])
+    @cache_response('geofence-metrics', tags=('geofences:user:{user}', 'geofence-events:user:{user}'),
+                    timeout=60)
     def metrics(self, request):
         """Get comprehensive geofence metrics."""
         try:
@@ -249,7 +330,7 @@ class GeofenceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get'], pagination_class=GeofenceEventPagination)
     def events(self, request, pk=None):
         """Get events for a specific geofence."""
         try:
@@ -265,7 +346,7 @@ class GeofenceViewSet(viewsets.ModelViewSet):
             events = GeoFenceEvent.objects.filter(
                 fence=geofence,
                 timestamp__gte=since
-            ).select_related('device')
+            )
             
             if device_imei:
                 events = events.filter(device__imei=device_imei)
@@ -273,17 +354,17 @@ class GeofenceViewSet(viewsets.ModelViewSet):
             if event_type and event_type.upper() in ['ENTRY', 'EXIT']:
                 events = events.filter(event_type=event_type.upper())
             
-            events = events.order_by('-timestamp')
+            events = FastGeoFenceEventSerializer.rows(events.order_by('-timestamp', '-id'), named=True)
             
             # Apply pagination
             page = self.paginate_queryset(events)
             if page is not None:
-                serializer = GeoFenceEventSerializer(page, many=True)
-                return self.get_paginated_response(serializer.data)
+                return self.get_paginated_response(FastGeoFenceEventSerializer.serialize(page))
             
-            serializer = GeoFenceEventSerializer(events, many=True)
-            return Response(serializer.data)
+            return Response(FastGeoFenceEventSerializer.serialize(events))
             
+        except NotFound:
+            raise
         except Exception as e:
             logger.error(f"Error getting events for geofence {pk}: {e}")
             return Response(
@@ -369,7 +450,7 @@ class GeofenceEventViewSet(viewsets.ReadOnlyModelViewSet):
     
     serializer_class = GeoFenceEventSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = GeofencePagination
+    pagination_class = GeofenceEventPagination
     
     def get_queryset(self):
         """Get geofence events for the current user."""
@@ -411,7 +492,15 @@ class GeofenceEventViewSet(viewsets.ReadOnlyModelViewSet):
             except ValueError:
                 pass
         
-        return queryset.order_by('-timestamp')
+        return queryset.order_by('-timestamp', '-id')
+    
+    def list(self, request, *args, **kwargs):
+        """List events with the values()-based serializer."""
+        rows = FastGeoFenceEventSerializer.rows(self.get_queryset(), named=True)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(FastGeoFenceEventSerializer.serialize(page))
+        return Response(FastGeoFenceEventSerializer.serialize(rows))
     
     @action(detail=False, methods=['get'])
     def summary(self, request):
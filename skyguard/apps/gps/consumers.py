@@ -10,10 +10,11 @@ from django.contrib.auth.models import AnonymousUser
 from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django.contrib.auth import get_user_model
-from django.core.serializers.json import DjangoJSONEncoder
 
+from .json_encoding import dumps_text
 from .models import GPSDevice, GPSEvent
 from .serializers import GPSDeviceSerializer
+from .services.latest_state import latest_state_table, get_device_metadata
 
 User = get_user_model()
 
@@ -127,7 +128,7 @@ class GPSRealtimeConsumer(AsyncWebsocketConsumer):
         """Send GPS update to WebSocket."""
         device_imei = event['device_imei']
         if str(device_imei) in self.subscribed_devices:
-            await self.send(text_data=json.dumps({
+            await self.send(text_data=dumps_text({
                 'type': 'gps_update',
                 'device_imei': device_imei,
                 'position': event['position'],
@@ -135,22 +136,22 @@ class GPSRealtimeConsumer(AsyncWebsocketConsumer):
                 'course': event['course'],
                 'timestamp': event['timestamp'],
                 'status': event['status']
-            }, cls=DjangoJSONEncoder))
+            }))
     
     async def device_status_change(self, event):
         """Send device status change to WebSocket."""
         device_imei = event['device_imei']
         if str(device_imei) in self.subscribed_devices:
-            await self.send(text_data=json.dumps({
+            await self.send(text_data=dumps_text({
                 'type': 'status_change',
                 'device_imei': device_imei,
                 'status': event['status'],
                 'timestamp': event['timestamp']
-            }, cls=DjangoJSONEncoder))
+            }))
     
     async def alarm_notification(self, event):
         """Send alarm notification to WebSocket."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'alarm',
             'device_imei': event['device_imei'],
             'alarm_type': event['alarm_type'],
@@ -158,7 +159,7 @@ class GPSRealtimeConsumer(AsyncWebsocketConsumer):
             'position': event.get('position'),
             'timestamp': event['timestamp'],
             'severity': event.get('severity', 'medium')
-        }, cls=DjangoJSONEncoder))
+        }))
     
     # Helper methods
     @database_sync_to_async
@@ -181,43 +182,48 @@ class GPSRealtimeConsumer(AsyncWebsocketConsumer):
     
     @database_sync_to_async
     def get_user_devices(self):
-        """Get all user devices."""
-        return list(GPSDevice.objects.filter(owner=self.user).select_related())
+        """Get all user devices with their latest state from the shared table."""
+        devices = [
+            info for info in get_device_metadata().values()
+            if info['owner_id'] == self.user.id
+        ]
+        states = latest_state_table.get_states(info['imei'] for info in devices)
+        return [(info, states.get(info['imei'])) for info in devices]
     
     async def send_device_list(self):
         """Send user's device list."""
         devices = await self.get_user_devices()
         device_data = []
         
-        for device in devices:
+        for info, state in devices:
             device_data.append({
-                'imei': device.imei,
-                'name': device.name,
-                'status': device.connection_status,
-                'last_update': device.last_connection.isoformat() if device.last_connection else None,
+                'imei': info['imei'],
+                'name': info['name'],
+                'status': state.status if state else 'OFFLINE',
+                'last_update': state.heartbeat_time.isoformat() if state and state.heartbeat_time else None,
                 'position': {
-                    'latitude': device.position.y if device.position else None,
-                    'longitude': device.position.x if device.position else None
-                } if device.position else None,
-                'speed': device.speed,
-                'course': device.course
+                    'latitude': state.latitude,
+                    'longitude': state.longitude
+                } if state and state.has_fix else None,
+                'speed': state.speed if state else 0,
+                'course': state.course if state else 0
             })
         
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'device_list',
             'devices': device_data
-        }, cls=DjangoJSONEncoder))
+        }))
     
     async def send_success(self, message):
         """Send success message."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'success',
             'message': message
         }))
     
     async def send_error(self, message):
         """Send error message."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'error',
             'message': message
         }))
@@ -245,7 +251,7 @@ class GPSAnalyticsConsumer(AsyncWebsocketConsumer):
     
     async def analytics_update(self, event):
         """Send analytics update."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'analytics_update',
             'data': event['data']
-        }, cls=DjangoJSONEncoder)) 
\ No newline at end of file
+        }))
\ No newline at end of file
@@ -0,0 +1,266 @@
+"""
+Read-only serializers built on ``values_list()`` rows.
+
+List endpoints spend most of their time building model instances and
+walking DRF field objects for every row. The serializers here skip both:
+they select the needed columns with ``values_list()`` (positions as
+``ST_Y``/``ST_X`` annotations, so no geometry is parsed) and turn each row
+into a dict with a mapper built once per class from ``itemgetter``
+closures over the row indexes.
+
+Field specs, in ``fields``:
+
+- ``'column'``: the value of a ``values_list()`` column
+- ``(function, 'column', ...)``: ``function`` applied to the column values
+- ``{...}``: a nested dict of specs
+"""
+from collections import defaultdict
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import orjson
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.db.models import F, FloatField, Func
+from django.db.models.functions import Coalesce
+
+
+def latitude_of(field: str) -> Func:
+    """``ST_Y`` of a point column."""
+    return Func(F(field), function='ST_Y', output_field=FloatField())
+
+
+def longitude_of(field: str) -> Func:
+    """``ST_X`` of a point column."""
+    return Func(F(field), function='ST_X', output_field=FloatField())
+
+
+def point(latitude, longitude):
+    """``{'latitude', 'longitude'}`` or ``None`` for a missing position."""
+    if latitude is None:
+        return None
+    return {'latitude': latitude, 'longitude': longitude}
+
+
+def compile_mapper(fields: Dict[str, Any]) -> Tuple[Tuple[str, ...], Callable[[Sequence], dict]]:
+    """
+    Compile field specs into ``values_list()`` columns and a row mapper.
+
+    Returns:
+        The columns to select, in row order, and a function mapping one row
+        to the output dict
+    """
+    columns: List[str] = []
+
+    def column(name):
+        if name not in columns:
+            columns.append(name)
+        return columns.index(name)
+
+    def build(spec):
+        if isinstance(spec, str):
+            return itemgetter(column(spec))
+        if isinstance(spec, dict):
+            items = tuple((key, build(value)) for key, value in spec.items())
+            return lambda row: {key: get(row) for key, get in items}
+        function, *sources = spec
+        indexes = [column(source) for source in sources]
+        if len(indexes) == 1:
+            get_one = itemgetter(indexes[0])
+            return lambda row: function(get_one(row))
+        get_many = itemgetter(*indexes)
+        return lambda row: function(*get_many(row))
+
+    mapper = build(fields)
+    return tuple(columns), mapper
+
+
+class ValuesSerializer:
+    """
+    Base class of the values()-based serializers.
+
+    Subclasses set ``fields`` and, for computed columns, ``annotations``.
+    """
+    fields: Dict[str, Any] = {}
+    annotations: Dict[str, Any] = {}
+    columns: Tuple[str, ...] = ()
+    mapper: Callable[[Sequence], dict] = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.columns, cls.mapper = compile_mapper(cls.fields)
+
+    @classmethod
+    def rows(cls, queryset, named: bool = False):
+        """
+        The queryset as ``values_list()`` rows in ``columns`` order.
+
+        ``named=True`` gives namedtuples, which also expose the columns as
+        attributes (as ``KeysetPagination`` needs).
+        """
+        if cls.annotations:
+            queryset = queryset.annotate(**cls.annotations)
+        return queryset.values_list(*cls.columns, named=named)
+
+    @classmethod
+    def serialize(cls, rows: Iterable[Sequence]) -> List[dict]:
+        """Map rows from ``rows()`` to dicts."""
+        mapper = cls.mapper
+        return [mapper(row) for row in rows]
+
+
+class FastDeviceSerializer(ValuesSerializer):
+    """Device list rows, as returned by ``GET /api/gps/devices/``."""
+    annotations = {
+        'device_latitude': latitude_of('position'),
+        'device_longitude': longitude_of('position'),
+    }
+    fields = {
+        'imei': 'imei',
+        'name': 'name',
+        'serial': 'serial',
+        'model': 'model',
+        'software_version': 'software_version',
+        'route': 'route',
+        'economico': 'economico',
+        'position': (point, 'device_latitude', 'device_longitude'),
+        'speed': 'speed',
+        'course': 'course',
+        'altitude': 'altitude',
+        'odometer': 'odometer',
+        'connection_status': 'connection_status',
+        'current_ip': 'current_ip',
+        'current_port': 'current_port',
+        'last_connection': 'last_connection',
+        'last_heartbeat': 'last_heartbeat',
+        'total_connections': 'total_connections',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+
+
+class FastGeoFenceEventSerializer(ValuesSerializer):
+    """
+    Geofence event list rows.
+
+    ``fence`` and ``device`` are id/name summaries rather than the nested
+    serializers of ``GeoFenceEventSerializer``.
+    """
+    annotations = {
+        'event_latitude': latitude_of('position'),
+        'event_longitude': longitude_of('position'),
+    }
+    fields = {
+        'id': 'id',
+        'fence': {'id': 'fence_id', 'name': 'fence__name'},
+        'device': {'imei': 'device_id', 'name': 'device__name'},
+        'geofence_id': 'fence_id',
+        'geofence_name': 'fence__name',
+        'device_id': 'device_id',
+        'device_name': 'device__name',
+        'event_type': 'event_type',
+        'position': (point, 'event_latitude', 'event_longitude'),
+        'position_coordinates': (lambda latitude, longitude: [latitude, longitude],
+                                 'event_latitude', 'event_longitude'),
+        'timestamp': 'timestamp',
+        'created_at': 'created_at',
+    }
+
+
+def _polygon(geojson):
+    if geojson is None:
+        return None
+    return {'type': 'polygon', 'coordinates': orjson.loads(geojson)['coordinates'][0]}
+
+
+class FastGeoFenceSerializer(ValuesSerializer):
+    """
+    Geofence list rows, with the same keys as ``GeoFenceSerializer``.
+
+    Devices and notified owners are read for the whole page with one query
+    each. Devices go through ``GPSDeviceSerializer``, the nested serializer
+    of ``GeoFenceSerializer``, so their ``position`` keeps its shape.
+    ``geometry_coordinates`` shares the ring parsed for ``geometry``.
+    """
+    annotations = {
+        'map_geojson': AsGeoJSON(Coalesce('simplified_geometry', 'geometry')),
+    }
+    fields = {
+        'id': 'id',
+        'name': 'name',
+        'description': 'description',
+        'geometry': (_polygon, 'map_geojson'),
+        'owner': (
+            lambda owner_id, username, email, first_name, last_name: {
+                'id': owner_id, 'username': username, 'email': email,
+                'first_name': first_name, 'last_name': last_name,
+            } if owner_id is not None else None,
+            'owner_id', 'owner__username', 'owner__email', 'owner__first_name', 'owner__last_name',
+        ),
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+        'is_active': 'is_active',
+        'notify_on_entry': 'notify_on_entry',
+        'notify_on_exit': 'notify_on_exit',
+        'base': 'base',
+        'color': 'color',
+        'stroke_color': 'stroke_color',
+        'stroke_width': 'stroke_width',
+        'notify_emails': 'notify_emails',
+        'notify_sms': 'notify_sms',
+        'alert_on_entry': 'alert_on_entry',
+        'alert_on_exit': 'alert_on_exit',
+        'notification_cooldown': 'notification_cooldown',
+    }
+
+    @classmethod
+    def serialize(cls, rows: Iterable[Sequence], devices: Optional[Dict[int, list]] = None,
+                  notify_owners: Optional[Dict[int, list]] = None) -> List[dict]:
+        """
+        Map rows to dicts and attach ``devices`` and ``notify_owners``.
+
+        Args:
+            devices: Device dicts by geofence id; queried when omitted
+            notify_owners: User ids by geofence id; queried when omitted
+        """
+        results = super().serialize(rows)
+        ids = [result['id'] for result in results]
+        if devices is None:
+            devices = cls.devices_by_fence(ids)
+        if notify_owners is None:
+            notify_owners = cls.notify_owners_by_fence(ids)
+        for result in results:
+            geometry = result['geometry']
+            result['geometry_coordinates'] = geometry['coordinates'] if geometry else []
+            result['devices'] = devices.get(result['id'], [])
+            result['notify_owners'] = notify_owners.get(result['id'], [])
+        return results
+
+    @staticmethod
+    def devices_by_fence(ids: Sequence[int]) -> Dict[int, list]:
+        from skyguard.apps.gps.models import GeoFence, GPSDevice
+        from skyguard.apps.gps.serializers import GPSDeviceSerializer
+
+        pairs = list(GeoFence.devices.through.objects.filter(geofence_id__in=ids).values_list(
+            'geofence_id', 'gpsdevice_id'
+        ))
+        devices = GPSDevice.objects.filter(imei__in={imei for _, imei in pairs}).only(
+            *GPSDeviceSerializer.Meta.fields
+        )
+        serialized = {device['imei']: device for device in GPSDeviceSerializer(devices, many=True).data}
+
+        grouped = defaultdict(list)
+        for fence_id, imei in pairs:
+            grouped[fence_id].append(serialized[imei])
+        return grouped
+
+    @staticmethod
+    def notify_owners_by_fence(ids: Sequence[int]) -> Dict[int, list]:
+        from skyguard.apps.gps.models import GeoFence
+
+        grouped = defaultdict(list)
+        rows = GeoFence.notify_owners.through.objects.filter(geofence_id__in=ids).values_list(
+            'geofence_id', 'user_id'
+        )
+        for fence_id, user_id in rows:
+            grouped[fence_id].append(user_id)
+        return grouped
@@ -20,6 +20,7 @@ from rest_framework.renderers import JSONRenderer
 
 from .models import GeoFence, GeoFenceEvent, GPSDevice
 from .serializers import GeoFenceSerializer, GeoFenceEventSerializer
+from .services.geofence_geometry import fence_contains
 
 
 @api_view(['GET', 'POST'])
@@ -58,8 +59,8 @@ def geofence_list(request):
         if end_date:
             geofences = geofences.filter(created_at__lte=end_date)
         
-        # Serialize and return
-        serializer = GeoFenceSerializer(geofences, many=True)
+        # Serialize and return (the list feeds the map: simplified polygons)
+        serializer = GeoFenceSerializer(geofences, many=True, context={'map_geometry': True})
         return Response(serializer.data)
     
     elif request.method == 'POST':
@@ -162,7 +163,7 @@ def check_point_in_geofence(request, geofence_id):
     # Check if point is inside the geofence
     from django.contrib.gis.geos import Point
     point = Point(lng, lat)  # Note: Point takes (x, y) which is (lng, lat)
-    inside = geofence.geometry.contains(point)
+    inside = fence_contains(geofence, point.x, point.y)
     
     return Response({'inside': inside})
 
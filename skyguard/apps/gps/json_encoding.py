@@ -0,0 +1,37 @@
+"""
+orjson-based JSON encoding for API responses and WebSocket messages.
+
+orjson serializes dicts, lists, tuples, datetimes, UUIDs, dataclasses and
+numpy values natively; anything else (``Decimal``, lazy translations,
+querysets...) falls back to DRF's encoder.
+
+Datetimes are written by orjson itself, as ISO 8601 with the full
+microseconds and ``Z`` for UTC. That is what the encoder of the pinned DRF
+(3.14) writes too, but some older DRF releases cut the fraction to
+milliseconds. ``test_fast_serializers`` checks the two
+renderers agree, so a DRF upgrade that changes the format shows up there.
+Passing datetimes through to DRF's encoder instead would make the device
+list about eight times slower to render.
+"""
+import orjson
+from rest_framework.utils.encoders import JSONEncoder
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+_fallback_encoder = JSONEncoder()
+
+
+def default(obj):
+    """Fallback for types orjson does not know."""
+    return _fallback_encoder.default(obj)
+
+
+def dumps(data, indent: bool = False) -> bytes:
+    """Encode ``data`` as UTF-8 JSON."""
+    option = (ORJSON_OPTIONS | orjson.OPT_INDENT_2) if indent else ORJSON_OPTIONS
+    return orjson.dumps(data, default=default, option=option)
+
+
+def dumps_text(data) -> str:
+    """Encode ``data`` as a JSON string, e.g. for ``send(text_data=...)``."""
+    return orjson.dumps(data, default=default, option=ORJSON_OPTIONS).decode()
@@ -0,0 +1,117 @@
+"""
+Management command to benchmark nearest-vehicle and radius searches.
+Usage: python manage.py benchmark_nearest [--sizes 10000 100000] [--database]
+"""
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from skyguard.apps.gps.services.latest_state import FLAG_HAS_FIX, SLOT_DTYPE, STATUS_CODES, STATUS_SHIFT
+from skyguard.apps.gps.services.nearest import (
+    NearestDeviceIndex, chord_to_metres, database_nearest, database_within, to_unit_vectors
+)
+
+# Synthetic fleet spread over the Mexico City metropolitan area
+BBOX = (-99.35, 19.15, -98.95, 19.65)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark k-nearest and radius device searches (KD-tree vs brute force, optionally PostGIS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10000, 100000],
+            help='Synthetic fleet sizes (default: 10000 100000)'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=1000,
+            help='Queries per measurement (default: 1000)'
+        )
+        parser.add_argument(
+            '--k',
+            type=int,
+            default=10,
+            help='Neighbours per k-nearest query (default: 10)'
+        )
+        parser.add_argument(
+            '--radius',
+            type=float,
+            default=1000.0,
+            help='Radius in metres for radius queries (default: 1000)'
+        )
+        parser.add_argument(
+            '--database',
+            action='store_true',
+            help='Also time the PostGIS KNN queries against the devices in the database'
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(42)
+        queries = options['queries']
+        k = options['k']
+        radius = options['radius']
+
+        for size in options['sizes']:
+            rows = self._fleet(rng, size)
+            index = NearestDeviceIndex(config={'max_age': float('inf')})
+
+            started = time.perf_counter()
+            index.build(rows)
+            build_ms = (time.perf_counter() - started) * 1000
+
+            lats = rng.uniform(BBOX[1], BBOX[3], queries)
+            lons = rng.uniform(BBOX[0], BBOX[2], queries)
+
+            knn_us = self._time(lambda i: index.nearest(lats[i], lons[i], k), queries)
+            radius_us = self._time(lambda i: index.within(lats[i], lons[i], radius), queries)
+
+            points = to_unit_vectors(rows['latitude'], rows['longitude'])
+
+            def brute(i):
+                diff = points - to_unit_vectors([lats[i]], [lons[i]])[0]
+                distances = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+                nearest = np.argpartition(distances, k)[:k]
+                return chord_to_metres(distances[nearest])
+
+            brute_us = self._time(brute, queries)
+
+            self.stdout.write(self.style.SUCCESS(f'{size} devices'))
+            self.stdout.write(f'  KD-tree build:        {build_ms:10.1f} ms')
+            self.stdout.write(f'  KD-tree {k}-nearest:    {knn_us:10.1f} us/query')
+            self.stdout.write(f'  KD-tree radius {radius:.0f} m: {radius_us:10.1f} us/query')
+            self.stdout.write(f'  Brute force {k}-nearest: {brute_us:10.1f} us/query')
+
+        if options['database']:
+            from skyguard.apps.gps.models import GPSDevice
+
+            devices = GPSDevice.objects.all()
+            count = devices.filter(position__isnull=False).count()
+            lats = rng.uniform(BBOX[1], BBOX[3], queries)
+            lons = rng.uniform(BBOX[0], BBOX[2], queries)
+            knn_us = self._time(lambda i: database_nearest(devices, lats[i], lons[i], k), queries)
+            radius_us = self._time(lambda i: database_within(devices, lats[i], lons[i], radius), queries)
+            self.stdout.write(self.style.SUCCESS(f'PostGIS ({count} devices with position)'))
+            self.stdout.write(f'  KNN {k}-nearest:        {knn_us:10.1f} us/query')
+            self.stdout.write(f'  radius {radius:.0f} m:         {radius_us:10.1f} us/query')
+
+    @staticmethod
+    def _fleet(rng, size):
+        rows = np.zeros(size, dtype=SLOT_DTYPE)
+        rows['imei'] = np.arange(size) + 860000000000000
+        rows['longitude'] = rng.uniform(BBOX[0], BBOX[2], size)
+        rows['latitude'] = rng.uniform(BBOX[1], BBOX[3], size)
+        rows['flags'] = FLAG_HAS_FIX | (STATUS_CODES['ONLINE'] << STATUS_SHIFT)
+        return rows
+
+    @staticmethod
+    def _time(function, queries):
+        started = time.perf_counter()
+        for i in range(queries):
+            function(i)
+        return (time.perf_counter() - started) / queries * 1e6
@@ -0,0 +1,181 @@
+"""
+Management command to compare DRF serializers with the values()-based fast path.
+Usage: python manage.py benchmark_serializers [--rows 10000]
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import orjson
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point, Polygon
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from skyguard.apps.gps.fast_serializers import (
+    FastDeviceSerializer, FastGeoFenceEventSerializer, FastGeoFenceSerializer
+)
+from skyguard.apps.gps.models import GeoFence, GeoFenceEvent, GPSDevice
+from skyguard.apps.gps.renderers import ORJSONRenderer
+from skyguard.apps.gps.serializers import GeoFenceEventSerializer, GeoFenceSerializer, GPSDeviceSerializer
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _prefetched(model, objects):
+    """A queryset that behaves as if ``objects`` had been prefetched into it."""
+    queryset = model.objects.all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    return queryset
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the device, geofence and geofence event list responses before (model instances, '
+            'JSONRenderer) and after (values() rows, ORJSONRenderer); serialization only, no database')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=10000,
+            help='Rows per response (default: 10000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Timing repetitions, best is reported (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(5)
+        count, repeat = options['rows'], options['repeat']
+        owner = User(id=1, username='fleet', email='fleet@example.com')
+
+        devices = [self._device(rng, i) for i in range(count)]
+        self._compare(
+            'devices',
+            lambda: JSONRenderer().render({'devices': [self._device_dict(device) for device in devices]}),
+            [self._row(FastDeviceSerializer, self._device_columns(device)) for device in devices],
+            lambda rows: ORJSONRenderer().render({'devices': FastDeviceSerializer.serialize(rows)}),
+            repeat,
+        )
+
+        fence_devices = devices[:5]
+        fences = [self._fence(rng, i, owner, fence_devices) for i in range(count)]
+        fence_device_rows = list(GPSDeviceSerializer(fence_devices, many=True).data)
+        device_rows = {fence.id: fence_device_rows for fence in fences}
+        self._compare(
+            'geofences',
+            lambda: JSONRenderer().render(GeoFenceSerializer(fences, many=True).data),
+            [self._row(FastGeoFenceSerializer, self._fence_columns(fence, owner)) for fence in fences],
+            lambda rows: ORJSONRenderer().render(
+                FastGeoFenceSerializer.serialize(rows, devices=device_rows, notify_owners={})
+            ),
+            repeat,
+        )
+
+        event_fences = fences[:50]
+        events = [
+            GeoFenceEvent(
+                id=i, fence=event_fences[i % 50], device=devices[i % len(devices)],
+                event_type='ENTRY' if i % 2 else 'EXIT', position=devices[i % len(devices)].position,
+                timestamp=START + timedelta(seconds=30 * i), created_at=START + timedelta(seconds=30 * i + 1),
+            )
+            for i in range(count)
+        ]
+        self._compare(
+            'geofence events',
+            lambda: JSONRenderer().render(GeoFenceEventSerializer(events, many=True).data),
+            [self._row(FastGeoFenceEventSerializer, self._event_columns(event)) for event in events],
+            lambda rows: ORJSONRenderer().render(FastGeoFenceEventSerializer.serialize(rows)),
+            repeat,
+        )
+
+    def _compare(self, name, before, rows, after, repeat):
+        before_s, before_body = self._time(before, repeat)
+        after_s, after_body = self._time(lambda: after(rows), repeat)
+        self.stdout.write(self.style.SUCCESS(f'{name} ({len(rows)} rows)'))
+        self.stdout.write(f'  instances + json         {before_s * 1000:9.1f} ms  {len(before_body) / 1024:9.1f} KiB')
+        self.stdout.write(f'  values() + orjson        {after_s * 1000:9.1f} ms  {len(after_body) / 1024:9.1f} KiB'
+                          f'  ({before_s / after_s:.1f}x)')
+
+    @staticmethod
+    def _row(serializer, values):
+        return tuple(values[column] for column in serializer.columns)
+
+    @staticmethod
+    def _device(rng, i):
+        return GPSDevice(
+            imei=860000000000000 + i, name=f'Unidad {i}', serial=i, route=92, economico=i,
+            position=Point(-99.1 + rng.normal(0, 0.1), 19.4 + rng.normal(0, 0.1), srid=4326),
+            speed=float(rng.uniform(0, 90)), course=float(rng.uniform(0, 360)), altitude=2240.0,
+            connection_status='ONLINE', current_ip='10.0.0.1', current_port=5000,
+            last_connection=START, last_heartbeat=START, last_log=START, created_at=START, updated_at=START,
+        )
+
+    @staticmethod
+    def _device_dict(device):
+        """Device list entry as the endpoint built it from model instances."""
+        return {
+            'imei': device.imei, 'name': device.name, 'serial': device.serial, 'model': device.model,
+            'software_version': device.software_version, 'route': device.route, 'economico': device.economico,
+            'position': {'latitude': device.position.y, 'longitude': device.position.x} if device.position else None,
+            'speed': device.speed, 'course': device.course, 'altitude': device.altitude,
+            'odometer': device.odometer, 'connection_status': device.connection_status,
+            'current_ip': device.current_ip, 'current_port': device.current_port,
+            'last_connection': device.last_connection.isoformat() if device.last_connection else None,
+            'last_heartbeat': device.last_heartbeat.isoformat() if device.last_heartbeat else None,
+            'total_connections': device.total_connections,
+            'created_at': device.created_at.isoformat() if device.created_at else None,
+            'updated_at': device.updated_at.isoformat() if device.updated_at else None,
+        }
+
+    @staticmethod
+    def _device_columns(device):
+        columns = {field: getattr(device, field) for field in FastDeviceSerializer.columns
+                   if field not in ('device_latitude', 'device_longitude')}
+        columns.update(device_latitude=device.position.y, device_longitude=device.position.x)
+        return columns
+
+    @staticmethod
+    def _fence(rng, i, owner, devices):
+        x, y = -99.1 + rng.normal(0, 0.1), 19.4 + rng.normal(0, 0.1)
+        angles = np.linspace(0, 2 * np.pi, 24, endpoint=False)
+        ring = [(x + 0.01 * np.cos(a), y + 0.01 * np.sin(a)) for a in angles]
+        fence = GeoFence(id=i + 1, name=f'Geocerca {i}', description='', owner=owner,
+                         geometry=Polygon(ring + ring[:1], srid=4326), created_at=START, updated_at=START)
+        fence._prefetched_objects_cache = {
+            'devices': _prefetched(GPSDevice, devices),
+            'notify_owners': _prefetched(User, []),
+        }
+        return fence
+
+    @staticmethod
+    def _fence_columns(fence, owner):
+        columns = {field: getattr(fence, field, None) for field in FastGeoFenceSerializer.columns}
+        columns.update({
+            'map_geojson': orjson.dumps({'type': 'Polygon', 'coordinates': fence.map_geometry.coords}).decode(),
+            'owner__username': owner.username, 'owner__email': owner.email,
+            'owner__first_name': owner.first_name, 'owner__last_name': owner.last_name,
+        })
+        return columns
+
+    @staticmethod
+    def _event_columns(event):
+        return {
+            'id': event.id, 'fence_id': event.fence_id, 'fence__name': event.fence.name,
+            'device_id': event.device_id, 'device__name': event.device.name,
+            'event_type': event.event_type, 'event_latitude': event.position.y,
+            'event_longitude': event.position.x, 'timestamp': event.timestamp, 'created_at': event.created_at,
+        }
+
+    @staticmethod
+    def _time(function, repeat):
+        best, result = float('inf'), None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = function()
+            best = min(best, time.perf_counter() - started)
+        return best, result
@@ -0,0 +1,89 @@
+"""
+Management command to compare the compact track format with JSON history.
+Usage: python manage.py benchmark_track_format [--points 8640 100000]
+"""
+import gzip
+import json
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from skyguard.apps.gps.services.compact import decode_track, encode_track
+
+
+class Command(BaseCommand):
+    help = 'Benchmark size and encode/decode time of compact tracks against JSON history payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--points',
+            type=int,
+            nargs='+',
+            default=[8640, 100000],
+            help='Track lengths (default: 8640 = 24 h at 10 s, and 100000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Timing repetitions, best is reported (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(11)
+        for count in options['points']:
+            columns = self._track(rng, count)
+            history = [
+                {
+                    'timestamp': datetime.fromtimestamp(t, tz=timezone.utc).isoformat(),
+                    'latitude': lat,
+                    'longitude': lon,
+                    'speed': speed,
+                    'course': course,
+                }
+                for t, lat, lon, speed, course in zip(*(columns[name].tolist() for name in columns))
+            ]
+
+            json_s, payload = self._time(lambda: json.dumps({'history': history}, cls=DjangoJSONEncoder),
+                                         options['repeat'])
+            json_bytes = payload.encode()
+            decode_json_s, _ = self._time(lambda: json.loads(json_bytes), options['repeat'])
+            compact_s, compact = self._time(lambda: encode_track(**columns), options['repeat'])
+            decode_s, _ = self._time(lambda: decode_track(compact), options['repeat'])
+
+            self.stdout.write(self.style.SUCCESS(f'{count} points'))
+            self._row('JSON', len(json_bytes), len(gzip.compress(json_bytes)), json_s, decode_json_s)
+            self._row('compact', len(compact), len(gzip.compress(compact)), compact_s, decode_s)
+
+    def _row(self, name, size, gzipped, encode_s, decode_s):
+        self.stdout.write(
+            f'  {name:8} {size / 1024:10.1f} KiB  gzip {gzipped / 1024:9.1f} KiB  '
+            f'encode {encode_s * 1000:8.1f} ms  decode {decode_s * 1000:8.1f} ms'
+        )
+
+    @staticmethod
+    def _track(rng, count):
+        """A vehicle reporting every ~10 s while driving around the city."""
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+        speed = np.clip(rng.normal(35, 15, count), 0, 110)
+        course = np.cumsum(rng.normal(0, 15, count)) % 360
+        step = speed / 3.6 * 10 / 111195.0
+        return {
+            'time': start + np.cumsum(rng.integers(9, 12, count)),
+            'latitude': np.round(19.4 + np.cumsum(step * np.cos(np.radians(course))), 6),
+            'longitude': np.round(-99.1 + np.cumsum(step * np.sin(np.radians(course))), 6),
+            'speed': np.round(speed, 1),
+            'course': np.round(course, 1),
+        }
+
+    @staticmethod
+    def _time(function, repeat):
+        best, result = float('inf'), None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = function()
+            best = min(best, time.perf_counter() - started)
+        return best, result
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.22 on 2026-10-19 05:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0017_geofence_alert_on_entry_geofence_alert_on_exit_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='name')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='last id')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'rollup watermark',
+                'verbose_name_plural': 'rollup watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='DeviceDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance', models.FloatField(default=0, verbose_name='distance (m)')),
+                ('moving_seconds', models.IntegerField(default=0, verbose_name='moving time (s)')),
+                ('max_speed', models.FloatField(default=0, verbose_name='max speed')),
+                ('speed_sum', models.FloatField(default=0, verbose_name='speed sum')),
+                ('point_count', models.IntegerField(default=0, verbose_name='points')),
+                ('event_count', models.IntegerField(default=0, verbose_name='events')),
+                ('geofence_entries', models.IntegerField(default=0, verbose_name='geofence entries')),
+                ('geofence_exits', models.IntegerField(default=0, verbose_name='geofence exits')),
+                ('first_timestamp', models.DateTimeField(blank=True, null=True, verbose_name='first fix')),
+                ('last_timestamp', models.DateTimeField(blank=True, null=True, verbose_name='last fix')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('day', models.DateField(verbose_name='day')),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='gps.gpsdevice')),
+            ],
+            options={
+                'verbose_name': 'daily telemetry rollup',
+                'verbose_name_plural': 'daily telemetry rollups',
+                'ordering': ['device', 'day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DeviceHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance', models.FloatField(default=0, verbose_name='distance (m)')),
+                ('moving_seconds', models.IntegerField(default=0, verbose_name='moving time (s)')),
+                ('max_speed', models.FloatField(default=0, verbose_name='max speed')),
+                ('speed_sum', models.FloatField(default=0, verbose_name='speed sum')),
+                ('point_count', models.IntegerField(default=0, verbose_name='points')),
+                ('event_count', models.IntegerField(default=0, verbose_name='events')),
+                ('geofence_entries', models.IntegerField(default=0, verbose_name='geofence entries')),
+                ('geofence_exits', models.IntegerField(default=0, verbose_name='geofence exits')),
+                ('first_timestamp', models.DateTimeField(blank=True, null=True, verbose_name='first fix')),
+                ('last_timestamp', models.DateTimeField(blank=True, null=True, verbose_name='last fix')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('bucket', models.DateTimeField(verbose_name='hour')),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_rollups', to='gps.gpsdevice')),
+            ],
+            options={
+                'verbose_name': 'hourly telemetry rollup',
+                'verbose_name_plural': 'hourly telemetry rollups',
+                'ordering': ['device', 'bucket'],
+                'indexes': [models.Index(fields=['bucket'], name='gps_deviceh_bucket_b84a5a_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='devicehourlyrollup',
+            constraint=models.UniqueConstraint(fields=('device', 'bucket'), name='unique_device_hourly_rollup'),
+        ),
+        migrations.AddIndex(
+            model_name='devicedailyrollup',
+            index=models.Index(fields=['day'], name='gps_deviced_day_d2b898_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='devicedailyrollup',
+            constraint=models.UniqueConstraint(fields=('device', 'day'), name='unique_device_daily_rollup'),
+        ),
+    ]
@@ -0,0 +1,120 @@
+"""
+Add bounding box, simplified polygon and subdivided parts to geofences.
+"""
+import django.contrib.gis.db.models.fields
+from django.conf import settings
+from django.contrib.gis.geos import GEOSGeometry, MultiPolygon, Polygon
+from django.db import migrations, models
+
+# Frozen copy of services.geofence_geometry as of this migration, so later
+# changes to the service do not change what the migration does.
+SIMPLIFY_TOLERANCE = 0.00005
+SUBDIVIDE_MAX_VERTICES = 64
+MAX_SUBDIVIDE_DEPTH = 16
+
+
+def simplify_geometry(geometry, tolerance):
+    simplified = geometry.simplify(tolerance, preserve_topology=True)
+    if not isinstance(simplified, Polygon) or simplified.empty or simplified.num_coords >= geometry.num_coords:
+        return geometry.clone()
+    simplified.srid = geometry.srid
+    return simplified
+
+
+def subdivide_shape(geometry, max_vertices, depth=0):
+    import shapely
+
+    if shapely.get_num_coordinates(geometry) <= max_vertices or depth >= MAX_SUBDIVIDE_DEPTH:
+        return [geometry]
+    minx, miny, maxx, maxy = geometry.bounds
+    if maxx - minx >= maxy - miny:
+        middle = (minx + maxx) / 2
+        halves = [(minx, miny, middle, maxy), (middle, miny, maxx, maxy)]
+    else:
+        middle = (miny + maxy) / 2
+        halves = [(minx, miny, maxx, middle), (minx, middle, maxx, maxy)]
+    parts = []
+    for box in halves:
+        piece = shapely.clip_by_rect(geometry, *box)
+        if piece.is_empty:
+            continue
+        for polygon in shapely.get_parts(piece):
+            if polygon.geom_type == 'Polygon' and polygon.area > 0:
+                parts.extend(subdivide_shape(polygon, max_vertices, depth + 1))
+    return parts
+
+
+def fill_derived_geometry(apps, schema_editor):
+    """Compute the derived geometry fields of existing geofences."""
+    import shapely
+
+    config = getattr(settings, 'GPS_GEOFENCE_GEOMETRY', {}) or {}
+    tolerance = config.get('simplify_tolerance', SIMPLIFY_TOLERANCE)
+    max_vertices = max(int(config.get('subdivide_max_vertices', SUBDIVIDE_MAX_VERTICES)), 8)
+
+    GeoFence = apps.get_model('gps', 'GeoFence')
+    fields = ['min_lon', 'min_lat', 'max_lon', 'max_lat', 'vertex_count',
+              'simplified_geometry', 'index_parts']
+    for fence in GeoFence.objects.exclude(geometry=None).iterator():
+        geometry = fence.geometry
+        fence.min_lon, fence.min_lat, fence.max_lon, fence.max_lat = geometry.extent
+        fence.vertex_count = geometry.num_coords
+        fence.simplified_geometry = simplify_geometry(geometry, tolerance)
+        parts = subdivide_shape(shapely.from_wkb(bytes(geometry.wkb)), max_vertices)
+        fence.index_parts = MultiPolygon(
+            [GEOSGeometry(memoryview(part.wkb)) for part in parts], srid=geometry.srid
+        )
+        fence.save(update_fields=fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0018_telemetry_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geofence',
+            name='min_lon',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='geofence',
+            name='min_lat',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='geofence',
+            name='max_lon',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='geofence',
+            name='max_lat',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='geofence',
+            name='vertex_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='geofence',
+            name='simplified_geometry',
+            field=django.contrib.gis.db.models.fields.PolygonField(
+                blank=True, editable=False, help_text='Simplified polygon served to map clients',
+                null=True, srid=4326, verbose_name='simplified polygon'
+            ),
+        ),
+        migrations.AddField(
+            model_name='geofence',
+            name='index_parts',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(
+                blank=True, editable=False,
+                help_text='Polygon subdivided into small parts for containment checks',
+                null=True, srid=4326, verbose_name='index parts'
+            ),
+        ),
+        migrations.RunPython(fill_derived_geometry, migrations.RunPython.noop),
+    ]
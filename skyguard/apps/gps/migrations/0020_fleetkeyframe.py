@@ -0,0 +1,31 @@
+# Generated by Django 4.2.22 on 2026-10-19 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0019_geofence_derived_geometry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FleetKeyframe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(unique=True, verbose_name='timestamp')),
+                ('duration', models.IntegerField(verbose_name='duration (s)')),
+                ('device_count', models.IntegerField(default=0, verbose_name='devices')),
+                ('fix_count', models.IntegerField(default=0, verbose_name='fixes')),
+                ('keyframe', models.BinaryField(verbose_name='keyframe')),
+                ('deltas', models.BinaryField(verbose_name='deltas')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'fleet keyframe',
+                'verbose_name_plural': 'fleet keyframes',
+                'ordering': ['timestamp'],
+            },
+        ),
+    ]
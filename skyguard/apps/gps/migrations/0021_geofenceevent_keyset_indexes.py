@@ -0,0 +1,25 @@
+# Generated by Django 4.2.22 on 2026-10-19 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0020_fleetkeyframe'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='geofenceevent',
+            index=models.Index(fields=['timestamp', 'id'], name='gps_geofenc_timesta_b8f275_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='geofenceevent',
+            index=models.Index(fields=['fence', 'timestamp', 'id'], name='gps_geofenc_fence_i_7d1838_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='geofenceevent',
+            index=models.Index(fields=['device', 'timestamp', 'id'], name='gps_geofenc_device__a3def1_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.22 on 2026-10-19 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0021_geofenceevent_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alarmlog',
+            index=models.Index(fields=['device', 'date'], name='gps_alarmlo_device__88ab4c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alarmlog',
+            index=models.Index(fields=['date'], name='gps_alarmlo_date_ebfba4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pressureweightlog',
+            index=models.Index(fields=['date'], name='gps_pressur_date_066c96_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.22 on 2026-10-19 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0022_sensor_log_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicedailyrollup',
+            name='nonzero_speed_count',
+            field=models.IntegerField(default=0, verbose_name='points with speed'),
+        ),
+        migrations.AddField(
+            model_name='devicehourlyrollup',
+            name='nonzero_speed_count',
+            field=models.IntegerField(default=0, verbose_name='points with speed'),
+        ),
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='gaps',
+            field=models.JSONField(blank=True, default=list, verbose_name='unseen id ranges'),
+        ),
+    ]
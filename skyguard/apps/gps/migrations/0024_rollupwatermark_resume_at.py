@@ -0,0 +1,37 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations, models
+
+# services.playback.TIMELINE_WATERMARK, which kept epoch seconds in last_id
+TIMELINE_WATERMARK = 'playback_timeline'
+
+
+def move_timeline_to_resume_at(apps, schema_editor):
+    RollupWatermark = apps.get_model('gps', 'RollupWatermark')
+    for watermark in RollupWatermark.objects.filter(name=TIMELINE_WATERMARK, last_id__gt=0):
+        watermark.resume_at = datetime.fromtimestamp(watermark.last_id, tz=dt_timezone.utc)
+        watermark.last_id = 0
+        watermark.save(update_fields=['resume_at', 'last_id'])
+
+
+def move_timeline_to_last_id(apps, schema_editor):
+    RollupWatermark = apps.get_model('gps', 'RollupWatermark')
+    for watermark in RollupWatermark.objects.filter(name=TIMELINE_WATERMARK, resume_at__isnull=False):
+        watermark.last_id = int(watermark.resume_at.timestamp())
+        watermark.save(update_fields=['last_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0023_rollup_gaps_nonzero_speed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='resume_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='resume at'),
+        ),
+        migrations.RunPython(move_timeline_to_resume_at, move_timeline_to_last_id),
+    ]
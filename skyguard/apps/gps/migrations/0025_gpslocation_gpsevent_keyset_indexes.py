@@ -0,0 +1,21 @@
+# Generated by Django 4.2.22 on 2026-10-19 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0024_rollupwatermark_resume_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gpsevent',
+            index=models.Index(fields=['device', 'timestamp', 'id'], name='gps_gpseven_device__dc84da_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gpslocation',
+            index=models.Index(fields=['device', 'timestamp', 'id'], name='gps_gpsloca_device__87a7c6_idx'),
+        ),
+    ]
@@ -39,6 +39,12 @@ from .protocols import (
     GPRSSession, GPRSPacket, GPRSRecord, UDPSession, ProtocolLog
 )
 
+# Telemetry rollup models
+from .rollups import DeviceHourlyRollup, DeviceDailyRollup, RollupWatermark
+
+# Fleet playback models
+from .playback import FleetKeyframe
+
 __all__ = [
     # Base models
     'BaseDevice', 'BaseLocation', 'BaseEvent', 'BaseGeoFence',
@@ -65,4 +71,10 @@ __all__ = [
     
     # Protocol models
     'GPRSSession', 'GPRSPacket', 'GPRSRecord', 'UDPSession', 'ProtocolLog',
+    
+    # Telemetry rollup models
+    'DeviceHourlyRollup', 'DeviceDailyRollup', 'RollupWatermark',
+    
+    # Fleet playback models
+    'FleetKeyframe',
 ] 
\ No newline at end of file
@@ -322,6 +322,10 @@ class GPSLocation(BaseLocation):
     class Meta:
         verbose_name = _('GPS location')
         verbose_name_plural = _('GPS locations')
+        indexes = [
+            # Keyset pagination of a device's history
+            models.Index(fields=['device', 'timestamp', 'id']),
+        ]
 
 
 class GPSEvent(BaseEvent):
@@ -341,6 +345,10 @@ class GPSEvent(BaseEvent):
     class Meta:
         verbose_name = _('GPS event')
         verbose_name_plural = _('GPS events')
+        indexes = [
+            # Keyset pagination of a device's events
+            models.Index(fields=['device', 'timestamp', 'id']),
+        ]
 
 
 class IOEvent(GPSEvent):
@@ -407,12 +415,38 @@ class GeoFence(BaseGeoFence):
     # Migrated field from old backend
     base = models.IntegerField(null=True, blank=True, choices=GPSDevice.ROUTE_CHOICES)
 
+    # Derived from geometry on save (services.geofence_geometry)
+    min_lon = models.FloatField(null=True, blank=True, editable=False)
+    min_lat = models.FloatField(null=True, blank=True, editable=False)
+    max_lon = models.FloatField(null=True, blank=True, editable=False)
+    max_lat = models.FloatField(null=True, blank=True, editable=False)
+    vertex_count = models.IntegerField(default=0, editable=False)
+    simplified_geometry = gis_models.PolygonField(
+        _('simplified polygon'), null=True, blank=True, editable=False,
+        help_text='Simplified polygon served to map clients'
+    )
+    index_parts = gis_models.MultiPolygonField(
+        _('index parts'), null=True, blank=True, editable=False,
+        help_text='Polygon subdivided into small parts for containment checks'
+    )
+
     objects = models.Manager()
 
     class Meta:
         verbose_name = _('geofence')
         verbose_name_plural = _('geofences')
 
+    def clean(self):
+        super().clean()
+        if self.geometry is not None:
+            from skyguard.apps.gps.services.geofence_geometry import check_vertex_budget
+            check_vertex_budget(self.geometry)
+
+    @property
+    def map_geometry(self):
+        """Geometry to send to map clients (simplified when available)."""
+        return self.simplified_geometry or self.geometry
+
 
 class GeoFenceEvent(models.Model):
     """Model for geofence events."""
@@ -434,6 +468,12 @@ class GeoFenceEvent(models.Model):
         verbose_name = _('geofence event')
         verbose_name_plural = _('geofence events')
         ordering = ['-timestamp']
+        indexes = [
+            # Keyset pagination on (timestamp, id), see skyguard.apps.gps.pagination
+            models.Index(fields=['timestamp', 'id']),
+            models.Index(fields=['fence', 'timestamp', 'id']),
+            models.Index(fields=['device', 'timestamp', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.event_type} at {self.timestamp}"
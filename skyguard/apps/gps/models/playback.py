@@ -0,0 +1,32 @@
+"""
+Fleet playback models.
+
+Each ``FleetKeyframe`` covers one interval of the fleet timeline: the last
+known position of every device at the start of the interval (the keyframe)
+plus every fix reported during it (the deltas). Both are packed binary arrays
+maintained by ``skyguard.apps.gps.services.playback``, so the fleet state at
+any timestamp is read from one or two rows.
+"""
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class FleetKeyframe(models.Model):
+    """Fleet positions at ``timestamp`` and the fixes of the following interval."""
+    timestamp = models.DateTimeField(_('timestamp'), unique=True)
+    duration = models.IntegerField(_('duration (s)'))
+    device_count = models.IntegerField(_('devices'), default=0)
+    fix_count = models.IntegerField(_('fixes'), default=0)
+    keyframe = models.BinaryField(_('keyframe'))
+    deltas = models.BinaryField(_('deltas'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        verbose_name = _('fleet keyframe')
+        verbose_name_plural = _('fleet keyframes')
+        ordering = ['timestamp']
+
+    def __str__(self):
+        return f"{self.timestamp:%Y-%m-%d %H:%M} ({self.device_count} devices, {self.fix_count} fixes)"
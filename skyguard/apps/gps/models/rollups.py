@@ -0,0 +1,109 @@
+"""
+Telemetry rollup models.
+
+Per-device aggregates over hourly and daily buckets, maintained incrementally
+by ``skyguard.apps.gps.services.rollups`` so reports and dashboards read a
+handful of rows instead of scanning raw location points.
+"""
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from .device import GPSDevice
+
+
+class BaseTelemetryRollup(models.Model):
+    """Aggregated telemetry for one device over one bucket."""
+    distance = models.FloatField(_('distance (m)'), default=0)
+    moving_seconds = models.IntegerField(_('moving time (s)'), default=0)
+    max_speed = models.FloatField(_('max speed'), default=0)
+    speed_sum = models.FloatField(_('speed sum'), default=0)
+    point_count = models.IntegerField(_('points'), default=0)
+    nonzero_speed_count = models.IntegerField(_('points with speed'), default=0)
+    event_count = models.IntegerField(_('events'), default=0)
+    geofence_entries = models.IntegerField(_('geofence entries'), default=0)
+    geofence_exits = models.IntegerField(_('geofence exits'), default=0)
+    first_timestamp = models.DateTimeField(_('first fix'), null=True, blank=True)
+    last_timestamp = models.DateTimeField(_('last fix'), null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        abstract = True
+
+    @property
+    def avg_speed(self):
+        """Average speed over all points in the bucket."""
+        return self.speed_sum / self.point_count if self.point_count else 0.0
+
+    @property
+    def avg_nonzero_speed(self):
+        """Average speed over the points with a non-zero speed."""
+        return self.speed_sum / self.nonzero_speed_count if self.nonzero_speed_count else 0.0
+
+
+class DeviceHourlyRollup(BaseTelemetryRollup):
+    """Telemetry aggregated per (device, hour)."""
+    device = models.ForeignKey(GPSDevice, on_delete=models.CASCADE, related_name='hourly_rollups')
+    bucket = models.DateTimeField(_('hour'))
+
+    class Meta:
+        verbose_name = _('hourly telemetry rollup')
+        verbose_name_plural = _('hourly telemetry rollups')
+        ordering = ['device', 'bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['device', 'bucket'], name='unique_device_hourly_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} @ {self.bucket:%Y-%m-%d %H}h"
+
+
+class DeviceDailyRollup(BaseTelemetryRollup):
+    """Telemetry aggregated per (device, day)."""
+    device = models.ForeignKey(GPSDevice, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField(_('day'))
+
+    class Meta:
+        verbose_name = _('daily telemetry rollup')
+        verbose_name_plural = _('daily telemetry rollups')
+        ordering = ['device', 'day']
+        constraints = [
+            models.UniqueConstraint(fields=['device', 'day'], name='unique_device_daily_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} @ {self.day}"
+
+
+class RollupWatermark(models.Model):
+    """
+    Highest source row id already folded into the rollups, per source.
+
+    ``gaps`` holds the id ranges skipped when ``last_id`` advanced, as
+    ``[first, last, seen_at]`` lists. Their rows may belong to transactions
+    that had not committed yet, so they are looked up again on later runs.
+
+    Watermarks over time instead of ids (e.g. the next playback interval to
+    build) use ``resume_at``.
+    """
+    name = models.CharField(_('name'), max_length=50, unique=True)
+    last_id = models.BigIntegerField(_('last id'), default=0)
+    gaps = models.JSONField(_('unseen id ranges'), default=list, blank=True)
+    resume_at = models.DateTimeField(_('resume at'), null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        verbose_name = _('rollup watermark')
+        verbose_name_plural = _('rollup watermarks')
+
+    def __str__(self):
+        return f"{self.name}: {self.last_id}"
@@ -50,6 +50,7 @@ class PressureWeightLog(models.Model):
         indexes = [
             models.Index(fields=['device', 'date']),
             models.Index(fields=['sensor']),
+            models.Index(fields=['date']),
         ]
 
     def __str__(self):
@@ -73,6 +74,10 @@ class AlarmLog(models.Model):
         verbose_name_plural = _('alarm logs')
         ordering = ['-date']
         get_latest_by = 'date'
+        indexes = [
+            models.Index(fields=['device', 'date']),
+            models.Index(fields=['date']),
+        ]
 
     def __str__(self):
         return f'Sensor alarm {self.comment}:{self.sensor[:8]} @ {self.date.strftime("%H:%M:%S")}'
@@ -0,0 +1,318 @@
+"""
+DRF pagination for the GPS application.
+
+High-volume lists (events, locations, geofence events) use keyset pagination:
+pages are selected with ``WHERE (timestamp, id) < (last timestamp, last id)``
+on an index instead of ``OFFSET``, so the cost of a page does not grow with
+its depth, and no ``COUNT(*)`` is run unless the client asks for one. The
+position is handed out as an opaque cursor in the ``next``/``previous`` links.
+
+Page-number pagination stays the DRF default. ``EstimatedCountPaginator``
+(used by the telemetry admin) takes the total of a large, unfiltered table
+from the PostgreSQL planner statistics instead of counting it.
+"""
+import base64
+import binascii
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Optional, Sequence, Tuple
+
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(position: Sequence[Any], reverse: bool = False) -> str:
+    """
+    Opaque cursor for a keyset position.
+
+    Args:
+        position: Values of the ordering fields of the row at the page edge
+        reverse: Whether the cursor selects the rows before the position
+    """
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in position]
+    payload = json.dumps({'p': values, 'r': int(reverse)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[list, bool]:
+    """
+    Position and direction of a cursor made by ``encode_cursor``.
+
+    ISO 8601 strings are turned back into datetimes.
+
+    Raises:
+        ValueError: The cursor is malformed
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values, reverse = payload['p'], bool(payload.get('r'))
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    if not isinstance(values, list) or not values:
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+
+    position = []
+    for value in values:
+        if isinstance(value, str):
+            value = parse_datetime(value) or value
+        position.append(value)
+    return position, reverse
+
+
+def keyset_filter(ordering: Sequence[str], position: Sequence[Any]) -> Q:
+    """
+    Rows strictly after ``position`` in ``ordering``.
+
+    For ``('-timestamp', '-id')`` this is ``timestamp < t OR (timestamp = t
+    AND id < i)``, the expanded form of the row comparison
+    ``(timestamp, id) < (t, i)``, plus a redundant ``timestamp <= t`` that
+    lets PostgreSQL bound the index scan.
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, position):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    first = ordering[0]
+    bound = 'lte' if first.startswith('-') else 'gte'
+    return Q(**{f'{first.lstrip("-")}__{bound}': position[0]}) & condition
+
+
+def is_unfiltered(queryset: QuerySet) -> bool:
+    """Whether a queryset reads every row of its table."""
+    query = queryset.query
+    return not (query.where or query.distinct or query.group_by or query.is_sliced)
+
+
+def estimate_count(queryset: QuerySet) -> Optional[int]:
+    """
+    Planner estimate of the number of rows in a queryset.
+
+    Unfiltered querysets read ``pg_class.reltuples``; filtered ones the row
+    estimate of ``EXPLAIN``. Both cost a catalog lookup instead of a scan.
+
+    Returns:
+        The estimate, or ``None`` on other databases or when the table has
+        no statistics yet
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        if is_unfiltered(queryset):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            estimate = row[0] if row else -1
+        else:
+            plan = json.loads(queryset.order_by().explain(format='json'))
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+    except (DatabaseError, ValueError, KeyError, IndexError) as e:
+        logger.warning(f"Could not estimate count of {queryset.model.__name__}: {e}")
+        return None
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedPage(Page):
+    """Page of an ``EstimatedCountPaginator``; a full page past the estimate has a next page."""
+
+    def has_next(self):
+        if self.paginator.estimated:
+            return len(self) >= self.paginator.per_page
+        return super().has_next()
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that stops counting exactly above ``exact_count_threshold`` rows.
+
+    Only unfiltered querysets are estimated, from ``pg_class.reltuples``: the
+    ``EXPLAIN`` row estimate of a filtered queryset can be off by orders of
+    magnitude. Because the statistics lag behind the table, pages past the
+    estimated last page are still served while they have rows, and the
+    last pages may come out short or empty.
+    """
+    exact_count_threshold = 10000
+    estimated = False
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet) and is_unfiltered(self.object_list):
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate > self.exact_count_threshold:
+                self.estimated = True
+                return estimate
+        return super().count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not self.estimated or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if not self.estimated and top + self.orphans >= self.count:
+            top = self.count
+        return self._get_page(self.object_list[bottom:top], number, self)
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedPage(*args, **kwargs)
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """
+    Page-number pagination counted by ``EstimatedCountPaginator``.
+
+    Only worth it for views listing a large table unfiltered; filtered
+    lists are counted exactly anyway.
+    """
+    django_paginator_class = EstimatedCountPaginator
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination on ``ordering``, by default ``(-timestamp, -id)``.
+
+    The last ordering field must be unique. Query parameters:
+
+    - ``cursor``: opaque position from a ``next``/``previous`` link
+    - ``page_size``: rows per page, up to ``max_page_size``
+    - ``count``: ``exact`` or ``estimate`` to include a total; omitted otherwise
+    """
+    ordering = ('-timestamp', '-id')
+    page_size = 100
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        position, reverse = None, False
+        if encoded:
+            try:
+                position, reverse = decode_cursor(encoded)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            if len(position) != len(self.ordering):
+                raise NotFound(self.invalid_cursor_message)
+
+        self.count = self.get_count(queryset, request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(ordering, position))
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        # Arriving through a cursor means there are rows on the other side of it.
+        self.has_next = position is not None if reverse else has_more
+        self.has_previous = has_more if reverse else position is not None
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            return estimate_count(queryset)
+        return None
+
+    def _position(self, row):
+        return [getattr(row, field.lstrip('-')) for field in self.ordering]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        cursor = encode_cursor(self._position(self.page[-1]))
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        cursor = encode_cursor(self._position(self.page[0]), reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Include a total: "exact" or "estimate".',
+                'schema': {'type': 'string', 'enum': ['exact', 'estimate']},
+            },
+        ]
@@ -0,0 +1,22 @@
+"""
+GPS ingest pipeline package.
+"""
+from skyguard.apps.gps.pipeline.base import (
+    Fix, PipelineStage, DeviceStateBuffer, IngestPipeline, register_flush_at_exit, register_periodic_flush
+)
+from skyguard.apps.gps.pipeline.odometer import OdometerStage, haversine_distance
+from skyguard.apps.gps.pipeline.recent import RecentFixStage
+from skyguard.apps.gps.pipeline.latest_state import LatestStateStage
+from skyguard.apps.gps.pipeline.geofence import GeofenceStage
+from skyguard.apps.gps.pipeline.route_corridor import RouteCorridorStage
+
+# Process-wide pipeline used by the ingest servers
+ingest_pipeline = IngestPipeline()
+register_flush_at_exit(ingest_pipeline)
+register_periodic_flush(ingest_pipeline)
+
+__all__ = [
+    'Fix', 'PipelineStage', 'DeviceStateBuffer', 'IngestPipeline',
+    'OdometerStage', 'RecentFixStage', 'LatestStateStage', 'GeofenceStage', 'RouteCorridorStage',
+    'haversine_distance', 'ingest_pipeline',
+]
@@ -0,0 +1,303 @@
+"""
+Core building blocks of the GPS ingest pipeline.
+
+Every decoded fix is wrapped in a ``Fix`` and passed through an ordered list of
+stages. Stages keep their own per-device state in memory so that derived values
+(odometer, etc.) are computed incrementally instead of being rebuilt from the
+event tables. The latest state of each device is accumulated in a
+``DeviceStateBuffer`` and written back with a single ``bulk_update``.
+
+Buffers are flushed by size or age when a fix comes in. A process that
+ingests fixes also runs a daemon thread (``register_periodic_flush``) that
+flushes buffers whose age passed while no fixes arrived.
+"""
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db.models import Case, DateTimeField, Q, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STAGES = [
+    'skyguard.apps.gps.pipeline.odometer.OdometerStage',
+    'skyguard.apps.gps.pipeline.recent.RecentFixStage',
+    'skyguard.apps.gps.pipeline.latest_state.LatestStateStage',
+    'skyguard.apps.gps.pipeline.geofence.GeofenceStage',
+    'skyguard.apps.gps.pipeline.route_corridor.RouteCorridorStage',
+]
+
+DEFAULT_STATE_BATCH_SIZE = 200
+DEFAULT_STATE_FLUSH_INTERVAL = 5.0  # seconds
+DEFAULT_PERIODIC_FLUSH_INTERVAL = 1.0  # seconds between checks of the flush thread
+
+
+def get_pipeline_config() -> Dict[str, Any]:
+    """Return the ``GPS_INGEST_PIPELINE`` settings dict (empty if unset)."""
+    return getattr(settings, 'GPS_INGEST_PIPELINE', {}) or {}
+
+
+@dataclass
+class Fix:
+    """A single decoded GPS fix flowing through the pipeline."""
+    imei: int
+    timestamp: datetime
+    latitude: float
+    longitude: float
+    speed: float = 0.0
+    course: float = 0.0
+    altitude: float = 0.0
+    hdop: Optional[float] = None
+    satellites: Optional[int] = None
+    odometer: Optional[float] = None
+    trail: bool = True  # stored as a trail event (TRAIL_EVENT_TYPES), so shown on trails
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def point(self) -> Point:
+        """Position as a GEOS point (x=lon, y=lat)."""
+        return Point(self.longitude, self.latitude, srid=4326)
+
+    @classmethod
+    def from_point(cls, imei: int, position: Point, timestamp: datetime, **kwargs) -> 'Fix':
+        """Build a fix from a GEOS point."""
+        return cls(imei=int(imei), timestamp=timestamp,
+                   latitude=position.y, longitude=position.x, **kwargs)
+
+
+class PipelineStage:
+    """Base class for ingest pipeline stages."""
+
+    def process(self, fix: Fix, device=None) -> None:
+        """
+        Process a fix.
+
+        Args:
+            fix: Fix being ingested; stages may annotate it in place
+            device: GPSDevice instance if the caller already has it loaded
+        """
+        raise NotImplementedError("Subclasses must implement process()")
+
+    def flush(self) -> None:
+        """Persist any buffered work. Called when the pipeline is flushed."""
+
+    def flush_if_due(self) -> None:
+        """Persist buffered work that is old or large enough. Called by the periodic flush."""
+
+    def reset(self, imei: Optional[int] = None) -> None:
+        """Drop in-memory state for one device, or for all devices."""
+
+
+class DeviceStateBuffer:
+    """
+    Accumulates the latest state of each device and writes it in batches.
+
+    Only the newest fix per device is kept, so a flush costs one
+    ``bulk_update`` per batch no matter how many fixes arrived in between.
+    """
+
+    # updated_at is listed because bulk_update skips auto_now; the
+    # latest-state tables of other hosts reconcile on it
+    FIELDS = ['position', 'speed', 'course', 'altitude', 'last_log', 'updated_at', 'odometer']
+
+    def __init__(self, batch_size: Optional[int] = None, flush_interval: Optional[float] = None):
+        config = get_pipeline_config()
+        self.batch_size = batch_size or config.get('state_batch_size', DEFAULT_STATE_BATCH_SIZE)
+        self.flush_interval = flush_interval or config.get(
+            'state_flush_interval', DEFAULT_STATE_FLUSH_INTERVAL
+        )
+        self._pending: Dict[int, Fix] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, fix: Fix) -> None:
+        """Record a fix as the latest state of its device, flushing if due."""
+        with self._lock:
+            current = self._pending.get(fix.imei)
+            if current is None or fix.timestamp >= current.timestamp:
+                self._pending[fix.imei] = fix
+            due = len(self._pending) >= self.batch_size
+        if due:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self) -> None:
+        """Flush if states are pending for longer than ``flush_interval``."""
+        with self._lock:
+            due = self._pending and time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write all pending device states. Returns the number of devices updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        from skyguard.apps.gps.models import GPSDevice
+
+        fixes = list(pending.values())
+        updated = 0
+        try:
+            for start in range(0, len(fixes), self.batch_size):
+                updated += self._write(GPSDevice, fixes[start:start + self.batch_size])
+        except Exception as e:
+            logger.error(f"Error flushing device state for {len(fixes)} devices: {e}")
+            return 0
+        return updated
+
+    def _write(self, model, fixes: List[Fix]) -> int:
+        """
+        Write one batch of fixes.
+
+        Rows whose ``last_log`` is already as new as the fix are left alone:
+        the protocol servers save the device themselves and may have written
+        a newer position in the meantime. Fixes without an odometer reading
+        (no odometer stage) do not touch the stored odometer.
+        """
+        fix_time = Case(*[When(imei=fix.imei, then=Value(fix.timestamp)) for fix in fixes],
+                        output_field=DateTimeField())
+        queryset = model.objects.filter(Q(last_log__isnull=True) | Q(last_log__lt=fix_time))
+        updated = 0
+        for with_odometer in (True, False):
+            devices = [self._device(model, fix) for fix in fixes if (fix.odometer is not None) == with_odometer]
+            if devices:
+                fields = self.FIELDS if with_odometer else [name for name in self.FIELDS if name != 'odometer']
+                updated += queryset.bulk_update(devices, fields)
+        return updated
+
+    @staticmethod
+    def _device(model, fix: Fix):
+        device = model(imei=fix.imei)
+        device.position = fix.point
+        device.speed = fix.speed
+        device.course = fix.course
+        device.altitude = fix.altitude
+        device.last_log = fix.timestamp
+        device.updated_at = timezone.now()
+        device.odometer = fix.odometer
+        return device
+
+
+class IngestPipeline:
+    """Ordered chain of stages applied to every incoming fix."""
+
+    def __init__(self, stages: Optional[List[PipelineStage]] = None,
+                 state_buffer: Optional[DeviceStateBuffer] = None):
+        self._stages = stages
+        self._state_buffer = state_buffer
+        self._lock = threading.Lock()
+        self.periodic_flush = False
+        self._flusher: Optional[threading.Thread] = None
+
+    @property
+    def stages(self) -> List[PipelineStage]:
+        """Stages, built lazily from ``GPS_INGEST_PIPELINE['stages']``."""
+        if self._stages is None:
+            with self._lock:
+                if self._stages is None:
+                    paths = get_pipeline_config().get('stages', DEFAULT_STAGES)
+                    self._stages = [import_string(path)() for path in paths]
+        return self._stages
+
+    @property
+    def state_buffer(self) -> DeviceStateBuffer:
+        if self._state_buffer is None:
+            self._state_buffer = DeviceStateBuffer()
+        return self._state_buffer
+
+    def get_stage(self, stage_class):
+        """Return the first stage that is an instance of ``stage_class``."""
+        for stage in self.stages:
+            if isinstance(stage, stage_class):
+                return stage
+        return None
+
+    def process(self, fix: Fix, device=None) -> Fix:
+        """
+        Run a fix through all stages and queue the resulting device state.
+
+        A failing stage is logged and skipped so it never blocks ingestion.
+        """
+        if self.periodic_flush and self._flusher is None:
+            self._start_flusher()
+        for stage in self.stages:
+            try:
+                stage.process(fix, device)
+            except Exception as e:
+                logger.error(f"Pipeline stage {stage.__class__.__name__} failed for {fix.imei}: {e}")
+        self.state_buffer.add(fix)
+        return fix
+
+    def flush(self) -> None:
+        """Flush buffered device state and any stage-level buffers."""
+        self.state_buffer.flush()
+        for stage in self.stages:
+            try:
+                stage.flush()
+            except Exception as e:
+                logger.error(f"Error flushing pipeline stage {stage.__class__.__name__}: {e}")
+
+    def flush_if_due(self) -> None:
+        """Flush the device state and the stage buffers that are due."""
+        self.state_buffer.flush_if_due()
+        for stage in self.stages:
+            try:
+                stage.flush_if_due()
+            except Exception as e:
+                logger.error(f"Error flushing pipeline stage {stage.__class__.__name__}: {e}")
+
+    def _start_flusher(self) -> None:
+        with self._lock:
+            if self._flusher is not None:
+                return
+            interval = get_pipeline_config().get('periodic_flush_interval', DEFAULT_PERIODIC_FLUSH_INTERVAL)
+            self._flusher = threading.Thread(target=self._flush_periodically, args=(interval,),
+                                             name='gps-pipeline-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self, interval: float) -> None:
+        from django.db import close_old_connections
+
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush_if_due()
+            except Exception as e:
+                logger.error(f"Error in periodic pipeline flush: {e}")
+            finally:
+                close_old_connections()
+
+    def reset(self, imei: Optional[int] = None) -> None:
+        """Drop in-memory state in every stage."""
+        for stage in self.stages:
+            stage.reset(imei)
+
+
+def register_flush_at_exit(pipeline: IngestPipeline) -> None:
+    """Make sure buffered state is written when the ingest process exits."""
+    atexit.register(pipeline.flush)
+
+
+def register_periodic_flush(pipeline: IngestPipeline) -> None:
+    """
+    Flush due buffers from a daemon thread once the pipeline ingests its first fix.
+
+    Without it a buffered transition waits for the next fix that happens to
+    be processed, which on a quiet server can take hours.
+    """
+    pipeline.periodic_flush = True
@@ -0,0 +1,202 @@
+"""
+Streaming geofence transition detection.
+
+Each fix is checked against the device's fences as it is ingested. The
+segment from the previous fix is intersected with the fence boundaries, so a
+vehicle that enters and leaves a fence between two samples still produces
+both events, timestamped by interpolation along the segment. The
+``MIN_TRANSITION_INTERVAL`` debounce only applies to the state observed at a
+fix; interpolated crossings are exact and always recorded.
+
+Transitions are buffered and written with one ``bulk_create`` once
+``batch_size`` are pending or ``flush_interval`` has passed, checked on every
+fix and by the pipeline's periodic flush; notifications and broadcasts run
+asynchronously in the ``process_geofence_transitions`` Celery task.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+from skyguard.apps.gps.pipeline.base import Fix, PipelineStage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GEOFENCE_STREAM_CONFIG = {
+    'batch_size': 100,     # transitions per bulk insert
+    'flush_interval': 1.0,  # seconds before pending transitions are written
+}
+
+# (timestamp, inside, longitude, latitude)
+Observation = Tuple[datetime, bool, float, float]
+
+
+class GeofenceStage(PipelineStage):
+    """Detect geofence entries/exits from consecutive fixes of a device."""
+
+    def __init__(self, index=None, state_cache=None, config: Optional[dict] = None):
+        if index is None:
+            from skyguard.apps.gps.services.geofence_index import geofence_index
+            index = geofence_index
+        if state_cache is None:
+            from skyguard.apps.gps.services.geofence_state import geofence_state_cache
+            state_cache = geofence_state_cache
+        self.index = index
+        self.state_cache = state_cache
+        self.config = dict(DEFAULT_GEOFENCE_STREAM_CONFIG)
+        self.config.update(getattr(settings, 'GPS_GEOFENCE_STREAM', {}) or {})
+        if config:
+            self.config.update(config)
+
+        self._last: Dict[int, Tuple[float, float, datetime]] = {}
+        # Fences each device is inside according to its stored states
+        self._inside: Dict[int, Set[int]] = {}
+        self._pending_events: List[dict] = []
+        self._pending_states: Dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def process(self, fix: Fix, device=None) -> None:
+        self.flush_if_due()
+        imei = fix.imei
+        previous = self._last.get(imei)
+        if previous is not None and fix.timestamp <= previous[2]:
+            return
+        self._last[imei] = (fix.longitude, fix.latitude, fix.timestamp)
+
+        fence_ids = self.index.fence_ids_for_device(imei)
+        if not fence_ids:
+            return
+
+        inside_now = self.index.containing(fix.longitude, fix.latitude) & fence_ids
+        crossings = {}
+        if previous is not None:
+            crossings = {
+                fence_id: fractions
+                for fence_id, fractions in self.index.crossings(
+                    previous[0], previous[1], fix.longitude, fix.latitude
+                ).items()
+                if fence_id in fence_ids
+            }
+
+        # Stored states already match the fix: skip the state lookup
+        if not crossings and self._inside.get(imei) == inside_now:
+            return
+
+        self._detect(imei, fix, previous, fence_ids, inside_now, crossings)
+        self.flush_if_due()
+
+    def _observations(self, fence_id: int, fix: Fix, previous, fractions) -> List[Observation]:
+        """Inside/outside observations along the segment, ending at the fix."""
+        observations = []
+        x0, y0, t0 = previous
+        dx, dy = fix.longitude - x0, fix.latitude - y0
+        seconds = (fix.timestamp - t0).total_seconds()
+        bounds = [0.0] + [float(f) for f in fractions] + [1.0]
+        for i, fraction in enumerate(bounds[1:-1], start=1):
+            # State right after the crossing = state at the middle of the next piece
+            middle = (bounds[i] + bounds[i + 1]) / 2
+            inside = self.index.contains(fence_id, x0 + dx * middle, y0 + dy * middle)
+            observations.append((
+                t0 + timedelta(seconds=seconds * fraction), inside,
+                x0 + dx * fraction, y0 + dy * fraction,
+            ))
+        return observations
+
+    def _detect(self, imei: int, fix: Fix, previous, fence_ids, inside_now, crossings) -> None:
+        from skyguard.apps.gps.services.geofence_state import (
+            MIN_TRANSITION_INTERVAL, GeofenceState, detect_transition
+        )
+
+        states = self.state_cache.get_states(imei)
+        with self._lock:
+            states.update(self._pending_states.get(imei, {}))
+        changed = {}
+        events = []
+        for fence_id in fence_ids:
+            observations = []
+            if fence_id in crossings:
+                observations = self._observations(fence_id, fix, previous, crossings[fence_id])
+            observations.append((fix.timestamp, fence_id in inside_now, fix.longitude, fix.latitude))
+
+            for position, (timestamp, inside, longitude, latitude) in enumerate(observations, start=1):
+                state = states.get(fence_id)
+                # Only the fix itself is debounced, crossings are exact
+                min_interval = MIN_TRANSITION_INTERVAL if position == len(observations) else 0
+                event_type = detect_transition(state, inside, timestamp.timestamp(), min_interval)
+                if event_type:
+                    states[fence_id] = GeofenceState(
+                        inside=inside,
+                        since=timestamp.timestamp(),
+                        last_notified=state.last_notified if state else None
+                    )
+                    changed[fence_id] = states[fence_id]
+                    events.append({
+                        'fence_id': fence_id, 'device_id': imei, 'event_type': event_type,
+                        'longitude': longitude, 'latitude': latitude, 'timestamp': timestamp,
+                    })
+                elif state is None and not inside:
+                    states[fence_id] = GeofenceState(inside=False)
+                    changed[fence_id] = states[fence_id]
+
+        # A debounced change leaves the stored state behind the fix, so the
+        # next fix of the device is checked again
+        self._inside[imei] = {
+            fence_id for fence_id in fence_ids if states.get(fence_id) and states[fence_id].inside
+        }
+        if changed:
+            with self._lock:
+                self._pending_events.extend(events)
+                self._pending_states.setdefault(imei, {}).update(changed)
+
+    def flush_if_due(self) -> None:
+        with self._lock:
+            due = self._pending_states and (
+                len(self._pending_events) >= self.config['batch_size'] or
+                time.monotonic() - self._last_flush >= self.config['flush_interval']
+            )
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write pending transitions and queue their notifications."""
+        with self._lock:
+            events, self._pending_events = self._pending_events, []
+            states, self._pending_states = self._pending_states, {}
+            self._last_flush = time.monotonic()
+        if not states:
+            return
+
+        from django.contrib.gis.geos import Point
+        from skyguard.apps.gps.models import GeoFenceEvent
+
+        if events:
+            rows = GeoFenceEvent.objects.bulk_create([
+                GeoFenceEvent(
+                    fence_id=event['fence_id'],
+                    device_id=event['device_id'],
+                    event_type=event['event_type'],
+                    position=Point(event['longitude'], event['latitude'], srid=4326),
+                    timestamp=event['timestamp'],
+                )
+                for event in events
+            ])
+        self.state_cache.set_many(states)
+
+        if events:
+            from skyguard.apps.gps.tasks import process_geofence_transitions
+            try:
+                process_geofence_transitions.delay([row.id for row in rows])
+            except Exception as e:
+                logger.error(f"Error queuing notifications for {len(rows)} geofence events: {e}")
+
+    def reset(self, imei: Optional[int] = None) -> None:
+        if imei is None:
+            self._last.clear()
+            self._inside.clear()
+        else:
+            self._last.pop(imei, None)
+            self._inside.pop(imei, None)
@@ -0,0 +1,29 @@
+"""
+Ingest stage that writes each fix into the shared-memory latest-state table.
+"""
+from django.utils import timezone
+
+from skyguard.apps.gps.pipeline.base import Fix, PipelineStage
+
+
+class LatestStateStage(PipelineStage):
+    """Publish the newest position of each device to ``latest_state_table``."""
+
+    def __init__(self, table=None):
+        if table is None:
+            from skyguard.apps.gps.services.latest_state import latest_state_table
+            table = latest_state_table
+        self.table = table
+
+    def process(self, fix: Fix, device=None) -> None:
+        self.table.update(
+            fix.imei,
+            latitude=fix.latitude,
+            longitude=fix.longitude,
+            speed=fix.speed,
+            course=fix.course,
+            altitude=fix.altitude,
+            fix_time=fix.timestamp,
+            heartbeat_time=timezone.now(),
+            status='ONLINE',
+        )
@@ -0,0 +1,209 @@
+"""
+Incremental per-device odometer.
+
+The odometer is advanced by the haversine distance between consecutive fixes
+as they are ingested, so ``GPSDevice.odometer`` and the odometer stored on
+events are always current without walking the event history (the legacy
+``setupOdom`` approach). Distances are in meters, like the legacy ``odom``.
+
+Fixes of one device are ingested by whichever process receives them: the
+hardware servers and every web worker running ``GPSService.process_location``.
+The previous fix and odometer of each device therefore live in Redis (one
+key per device), and each step is applied as an optimistic transaction so
+two processes handling fixes of the same device never measure against a
+stale fix or overwrite each other's odometer. Without Redis the state falls
+back to process memory, which is only correct while a single process
+ingests each device.
+"""
+import math
+import struct
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from skyguard.apps.gps.pipeline.base import Fix, PipelineStage
+from skyguard.apps.gps.services.redis_client import get_redis_client
+
+EARTH_RADIUS_M = 6371008.8
+
+DEFAULT_ODOMETER_CONFIG = {
+    'max_hdop': 5.0,            # fixes with a worse HDOP are ignored
+    'stationary_speed': 3.0,    # km/h; below this the device is considered parked
+    'stationary_radius': 30.0,  # m; drift allowed while parked before counting
+    'min_distance': 5.0,        # m; smaller steps are treated as jitter
+    'max_speed': 250.0,         # km/h; implied speeds above this are outliers
+    'state_ttl': 7 * 24 * 3600,  # seconds an idle device's previous fix is kept in Redis
+}
+
+# latitude, longitude, epoch, odometer
+OdometerState = Tuple[float, float, float, float]
+STATE = struct.Struct('<dddd')
+
+
+def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters between two WGS84 coordinates."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class RedisOdometerStore:
+    """Previous accepted fix and odometer of each device in a Redis key."""
+
+    KEY = 'gps:odometer:{imei}'
+    RETRIES = 10
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    def get(self, client, imei: int) -> Optional[OdometerState]:
+        raw = client.get(self.KEY.format(imei=imei))
+        return STATE.unpack(raw) if raw else None
+
+    def update(self, client, imei: int,
+               advance: Callable[[Optional[OdometerState]], Optional[OdometerState]]) -> Optional[OdometerState]:
+        """
+        Replace the state with ``advance(current)`` unless another process changed it meanwhile.
+
+        ``advance`` returns ``None`` to leave the state as it is. It is called
+        again with the new state when the update races another process.
+        """
+        from redis.exceptions import WatchError
+
+        key = self.KEY.format(imei=imei)
+        with client.pipeline() as pipe:
+            for _ in range(self.RETRIES):
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    current = STATE.unpack(raw) if raw else None
+                    state = advance(current)
+                    if state is None:
+                        pipe.unwatch()
+                        return current
+                    pipe.multi()
+                    pipe.set(key, STATE.pack(*state), ex=self.ttl)
+                    pipe.execute()
+                    return state
+                except WatchError:
+                    continue
+        raise RuntimeError(f"Odometer of {imei} kept changing during {self.RETRIES} attempts")
+
+    def clear(self, client, imei: Optional[int] = None) -> None:
+        if imei is None:
+            keys = list(client.scan_iter(self.KEY.format(imei='*')))
+            if keys:
+                client.delete(*keys)
+        else:
+            client.delete(self.KEY.format(imei=imei))
+
+
+class LocalOdometerStore:
+    """In-process equivalent of ``RedisOdometerStore``."""
+
+    def __init__(self, ttl: int):
+        self._states: Dict[int, OdometerState] = {}
+        self._lock = threading.Lock()
+
+    def get(self, client, imei: int) -> Optional[OdometerState]:
+        with self._lock:
+            return self._states.get(imei)
+
+    def update(self, client, imei: int,
+               advance: Callable[[Optional[OdometerState]], Optional[OdometerState]]) -> Optional[OdometerState]:
+        with self._lock:
+            current = self._states.get(imei)
+            state = advance(current)
+            if state is None:
+                return current
+            self._states[imei] = state
+            return state
+
+    def clear(self, client, imei: Optional[int] = None) -> None:
+        with self._lock:
+            if imei is None:
+                self._states.clear()
+            else:
+                self._states.pop(imei, None)
+
+
+class OdometerStage(PipelineStage):
+    """
+    Pipeline stage that maintains the odometer of each device.
+
+    The previous accepted fix of each device is kept in Redis (see the module
+    docstring). A new fix adds its haversine distance to the previous one
+    unless it is filtered as jitter: poor HDOP, a stationary device wandering
+    inside ``stationary_radius``, a step shorter than ``min_distance`` or an
+    implausible implied speed.
+    """
+
+    def __init__(self, config: Optional[Dict[str, float]] = None):
+        self.config = dict(DEFAULT_ODOMETER_CONFIG)
+        self.config.update(getattr(settings, 'GPS_ODOMETER', {}) or {})
+        if config:
+            self.config.update(config)
+        self.redis_store = RedisOdometerStore(int(self.config['state_ttl']))
+        self.local_store = LocalOdometerStore(int(self.config['state_ttl']))
+
+    def _store(self):
+        client = get_redis_client()
+        return (self.redis_store, client) if client is not None else (self.local_store, None)
+
+    def _initial_odometer(self, imei: int, device=None) -> float:
+        """Odometer to start from when a device is seen for the first time."""
+        if device is not None:
+            return float(device.odometer or 0)
+        from skyguard.apps.gps.models import GPSDevice
+        value = GPSDevice.objects.filter(imei=imei).values_list('odometer', flat=True).first()
+        return float(value or 0)
+
+    def get_odometer(self, imei: int) -> Optional[float]:
+        """Current odometer of a device, if it has been seen."""
+        store, client = self._store()
+        state = store.get(client, int(imei))
+        return state[3] if state else None
+
+    def process(self, fix: Fix, device=None) -> None:
+        imei = int(fix.imei)
+        store, client = self._store()
+        initial = None
+        if store.get(client, imei) is None:
+            initial = self._initial_odometer(imei, device)
+        epoch = fix.timestamp.timestamp()
+
+        def advance(previous: Optional[OdometerState]) -> Optional[OdometerState]:
+            if previous is None:
+                odometer = initial if initial is not None else self._initial_odometer(imei, device)
+                return fix.latitude, fix.longitude, epoch, odometer
+            step = self._step(previous, fix, epoch)
+            return None if step is None else (fix.latitude, fix.longitude, epoch, previous[3] + step)
+
+        fix.odometer = store.update(client, imei, advance)[3]
+
+    def _step(self, previous: OdometerState, fix: Fix, epoch: float) -> Optional[float]:
+        """Distance ``fix`` adds after ``previous``, or ``None`` if it is filtered out."""
+        lat0, lon0, epoch0, _ = previous
+        if epoch <= epoch0:
+            return None
+        if fix.hdop is not None and fix.hdop > self.config['max_hdop']:
+            return None
+
+        distance = haversine_distance(lat0, lon0, fix.latitude, fix.longitude)
+        if distance < self.config['min_distance']:
+            return None
+        if (fix.speed or 0) < self.config['stationary_speed'] and \
+                distance < self.config['stationary_radius']:
+            return None
+
+        if distance / (epoch - epoch0) * 3.6 > self.config['max_speed']:
+            return None
+        return distance
+
+    def reset(self, imei: Optional[int] = None) -> None:
+        store, client = self._store()
+        store.clear(client, None if imei is None else int(imei))
@@ -0,0 +1,25 @@
+"""
+Ingest stage that feeds the per-device recent-fix buffer.
+"""
+from skyguard.apps.gps.pipeline.base import Fix, PipelineStage
+
+
+class RecentFixStage(PipelineStage):
+    """
+    Append trail fixes to ``recent_fix_buffer`` for trail/realtime reads.
+
+    Fixes not stored as trail events (e.g. I/O events) are skipped so the
+    buffer holds exactly what the SQL fallback would read.
+    """
+
+    def __init__(self, buffer=None):
+        if buffer is None:
+            from skyguard.apps.gps.services.recent_fixes import recent_fix_buffer
+            buffer = recent_fix_buffer
+        self.buffer = buffer
+
+    def process(self, fix: Fix, device=None) -> None:
+        if not fix.trail:
+            return
+        self.buffer.add(fix.imei, fix.timestamp, fix.latitude, fix.longitude,
+                        fix.speed, fix.course)
@@ -0,0 +1,142 @@
+"""
+Off-route detection for vehicles assigned to a route.
+
+Each fix is classified against the corridor of the device's route
+(``services.route_corridor``). Hysteresis avoids flapping on GPS noise: a
+vehicle goes OFF_ROUTE only after ``exit_fixes`` consecutive fixes outside
+the corridor, and comes back ON_ROUTE only after ``return_fixes``
+consecutive fixes inside the narrower inner corridor.
+
+Events are stored as ``GPSEvent`` rows (type OFF_ROUTE / ON_ROUTE) with one
+``bulk_create`` per flush. The flush interval is checked on every fix and by
+the pipeline's periodic flush, not only when an event is emitted.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from skyguard.apps.gps.pipeline.base import Fix, PipelineStage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 1.0  # seconds
+
+
+@dataclass
+class RouteStatus:
+    """Off-route state of one device."""
+    route: int
+    off_route: bool = False
+    streak: int = 0  # consecutive fixes pointing to the other state
+
+
+class RouteCorridorStage(PipelineStage):
+    """Emit OFF_ROUTE / ON_ROUTE events from the corridor of each device's route."""
+
+    def __init__(self, index=None, metadata=None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        if index is None:
+            from skyguard.apps.gps.services.route_corridor import route_corridor_index
+            index = route_corridor_index
+        if metadata is None:
+            from skyguard.apps.gps.services.latest_state import get_device_metadata
+            metadata = get_device_metadata
+        self.index = index
+        self.metadata = metadata
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._status: Dict[int, RouteStatus] = {}
+        self._pending: List[dict] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def process(self, fix: Fix, device=None) -> None:
+        self.flush_if_due()
+        route = getattr(device, 'route', None) if device is not None else \
+            self.metadata().get(fix.imei, {}).get('route')
+        if route is None:
+            return
+        zone = self.index.classify(route, fix.longitude, fix.latitude)
+        if zone is None:
+            return
+        zone, distance = zone
+
+        status = self._status.get(fix.imei)
+        if status is None or status.route != route:
+            status = self._status[fix.imei] = RouteStatus(route)
+
+        config = self.index.config
+        if not status.off_route:
+            if zone != 'outside':
+                status.streak = 0
+                return
+            status.streak += 1
+            if status.streak < config['exit_fixes']:
+                return
+            status.off_route, status.streak = True, 0
+            self._emit(fix, 'OFF_ROUTE', route, distance)
+        else:
+            if zone != 'inner':
+                status.streak = 0
+                return
+            status.streak += 1
+            if status.streak < config['return_fixes']:
+                return
+            status.off_route, status.streak = False, 0
+            self._emit(fix, 'ON_ROUTE', route, distance)
+
+    def _emit(self, fix: Fix, event_type: str, route: int, distance: Optional[float]) -> None:
+        if distance is None:
+            distance = self.index.distance(route, fix.longitude, fix.latitude)
+        with self._lock:
+            self._pending.append({
+                'fix': fix, 'type': event_type, 'route': route, 'distance': distance,
+            })
+            due = len(self._pending) >= self.batch_size
+        if due:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self) -> None:
+        with self._lock:
+            due = self._pending and time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write pending route events."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        from skyguard.apps.gps.models import GPSEvent
+
+        try:
+            GPSEvent.objects.bulk_create([
+                GPSEvent(
+                    device_id=item['fix'].imei,
+                    type=item['type'],
+                    position=item['fix'].point,
+                    speed=item['fix'].speed,
+                    course=item['fix'].course,
+                    altitude=item['fix'].altitude,
+                    timestamp=item['fix'].timestamp,
+                    source='route_corridor',
+                    text=f"Ruta {item['route']}: {item['distance']:.0f} m",
+                )
+                for item in pending
+            ])
+        except Exception as e:
+            logger.error(f"Error storing {len(pending)} route corridor events: {e}")
+
+    def reset(self, imei: Optional[int] = None) -> None:
+        if imei is None:
+            self._status.clear()
+        else:
+            self._status.pop(imei, None)
@@ -0,0 +1,74 @@
+"""
+DRF renderers for the GPS application.
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from skyguard.apps.gps.json_encoding import dumps
+from skyguard.apps.gps.services.compact import MEDIA_TYPE
+from skyguard.apps.gps.services.tiles import MEDIA_TYPE as VECTOR_TILE_MEDIA_TYPE
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` backed by orjson.
+
+    Same media type and values as the stock renderer of the pinned DRF
+    (see ``json_encoding`` for datetimes); ``indent`` in the accepted media
+    type selects two-space indentation.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return dumps(data, indent=bool(indent))
+
+
+class BinaryPassthroughRenderer(BaseRenderer):
+    """
+    Renderer for formats whose views build the body themselves.
+
+    Views return already encoded bytes as the response data (or a streaming
+    response, which is not rendered at all); anything else, such as an error
+    payload, is rendered as JSON.
+    """
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, bytearray)):
+            return bytes(data)
+        return ORJSONRenderer().render(data, accepted_media_type, renderer_context)
+
+
+class CompactTrackRenderer(BinaryPassthroughRenderer):
+    """``format=compact`` track responses (``services.compact.encode_track``)."""
+    media_type = MEDIA_TYPE
+    format = 'compact'
+
+
+class VectorTileRenderer(BinaryPassthroughRenderer):
+    """Mapbox Vector Tiles (``services.tiles.render_tile``)."""
+    media_type = VECTOR_TILE_MEDIA_TYPE
+    format = 'mvt'
+
+
+class CSVExportRenderer(BinaryPassthroughRenderer):
+    """``format=csv`` streaming exports (``services.export``)."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONExportRenderer(BinaryPassthroughRenderer):
+    """``format=ndjson`` streaming exports (``services.export``)."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class GeoJSONExportRenderer(BinaryPassthroughRenderer):
+    """``format=geojson`` streaming exports (``services.export``)."""
+    media_type = 'application/geo+json'
+    format = 'geojson'
+
+
+EXPORT_RENDERERS = [CSVExportRenderer, NDJSONExportRenderer, GeoJSONExportRenderer]
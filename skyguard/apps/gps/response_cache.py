@@ -0,0 +1,192 @@
+"""
+Response cache for hot read endpoints.
+
+Entries are stored in the default (Redis) cache under a key built from the
+endpoint, a scope (the user, or ``all`` for responses that do not depend on
+who asks) and the query parameters. Each entry is tagged, e.g.
+``geofences:user:7`` or ``devices``, and records the version of each tag when
+it was built. Invalidating a tag just gives it a new version, so every entry
+carrying it misses on its next read; nothing has to enumerate or delete the
+entries themselves. Model signals invalidate the tags (see ``signals.py``).
+
+Every entry gets an ETag when it is built. Responses carry it and a request
+whose ``If-None-Match`` still matches gets a 304 without the body being
+rendered or sent.
+"""
+import hashlib
+import secrets
+import time
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+
+import orjson
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+DEFAULT_RESPONSE_CACHE_CONFIG = {
+    'enabled': True,
+    'timeout': 300,   # seconds an entry lives even if no tag is invalidated
+}
+
+
+def get_response_cache_config() -> Dict[str, Any]:
+    """Response cache settings merged over the defaults."""
+    config = dict(DEFAULT_RESPONSE_CACHE_CONFIG)
+    config.update(getattr(settings, 'GPS_RESPONSE_CACHE', {}) or {})
+    return config
+
+
+@dataclass
+class CacheEntry:
+    """A cached result with its ETag and the tag versions it was built under."""
+    data: Any
+    etag: str
+    versions: Dict[str, int]
+
+
+class ResponseCache:
+    """Tagged entries over the Django cache."""
+
+    prefix = 'gps:response'
+
+    def entry_key(self, endpoint: str, scope: Any, params: Optional[Dict[str, Any]] = None) -> str:
+        """Key of one endpoint's result for a scope and query parameters."""
+        digest = hashlib.blake2b(
+            orjson.dumps(sorted((params or {}).items()), default=str), digest_size=12
+        ).hexdigest()
+        return f'{self.prefix}:{endpoint}:{scope}:{digest}'
+
+    def tag_key(self, tag: str) -> str:
+        return f'{self.prefix}-tag:{tag}'
+
+    def tag_versions(self, tags: Iterable[str]) -> Dict[str, int]:
+        """Current version of each tag; tags never seen get one."""
+        keys = {self.tag_key(tag): tag for tag in tags}
+        found = cache.get_many(list(keys))
+        missing = {key: time.time_ns() for key in keys if key not in found}
+        if missing:
+            cache.set_many(missing, None)
+            found.update(missing)
+        return {tag: found[key] for key, tag in keys.items()}
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """The entry under ``key`` unless it is missing or one of its tags changed."""
+        entry = cache.get(key)
+        if entry is None or self.tag_versions(entry.versions) != entry.versions:
+            return None
+        return entry
+
+    def set(self, key: str, data: Any, versions: Dict[str, int], timeout: Optional[int] = None) -> CacheEntry:
+        """
+        Store ``data`` under ``key``.
+
+        ``versions`` must be read with ``tag_versions`` *before* ``data`` was
+        built, so an invalidation that happens meanwhile is not lost.
+        """
+        entry = CacheEntry(data=data, etag=f'W/"{secrets.token_hex(12)}"', versions=versions)
+        cache.set(key, entry, timeout or get_response_cache_config()['timeout'])
+        return entry
+
+    def fetch(self, endpoint: str, scope: Any, params: Optional[Dict[str, Any]], tags: Sequence[str],
+              build: Callable[[], Any], timeout: Optional[int] = None) -> CacheEntry:
+        """The cached entry, or a new one from ``build()``."""
+        key = self.entry_key(endpoint, scope, params)
+        entry = self.get(key)
+        if entry is None:
+            versions = self.tag_versions(tags)
+            entry = self.set(key, build(), versions, timeout)
+        return entry
+
+    def invalidate(self, *tags: str) -> None:
+        """Retire every entry carrying any of ``tags``."""
+        if tags:
+            version = time.time_ns()
+            cache.set_many({self.tag_key(tag): version for tag in tags}, None)
+
+
+response_cache = ResponseCache()
+
+
+def invalidate_tags(*tags: str) -> None:
+    """Shortcut for ``response_cache.invalidate``."""
+    response_cache.invalidate(*tags)
+
+
+def etag_matches(request, etag: str) -> bool:
+    """Whether ``If-None-Match`` names ``etag`` (weak comparison) or is ``*``."""
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if not header:
+        return False
+    candidates = {_opaque(candidate) for candidate in header.split(',')}
+    return '*' in candidates or _opaque(etag) in candidates
+
+
+def _opaque(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def conditional_response(request, entry: CacheEntry, respond: Callable[[Any], Any]):
+    """
+    ``respond(entry.data)`` with the entry's ETag, or a 304 if the client has it.
+
+    Responses are marked private and ``no-cache`` so browsers revalidate
+    instead of reusing them blindly.
+    """
+    if etag_matches(request, entry.etag):
+        response = HttpResponseNotModified()
+    else:
+        response = respond(entry.data)
+    response['ETag'] = entry.etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Authorization', 'Cookie'))
+    return response
+
+
+def _request_of(args) -> HttpRequest:
+    for arg in args[:2]:
+        if isinstance(arg, (Request, HttpRequest)):
+            return arg
+    raise TypeError('cache_response needs the request as the first or second argument')
+
+
+def cache_response(endpoint: str, tags: Sequence[str] = (), per_user: bool = True,
+                   timeout: Optional[int] = None):
+    """
+    Cache the data of a DRF ``GET`` handler's successful responses.
+
+    Works on function views (below ``@api_view``) and on viewset methods.
+    ``tags`` may use ``{user}`` and the view's keyword arguments, e.g.
+    ``'geofences:user:{user}'``. With ``per_user=False`` all users share the
+    entry (the response must then not depend on who asks).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = _request_of(args)
+            if request.method != 'GET' or not get_response_cache_config()['enabled']:
+                return view(*args, **kwargs)
+
+            user = request.user.pk
+            entry_tags = [tag.format(user=user, **kwargs) for tag in tags]
+            params = {key: request.GET.getlist(key) for key in request.GET}
+            params.update({f'kwarg:{key}': value for key, value in kwargs.items()})
+            key = response_cache.entry_key(endpoint, user if per_user else 'all', params)
+
+            entry = response_cache.get(key)
+            if entry is not None:
+                return conditional_response(request, entry, Response)
+
+            versions = response_cache.tag_versions(entry_tags)
+            response = view(*args, **kwargs)
+            if not isinstance(response, Response) or response.status_code != 200:
+                return response
+            entry = response_cache.set(key, response.data, versions, timeout)
+            return conditional_response(request, entry, lambda data: response)
+        return wrapper
+    return decorator
@@ -31,10 +31,16 @@ class GeoFenceSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'updated_at', 'owner')
     
     def get_geometry_coordinates(self, obj):
-        """Convert geometry to coordinates array for frontend compatibility."""
+        """
+        Convert geometry to coordinates array for frontend compatibility.
+
+        The original polygon is returned so edit forms save it back intact;
+        list/map endpoints pass ``map_geometry=True`` in the context to get
+        the simplified polygon instead.
+        """
         if obj.geometry:
-            # Convert PolygonField to coordinates array
-            coords = obj.geometry.coords[0]  # Get exterior ring
+            geometry = obj.map_geometry if self.context.get('map_geometry') else obj.geometry
+            coords = geometry.coords[0]  # Get exterior ring
             return coords
         return []
     
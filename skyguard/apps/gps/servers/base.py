@@ -13,6 +13,7 @@ from django.db import transaction
 from django.contrib.gis.geos import Point
 
 from skyguard.apps.gps.models import GPSDevice, GPSLocation
+from skyguard.apps.gps.pipeline import Fix, ingest_pipeline
 
 
 class BaseGPSRequestHandler(socketserver.BaseRequestHandler):
@@ -35,12 +36,29 @@ class BaseGPSRequestHandler(socketserver.BaseRequestHandler):
         if self.device:
             self.device.last_log = datetime.now()
             self.device.save()
+        ingest_pipeline.flush()
+
+    def ingest_fix(self, position, timestamp, speed=0, course=0, altitude=0, **kwargs):
+        """Run a decoded fix through the ingest pipeline and return it."""
+        fix = ingest_pipeline.process(
+            Fix.from_point(self.device.imei, position, timestamp,
+                           speed=speed, course=course, altitude=altitude, **kwargs),
+            self.device
+        )
+        if fix.odometer is not None:
+            self.device.odometer = fix.odometer
+        return fix
 
     def save_location(self, position, speed=0, course=0, altitude=0, satellites=0, accuracy=0):
         """Save a location record for the device."""
         if not self.device:
             return
 
+        timestamp = datetime.now()
+        # Stored as a GPSLocation only, not as a trail event
+        self.ingest_fix(position, timestamp, speed=speed, course=course, altitude=altitude,
+                        satellites=satellites, trail=False)
+
         with transaction.atomic():
             location = GPSLocation.objects.create(
                 device=self.device,
@@ -50,7 +68,7 @@ class BaseGPSRequestHandler(socketserver.BaseRequestHandler):
                 altitude=altitude,
                 satellites=satellites,
                 accuracy=accuracy,
-                timestamp=datetime.now()
+                timestamp=timestamp
             )
             
             self.device.position = position
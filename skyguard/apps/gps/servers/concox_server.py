@@ -134,6 +134,8 @@ class ConcoxRequestHandler(BaseGPSRequestHandler):
             if self.device:
                 # Save location event
                 position = Point(lon, lat)
+                self.ingest_fix(position, utc_time, speed=speed, course=course,
+                                satellites=ns & 0x0f)
                 event = GPSEvent.objects.create(
                     device=self.device,
                     event_type="LOCATION",
@@ -142,6 +144,7 @@ class ConcoxRequestHandler(BaseGPSRequestHandler):
                     speed=speed,
                     course=course,
                     altitude=0,
+                    odometer=self.device.odometer,
                     satellites=ns & 0x0f
                 )
                 
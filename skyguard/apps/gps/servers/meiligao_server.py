@@ -119,6 +119,7 @@ class MeiligaoRequestHandler(BaseGPSRequestHandler):
                 
                 if self.device:
                     position = Point(lon, lat)
+                    self.ingest_fix(position, timestamp)
                     
                     # Save location event
                     GPSEvent.objects.create(
@@ -128,7 +129,8 @@ class MeiligaoRequestHandler(BaseGPSRequestHandler):
                         timestamp=timestamp,
                         speed=0,
                         course=0,
-                        altitude=0
+                        altitude=0,
+                        odometer=self.device.odometer
                     )
                     
                     # Update device position
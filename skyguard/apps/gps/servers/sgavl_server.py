@@ -169,6 +169,8 @@ class SGAvlRequestHandler(BaseGPSRequestHandler):
         
         if has_fix:
             gps_fix = self.protocol.unpack_fix(data[8:])
+            self.ingest_fix(gps_fix['pos'], gps_fix['date'], speed=gps_fix['speed'],
+                            course=gps_fix['course'], altitude=gps_fix['altitude'], trail=False)
             event = IOEvent.objects.create(
                 device=self.device,
                 event_type=event_type,
@@ -278,6 +280,8 @@ class SGAvlRequestHandler(BaseGPSRequestHandler):
             raise BadRecord(event_type, data)
             
         gps_fix = self.protocol.unpack_fix(data)
+        self.ingest_fix(gps_fix['pos'], gps_fix['date'], speed=gps_fix['speed'],
+                        course=gps_fix['course'], altitude=gps_fix['altitude'])
         
         event = GPSEvent.objects.create(
             device=self.device,
@@ -286,7 +290,8 @@ class SGAvlRequestHandler(BaseGPSRequestHandler):
             timestamp=gps_fix['date'],
             speed=gps_fix['speed'],
             course=gps_fix['course'],
-            altitude=gps_fix['altitude']
+            altitude=gps_fix['altitude'],
+            odometer=self.device.odometer
         )
         
         self.events.append(event)
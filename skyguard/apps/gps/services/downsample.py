@@ -0,0 +1,103 @@
+"""
+Time-series downsampling for charts.
+
+Largest-Triangle-Three-Buckets (Steinarsson, 2013): the first and last points
+are kept and the rest are split into ``max_points - 2`` equal buckets. From
+each bucket the point forming the largest triangle with the point kept from
+the previous bucket and the average of the next bucket is kept, which keeps
+peaks and dips that averaging or striding would lose.
+
+The bucket averages are computed for all buckets at once with
+``np.add.reduceat``; the selection walks the buckets in order (each choice
+depends on the previous one) with the triangle areas of a bucket computed in
+one vectorized expression, so the Python loop runs ``max_points`` times
+whatever the input length.
+"""
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+
+DEFAULT_DOWNSAMPLE_CONFIG = {
+    'max_points': 1000,        # default chart size of the time-series endpoints
+    'max_points_limit': 10000,
+}
+
+
+def get_downsample_config() -> Dict[str, Any]:
+    """Downsampling settings merged over the defaults."""
+    config = dict(DEFAULT_DOWNSAMPLE_CONFIG)
+    config.update(getattr(settings, 'GPS_DOWNSAMPLE', {}) or {})
+    return config
+
+
+def parse_max_points(value: Optional[str], default: Optional[int] = None) -> Optional[int]:
+    """
+    ``max_points`` query parameter, clamped to the configured limit.
+
+    Raises:
+        ValueError: If the value is not an integer of at least 3
+    """
+    config = get_downsample_config()
+    if value in (None, ''):
+        return default
+    max_points = int(value)
+    if max_points < 3:
+        raise ValueError('max_points must be at least 3')
+    return min(max_points, config['max_points_limit'])
+
+
+def lttb(x, y, max_points: int) -> np.ndarray:
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    Args:
+        x: Increasing x values (e.g. epoch seconds)
+        y: Values; NaN counts as 0
+        max_points: Number of points to keep
+
+    Returns:
+        Sorted indices into ``x``/``y``; every index when there are no more
+        than ``max_points`` points
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    n = len(x)
+    if max_points >= n:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1][:max_points], dtype=np.int64)
+
+    buckets = max_points - 2
+    # Bucket i holds the interior points edges[i]:edges[i + 1]
+    edges = (np.arange(buckets + 1) * (n - 2) // buckets + 1).astype(np.int64)
+    counts = np.diff(edges)
+    average_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    average_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # The third vertex is the next bucket's average, or the last point for the last bucket
+    next_x = np.append(average_x[1:], x[-1])
+    next_y = np.append(average_y[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(buckets):
+        start, end = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        areas = np.abs((ax - next_x[i]) * (y[start:end] - ay) - (ax - x[start:end]) * (next_y[i] - ay))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def lttb_multi(x, series: Sequence, max_points: int) -> np.ndarray:
+    """
+    Indices kept for several series sharing ``x``, for charts that draw them together.
+
+    Each series gets an equal share of ``max_points`` (at least 3) and the
+    kept indices are merged.
+    """
+    if len(series) == 1:
+        return lttb(x, series[0], max_points)
+    share = max(max_points // len(series), 3)
+    return np.unique(np.concatenate([lttb(x, y, share) for y in series]))
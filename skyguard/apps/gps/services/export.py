@@ -0,0 +1,205 @@
+"""
+Streaming history exports.
+
+Locations, events and sensor logs are exported as CSV, NDJSON or a GeoJSON
+FeatureCollection without ever holding the whole range in memory: rows are
+read with ``values_list(...).iterator(chunk_size=...)``, which on PostgreSQL
+uses a named server-side cursor, and written to a ``StreamingHttpResponse``
+in buffers of about ``buffer_size`` characters. Memory use is bounded by one
+cursor chunk plus one buffer, whatever the range.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence
+
+from django.conf import settings
+from django.db.models import F, FloatField, Func
+from django.http import StreamingHttpResponse
+
+DEFAULT_EXPORT_CONFIG = {
+    'chunk_size': 2000,      # rows fetched per server-side cursor round trip
+    'buffer_size': 65536,    # characters per streamed chunk
+}
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'geojson': ('application/geo+json', 'geojson'),
+}
+
+
+@dataclass(frozen=True)
+class ExportSource:
+    """A per-device history table that can be exported."""
+    model: str
+    time_field: str
+    fields: Sequence[str]
+    position: Optional[str] = None
+
+    def get_model(self):
+        from django.apps import apps
+        return apps.get_model('gps', self.model)
+
+    @property
+    def columns(self):
+        located = ('latitude', 'longitude') if self.position else ()
+        return ('timestamp',) + located + tuple(self.fields)
+
+
+EXPORT_SOURCES = {
+    'locations': ExportSource('GPSLocation', 'timestamp',
+                              ('speed', 'course', 'altitude', 'satellites', 'accuracy', 'hdop'),
+                              position='position'),
+    'events': ExportSource('GPSEvent', 'timestamp',
+                           ('type', 'speed', 'course', 'altitude', 'odometer', 'source', 'text'),
+                           position='position'),
+    'pressure': ExportSource('PressureWeightLog', 'date', ('sensor', 'psi1', 'psi2')),
+    'alarms': ExportSource('AlarmLog', 'date', ('sensor', 'checksum', 'duration', 'comment')),
+}
+
+
+def get_export_config() -> Dict[str, Any]:
+    """Export settings merged over the defaults."""
+    config = dict(DEFAULT_EXPORT_CONFIG)
+    config.update(getattr(settings, 'GPS_EXPORT', {}) or {})
+    return config
+
+
+def export_rows(source: ExportSource, device_id: int, start_time=None, end_time=None,
+                chunk_size: Optional[int] = None) -> Iterator[tuple]:
+    """
+    Rows of one device's history, oldest first, in ``source.columns`` order.
+
+    Uses ``iterator(chunk_size=...)`` so PostgreSQL streams the rows through a
+    named server-side cursor.
+    """
+    queryset = source.get_model().objects.filter(device_id=device_id)
+    if start_time:
+        queryset = queryset.filter(**{f'{source.time_field}__gte': start_time})
+    if end_time:
+        queryset = queryset.filter(**{f'{source.time_field}__lte': end_time})
+
+    fields = [source.time_field]
+    if source.position:
+        queryset = queryset.annotate(
+            export_latitude=Func(F(source.position), function='ST_Y', output_field=FloatField()),
+            export_longitude=Func(F(source.position), function='ST_X', output_field=FloatField()),
+        )
+        fields += ['export_latitude', 'export_longitude']
+    fields += list(source.fields)
+
+    return queryset.order_by(source.time_field).values_list(*fields).iterator(
+        chunk_size=chunk_size or get_export_config()['chunk_size']
+    )
+
+
+def _plain(value):
+    """JSON-serializable form of a column value (CSV keeps ``str()`` of the value)."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _buffered(pieces: Iterable[str], buffer_size: int) -> Iterator[str]:
+    """Join small string pieces into chunks of about ``buffer_size`` characters."""
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= buffer_size:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def csv_chunks(rows: Iterable[Sequence], header: Optional[Sequence[str]] = None,
+               buffer_size: Optional[int] = None) -> Iterator[str]:
+    """Stream rows as CSV text chunks, values written as ``csv.writer`` does (``str()``)."""
+    buffer_size = buffer_size or get_export_config()['buffer_size']
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= buffer_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(rows: Iterable[Sequence], columns: Sequence[str],
+                  buffer_size: Optional[int] = None) -> Iterator[str]:
+    """Stream rows as newline-delimited JSON objects."""
+    buffer_size = buffer_size or get_export_config()['buffer_size']
+    return _buffered(
+        (json.dumps(dict(zip(columns, map(_plain, row))), separators=(',', ':')) + '\n' for row in rows),
+        buffer_size,
+    )
+
+
+def geojson_chunks(rows: Iterable[Sequence], columns: Sequence[str],
+                   buffer_size: Optional[int] = None) -> Iterator[str]:
+    """
+    Stream rows as a GeoJSON FeatureCollection of points.
+
+    ``latitude``/``longitude`` columns become the geometry (null when absent);
+    the other columns become the feature properties.
+    """
+    buffer_size = buffer_size or get_export_config()['buffer_size']
+    located = 'latitude' in columns and 'longitude' in columns
+
+    def pieces():
+        yield '{"type":"FeatureCollection","features":['
+        separator = ''
+        for row in rows:
+            properties = {name: _plain(value) for name, value in zip(columns, row)}
+            geometry = None
+            if located:
+                latitude, longitude = properties.pop('latitude'), properties.pop('longitude')
+                if latitude is not None and longitude is not None:
+                    geometry = {'type': 'Point', 'coordinates': [longitude, latitude]}
+            yield separator + json.dumps(
+                {'type': 'Feature', 'geometry': geometry, 'properties': properties},
+                separators=(',', ':'),
+            )
+            separator = ','
+        yield ']}'
+
+    return _buffered(pieces(), buffer_size)
+
+
+def streaming_export_response(source_name: str, export_format: str, device_id: int,
+                              start_time=None, end_time=None) -> StreamingHttpResponse:
+    """
+    Chunked download of one device's history.
+
+    Args:
+        source_name: Key of ``EXPORT_SOURCES``
+        export_format: ``csv``, ``ndjson`` or ``geojson``
+
+    Raises:
+        KeyError: Unknown source or format
+    """
+    source = EXPORT_SOURCES[source_name]
+    content_type, extension = EXPORT_FORMATS[export_format]
+    rows = export_rows(source, device_id, start_time, end_time)
+    if export_format == 'csv':
+        content = csv_chunks(rows, header=source.columns)
+    elif export_format == 'ndjson':
+        content = ndjson_chunks(rows, source.columns)
+    else:
+        content = geojson_chunks(rows, source.columns)
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{device_id}-{source_name}.{extension}"'
+    return response
@@ -0,0 +1,65 @@
+"""
+Debounced geofence evaluation.
+
+Device and location saves do not queue a ``process_geofence_detection`` task
+each any more. The signals add the device to a Redis set of dirty devices,
+and the ``dispatch_dirty_geofence_devices`` beat task pops the whole set
+every few seconds and evaluates it in batches with the fleet evaluator
+(``evaluate_geofence_chunk``). Because it is a set, any number of saves of
+one device between two runs cost a single evaluation. Devices whose batch
+could not be queued are put back with ``requeue`` for the next run.
+
+The set must be shared by the processes that save devices and the worker
+that drains it, so there is no in-process fallback: without Redis ``mark``
+returns ``False`` and callers queue the per-device task as before.
+"""
+import logging
+from typing import Iterable, List
+
+from skyguard.apps.gps.services.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class GeofenceDispatcher:
+    """Redis set of devices whose geofences need to be evaluated."""
+
+    KEY = 'gps:geofence:dirty'
+
+    def mark(self, imei: int) -> bool:
+        """
+        Queue a device for the next evaluation.
+
+        Returns:
+            False if Redis is not available and the caller must dispatch itself
+        """
+        client = get_redis_client()
+        if client is None:
+            return False
+        try:
+            client.sadd(self.KEY, imei)
+        except Exception as e:
+            logger.warning(f"Could not mark device {imei} for geofence evaluation: {e}")
+            return False
+        return True
+
+    def drain(self) -> List[int]:
+        """Pop every queued device. Devices marked meanwhile wait for the next run."""
+        client = get_redis_client()
+        if client is None:
+            return []
+        size = client.scard(self.KEY)
+        if not size:
+            return []
+        return sorted(int(imei) for imei in client.spop(self.KEY, size))
+
+    def requeue(self, imeis: Iterable[int]) -> None:
+        """Put back drained devices that could not be dispatched."""
+        imeis = list(imeis)
+        client = get_redis_client()
+        if client is None or not imeis:
+            return
+        client.sadd(self.KEY, *imeis)
+
+
+geofence_dispatcher = GeofenceDispatcher()
@@ -0,0 +1,234 @@
+"""
+Fleet-wide geofence evaluation.
+
+Evaluates a whole batch of devices in one pass instead of one Celery task per
+device: current positions are read with a single query, containment is
+computed for all points at once against the in-memory geofence index, the
+result is compared with the cached inside/outside state and only the
+transitions are written (bulk) and notified.
+
+``populate`` does the same for all devices assigned to one fence when it is
+created or edited, with containment decided by PostGIS in the same query
+that reads the positions.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.utils import timezone
+
+from skyguard.apps.gps.models import GPSDevice, GeoFence, GeoFenceEvent
+from skyguard.apps.gps.services.geofence_index import geofence_index
+from skyguard.apps.gps.services.geofence_state import (
+    GeofenceState, detect_transition, geofence_state_cache
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GeofenceTransition:
+    """A device crossing a geofence boundary."""
+    imei: int
+    fence_id: int
+    event_type: str  # 'ENTRY' or 'EXIT'
+    longitude: float
+    latitude: float
+
+
+class FleetGeofenceEvaluator:
+    """Set-based geofence evaluation for many devices at once."""
+
+    def __init__(self, index=None, state_cache=None, manager=None):
+        self.index = index or geofence_index
+        self.state_cache = state_cache or geofence_state_cache
+        self._manager = manager
+
+    @property
+    def manager(self):
+        if self._manager is None:
+            from skyguard.apps.gps.services.geofence_manager import advanced_geofence_manager
+            self._manager = advanced_geofence_manager
+        return self._manager
+
+    def online_positions(self, imeis: Optional[Iterable[int]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Current positions of online devices that have geofences assigned.
+
+        Returns:
+            Parallel arrays (imeis, longitudes, latitudes)
+        """
+        assigned = self.index.assigned_devices()
+        devices = GPSDevice.objects.filter(connection_status='ONLINE', position__isnull=False)
+        if imeis is not None:
+            devices = devices.filter(imei__in=[imei for imei in imeis if imei in assigned])
+        rows = [(imei, position.x, position.y)
+                for imei, position in devices.values_list('imei', 'position').iterator()
+                if imei in assigned]
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+        imei_array, longitudes, latitudes = (np.asarray(column) for column in zip(*rows))
+        return imei_array.astype(np.int64), longitudes.astype(float), latitudes.astype(float)
+
+    def find_transitions(self, imeis: np.ndarray, longitudes: np.ndarray, latitudes: np.ndarray,
+                         states: Dict[int, Dict[int, GeofenceState]],
+                         now: Optional[float] = None) -> Tuple[List[GeofenceTransition], Dict[int, Dict[int, GeofenceState]]]:
+        """
+        Compare current containment with stored state.
+
+        Returns:
+            Tuple of (transitions, new_states) where ``new_states`` holds
+            first-seen "outside" states that should be recorded
+        """
+        now = now if now is not None else timezone.now().timestamp()
+        point_idx, fence_ids = self.index.containing_many(longitudes, latitudes)
+        inside_pairs = set(zip(imeis[point_idx].tolist(), fence_ids.tolist()))
+
+        transitions = []
+        new_states = {}
+        for i, imei in enumerate(imeis.tolist()):
+            device_states = states.get(imei, {})
+            for fence in self.index.fences_for_device(imei):
+                is_inside = (imei, fence.id) in inside_pairs
+                state = device_states.get(fence.id)
+                event_type = detect_transition(state, is_inside, now)
+                if event_type:
+                    transitions.append(GeofenceTransition(
+                        imei, fence.id, event_type, float(longitudes[i]), float(latitudes[i])
+                    ))
+                elif state is None:
+                    new_states.setdefault(imei, {})[fence.id] = GeofenceState(inside=False)
+        return transitions, new_states
+
+    def emit(self, transitions: List[GeofenceTransition],
+             states: Dict[int, Dict[int, GeofenceState]],
+             fences: Optional[Dict[int, GeoFence]] = None) -> List[Dict[str, Any]]:
+        """
+        Bulk-insert the events of ``transitions`` and run notifications.
+
+        ``fences`` overrides the index lookup (for fences the index may not
+        have picked up yet).
+        """
+        if not transitions:
+            return []
+
+        devices = GPSDevice.objects.in_bulk({t.imei for t in transitions})
+        timestamp = timezone.now()
+        events = [
+            GeoFenceEvent(
+                fence_id=t.fence_id,
+                device_id=t.imei,
+                event_type=t.event_type,
+                position=Point(t.longitude, t.latitude, srid=4326),
+                timestamp=timestamp
+            )
+            for t in transitions
+        ]
+        with transaction.atomic():
+            GeoFenceEvent.objects.bulk_create(events)
+
+        results = []
+        for transition, event in zip(transitions, events):
+            device = devices.get(transition.imei)
+            fence = fences.get(transition.fence_id) if fences else self.index.get_fence(transition.fence_id)
+            if device is None or fence is None:
+                continue
+            event.device = device
+            event.fence = fence
+            try:
+                results.append(self.manager._handle_geofence_event(
+                    device, fence, event, states.setdefault(transition.imei, {})
+                ))
+            except Exception as e:
+                logger.error(f"Error handling geofence event {event.id} for device {transition.imei}: {e}")
+        return results
+
+    def evaluate(self, imeis: Optional[Iterable[int]] = None) -> Dict[str, Any]:
+        """
+        Evaluate a batch of devices (all online devices if ``imeis`` is None).
+
+        Returns:
+            Summary with the number of devices checked and the events generated
+        """
+        imei_array, longitudes, latitudes = self.online_positions(imeis)
+        if not len(imei_array):
+            return {'devices_checked': 0, 'transitions': 0, 'events': []}
+
+        states = self.state_cache.get_many(imei_array.tolist())
+        transitions, new_states = self.find_transitions(imei_array, longitudes, latitudes, states)
+        self.state_cache.set_many(new_states)
+        events = self.emit(transitions, states)
+
+        return {
+            'devices_checked': len(imei_array),
+            'transitions': len(transitions),
+            'events': events,
+        }
+
+    def populate(self, fence_id: int, chunk_size: int = 500,
+                 progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Initial inside/outside state of every device assigned to a fence.
+
+        One query returns the assigned devices with a position together with
+        whether PostGIS finds them inside the fence. Devices already inside
+        get an ENTRY (bulk-inserted in chunks of ``chunk_size``), the others
+        are recorded as outside.
+
+        Args:
+            fence_id: Geofence to populate
+            chunk_size: Events inserted and notified per batch
+            progress: Called with (processed, total) after each batch
+
+        Returns:
+            Summary with the number of devices checked and inside
+        """
+        fence = GeoFence.objects.select_related('owner').get(id=fence_id)
+        rows = list(
+            GPSDevice.objects.filter(geofences=fence, position__isnull=False)
+            .annotate(inside=ExpressionWrapper(
+                Q(position__within=fence.geometry), output_field=BooleanField()
+            ))
+            .values_list('imei', 'position', 'inside')
+        )
+        total = len(rows)
+        if progress:
+            progress(0, total)
+        if not rows:
+            return {'devices_checked': 0, 'devices_inside': 0, 'transitions': 0}
+
+        now = timezone.now().timestamp()
+        states = self.state_cache.get_many([imei for imei, _, _ in rows])
+        transitions = []
+        new_states = {}
+        for imei, position, inside in rows:
+            state = states.get(imei, {}).get(fence.id)
+            event_type = detect_transition(state, bool(inside), now)
+            if event_type:
+                transitions.append(GeofenceTransition(imei, fence.id, event_type, position.x, position.y))
+            elif state is None:
+                new_states[imei] = {fence.id: GeofenceState(inside=False)}
+        self.state_cache.set_many(new_states)
+
+        processed = total - len(transitions)
+        if progress:
+            progress(processed, total)
+        for start in range(0, len(transitions), chunk_size):
+            chunk = transitions[start:start + chunk_size]
+            self.emit(chunk, states, fences={fence.id: fence})
+            processed += len(chunk)
+            if progress:
+                progress(processed, total)
+
+        return {
+            'devices_checked': total,
+            'devices_inside': sum(1 for _, _, inside in rows if inside),
+            'transitions': len(transitions),
+        }
+
+
+fleet_geofence_evaluator = FleetGeofenceEvaluator()
@@ -0,0 +1,142 @@
+"""
+Save-time preprocessing of geofence geometries.
+
+User-drawn fences can have thousands of vertices. When a ``GeoFence`` is
+saved this module derives, next to the original polygon:
+
+* its bounding box (``min_lon``/``min_lat``/``max_lon``/``max_lat``) for a
+  cheap first rejection test,
+* a topology-preserving simplified polygon served to map clients,
+* the polygon subdivided into parts of at most ``subdivide_max_vertices``
+  vertices (like PostGIS ``ST_Subdivide``), used by the geofence index so
+  each containment test only touches a small piece of the fence.
+
+It also enforces the configurable vertex budget for new geometries.
+"""
+from typing import List, Optional
+
+import shapely
+from django.conf import settings
+from django.contrib.gis.geos import GEOSGeometry, MultiPolygon, Point, Polygon
+from django.core.exceptions import ValidationError
+
+DEFAULT_GEOFENCE_GEOMETRY_CONFIG = {
+    'max_vertices': 1000,             # vertex budget of a geofence polygon
+    'simplify_tolerance': 0.00005,    # degrees (~5 m) for the map geometry
+    'subdivide_max_vertices': 64,     # vertices per indexed part
+}
+
+
+def get_geometry_config() -> dict:
+    """Return the geometry config merged with ``GPS_GEOFENCE_GEOMETRY``."""
+    config = dict(DEFAULT_GEOFENCE_GEOMETRY_CONFIG)
+    config.update(getattr(settings, 'GPS_GEOFENCE_GEOMETRY', {}) or {})
+    return config
+
+
+def vertex_count(geometry) -> int:
+    """Number of vertices of a polygon, holes included."""
+    return geometry.num_coords if geometry is not None else 0
+
+
+def check_vertex_budget(geometry, max_vertices: Optional[int] = None) -> None:
+    """
+    Reject polygons over the vertex budget.
+
+    Raises:
+        ValidationError: If the polygon has more than ``max_vertices`` vertices
+    """
+    if max_vertices is None:
+        max_vertices = get_geometry_config()['max_vertices']
+    count = vertex_count(geometry)
+    if count > max_vertices:
+        raise ValidationError(f"Polygon too complex ({count} points, max {max_vertices})")
+
+
+def simplify_geometry(geometry: Polygon, tolerance: Optional[float] = None) -> Polygon:
+    """Topology-preserving simplification; the original is kept if it gets no smaller."""
+    if tolerance is None:
+        tolerance = get_geometry_config()['simplify_tolerance']
+    simplified = geometry.simplify(tolerance, preserve_topology=True)
+    if not isinstance(simplified, Polygon) or simplified.empty or simplified.num_coords >= geometry.num_coords:
+        return geometry.clone()
+    simplified.srid = geometry.srid
+    return simplified
+
+
+# Recursion limit of the subdivision (2**MAX_SUBDIVIDE_DEPTH parts at most)
+MAX_SUBDIVIDE_DEPTH = 16
+
+
+def subdivide_shape(geometry, max_vertices: int, depth: int = 0) -> List:
+    """Split a shapely polygon along the longer bbox axis until parts are small enough."""
+    if shapely.get_num_coordinates(geometry) <= max_vertices or depth >= MAX_SUBDIVIDE_DEPTH:
+        return [geometry]
+    minx, miny, maxx, maxy = geometry.bounds
+    if maxx - minx >= maxy - miny:
+        middle = (minx + maxx) / 2
+        halves = [(minx, miny, middle, maxy), (middle, miny, maxx, maxy)]
+    else:
+        middle = (miny + maxy) / 2
+        halves = [(minx, miny, maxx, middle), (minx, middle, maxx, maxy)]
+    parts = []
+    for box in halves:
+        piece = shapely.clip_by_rect(geometry, *box)
+        if piece.is_empty:
+            continue
+        for polygon in shapely.get_parts(piece):
+            if polygon.geom_type == 'Polygon' and polygon.area > 0:
+                parts.extend(subdivide_shape(polygon, max_vertices, depth + 1))
+    return parts
+
+
+def subdivide(geometry: Polygon, max_vertices: Optional[int] = None) -> List:
+    """
+    Subdivide a polygon into parts of at most ``max_vertices`` vertices.
+
+    Returns:
+        List of shapely polygons covering the original polygon
+    """
+    if max_vertices is None:
+        max_vertices = get_geometry_config()['subdivide_max_vertices']
+    return subdivide_shape(shapely.from_wkb(bytes(geometry.wkb)), max(int(max_vertices), 8))
+
+
+def prepare_geofence(fence) -> None:
+    """Fill the derived geometry fields of a ``GeoFence`` from ``fence.geometry``."""
+    geometry = fence.geometry
+    if geometry is None:
+        return
+    config = get_geometry_config()
+    fence.min_lon, fence.min_lat, fence.max_lon, fence.max_lat = geometry.extent
+    fence.vertex_count = vertex_count(geometry)
+    fence.simplified_geometry = simplify_geometry(geometry, config['simplify_tolerance'])
+    parts = subdivide(geometry, config['subdivide_max_vertices'])
+    fence.index_parts = MultiPolygon(
+        [GEOSGeometry(memoryview(part.wkb)) for part in parts], srid=geometry.srid
+    )
+
+
+def in_bounds(fence, longitude: float, latitude: float) -> bool:
+    """Bounding-box test; fences without a stored bbox always pass."""
+    if getattr(fence, 'min_lon', None) is None:
+        return True
+    return (fence.min_lon <= longitude <= fence.max_lon and
+            fence.min_lat <= latitude <= fence.max_lat)
+
+
+def fence_contains(fence, longitude: float, latitude: float) -> bool:
+    """
+    Whether a fence contains a point.
+
+    The stored bbox is checked first; active fences are then tested against
+    their subdivided parts in the geofence index, anything else against the
+    full polygon.
+    """
+    if not in_bounds(fence, longitude, latitude):
+        return False
+    from skyguard.apps.gps.services.geofence_index import geofence_index
+
+    if getattr(fence, 'id', None) is not None and geofence_index.get_fence(fence.id) is not None:
+        return geofence_index.contains(fence.id, longitude, latitude)
+    return fence.geometry.contains(Point(longitude, latitude, srid=fence.geometry.srid))
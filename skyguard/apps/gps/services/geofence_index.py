@@ -0,0 +1,285 @@
+"""
+In-memory spatial index of active geofences.
+
+Each process keeps an STRtree over the subdivided parts (see
+``geofence_geometry``) of all active fences plus the fence -> devices
+membership sets, so point-in-fence checks are a bounding-box probe followed
+by prepared tests against a few small polygons, with no database access.
+
+The index is reloaded lazily after ``invalidate()``; invalidations bump a
+version number in the Django cache so every process (web, Celery workers,
+ingest servers) picks up geofence changes within ``check_interval`` seconds.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict, namedtuple
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+import numpy as np
+import shapely
+from shapely import STRtree
+from django.conf import settings
+from django.core.cache import cache
+
+from skyguard.apps.gps.services.geofence_geometry import get_geometry_config, subdivide_shape
+
+logger = logging.getLogger(__name__)
+
+VERSION_CACHE_KEY = 'gps:geofence_index:version'
+
+DEFAULT_GEOFENCE_INDEX_CONFIG = {
+    'check_interval': 5.0,  # seconds between checks of the shared version
+}
+
+_Snapshot = namedtuple('_Snapshot', [
+    'fences', 'members', 'device_fences', 'ids', 'positions', 'bounds', 'boundaries',
+    'parts', 'part_owner', 'fence_parts', 'tree',
+])
+
+_EMPTY = _Snapshot({}, {}, {}, np.empty(0, dtype=np.int64), {}, np.empty((0, 4)),
+                   np.empty(0, dtype=object), np.empty(0, dtype=object),
+                   np.empty(0, dtype=np.int64), {}, None)
+
+
+class GeofenceIndex:
+    """Per-process STRtree of active geofences with device membership sets."""
+
+    def __init__(self, check_interval: Optional[float] = None):
+        config = dict(DEFAULT_GEOFENCE_INDEX_CONFIG)
+        config.update(getattr(settings, 'GPS_GEOFENCE_INDEX', {}) or {})
+        self.check_interval = check_interval if check_interval is not None else config['check_interval']
+        self._snapshot = _EMPTY
+        self._dirty = True
+        self._version = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    # -- lifecycle -------------------------------------------------------
+
+    def invalidate(self, broadcast: bool = True) -> None:
+        """Mark the index stale here and, if ``broadcast``, in every process."""
+        self._dirty = True
+        if broadcast:
+            try:
+                cache.incr(VERSION_CACHE_KEY)
+            except ValueError:
+                cache.set(VERSION_CACHE_KEY, 1, None)
+            except Exception as e:
+                logger.warning(f"Could not broadcast geofence index invalidation: {e}")
+
+    def _shared_version(self):
+        try:
+            return cache.get(VERSION_CACHE_KEY, 0)
+        except Exception:
+            return self._version
+
+    def _current(self) -> _Snapshot:
+        now = time.monotonic()
+        if not self._dirty and now - self._last_check >= self.check_interval:
+            self._last_check = now
+            if self._shared_version() != self._version:
+                self._dirty = True
+        if self._dirty:
+            with self._lock:
+                if self._dirty:
+                    self.load()
+        return self._snapshot
+
+    def load(self) -> None:
+        """Rebuild the index from the database."""
+        from skyguard.apps.gps.models import GeoFence
+
+        version = self._shared_version()
+        fences = GeoFence.objects.filter(is_active=True).select_related(
+            'owner'
+        ).prefetch_related('notify_owners')
+        memberships = GeoFence.devices.through.objects.filter(
+            geofence__is_active=True
+        ).values_list('geofence_id', 'gpsdevice_id')
+        self.build(fences, memberships)
+        self._version = version
+
+    def build(self, fences, memberships) -> None:
+        """
+        Replace the index contents.
+
+        Args:
+            fences: ``GeoFence`` instances (anything with ``id`` and ``geometry``)
+            memberships: Iterable of (fence_id, imei) pairs
+        """
+        fences = {fence.id: fence for fence in fences}
+        members = defaultdict(set)
+        device_fences = defaultdict(set)
+        for fence_id, imei in memberships:
+            if fence_id in fences:
+                members[fence_id].add(imei)
+                device_fences[imei].add(fence_id)
+
+        ids = np.fromiter(fences.keys(), dtype=np.int64, count=len(fences))
+        geometries = shapely.from_wkb([bytes(fence.geometry.wkb) for fence in fences.values()])
+        boundaries = np.asarray(shapely.boundary(geometries), dtype=object)
+        shapely.prepare(boundaries)
+
+        parts, part_owner, fence_parts = [], [], {}
+        for position, (fence, geometry) in enumerate(zip(fences.values(), geometries)):
+            pieces = self._parts(fence, geometry)
+            fence_parts[position] = np.arange(len(parts), len(parts) + len(pieces))
+            parts.extend(pieces)
+            part_owner.extend([position] * len(pieces))
+        parts = np.asarray(parts, dtype=object)
+        shapely.prepare(parts)
+        part_owner = np.asarray(part_owner, dtype=np.int64)
+
+        self._snapshot = _Snapshot(
+            fences,
+            {fence_id: frozenset(imeis) for fence_id, imeis in members.items()},
+            {imei: frozenset(fence_ids) for imei, fence_ids in device_fences.items()},
+            ids,
+            {fence_id: position for position, fence_id in enumerate(fences)},
+            shapely.bounds(geometries).reshape(-1, 4),
+            boundaries,
+            parts,
+            part_owner,
+            fence_parts,
+            STRtree(parts) if len(parts) else None,
+        )
+        self._dirty = False
+        self._last_check = time.monotonic()
+        logger.debug(f"Geofence index loaded: {len(fences)} fences, {len(device_fences)} devices")
+
+    @staticmethod
+    def _parts(fence, geometry) -> List:
+        """Subdivided parts of a fence: stored ``index_parts`` or computed now."""
+        stored = getattr(fence, 'index_parts', None)
+        if stored:
+            return list(shapely.get_parts(shapely.from_wkb(bytes(stored.wkb))))
+        return subdivide_shape(geometry, get_geometry_config()['subdivide_max_vertices'])
+
+    @staticmethod
+    def _inside(snapshot: _Snapshot, part_idx: np.ndarray, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Whether each point lies inside the fence its paired part belongs to.
+
+        A point inside a part is inside the fence. A point on the edge of a
+        part is inside too unless it is on the fence's own boundary (the
+        other edges are cuts made by the subdivision).
+        """
+        inside = shapely.contains_xy(snapshot.parts[part_idx], xs, ys)
+        edge = np.flatnonzero(~inside)
+        if len(edge):
+            edge = edge[shapely.intersects_xy(snapshot.parts[part_idx[edge]], xs[edge], ys[edge])]
+        if len(edge):
+            owners = snapshot.part_owner[part_idx[edge]]
+            inside[edge] = ~shapely.intersects_xy(snapshot.boundaries[owners], xs[edge], ys[edge])
+        return inside
+
+    # -- queries ---------------------------------------------------------
+
+    def get_fence(self, fence_id: int):
+        """Cached ``GeoFence`` instance (owner and notify_owners preloaded)."""
+        return self._current().fences.get(fence_id)
+
+    def fences_for_device(self, imei: int) -> List:
+        """Active geofences a device is assigned to."""
+        snapshot = self._current()
+        return [snapshot.fences[fence_id] for fence_id in snapshot.device_fences.get(int(imei), ())]
+
+    def fence_ids_for_device(self, imei: int) -> FrozenSet[int]:
+        """Ids of the active geofences a device is assigned to."""
+        return self._current().device_fences.get(int(imei), frozenset())
+
+    def devices_for_fence(self, fence_id: int) -> FrozenSet[int]:
+        """IMEIs assigned to an active geofence."""
+        return self._current().members.get(fence_id, frozenset())
+
+    def containing(self, longitude: float, latitude: float) -> Set[int]:
+        """Ids of all active geofences that contain the point."""
+        snapshot = self._current()
+        if snapshot.tree is None:
+            return set()
+        candidates = snapshot.tree.query(shapely.points(longitude, latitude))
+        if not len(candidates):
+            return set()
+        xs = np.full(len(candidates), float(longitude))
+        ys = np.full(len(candidates), float(latitude))
+        hits = candidates[self._inside(snapshot, candidates, xs, ys)]
+        return set(snapshot.ids[snapshot.part_owner[hits]].tolist())
+
+    def contains(self, fence_id: int, longitude: float, latitude: float) -> bool:
+        """Whether one fence contains the point (bbox first, then its parts)."""
+        snapshot = self._current()
+        position = snapshot.positions.get(fence_id)
+        if position is None:
+            return False
+        min_x, min_y, max_x, max_y = snapshot.bounds[position]
+        if not (min_x <= longitude <= max_x and min_y <= latitude <= max_y):
+            return False
+        part_idx = snapshot.fence_parts[position]
+        xs = np.full(len(part_idx), float(longitude))
+        ys = np.full(len(part_idx), float(latitude))
+        return bool(self._inside(snapshot, part_idx, xs, ys).any())
+
+    def crossings(self, x0: float, y0: float, x1: float, y1: float) -> Dict[int, np.ndarray]:
+        """
+        Boundary crossings of the segment (x0, y0) -> (x1, y1).
+
+        Returns:
+            Dict mapping fence id to the sorted fractions (0..1) along the
+            segment at which it meets that fence's boundary
+        """
+        snapshot = self._current()
+        if snapshot.tree is None or (x0 == x1 and y0 == y1):
+            return {}
+        segment = shapely.linestrings([(x0, y0), (x1, y1)])
+        result = {}
+        owners = np.unique(snapshot.part_owner[snapshot.tree.query(segment, predicate='intersects')])
+        for position in owners:
+            hit = shapely.intersection(segment, snapshot.boundaries[position])
+            if hit.is_empty:
+                continue
+            points = shapely.points(shapely.get_coordinates(hit))
+            fractions = np.unique(shapely.line_locate_point(segment, points, normalized=True))
+            result[int(snapshot.ids[position])] = fractions
+        return result
+
+    def assigned_devices(self) -> FrozenSet[int]:
+        """IMEIs assigned to at least one active geofence."""
+        return frozenset(self._current().device_fences)
+
+    def containing_many(self, longitudes: np.ndarray, latitudes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Containment of many points in one pass.
+
+        Returns:
+            Parallel arrays (point indices, fence ids), one entry per
+            (point, fence) pair where the fence contains the point
+        """
+        snapshot = self._current()
+        if snapshot.tree is None or not len(longitudes):
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        longitudes = np.asarray(longitudes, dtype=float)
+        latitudes = np.asarray(latitudes, dtype=float)
+        point_idx, part_idx = snapshot.tree.query(shapely.points(longitudes, latitudes))
+        inside = self._inside(snapshot, part_idx, longitudes[point_idx], latitudes[point_idx])
+        pairs = np.unique(np.column_stack((
+            point_idx[inside], snapshot.part_owner[part_idx[inside]]
+        )).reshape(-1, 2), axis=0)
+        return pairs[:, 0], snapshot.ids[pairs[:, 1]]
+
+    def evaluate(self, imei: int, longitude: float, latitude: float) -> Dict[int, bool]:
+        """
+        Inside/outside state of a position against the fences of a device.
+
+        Returns:
+            Dict mapping each assigned fence id to whether the point is inside
+        """
+        fence_ids = self._current().device_fences.get(int(imei))
+        if not fence_ids:
+            return {}
+        inside = self.containing(longitude, latitude)
+        return {fence_id: fence_id in inside for fence_id in fence_ids}
+
+
+geofence_index = GeofenceIndex()
@@ -3,6 +3,7 @@ Advanced Geofence Management System for SkyGuard
 Integrates with all system modules for comprehensive geofencing functionality.
 """
 import logging
+import uuid
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple, Set
 from datetime import datetime, timedelta
@@ -11,13 +12,16 @@ from django.utils import timezone
 from django.contrib.gis.geos import Point, Polygon
 from django.contrib.auth.models import User
 from django.db import transaction, models
-from django.db.models import Q, Count, Avg, Max, Min
+from django.db.models import Q, Count, Avg, Max, Min, QuerySet
 from django.core.cache import cache
 from django.core.exceptions import PermissionDenied, ValidationError
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
 from skyguard.apps.gps.models import GPSDevice, GeoFence, GeoFenceEvent, GPSEvent
+from skyguard.apps.gps.services.geofence_geometry import check_vertex_budget, fence_contains
+from skyguard.apps.gps.services.geofence_index import geofence_index
+from skyguard.apps.gps.services.geofence_state import GeofenceState, detect_transition, geofence_state_cache
 from skyguard.apps.gps.notifications import GeofenceNotificationService
 from skyguard.apps.tracking.models import TrackingSession, TrackingEvent
 
@@ -317,8 +321,8 @@ class AdvancedGeofenceManager:
         # Broadcast creation
         self._broadcast_geofence_update(geofence, 'created')
         
-        # Trigger immediate check for devices already inside
-        self._check_initial_device_positions(geofence)
+        # Queue the check for devices already inside (runs after commit)
+        geofence.initial_check_task_id = self.check_initial_device_positions(geofence)
         
         self.logger.info(f"Created geofence '{name}' for {len(devices)} devices by user {user.username}")
         
@@ -340,15 +344,16 @@ class AdvancedGeofenceManager:
         
         events_generated = []
         
-        # Get active geofences for this device with spatial optimization
-        active_geofences = GeoFence.objects.filter(
-            is_active=True,
-            devices=device
-        ).select_related('owner').prefetch_related('notify_owners')
+        # Active geofences and inside/outside state come from the in-memory index
+        active_geofences = geofence_index.fences_for_device(device.imei)
+        if not active_geofences:
+            return []
+        inside = geofence_index.containing(device.position.x, device.position.y)
+        states = geofence_state_cache.get_states(device.imei)
         
         # Batch process geofences for better performance
         for geofence_batch in self._batch_geofences(active_geofences):
-            batch_events = self._process_geofence_batch(device, geofence_batch)
+            batch_events = self._process_geofence_batch(device, geofence_batch, inside, states)
             events_generated.extend(batch_events)
         
         # Cache result
@@ -365,14 +370,16 @@ class AdvancedGeofenceManager:
         return [geofence_list[i:i + self.batch_size] 
                 for i in range(0, len(geofence_list), self.batch_size)]
     
-    def _process_geofence_batch(self, device: GPSDevice, 
-                               geofence_batch: List[GeoFence]) -> List[Dict[str, Any]]:
+    def _process_geofence_batch(self, device: GPSDevice, geofence_batch: List[GeoFence],
+                               inside: Optional[Set[int]] = None,
+                               states: Optional[Dict[int, GeofenceState]] = None) -> List[Dict[str, Any]]:
         """Process a batch of geofences for a device."""
         events = []
         
         for geofence in geofence_batch:
             try:
-                event = self._check_single_geofence_enhanced(device, geofence)
+                is_inside = geofence.id in inside if inside is not None else None
+                event = self._check_single_geofence_enhanced(device, geofence, is_inside, states)
                 if event:
                     events.append(event)
             except Exception as e:
@@ -380,47 +387,31 @@ class AdvancedGeofenceManager:
         
         return events
     
-    def _check_single_geofence_enhanced(self, device: GPSDevice, 
-                                      geofence: GeoFence) -> Optional[Dict[str, Any]]:
+    def _check_single_geofence_enhanced(self, device: GPSDevice, geofence: GeoFence,
+                                      is_inside: Optional[bool] = None,
+                                      states: Optional[Dict[int, GeofenceState]] = None) -> Optional[Dict[str, Any]]:
         """Enhanced single geofence check with intelligent analysis."""
-        is_inside = geofence.geometry.contains(device.position)
+        if is_inside is None:
+            is_inside = fence_contains(geofence, device.position.x, device.position.y)
+        if states is None:
+            states = geofence_state_cache.get_states(device.imei)
         
-        # Get the last event efficiently
-        last_event = GeoFenceEvent.objects.filter(
-            device=device,
-            fence=geofence
-        ).order_by('-timestamp').first()
-        
-        # Determine event generation with enhanced logic
-        should_generate_event = False
-        event_type = None
-        
-        if last_event is None:
-            # First time checking - generate entry event only if inside
-            if is_inside:
-                should_generate_event = True
-                event_type = 'ENTRY'
-        else:
-            # Check for state change with hysteresis
-            was_inside = (last_event.event_type == 'ENTRY')
-            time_since_last = timezone.now() - last_event.timestamp
-            min_interval = timedelta(seconds=30)  # Prevent event spam
-            
-            if is_inside and not was_inside and time_since_last > min_interval:
-                should_generate_event = True
-                event_type = 'ENTRY'
-            elif not is_inside and was_inside and time_since_last > min_interval:
-                should_generate_event = True
-                event_type = 'EXIT'
+        state = states.get(geofence.id)
+        event_type = detect_transition(state, is_inside, timezone.now().timestamp())
+        
+        if state is None and not is_inside:
+            # First time checking and outside: remember it so a later entry is detected
+            states[geofence.id] = GeofenceState(inside=False)
+            geofence_state_cache.set_states(device.imei, {geofence.id: states[geofence.id]})
         
-        if should_generate_event:
-            return self._generate_enhanced_geofence_event(device, geofence, event_type)
+        if event_type:
+            return self._generate_enhanced_geofence_event(device, geofence, event_type, states)
         
         return None
     
     @transaction.atomic
-    def _generate_enhanced_geofence_event(self, device: GPSDevice, geofence: GeoFence, 
-                                        event_type: str) -> Dict[str, Any]:
+    def _generate_enhanced_geofence_event(self, device: GPSDevice, geofence: GeoFence, event_type: str,
+                                        states: Optional[Dict[int, GeofenceState]] = None) -> Dict[str, Any]:
         """Generate enhanced geofence event with comprehensive tracking."""
         # Create the event
         event = GeoFenceEvent.objects.create(
@@ -430,10 +421,22 @@ class AdvancedGeofenceManager:
             position=device.position,
             timestamp=timezone.now()
         )
+        return self._handle_geofence_event(device, geofence, event, states)
+    
+    def _handle_geofence_event(self, device: GPSDevice, geofence: GeoFence, event: GeoFenceEvent,
+                               states: Optional[Dict[int, GeofenceState]] = None) -> Dict[str, Any]:
+        """Update state, notify and broadcast for a stored geofence event."""
+        event_type = event.event_type
+        previous = states.get(geofence.id) if states is not None else None
+        state = GeofenceState(
+            inside=event_type == 'ENTRY',
+            since=event.timestamp.timestamp(),
+            last_notified=previous.last_notified if previous else None
+        )
         
         # Calculate additional metrics
-        dwell_time = self._calculate_dwell_time(device, geofence, event_type)
-        distance_from_center = self._calculate_distance_from_center(device.position, geofence)
+        dwell_time = self._calculate_dwell_time(previous, event)
+        distance_from_center = self._calculate_distance_from_center(event.position, geofence)
         
         # Prepare comprehensive event data
         event_data = {
@@ -443,14 +446,14 @@ class AdvancedGeofenceManager:
             'geofence_id': geofence.id,
             'geofence_name': geofence.name,
             'event_type': event_type,
-            'position': [device.position.y, device.position.x],
+            'position': [event.position.y, event.position.x],
             'timestamp': event.timestamp.isoformat(),
             'dwell_time': dwell_time,
             'distance_from_center': distance_from_center,
             'device_speed': device.speed or 0,
             'device_course': device.course or 0,
-            'battery_level': device.battery_level,
-            'signal_strength': device.signal_strength
+            'battery_level': getattr(device, 'battery_level', None),
+            'signal_strength': getattr(device, 'signal_strength', None)
         }
         
         # Log detailed event information
@@ -460,7 +463,15 @@ class AdvancedGeofenceManager:
         self._create_tracking_event(device, event, event_data)
         
         # Send notifications with enhanced data
-        self._send_enhanced_notifications(event, geofence, device, event_data)
+        self._send_enhanced_notifications(event, geofence, device, event_data, state)
+        
+        # Publish the new state once the event row is committed, unless a
+        # newer transition was stored meanwhile
+        if states is not None:
+            states[geofence.id] = state
+        transaction.on_commit(
+            lambda: geofence_state_cache.set_if_newer(device.imei, geofence.id, state)
+        )
         
         # Broadcast via WebSocket
         self._broadcast_geofence_event(event_data, geofence.owner.id)
@@ -475,22 +486,14 @@ class AdvancedGeofenceManager:
         
         return event_data
     
-    def _calculate_dwell_time(self, device: GPSDevice, geofence: GeoFence, 
-                            event_type: str) -> Optional[float]:
-        """Calculate dwell time for EXIT events."""
-        if event_type != 'EXIT':
+    def _calculate_dwell_time(self, previous: Optional[GeofenceState],
+                            event: GeoFenceEvent) -> Optional[float]:
+        """Calculate dwell time for EXIT events from the state before the exit."""
+        if event.event_type != 'EXIT' or previous is None:
             return None
         
-        # Find the most recent ENTRY event
-        entry_event = GeoFenceEvent.objects.filter(
-            device=device,
-            fence=geofence,
-            event_type='ENTRY',
-            timestamp__lte=timezone.now()
-        ).order_by('-timestamp').first()
-        
-        if entry_event:
-            return (timezone.now() - entry_event.timestamp).total_seconds()
+        if previous.inside and previous.since:
+            return event.timestamp.timestamp() - previous.since
         
         return None
     
@@ -533,12 +536,13 @@ class AdvancedGeofenceManager:
             self.logger.warning(f"Failed to create tracking event: {e}")
     
     def _send_enhanced_notifications(self, event: GeoFenceEvent, geofence: GeoFence, 
-                                   device: GPSDevice, event_data: Dict[str, Any]):
+                                   device: GPSDevice, event_data: Dict[str, Any],
+                                   state: GeofenceState):
         """Send enhanced notifications with additional context."""
         if not self._should_send_notification(geofence, event.event_type):
             return
         
-        if self._is_in_cooldown(geofence, device, event.event_type):
+        if self._is_in_cooldown(geofence, state):
             return
         
         try:
@@ -552,6 +556,7 @@ class AdvancedGeofenceManager:
             })
             
             self.notification_service.send_geofence_notification(event, geofence, device)
+            state.last_notified = timezone.now().timestamp()
         except Exception as e:
             self.logger.warning(f"Error sending enhanced notification: {e}")
     
@@ -563,25 +568,19 @@ class AdvancedGeofenceManager:
             return False
         return True
     
-    def _is_in_cooldown(self, geofence: GeoFence, device: GPSDevice, event_type: str) -> bool:
-        """Check cooldown period."""
-        if geofence.notification_cooldown <= 0:
+    def _is_in_cooldown(self, geofence: GeoFence, state: GeofenceState) -> bool:
+        """Check cooldown period since the last notification for this device/fence."""
+        if geofence.notification_cooldown <= 0 or not state.last_notified:
             return False
         
-        since = timezone.now() - timedelta(seconds=geofence.notification_cooldown)
-        return GeoFenceEvent.objects.filter(
-            fence=geofence,
-            device=device,
-            event_type=event_type,
-            timestamp__gte=since
-        ).exists()
+        return timezone.now().timestamp() - state.last_notified < geofence.notification_cooldown
     
     def _determine_alert_level(self, event_data: Dict[str, Any]) -> str:
         """Determine alert level based on event characteristics."""
         # Simple logic - can be enhanced with ML
         if event_data.get('device_speed', 0) > 80:  # High speed
             return 'HIGH'
-        elif event_data.get('battery_level', 100) < 20:  # Low battery
+        elif (event_data.get('battery_level') or 100) < 20:  # Low battery
             return 'MEDIUM'
         else:
             return 'LOW'
@@ -694,13 +693,10 @@ class AdvancedGeofenceManager:
             raise ValidationError("Invalid geometry provided")
         
         # Check polygon complexity
+        check_vertex_budget(geometry)
         num_points = len(geometry.coords[0])
-        max_points = 1000
         min_points = 3
         
-        if num_points > max_points:
-            raise ValidationError(f"Polygon too complex ({num_points} points, max {max_points})")
-        
         if num_points < min_points:
             raise ValidationError(f"Polygon too simple ({num_points} points, min {min_points})")
         
@@ -712,13 +708,28 @@ class AdvancedGeofenceManager:
         if area > 10:  # Very large area (rough degrees)
             raise ValidationError("Geofence area too large")
     
-    def _check_initial_device_positions(self, geofence: GeoFence):
-        """Check if devices are already inside the new geofence."""
-        for device in geofence.devices.filter(position__isnull=False):
+    def check_initial_device_positions(self, geofence: GeoFence) -> str:
+        """
+        Queue the initial inside/outside check of the devices assigned to a geofence.
+
+        The ``populate_geofence_devices`` task is sent once the current
+        transaction commits, so it sees the new fence and its devices.
+
+        Returns:
+            Id of the Celery task, to poll its progress
+        """
+        from skyguard.apps.gps.tasks import populate_geofence_devices
+
+        task_id = str(uuid.uuid4())
+
+        def queue():
             try:
-                self.check_device_geofences(device, force_check=True)
+                populate_geofence_devices.apply_async((geofence.id,), task_id=task_id)
             except Exception as e:
-                self.logger.warning(f"Error checking initial position for device {device.imei}: {e}")
+                self.logger.warning(f"Error queuing initial device check for geofence {geofence.id}: {e}")
+
+        transaction.on_commit(queue)
+        return task_id
     
     def _update_device_geofence_status(self, device: GPSDevice, events: List[Dict[str, Any]]):
         """Update device's current geofence status."""
@@ -818,6 +829,11 @@ class AdvancedGeofenceManager:
     
     def get_user_geofences(self, user: User, include_inactive: bool = False) -> List[GeoFence]:
         """Get geofences for a user with permission checking."""
+        queryset = self.user_geofences_queryset(user, include_inactive)
+        return list(queryset.select_related('owner').prefetch_related('devices', 'notify_owners'))
+    
+    def user_geofences_queryset(self, user: User, include_inactive: bool = False) -> QuerySet:
+        """Queryset of the geofences a user owns or is notified about."""
         queryset = GeoFence.objects.filter(
             Q(owner=user) | Q(notify_owners=user)
         ).distinct()
@@ -825,7 +841,7 @@ class AdvancedGeofenceManager:
         if not include_inactive:
             queryset = queryset.filter(is_active=True)
         
-        return list(queryset.select_related('owner').prefetch_related('devices', 'notify_owners'))
+        return queryset
     
     def delete_geofence(self, user: User, geofence_id: int) -> bool:
         """Delete a geofence with permission checking."""
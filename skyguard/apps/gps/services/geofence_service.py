@@ -11,6 +11,7 @@ from django.db.models import Q
 
 from skyguard.apps.gps.models import GPSDevice, GeoFence, GeoFenceEvent
 from skyguard.apps.gps.notifications import GeofenceNotificationService
+from skyguard.apps.gps.services.geofence_geometry import fence_contains
 from skyguard.apps.gps.services.geofence_manager import advanced_geofence_manager
 
 logger = logging.getLogger(__name__)
@@ -168,7 +169,7 @@ class GeofenceDetectionService:
         if not device.position:
             return False
         
-        return geofence.geometry.contains(device.position)
+        return fence_contains(geofence, device.position.x, device.position.y)
     
     def get_device_geofences(self, device: GPSDevice) -> List[GeoFence]:
         """
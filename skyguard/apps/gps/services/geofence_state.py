@@ -0,0 +1,290 @@
+"""
+Per-(device, geofence) inside/outside state.
+
+Keeps, for every device and fence, whether the device is currently inside,
+since when (time of the last ENTRY/EXIT) and when a notification was last
+sent, so entry/exit detection, dwell time and notification cooldown are
+decided without querying ``GeoFenceEvent``.
+
+State lives in one Redis hash per device, with an in-process fallback. A
+device's state is loaded from its latest ``GeoFenceEvent`` per fence the
+first time it is needed (cold start or expired key).
+"""
+import json
+import threading
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+from skyguard.apps.gps.services.redis_client import get_redis_client
+
+LOADED_FIELD = '_loaded'
+
+# Minimum seconds between two transitions of the same device/fence (prevents event spam)
+MIN_TRANSITION_INTERVAL = 30
+
+DEFAULT_GEOFENCE_STATE_CONFIG = {
+    'ttl': 7 * 24 * 3600,  # seconds an idle device's state is kept in Redis
+}
+
+
+@dataclass
+class GeofenceState:
+    """Inside/outside state of one device against one geofence."""
+    inside: bool
+    since: Optional[float] = None          # epoch of the last ENTRY/EXIT
+    last_notified: Optional[float] = None  # epoch of the last notification sent
+
+    @property
+    def since_datetime(self) -> Optional[datetime]:
+        return datetime.fromtimestamp(self.since, dt_timezone.utc) if self.since else None
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self), separators=(',', ':'))
+
+    @classmethod
+    def loads(cls, value) -> 'GeofenceState':
+        return cls(**json.loads(value))
+
+
+def detect_transition(state: Optional[GeofenceState], is_inside: bool, now: float,
+                      min_interval: float = MIN_TRANSITION_INTERVAL) -> Optional[str]:
+    """
+    Event type implied by a new inside/outside observation.
+
+    Args:
+        state: Current state of the device/fence pair, ``None`` if unknown
+        is_inside: Whether the device is inside the fence now
+        now: Current epoch seconds
+        min_interval: Seconds after the last transition during which a change is ignored
+
+    Returns:
+        'ENTRY', 'EXIT' or ``None``
+    """
+    if state is None:
+        # First time checking - entry only if inside
+        return 'ENTRY' if is_inside else None
+    if is_inside == state.inside:
+        return None
+    if min_interval and now - (state.since or 0) <= min_interval:
+        return None
+    return 'ENTRY' if is_inside else 'EXIT'
+
+
+class RedisGeofenceStateStore:
+    """States kept in a Redis hash per device (field = fence id)."""
+
+    KEY = 'gps:geofence_state:{imei}'
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @staticmethod
+    def _decode(raw) -> Optional[Dict[int, GeofenceState]]:
+        if not raw:
+            return None
+        return {
+            int(field): GeofenceState.loads(value)
+            for field, value in raw.items() if field != LOADED_FIELD.encode()
+        }
+
+    def load(self, client, imei: int) -> Optional[Dict[int, GeofenceState]]:
+        return self._decode(client.hgetall(self.KEY.format(imei=imei)))
+
+    def load_many(self, client, imeis: List[int]) -> Dict[int, Optional[Dict[int, GeofenceState]]]:
+        pipe = client.pipeline(transaction=False)
+        for imei in imeis:
+            pipe.hgetall(self.KEY.format(imei=imei))
+        return {imei: self._decode(raw) for imei, raw in zip(imeis, pipe.execute())}
+
+    def save(self, client, imei: int, states: Dict[int, GeofenceState], initial: bool = False) -> None:
+        self.save_many(client, {imei: states}, initial)
+
+    def save_many(self, client, states_by_imei: Dict[int, Dict[int, GeofenceState]],
+                  initial: bool = False) -> None:
+        pipe = client.pipeline(transaction=False)
+        for imei, states in states_by_imei.items():
+            key = self.KEY.format(imei=imei)
+            mapping = {str(fence_id): state.dumps() for fence_id, state in states.items()}
+            if initial:
+                mapping[LOADED_FIELD] = '1'
+            if mapping:
+                pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def clear(self, client, imei: int) -> None:
+        client.delete(self.KEY.format(imei=imei))
+
+
+class LocalGeofenceStateStore:
+    """In-process equivalent of ``RedisGeofenceStateStore``."""
+
+    def __init__(self, ttl: int):
+        self._states: Dict[int, Dict[int, GeofenceState]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, client, imei: int) -> Optional[Dict[int, GeofenceState]]:
+        with self._lock:
+            states = self._states.get(imei)
+            return dict(states) if states is not None else None
+
+    def load_many(self, client, imeis: List[int]) -> Dict[int, Optional[Dict[int, GeofenceState]]]:
+        return {imei: self.load(client, imei) for imei in imeis}
+
+    def save(self, client, imei: int, states: Dict[int, GeofenceState], initial: bool = False) -> None:
+        self.save_many(client, {imei: states}, initial)
+
+    def save_many(self, client, states_by_imei: Dict[int, Dict[int, GeofenceState]],
+                  initial: bool = False) -> None:
+        with self._lock:
+            for imei, states in states_by_imei.items():
+                self._states.setdefault(imei, {}).update(states)
+
+    def clear(self, client, imei: int) -> None:
+        with self._lock:
+            self._states.pop(imei, None)
+
+
+class GeofenceStateCache:
+    """Facade over the Redis/in-process geofence state stores."""
+
+    def __init__(self, config: Optional[Dict[str, int]] = None):
+        self.config = dict(DEFAULT_GEOFENCE_STATE_CONFIG)
+        self.config.update(getattr(settings, 'GPS_GEOFENCE_STATE', {}) or {})
+        if config:
+            self.config.update(config)
+        self.redis_store = RedisGeofenceStateStore(int(self.config['ttl']))
+        self.local_store = LocalGeofenceStateStore(int(self.config['ttl']))
+
+    def _store(self):
+        client = get_redis_client()
+        return (self.redis_store, client) if client is not None else (self.local_store, None)
+
+    def get_states(self, imei: int) -> Dict[int, GeofenceState]:
+        """
+        All known fence states of a device, keyed by fence id.
+
+        Fences the device has no history with are absent.
+        """
+        imei = int(imei)
+        store, client = self._store()
+        states = store.load(client, imei)
+        if states is None:
+            states = self.load_from_database(imei)
+            store.save(client, imei, states, initial=True)
+        return states
+
+    def get_many(self, imeis: Iterable[int]) -> Dict[int, Dict[int, GeofenceState]]:
+        """``get_states`` for many devices, with one cold-start query for all misses."""
+        imeis = [int(imei) for imei in imeis]
+        store, client = self._store()
+        result = store.load_many(client, imeis)
+        missing = [imei for imei, states in result.items() if states is None]
+        if missing:
+            loaded = self.load_many_from_database(missing)
+            store.save_many(client, loaded, initial=True)
+            result.update(loaded)
+        return result
+
+    def set_states(self, imei: int, states: Dict[int, GeofenceState]) -> None:
+        """Store updated states for some fences of a device."""
+        store, client = self._store()
+        store.save(client, int(imei), states)
+
+    def set_if_newer(self, imei: int, fence_id: int, state: GeofenceState) -> None:
+        """
+        Store the state of one fence unless a transition as recent is already stored.
+
+        Used for events handled after the fact (e.g. by a queued task): a late
+        ENTRY must not overwrite a newer EXIT, it only contributes the time of
+        the notification it sent.
+        """
+        current = self.get_states(imei).get(fence_id)
+        if current is not None and (current.since or 0) >= (state.since or 0):
+            if not state.last_notified or (current.last_notified or 0) >= state.last_notified:
+                return
+            state = replace(current, last_notified=state.last_notified)
+        self.set_states(imei, {fence_id: state})
+
+    def set_many(self, states_by_imei: Dict[int, Dict[int, GeofenceState]]) -> None:
+        """``set_states`` for many devices in one round trip."""
+        if states_by_imei:
+            store, client = self._store()
+            store.save_many(client, states_by_imei)
+
+    def clear(self, imei: int) -> None:
+        """Forget the state of a device; it is reloaded on next use."""
+        store, client = self._store()
+        store.clear(client, int(imei))
+
+    def load_from_database(self, imei: int,
+                           fence_ids: Optional[Iterable[int]] = None) -> Dict[int, GeofenceState]:
+        """Build states from the latest ``GeoFenceEvent`` of each fence."""
+        from skyguard.apps.gps.models import GeoFenceEvent
+
+        events = GeoFenceEvent.objects.filter(device_id=imei)
+        if fence_ids is not None:
+            events = events.filter(fence_id__in=list(fence_ids))
+        latest = events.order_by('fence_id', '-timestamp').distinct('fence_id').values_list(
+            'fence_id', 'event_type', 'timestamp'
+        )
+        return {
+            fence_id: GeofenceState(inside=event_type == 'ENTRY', since=timestamp.timestamp())
+            for fence_id, event_type, timestamp in latest
+        }
+
+    def load_many_from_database(self, imeis: List[int]) -> Dict[int, Dict[int, GeofenceState]]:
+        """``load_from_database`` for many devices in one query."""
+        from skyguard.apps.gps.models import GeoFenceEvent
+
+        states = {imei: {} for imei in imeis}
+        latest = GeoFenceEvent.objects.filter(device_id__in=imeis).order_by(
+            'device_id', 'fence_id', '-timestamp'
+        ).distinct('device_id', 'fence_id').values_list('device_id', 'fence_id', 'event_type', 'timestamp')
+        for imei, fence_id, event_type, timestamp in latest.iterator():
+            states[imei][fence_id] = GeofenceState(inside=event_type == 'ENTRY', since=timestamp.timestamp())
+        return states
+
+    def states_before(self, events) -> Dict[int, GeofenceState]:
+        """
+        State of each event's device/fence right before the event, keyed by event id.
+
+        Built from the event history in two queries whatever the number of
+        events: the last event before the earliest one of each device/fence
+        pair, and every event of the pair from there to its latest one.
+        """
+        from django.db.models import Q
+        from skyguard.apps.gps.models import GeoFenceEvent
+
+        bounds = {}
+        for event in events:
+            first, last = bounds.get((event.device_id, event.fence_id), (event.timestamp, event.timestamp))
+            bounds[(event.device_id, event.fence_id)] = (min(first, event.timestamp), max(last, event.timestamp))
+        if not bounds:
+            return {}
+
+        before, window = Q(), Q()
+        for (device_id, fence_id), (first, last) in bounds.items():
+            before |= Q(device_id=device_id, fence_id=fence_id, timestamp__lt=first)
+            window |= Q(device_id=device_id, fence_id=fence_id, timestamp__gte=first, timestamp__lte=last)
+        fields = ('id', 'device_id', 'fence_id', 'event_type', 'timestamp')
+        history = list(
+            GeoFenceEvent.objects.filter(before).order_by('device_id', 'fence_id', '-timestamp')
+            .distinct('device_id', 'fence_id').values_list(*fields)
+        )
+        history += GeoFenceEvent.objects.filter(window).values_list(*fields)
+        history.sort(key=lambda row: (row[1], row[2], row[4], row[0]))
+
+        states = {}
+        for previous, row in zip([None] + history, history):
+            if previous is not None and previous[1:3] == row[1:3]:
+                states[row[0]] = GeofenceState(inside=previous[3] == 'ENTRY', since=previous[4].timestamp())
+            else:
+                states[row[0]] = GeofenceState(inside=False)
+        return {event.id: states.get(event.id, GeofenceState(inside=False)) for event in events}
+
+
+geofence_state_cache = GeofenceStateCache()
@@ -1,7 +1,8 @@
 """
 GPS service implementation.
 """
-from typing import List, Optional, Any
+from typing import Any, Callable, List, Optional
+import numpy as np
 from django.utils import timezone
 from django.contrib.gis.geos import Point
 
@@ -12,6 +13,9 @@ from skyguard.core.exceptions import (
     InvalidEventDataError,
 )
 from skyguard.apps.gps.models import GPSDevice
+from skyguard.apps.gps.pipeline import Fix, ingest_pipeline
+from skyguard.apps.gps.services.compact import encode_track, track_columns
+from skyguard.apps.gps.services.downsample import lttb
 
 
 class GPSService(ILocationService, IEventService):
@@ -67,6 +71,18 @@ class GPSService(ILocationService, IEventService):
             # Actualizar posición del dispositivo
             self.repository.update_device_position(device.imei, location.position)
             
+            # Avanzar el odómetro incremental del dispositivo
+            fix = ingest_pipeline.process(
+                Fix.from_point(
+                    device.imei, location.position, location.timestamp,
+                    speed=location.speed or 0,
+                    course=location.course or 0,
+                    altitude=location.altitude or 0,
+                    hdop=location.hdop
+                ),
+                device
+            )
+            
             # Crear evento de tracking
             event_data = {
                 'type': 'TRACK',
@@ -75,7 +91,7 @@ class GPSService(ILocationService, IEventService):
                 'speed': location.speed,
                 'course': location.course,
                 'altitude': location.altitude,
-                'odometer': device.odometer
+                'odometer': fix.odometer
             }
             self.process_event(device, event_data)
             
@@ -104,7 +120,9 @@ class GPSService(ILocationService, IEventService):
         except Exception as e:
             raise InvalidEventDataError(f'Error processing event: {str(e)}')
 
-    def get_device_history(self, imei: int, start_time: Any, end_time: Any) -> List[dict]:
+    def get_device_history(self, imei: int, start_time: Any, end_time: Any,
+                           max_points: Optional[int] = None,
+                           paginate: Optional[Callable[[Any], list]] = None) -> List[dict]:
         """
         Get location history for a GPS device.
         
@@ -112,6 +130,9 @@ class GPSService(ILocationService, IEventService):
             imei: Device IMEI
             start_time: Start time for history
             end_time: End time for history
+            max_points: Downsample the speed series to this many points (LTTB)
+            paginate: Selects one page of the locations queryset, e.g. a
+                bound ``KeysetPagination.paginate_queryset``
             
         Returns:
             List of location records
@@ -125,6 +146,10 @@ class GPSService(ILocationService, IEventService):
                 raise DeviceNotFoundError(f'Device not found: {imei}')
             
             locations = self.repository.get_device_locations(imei, start_time, end_time)
+            if max_points:
+                locations = self._downsampled(locations, max_points)
+            if paginate:
+                locations = paginate(locations)
             return [{
                 'timestamp': loc.timestamp,
                 'position': {
@@ -144,4 +169,89 @@ class GPSService(ILocationService, IEventService):
         except DeviceNotFoundError:
             raise
         except Exception as e:
-            raise InvalidLocationDataError(f'Error getting device history: {str(e)}') 
\ No newline at end of file
+            raise InvalidLocationDataError(f'Error getting device history: {str(e)}')
+    
+    def get_device_events(self, imei: int, event_type: Optional[str] = None,
+                          paginate: Optional[Callable[[Any], list]] = None) -> List[dict]:
+        """
+        Get events for a GPS device, newest first.
+        
+        Args:
+            imei: Device IMEI
+            event_type: Optional event type filter
+            paginate: Selects one page of the events queryset, e.g. a
+                bound ``KeysetPagination.paginate_queryset``
+            
+        Returns:
+            List of event records
+            
+        Raises:
+            DeviceNotFoundError: If device is not found
+        """
+        try:
+            device = self.repository.get_device(imei)
+            if not device:
+                raise DeviceNotFoundError(f'Device not found: {imei}')
+            
+            events = self.repository.get_device_events(imei, event_type)
+            if paginate:
+                events = paginate(events)
+            return [{
+                'type': event.type,
+                'timestamp': event.timestamp,
+                'position': {
+                    'latitude': event.position.y,
+                    'longitude': event.position.x
+                } if event.position else None,
+                'speed': event.speed,
+                'course': event.course,
+                'altitude': event.altitude,
+                'odometer': event.odometer
+            } for event in events]
+        except DeviceNotFoundError:
+            raise
+        except Exception as e:
+            raise InvalidEventDataError(f'Error getting device events: {str(e)}')
+    
+    @staticmethod
+    def _downsampled(locations, max_points: int):
+        """
+        The locations kept by LTTB on the speed series.
+
+        Only ids, timestamps and speeds are read to choose the points; the
+        full rows are then loaded for the kept ids only.
+        """
+        rows = list(locations.values_list('id', 'timestamp', 'speed'))
+        if len(rows) <= max_points:
+            return locations
+        ids, timestamps, speeds = zip(*rows)
+        keep = lttb([timestamp.timestamp() for timestamp in timestamps],
+                    np.asarray(speeds, dtype=np.float64), max_points)
+        return locations.filter(id__in=[ids[i] for i in keep.tolist()])
+    
+    def get_device_track(self, imei: int, start_time: Any, end_time: Any) -> bytes:
+        """
+        Get location history for a GPS device in the compact track format.
+        
+        Args:
+            imei: Device IMEI
+            start_time: Start time for history
+            end_time: End time for history
+            
+        Returns:
+            Encoded track (see ``skyguard.apps.gps.services.compact``)
+            
+        Raises:
+            DeviceNotFoundError: If device is not found
+        """
+        try:
+            device = self.repository.get_device(imei)
+            if not device:
+                raise DeviceNotFoundError(f'Device not found: {imei}')
+            
+            locations = self.repository.get_device_locations(imei, start_time, end_time)
+            return encode_track(**track_columns(locations))
+        except DeviceNotFoundError:
+            raise
+        except Exception as e:
+            raise InvalidLocationDataError(f'Error getting device track: {str(e)}')
@@ -20,6 +20,7 @@ import pytz
 
 from skyguard.apps.gps.models import GPSDevice, GPSLocation, GPSEvent
 from skyguard.apps.gps.protocols import GPSProtocolHandler
+from skyguard.apps.gps.pipeline import Fix, ingest_pipeline
 
 logger = logging.getLogger(__name__)
 
@@ -458,8 +459,22 @@ class HardwareGPSService:
                 fix_quality=gps_data.get('fix_quality', 0)
             )
             
+            # Pasar el fix por el pipeline de ingesta (odómetro incremental)
+            fix = ingest_pipeline.process(Fix(
+                imei=device.imei,
+                timestamp=timestamp,
+                latitude=position.y,
+                longitude=position.x,
+                speed=gps_data.get('speed', 0),
+                course=gps_data.get('course', 0),
+                altitude=gps_data.get('altitude', 0),
+                hdop=hdop,
+                satellites=satellites
+            ), device)
+            
             # Actualizar posición del dispositivo
             device.position = position
+            device.odometer = fix.odometer or device.odometer
             device.speed = gps_data.get('speed', 0)
             device.course = gps_data.get('course', 0)
             device.altitude = gps_data.get('altitude', 0)
@@ -477,6 +492,7 @@ class HardwareGPSService:
                 speed=gps_data.get('speed', 0),
                 course=gps_data.get('course', 0),
                 altitude=gps_data.get('altitude', 0),
+                odometer=device.odometer,
                 source=protocol
             )
             
@@ -0,0 +1,237 @@
+"""
+Server-side heatmaps.
+
+A day of fixes is binned into a fixed web-mercator grid: at resolution ``r``
+the cells are the XYZ tiles of zoom ``r`` (about 600 m at zoom 16, 150 m at
+18, 40 m at 20), so cells line up with the map tiles and across days. Fixes
+are streamed from a server-side cursor in chunks; each chunk is reduced to
+per-cell sums with ``np.unique``/``np.bincount`` and the partial sums are
+merged at the end, so memory depends on the number of cells, not fixes.
+
+Metrics:
+
+- ``fixes``: number of position samples per cell
+- ``dwell``: seconds spent stopped (below ``moving_speed``) in each cell; a
+  fix's time runs until the device's next fix, capped at ``max_gap``
+- ``speeding``: samples above the speed limit
+
+Results are cached per owner, route, day, resolution and metric. Past days
+do not change and are kept for ``cache_ttl``; today's map for
+``today_cache_ttl``.
+"""
+import itertools
+import math
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.functions import Extract
+from django.utils import timezone
+
+from skyguard.apps.gps.fast_serializers import latitude_of, longitude_of
+from skyguard.apps.gps.services.trail import TRAIL_EVENT_TYPES
+
+METRICS = ('fixes', 'dwell', 'speeding')
+
+DEFAULT_HEATMAP_CONFIG = {
+    'min_resolution': 8,
+    'max_resolution': 20,
+    'default_resolution': 16,
+    'speed_limit': 80.0,       # km/h; default threshold of the speeding metric
+    'moving_speed': 3.0,       # km/h; slower samples count as stopped
+    'max_gap': 300,            # s; longer gaps between fixes add no dwell time
+    'chunk_size': 20000,       # rows per server-side cursor fetch
+    'cache_ttl': 7 * 86400,    # s; past days
+    'today_cache_ttl': 300,    # s; the current day
+}
+
+
+def get_heatmap_config() -> Dict[str, Any]:
+    """Heatmap settings merged over the defaults."""
+    config = dict(DEFAULT_HEATMAP_CONFIG)
+    config.update(getattr(settings, 'GPS_HEATMAP', {}) or {})
+    return config
+
+
+def grid_cells(latitudes: np.ndarray, longitudes: np.ndarray, resolution: int) -> np.ndarray:
+    """Cell index (``x * 2**resolution + y`` of the zoom ``resolution`` tile) of each point."""
+    n = 2 ** resolution
+    latitudes = np.clip(np.asarray(latitudes, dtype=np.float64), -85.05112878, 85.05112878)
+    x = np.floor((np.asarray(longitudes, dtype=np.float64) + 180) / 360 * n)
+    y = np.floor((1 - np.arcsinh(np.tan(np.radians(latitudes))) / math.pi) / 2 * n)
+    return np.clip(x, 0, n - 1).astype(np.int64) * n + np.clip(y, 0, n - 1).astype(np.int64)
+
+
+def cell_centers(cells: np.ndarray, resolution: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Latitudes and longitudes of the centres of ``grid_cells`` cells."""
+    n = 2 ** resolution
+    x, y = np.divmod(np.asarray(cells, dtype=np.int64), n)
+    longitudes = (x + 0.5) / n * 360 - 180
+    latitudes = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * (y + 0.5) / n))))
+    return latitudes, longitudes
+
+
+def chunk_weights(devices: np.ndarray, epochs: np.ndarray, speeds: np.ndarray, metric: str,
+                  config: Dict[str, Any], speed_limit: float) -> np.ndarray:
+    """
+    Weight of each fix for ``metric``.
+
+    Fixes are ordered by device and time; for ``dwell`` the last fix of the
+    array has no successor yet and weighs nothing (``HeatmapAccumulator``
+    carries it over to the next chunk).
+    """
+    if metric == 'fixes':
+        return np.ones(len(devices))
+    if metric == 'speeding':
+        return (speeds > speed_limit).astype(np.float64)
+    gaps = np.zeros(len(devices))
+    gaps[:-1] = np.diff(epochs)
+    same_device = np.zeros(len(devices), dtype=bool)
+    same_device[:-1] = devices[1:] == devices[:-1]
+    stopped = speeds < config['moving_speed']
+    return np.where(same_device & stopped & (gaps <= config['max_gap']), gaps, 0.0)
+
+
+class HeatmapAccumulator:
+    """Per-cell sums over chunks of fixes ordered by device and time."""
+
+    def __init__(self, resolution: int, metric: str, config: Optional[Dict[str, Any]] = None,
+                 speed_limit: Optional[float] = None):
+        self.resolution = resolution
+        self.metric = metric
+        self.config = config or get_heatmap_config()
+        self.speed_limit = self.config['speed_limit'] if speed_limit is None else speed_limit
+        self.samples = 0
+        self._cells = []
+        self._sums = []
+        self._carry = None
+
+    def add(self, devices, epochs, latitudes, longitudes, speeds) -> None:
+        """Add one chunk of fixes, each argument an array of the same length."""
+        columns = [np.asarray(column, dtype=dtype) for column, dtype in (
+            (devices, np.int64), (epochs, np.float64), (latitudes, np.float64),
+            (longitudes, np.float64), (speeds, np.float64),
+        )]
+        self.samples += len(columns[0])
+        if self._carry is not None:
+            # The previous chunk's last fix gets its dwell time from this chunk's first
+            columns = [np.concatenate(([carried], column)) for carried, column in zip(self._carry, columns)]
+        if not len(columns[0]):
+            return
+        devices, epochs, latitudes, longitudes, speeds = columns
+        speeds = np.nan_to_num(speeds)
+        if self.metric == 'dwell':
+            self._carry = [column[-1] for column in columns]
+        weights = chunk_weights(devices, epochs, speeds, self.metric, self.config, self.speed_limit)
+        if self.metric == 'dwell':
+            weights = weights[:-1]
+            latitudes, longitudes = latitudes[:-1], longitudes[:-1]
+        self._reduce(grid_cells(latitudes, longitudes, self.resolution), weights)
+
+    def _reduce(self, cells: np.ndarray, weights: np.ndarray) -> None:
+        keep = weights > 0
+        cells, inverse = np.unique(cells[keep], return_inverse=True)
+        self._cells.append(cells)
+        self._sums.append(np.bincount(inverse, weights=weights[keep], minlength=len(cells)))
+
+    def result(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Cells with a non-zero value and their values, by cell index."""
+        if not self._cells:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        cells, inverse = np.unique(np.concatenate(self._cells), return_inverse=True)
+        return cells, np.bincount(inverse, weights=np.concatenate(self._sums), minlength=len(cells))
+
+
+def day_range(day: date) -> Tuple[datetime, datetime]:
+    """Start and end of a day in the current time zone."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def fix_chunks(owner_id: Optional[int], route: Optional[int], day: date,
+               chunk_size: int) -> Iterable[Tuple[np.ndarray, ...]]:
+    """
+    The day's fixes as ``(devices, epochs, latitudes, longitudes, speeds)`` arrays.
+
+    Rows come from a server-side cursor ordered by device and time, at most
+    ``chunk_size`` per chunk.
+    """
+    from skyguard.apps.gps.models import GPSEvent
+
+    start, end = day_range(day)
+    queryset = GPSEvent.objects.filter(
+        timestamp__gte=start, timestamp__lt=end, type__in=TRAIL_EVENT_TYPES, position__isnull=False
+    )
+    if owner_id is not None:
+        queryset = queryset.filter(device__owner_id=owner_id)
+    if route is not None:
+        queryset = queryset.filter(device__route=route)
+    rows = queryset.annotate(
+        fix_epoch=Extract('timestamp', 'epoch', tzinfo=dt_timezone.utc),
+        fix_latitude=latitude_of('position'),
+        fix_longitude=longitude_of('position'),
+    ).order_by('device_id', 'timestamp').values_list(
+        'device_id', 'fix_epoch', 'fix_latitude', 'fix_longitude', 'speed'
+    ).iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield tuple(np.asarray(column, dtype=np.float64) for column in zip(*chunk))
+
+
+def build_heatmap(owner_id: Optional[int], route: Optional[int], day: date, resolution: int,
+                  metric: str = 'fixes', speed_limit: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Heatmap of one day, cached.
+
+    Args:
+        owner_id: Only this owner's devices; ``None`` for the whole fleet
+        route: Only devices of this route; ``None`` for every route
+        day: Local calendar day
+        resolution: Grid zoom level
+        metric: ``fixes``, ``dwell`` or ``speeding``
+        speed_limit: km/h threshold of ``speeding``
+
+    Raises:
+        ValueError: On an unknown metric or a resolution out of range
+    """
+    config = get_heatmap_config()
+    if metric not in METRICS:
+        raise ValueError(f'metric must be one of {", ".join(METRICS)}')
+    if not config['min_resolution'] <= resolution <= config['max_resolution']:
+        raise ValueError(f'resolution must be between {config["min_resolution"]} '
+                         f'and {config["max_resolution"]}')
+    if speed_limit is None:
+        speed_limit = config['speed_limit']
+
+    key = (f'gps:heatmap:{owner_id or "all"}:{route or "all"}:{day.isoformat()}:{resolution}:{metric}'
+           + (f':{speed_limit:g}' if metric == 'speeding' else ''))
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    accumulator = HeatmapAccumulator(resolution, metric, config, speed_limit)
+    for chunk in fix_chunks(owner_id, route, day, config['chunk_size']):
+        accumulator.add(*chunk)
+    cells, values = accumulator.result()
+    latitudes, longitudes = cell_centers(cells, resolution)
+
+    data = {
+        'date': day.isoformat(),
+        'route': route,
+        'resolution': resolution,
+        'metric': metric,
+        'samples': accumulator.samples,
+        'total': float(values.sum()),
+        'max': float(values.max()) if len(values) else 0.0,
+        'cells': np.column_stack((np.round(latitudes, 6), np.round(longitudes, 6), values)).tolist(),
+    }
+    if metric == 'speeding':
+        data['speed_limit'] = speed_limit
+    ttl = config['today_cache_ttl'] if day >= timezone.localdate() else config['cache_ttl']
+    cache.set(key, data, ttl)
+    return data
@@ -0,0 +1,416 @@
+"""
+Host-local shared-memory table with the latest state of every device.
+
+Ingest workers write position/speed/heartbeat into a fixed-layout,
+memory-mapped file (one 72-byte slot per device); web and ASGI workers on the
+same host map the same file and read consistent fleet snapshots through NumPy
+without touching the database.
+
+The table only sees the writes made on its own host, so readers reconcile it
+with the ``GPSDevice`` rows: fully when the file is created and then, at most
+every ``reconcile_interval`` seconds, with the rows whose ``updated_at``
+moved (the ingest state flush bumps it). The newer timestamp wins, so state
+written on other hosts shows up after the flush interval plus the reconcile
+interval, and devices that have not reported since the file was created are
+still listed with their stored position.
+
+Each slot is protected by a sequence counter (seqlock): the writer makes it
+odd, updates the fields and makes it even again; readers copy the slots and
+retry any whose counter was odd or changed during the copy. Slot allocation
+is serialized across processes with ``flock`` on the table file.
+"""
+import fcntl
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SKYLST02'
+HEADER_SIZE = 64
+
+HEADER_DTYPE = np.dtype({
+    'names': ['magic', 'capacity', 'count', 'reconciled_at'],
+    'formats': ['S8', '<u4', '<u4', '<f8'],
+    'offsets': [0, 8, 12, 16],
+    'itemsize': HEADER_SIZE,
+})
+
+SLOT_DTYPE = np.dtype([
+    ('seq', '<u4'),
+    ('flags', '<u4'),
+    ('imei', '<i8'),
+    ('latitude', '<f8'),
+    ('longitude', '<f8'),
+    ('speed', '<f8'),
+    ('course', '<f8'),
+    ('altitude', '<f4'),
+    ('_reserved', '<f4'),
+    ('fix_time', '<f8'),        # epoch seconds, 0 = unknown
+    ('heartbeat_time', '<f8'),  # epoch seconds, 0 = unknown
+])
+
+# Status bits; bits 8-15 hold the connection status code
+FLAG_HAS_FIX = 0x1
+STATUS_SHIFT = 8
+STATUS_MASK = 0xFF << STATUS_SHIFT
+STATUS_CODES = {'OFFLINE': 0, 'ONLINE': 1, 'SLEEPING': 2, 'ERROR': 3}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+SEQ_MASK = 0xFFFFFFFF
+READ_RETRIES = 5
+
+DEFAULT_LATEST_STATE_CONFIG = {
+    'path': os.path.join(tempfile.gettempdir(), 'skyguard-latest-state.bin'),
+    'capacity': 65536,
+    'metadata_ttl': 60,  # seconds the device metadata list is cached
+    'reconcile_interval': 30,  # seconds between catch-ups with GPSDevice rows
+}
+
+DeviceState = namedtuple('DeviceState', [
+    'imei', 'latitude', 'longitude', 'speed', 'course', 'altitude',
+    'fix_time', 'heartbeat_time', 'has_fix', 'status',
+])
+
+METADATA_CACHE_KEY = 'gps:latest_state:device_metadata'
+METADATA_FIELDS = ['imei', 'name', 'route', 'economico', 'owner_id', 'is_active']
+DEVICE_STATE_FIELDS = [
+    'imei', 'position', 'speed', 'course', 'altitude',
+    'last_log', 'last_heartbeat', 'connection_status',
+]
+
+
+def _epoch(value: Optional[datetime]) -> float:
+    return value.timestamp() if value else 0.0
+
+
+def _from_epoch(value: float) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, dt_timezone.utc) if value else None
+
+
+class LatestStateTable:
+    """Memory-mapped latest-state table shared by the processes of one host."""
+
+    def __init__(self, path: Optional[str] = None, capacity: Optional[int] = None):
+        self.config = dict(DEFAULT_LATEST_STATE_CONFIG)
+        self.config.update(getattr(settings, 'GPS_LATEST_STATE', {}) or {})
+        self.path = path or self.config['path']
+        self.requested_capacity = int(capacity or self.config['capacity'])
+        self._file = None
+        self._map = None
+        self._header = None
+        self._slots = None
+        self._index: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._full_warned = False
+
+    # -- mapping ---------------------------------------------------------
+
+    def _ensure_open(self) -> np.ndarray:
+        if self._slots is not None:
+            return self._slots
+        with self._lock:
+            if self._slots is None:
+                self._open()
+        return self._slots
+
+    def _open(self) -> None:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o660)
+        handle = os.fdopen(fd, 'r+b')
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            size = os.fstat(fd).st_size
+            if size >= HEADER_SIZE and handle.read(len(MAGIC)) != MAGIC:
+                # Older layout left by a previous release: it is only a cache, start over
+                logger.warning(f"Recreating latest-state table {self.path} with the current layout")
+                handle.truncate(0)
+                size = 0
+            if size < HEADER_SIZE:
+                size = HEADER_SIZE + self.requested_capacity * SLOT_DTYPE.itemsize
+                handle.truncate(size)
+                mapping = mmap.mmap(fd, size)
+                header = np.ndarray((), HEADER_DTYPE, buffer=mapping)
+                header['capacity'] = self.requested_capacity
+                header['count'] = 0
+                header['reconciled_at'] = 0
+                header['magic'] = MAGIC
+            else:
+                mapping = mmap.mmap(fd, size)
+                header = np.ndarray((), HEADER_DTYPE, buffer=mapping)
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+        self._file = handle
+        self._map = mapping
+        self._header = header
+        self._slots = np.ndarray(
+            (int(header['capacity']),), SLOT_DTYPE, buffer=mapping, offset=HEADER_SIZE
+        )
+
+    def close(self) -> None:
+        """Unmap the table (the file is kept for other processes)."""
+        with self._lock:
+            self._header = None
+            self._slots = None
+            self._index.clear()
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @property
+    def count(self) -> int:
+        """Number of allocated slots."""
+        self._ensure_open()
+        return int(self._header['count'])
+
+    # -- writing ---------------------------------------------------------
+
+    def _slot_for(self, imei: int) -> Optional[int]:
+        slots = self._ensure_open()
+        slot = self._index.get(imei)
+        if slot is not None and slots['imei'][slot] == imei:
+            return slot
+
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            count = int(self._header['count'])
+            found = np.flatnonzero(slots['imei'][:count] == imei)
+            if found.size:
+                slot = int(found[0])
+            elif count < len(slots):
+                slot = count
+                slots['imei'][slot] = imei
+                self._header['count'] = count + 1
+            else:
+                if not self._full_warned:
+                    logger.warning(f"Latest-state table full ({len(slots)} slots), "
+                                   f"raise GPS_LATEST_STATE['capacity']")
+                    self._full_warned = True
+                return None
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+        self._index[imei] = slot
+        return slot
+
+    def update(self, imei: int, latitude: Optional[float] = None, longitude: Optional[float] = None,
+               speed: Optional[float] = None, course: Optional[float] = None,
+               altitude: Optional[float] = None, fix_time: Optional[datetime] = None,
+               heartbeat_time: Optional[datetime] = None, status: Optional[str] = None) -> None:
+        """
+        Update the slot of a device. Fields left as ``None`` keep their value.
+
+        A device is expected to be written by one process at a time (the one
+        holding its connection); readers never block.
+        """
+        imei = int(imei)
+        slot = self._slot_for(imei)
+        if slot is None:
+            return
+        slots = self._slots
+        seq = int(slots['seq'][slot])
+        slots['seq'][slot] = (seq + 1) & SEQ_MASK
+        flags = int(slots['flags'][slot])
+        if latitude is not None and longitude is not None:
+            slots['latitude'][slot] = latitude
+            slots['longitude'][slot] = longitude
+            flags |= FLAG_HAS_FIX
+        if speed is not None:
+            slots['speed'][slot] = speed
+        if course is not None:
+            slots['course'][slot] = course
+        if altitude is not None:
+            slots['altitude'][slot] = altitude
+        if fix_time is not None:
+            slots['fix_time'][slot] = _epoch(fix_time)
+        if heartbeat_time is not None:
+            slots['heartbeat_time'][slot] = _epoch(heartbeat_time)
+        if status is not None:
+            flags = (flags & ~STATUS_MASK) | (STATUS_CODES.get(status, 0) << STATUS_SHIFT)
+        slots['flags'][slot] = flags
+        slots['seq'][slot] = (seq + 2) & SEQ_MASK
+
+    def update_from_device(self, device) -> None:
+        """Mirror the state stored on a ``GPSDevice`` instance."""
+        position = device.position
+        self.update(
+            device.imei,
+            latitude=position.y if position else None,
+            longitude=position.x if position else None,
+            speed=device.speed or 0,
+            course=device.course or 0,
+            altitude=device.altitude or 0,
+            fix_time=device.last_log,
+            heartbeat_time=device.last_heartbeat,
+            status=device.connection_status,
+        )
+
+    # -- reading ---------------------------------------------------------
+
+    def snapshot(self, imeis: Optional[Iterable[int]] = None) -> np.ndarray:
+        """
+        Consistent copy of the allocated slots as a structured array.
+
+        Args:
+            imeis: Restrict the result to these devices
+
+        Returns:
+            Array of ``SLOT_DTYPE`` records, one per known device
+        """
+        slots = self._ensure_open()
+        self._reconcile_if_due()
+
+        count = int(self._header['count'])
+        view = slots[:count]
+        before = view['seq'].copy()
+        data = view.copy()
+        pending = np.flatnonzero((before & 1).astype(bool) | (view['seq'] != before))
+
+        for _ in range(READ_RETRIES):
+            if not pending.size:
+                break
+            before = view['seq'][pending].copy()
+            data[pending] = view[pending]
+            pending = pending[(before & 1).astype(bool) | (view['seq'][pending] != before)]
+
+        if pending.size:
+            # Slot still being rewritten: leave it out rather than return a torn record
+            data = np.delete(data, pending)
+        if imeis is not None:
+            data = data[np.isin(data['imei'], np.fromiter(imeis, dtype='<i8'))]
+        return data
+
+    def get_states(self, imeis: Optional[Iterable[int]] = None) -> Dict[int, DeviceState]:
+        """Snapshot keyed by IMEI, with timestamps as aware datetimes."""
+        data = self.snapshot(imeis)
+        return {
+            imei: DeviceState(
+                imei, lat, lon, speed, course, altitude,
+                _from_epoch(fix_time), _from_epoch(heartbeat_time),
+                bool(flags & FLAG_HAS_FIX), STATUS_NAMES.get(flags >> STATUS_SHIFT & 0xFF, 'OFFLINE'),
+            )
+            for (flags, imei, lat, lon, speed, course, altitude, fix_time, heartbeat_time) in zip(
+                data['flags'].tolist(), data['imei'].tolist(),
+                data['latitude'].tolist(), data['longitude'].tolist(),
+                data['speed'].tolist(), data['course'].tolist(), data['altitude'].tolist(),
+                data['fix_time'].tolist(), data['heartbeat_time'].tolist(),
+            )
+        }
+
+    # -- reconciling with the database ------------------------------------
+
+    def _reconcile_if_due(self) -> None:
+        """
+        Catch up with ``GPSDevice`` rows changed since the last reconcile.
+
+        The time of the last reconcile is kept in the table header, so the
+        processes of a host take turns instead of each querying on its own.
+        """
+        interval = self.config['reconcile_interval']
+        last = float(self._header['reconciled_at'])
+        now = time.time()
+        if last and now - last < interval:
+            return
+        self._header['reconciled_at'] = now
+        # Rows are stamped by the database hosts' clocks: overlap by one interval
+        since = _from_epoch(last - interval) if last else None
+        try:
+            self.reconcile(self._device_rows(since))
+        except Exception as e:
+            self._header['reconciled_at'] = last
+            logger.error(f"Error reconciling latest-state table: {e}")
+
+    @staticmethod
+    def _device_rows(since: Optional[datetime]) -> Iterable[tuple]:
+        """``DEVICE_STATE_FIELDS`` of the devices updated since ``since`` (all if None)."""
+        from skyguard.apps.gps.models import GPSDevice
+
+        rows = GPSDevice.objects.all()
+        if since is not None:
+            rows = rows.filter(updated_at__gte=since)
+        return rows.values_list(*DEVICE_STATE_FIELDS).iterator()
+
+    def reconcile(self, rows: Iterable[tuple]) -> int:
+        """
+        Merge stored device state into the table.
+
+        A device missing from the table is added; for a known device the
+        position and the heartbeat are only taken when the stored ones are
+        newer than what the table holds.
+
+        Args:
+            rows: ``DEVICE_STATE_FIELDS`` tuples
+
+        Returns:
+            Number of devices updated
+        """
+        slots = self._ensure_open()
+        count = int(self._header['count'])
+        known = {
+            imei: (fix_time, heartbeat_time)
+            for imei, fix_time, heartbeat_time in zip(
+                slots['imei'][:count].tolist(),
+                slots['fix_time'][:count].tolist(),
+                slots['heartbeat_time'][:count].tolist(),
+            )
+        }
+        updated = 0
+        for imei, position, speed, course, altitude, last_log, last_heartbeat, status in rows:
+            fix_time, heartbeat_time = known.get(imei, (None, None))
+            fields = {}
+            if fix_time is None or _epoch(last_log) > fix_time:
+                fields.update(
+                    latitude=position.y if position else None,
+                    longitude=position.x if position else None,
+                    speed=speed or 0, course=course or 0, altitude=altitude or 0,
+                    fix_time=last_log,
+                )
+            if heartbeat_time is None or _epoch(last_heartbeat) > heartbeat_time:
+                fields.update(heartbeat_time=last_heartbeat, status=status)
+            if fields:
+                self.update(imei, **fields)
+                updated += 1
+        if updated:
+            logger.info(f"Latest-state table reconciled {updated} devices")
+        return updated
+
+
+def get_device_metadata() -> Dict[int, dict]:
+    """
+    Static device attributes (name, route, owner...) keyed by IMEI.
+
+    These change rarely, so the list is cached for
+    ``GPS_LATEST_STATE['metadata_ttl']`` seconds and combined with the
+    shared-memory table to answer fleet queries.
+    """
+    metadata = cache.get(METADATA_CACHE_KEY)
+    if metadata is None:
+        from skyguard.apps.gps.models import GPSDevice
+
+        metadata = {
+            row['imei']: row
+            for row in GPSDevice.objects.order_by('imei').values(*METADATA_FIELDS)
+        }
+        cache.set(METADATA_CACHE_KEY, metadata, latest_state_table.config['metadata_ttl'])
+    return metadata
+
+
+def invalidate_device_metadata() -> None:
+    """Drop the cached device metadata list."""
+    cache.delete(METADATA_CACHE_KEY)
+
+
+latest_state_table = LatestStateTable()
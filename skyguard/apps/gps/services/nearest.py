@@ -0,0 +1,337 @@
+"""
+Nearest-vehicle and radius searches.
+
+Two interchangeable backends:
+
+* ``NearestDeviceIndex`` keeps a KD-tree over the positions in the
+  shared-memory latest-state table (rebuilt at most every ``max_age``
+  seconds), so dispatch queries never touch the database.
+* ``database_nearest`` / ``database_within`` run the same searches in
+  PostGIS, ordering by the ``<->`` KNN operator so the GiST index on
+  ``GPSDevice.position`` is used.
+
+Points are stored on the unit sphere (x, y, z), where straight-line
+(chord) distance grows with great-circle distance, so the tree gives exact
+geographic neighbours at any latitude.
+"""
+import heapq
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+EARTH_RADIUS = 6371008.8  # metres
+
+DEFAULT_NEAREST_CONFIG = {
+    'max_age': 2.0,    # seconds a KD-tree built from the latest-state table is reused
+    'leaf_size': 32,   # points per KD-tree leaf
+}
+
+
+def to_unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """(lat, lon) in degrees to (N, 3) points on the unit sphere."""
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def chord_to_metres(chord):
+    """Great-circle distance in metres for a unit-sphere chord length."""
+    return 2 * EARTH_RADIUS * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+def metres_to_chord(metres: float) -> float:
+    """Unit-sphere chord length for a great-circle distance in metres."""
+    return 2 * math.sin(min(metres / EARTH_RADIUS, math.pi) / 2)
+
+
+class KDTree:
+    """
+    Static KD-tree over points in R^d.
+
+    Nodes are stored in flat lists; leaves hold up to ``leaf_size`` points
+    that are compared with one vectorized distance computation.
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = 32):
+        self.points = np.ascontiguousarray(points, dtype=float)
+        self.leaf_size = max(int(leaf_size), 1)
+        self.order = np.arange(len(self.points))
+        # Per node: start/end in ``order``, children (-1 for leaves), bounding box
+        self._start: List[int] = []
+        self._end: List[int] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        self._mins: List[np.ndarray] = []
+        self._maxs: List[np.ndarray] = []
+        if len(self.points):
+            self._build(0, len(self.points))
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, start: int, end: int) -> int:
+        node = len(self._start)
+        idx = self.order[start:end]
+        box = self.points[idx]
+        mins, maxs = box.min(axis=0), box.max(axis=0)
+        self._start.append(start)
+        self._end.append(end)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._mins.append(mins)
+        self._maxs.append(maxs)
+        if end - start > self.leaf_size:
+            axis = int(np.argmax(maxs - mins))
+            middle = (end - start) // 2
+            part = np.argpartition(box[:, axis], middle)
+            self.order[start:end] = idx[part]
+            self._left[node] = self._build(start, start + middle)
+            self._right[node] = self._build(start + middle, end)
+        return node
+
+    def _box_distance(self, node: int, point: np.ndarray) -> float:
+        gap = np.maximum(self._mins[node] - point, 0) + np.maximum(point - self._maxs[node], 0)
+        return float(math.sqrt(gap @ gap))
+
+    def _leaf(self, node: int, point: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        idx = self.order[self._start[node]:self._end[node]]
+        diff = self.points[idx] - point
+        return idx, np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+    def query(self, point, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The ``k`` nearest points.
+
+        Returns:
+            Tuple of (distances, indices) sorted by distance
+        """
+        if not len(self) or k <= 0:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        point = np.asarray(point, dtype=float)
+        k = min(k, len(self))
+        best = []  # max-heap of (-distance, index)
+        stack = [(0.0, 0)]
+        while stack:
+            bound, node = stack.pop()
+            if len(best) == k and bound > -best[0][0]:
+                continue
+            if self._left[node] < 0:
+                idx, dist = self._leaf(node, point)
+                for d, i in zip(dist.tolist(), idx.tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, i))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, i))
+                continue
+            children = [(self._box_distance(child, point), child)
+                        for child in (self._left[node], self._right[node])]
+            # Push the farther child first so the nearer one is explored first
+            children.sort(reverse=True)
+            stack.extend(children)
+        best.sort(reverse=True)
+        return (np.array([-d for d, _ in best]), np.array([i for _, i in best], dtype=np.int64))
+
+    def query_radius(self, point, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        All points within ``radius``.
+
+        Returns:
+            Tuple of (distances, indices) sorted by distance
+        """
+        if not len(self):
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        point = np.asarray(point, dtype=float)
+        found_idx, found_dist = [], []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self._box_distance(node, point) > radius:
+                continue
+            if self._left[node] < 0:
+                idx, dist = self._leaf(node, point)
+                keep = dist <= radius
+                found_idx.append(idx[keep])
+                found_dist.append(dist[keep])
+            else:
+                stack.extend((self._left[node], self._right[node]))
+        if not found_idx:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        idx, dist = np.concatenate(found_idx), np.concatenate(found_dist)
+        order = np.argsort(dist, kind='stable')
+        return dist[order], idx[order]
+
+
+class NearestDeviceIndex:
+    """KD-tree over the latest positions of all devices with a fix."""
+
+    def __init__(self, table=None, config: Optional[dict] = None):
+        self._table = table
+        self.config = dict(DEFAULT_NEAREST_CONFIG)
+        self.config.update(getattr(settings, 'GPS_NEAREST', {}) or {})
+        if config:
+            self.config.update(config)
+        self._tree: Optional[KDTree] = None
+        self._rows: Optional[np.ndarray] = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def table(self):
+        if self._table is None:
+            from skyguard.apps.gps.services.latest_state import latest_state_table
+            self._table = latest_state_table
+        return self._table
+
+    def build(self, rows: np.ndarray) -> None:
+        """
+        Index a latest-state snapshot.
+
+        Args:
+            rows: ``SLOT_DTYPE`` records (see ``latest_state``); rows
+                without a fix are skipped
+        """
+        from skyguard.apps.gps.services.latest_state import FLAG_HAS_FIX
+
+        rows = rows[(rows['flags'] & FLAG_HAS_FIX).astype(bool)]
+        self._rows = rows
+        self._tree = KDTree(to_unit_vectors(rows['latitude'], rows['longitude']),
+                            self.config['leaf_size'])
+        self._built_at = time.monotonic()
+
+    def _current(self):
+        if self._tree is None or time.monotonic() - self._built_at >= self.config['max_age']:
+            with self._lock:
+                if self._tree is None or time.monotonic() - self._built_at >= self.config['max_age']:
+                    self.build(self.table.snapshot())
+        return self._tree, self._rows
+
+    def _results(self, rows, chords, idx) -> List[Dict]:
+        from skyguard.apps.gps.services.latest_state import STATUS_NAMES, STATUS_SHIFT
+
+        metres = chord_to_metres(chords)
+        return [
+            {
+                'imei': int(rows['imei'][i]),
+                'latitude': float(rows['latitude'][i]),
+                'longitude': float(rows['longitude'][i]),
+                'speed': float(rows['speed'][i]),
+                'course': float(rows['course'][i]),
+                'status': STATUS_NAMES.get(int(rows['flags'][i]) >> STATUS_SHIFT & 0xFF, 'OFFLINE'),
+                'distance': float(distance),
+            }
+            for i, distance in zip(idx.tolist(), metres.tolist())
+        ]
+
+    def nearest(self, latitude: float, longitude: float, k: int = 10,
+                predicate: Optional[Callable[[Dict], bool]] = None,
+                max_distance: Optional[float] = None) -> List[Dict]:
+        """
+        The ``k`` devices closest to a point.
+
+        Args:
+            predicate: Filter applied to each result (owner, route, status...);
+                the search widens until ``k`` results pass it
+            max_distance: Ignore devices farther than this many metres
+
+        Returns:
+            Result dicts (imei, position, speed, course, status, distance in
+            metres) sorted by distance
+        """
+        tree, rows = self._current()
+        point = to_unit_vectors([latitude], [longitude])[0]
+        want = k
+        while True:
+            chords, idx = tree.query(point, want)
+            results = self._results(rows, chords, idx)
+            if max_distance is not None:
+                results = [r for r in results if r['distance'] <= max_distance]
+            exhausted = want >= len(tree) or len(results) < len(idx)
+            if predicate is not None:
+                results = [r for r in results if predicate(r)]
+            if len(results) >= k or exhausted:
+                return results[:k]
+            want *= 4
+
+    def within(self, latitude: float, longitude: float, radius: float,
+               predicate: Optional[Callable[[Dict], bool]] = None,
+               limit: Optional[int] = None) -> List[Dict]:
+        """Devices within ``radius`` metres of a point, nearest first."""
+        tree, rows = self._current()
+        point = to_unit_vectors([latitude], [longitude])[0]
+        chords, idx = tree.query_radius(point, metres_to_chord(radius))
+        results = self._results(rows, chords, idx)
+        if predicate is not None:
+            results = [r for r in results if predicate(r)]
+        return results[:limit] if limit else results
+
+
+def _database_queryset(queryset, latitude: float, longitude: float):
+    from django.contrib.gis.db.models.functions import Distance
+    from django.contrib.gis.geos import Point
+
+    point = Point(longitude, latitude, srid=4326)
+    return queryset.filter(position__isnull=False).annotate(distance=Distance('position', point)), point
+
+
+def _database_rows(queryset) -> List[Dict]:
+    return [
+        {
+            'imei': imei,
+            'latitude': position.y,
+            'longitude': position.x,
+            'speed': speed,
+            'course': course,
+            'status': status,
+            'distance': distance.m,
+        }
+        for imei, position, speed, course, status, distance in queryset.values_list(
+            'imei', 'position', 'speed', 'course', 'connection_status', 'distance'
+        )
+    ]
+
+
+def database_nearest(queryset, latitude: float, longitude: float, k: int = 10) -> List[Dict]:
+    """
+    The ``k`` devices of ``queryset`` closest to a point, using PostGIS KNN.
+
+    Rows are ordered by ``position <-> point`` (served by the GiST index) and
+    then by the exact spheroidal distance among the KNN candidates.
+    """
+    from django.db.models.expressions import RawSQL
+
+    queryset, _ = _database_queryset(queryset, latitude, longitude)
+    knn = RawSQL(
+        '"gps_gpsdevice"."position" <-> ST_SetSRID(ST_MakePoint(%s, %s), 4326)',
+        (longitude, latitude)
+    )
+    # KNN on lon/lat degrees is approximate: take extra candidates, re-rank exactly
+    candidates = list(queryset.order_by(knn).values_list('imei', flat=True)[:max(k * 4, k + 16)])
+    return sorted(_database_rows(queryset.filter(imei__in=candidates)), key=lambda r: r['distance'])[:k]
+
+
+def database_within(queryset, latitude: float, longitude: float, radius: float,
+                    limit: Optional[int] = None) -> List[Dict]:
+    """Devices of ``queryset`` within ``radius`` metres, nearest first."""
+    from django.contrib.gis.geos import Polygon
+    from django.contrib.gis.measure import D
+
+    queryset, point = _database_queryset(queryset, latitude, longitude)
+    # Bounding box first (GiST index), exact distance second
+    dlat = math.degrees(radius / EARTH_RADIUS)
+    dlon = dlat / max(math.cos(math.radians(latitude)), 1e-6)
+    bbox = Polygon.from_bbox((longitude - dlon, latitude - dlat, longitude + dlon, latitude + dlat))
+    bbox.srid = 4326
+    queryset = queryset.filter(
+        position__intersects=bbox, position__distance_lte=(point, D(m=radius))
+    ).order_by('distance')
+    if limit:
+        queryset = queryset[:limit]
+    return _database_rows(queryset)
+
+
+nearest_device_index = NearestDeviceIndex()
@@ -0,0 +1,397 @@
+"""
+Fleet playback: where every device was at any timestamp.
+
+The timeline is cut into fixed intervals stored as ``FleetKeyframe`` rows. A
+row holds the last known fix of every device at the start of its interval (the
+keyframe) and the fixes reported during the interval (the deltas), both as
+zlib-compressed ``FIX_DTYPE`` arrays sorted by device. The keyframe of an
+interval is the previous keyframe updated with the last delta of each device,
+so building a row only reads that interval's fixes.
+
+Intervals are built by a Celery beat task once they are ``lag`` seconds old.
+New ``GPSEvent`` ids are tracked with a watermark (with the skipped-id
+bookkeeping of the telemetry rollups, so rows committed late are not lost);
+fixes that arrive late for an interval already built rewind the timeline so
+that interval and every later keyframe are rebuilt. The first run starts the
+id watermark at the newest event and builds ``backfill`` seconds of history
+from the timestamps alone.
+"""
+import logging
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, ExpressionWrapper, Max, Q
+from django.utils import timezone
+
+from skyguard.apps.gps.models import FleetKeyframe, GPSEvent, RollupWatermark
+from skyguard.apps.gps.services.rollups import find_gaps, gap_filter, remaining_gaps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PLAYBACK_CONFIG = {
+    'interval': 600,          # seconds covered by each keyframe row
+    'lag': 120,               # s; an interval is built once it ended this long ago
+    'max_gap': 300,           # s; fixes further apart are not interpolated
+    'max_age': 86400,         # s; devices silent longer drop out of the keyframes
+    'backfill': 86400,        # s of history built on the first run
+    'retention_days': 30,
+    'max_intervals': 36,      # intervals built per task run
+    'batch_size': 50000,      # new event ids read per query
+    'gap_lag': 600,           # s; skipped ids are looked up again for this long
+    'max_gaps': 1000,         # skipped id ranges kept before merging
+    'event_types': ['LOCATION', 'TRACK'],
+}
+
+FIX_DTYPE = np.dtype([
+    ('imei', '<i8'),
+    ('time', '<i4'),          # seconds from the start of the interval
+    ('latitude', '<i4'),      # microdegrees
+    ('longitude', '<i4'),     # microdegrees
+    ('speed', '<u2'),         # 0.1 km/h
+    ('course', '<u2'),        # 0.1 degree
+])
+
+# RollupWatermark names: the last GPSEvent id seen (last_id/gaps), and the
+# start of the next interval to build (resume_at)
+SOURCE_WATERMARK = 'playback_events'
+TIMELINE_WATERMARK = 'playback_timeline'
+
+FIXES_SQL = """
+    SELECT e.device_id, EXTRACT(EPOCH FROM e."timestamp"), ST_Y(e.position), ST_X(e.position),
+           e.speed, e.course
+    FROM {table} e
+    WHERE e."timestamp" >= %(start)s AND e."timestamp" < %(end)s
+      AND e.type = ANY(%(types)s) AND e.position IS NOT NULL
+    ORDER BY e.device_id, e."timestamp"
+"""
+
+LAST_FIXES_SQL = """
+    SELECT DISTINCT ON (e.device_id)
+           e.device_id, EXTRACT(EPOCH FROM e."timestamp"), ST_Y(e.position), ST_X(e.position),
+           e.speed, e.course
+    FROM {table} e
+    WHERE e."timestamp" >= %(since)s AND e."timestamp" < %(start)s
+      AND e.type = ANY(%(types)s) AND e.position IS NOT NULL
+    ORDER BY e.device_id, e."timestamp" DESC
+"""
+
+
+def pack_fixes(fixes: np.ndarray) -> bytes:
+    """Serialize a ``FIX_DTYPE`` array for storage."""
+    return zlib.compress(np.ascontiguousarray(fixes, dtype=FIX_DTYPE).tobytes())
+
+
+def unpack_fixes(data) -> np.ndarray:
+    """Inverse of ``pack_fixes``; returns a writable array."""
+    if not data:
+        return np.empty(0, dtype=FIX_DTYPE)
+    return np.frombuffer(zlib.decompress(bytes(data)), dtype=FIX_DTYPE).copy()
+
+
+def to_fixes(rows: Iterable[tuple], origin: float) -> np.ndarray:
+    """
+    Build a ``FIX_DTYPE`` array from database rows.
+
+    Args:
+        rows: ``(imei, epoch, latitude, longitude, speed, course)`` tuples
+        origin: Epoch seconds the ``time`` column is relative to
+    """
+    rows = list(rows)
+    fixes = np.zeros(len(rows), dtype=FIX_DTYPE)
+    if not rows:
+        return fixes
+    imeis, epochs, latitudes, longitudes, speeds, courses = zip(*rows)
+    fixes['imei'] = imeis
+    fixes['time'] = np.floor(np.asarray(epochs, dtype=np.float64) - origin)
+    fixes['latitude'] = np.round(np.asarray(latitudes, dtype=np.float64) * 1e6)
+    fixes['longitude'] = np.round(np.asarray(longitudes, dtype=np.float64) * 1e6)
+    speeds = np.nan_to_num(np.asarray(speeds, dtype=np.float64))
+    fixes['speed'] = np.clip(np.round(speeds * 10), 0, 65535)
+    courses = np.nan_to_num(np.asarray(courses, dtype=np.float64)) % 360
+    fixes['course'] = np.round(courses * 10) % 3600
+    return fixes
+
+
+def _by_device(fixes: np.ndarray) -> np.ndarray:
+    return fixes[np.lexsort((fixes['time'], fixes['imei']))]
+
+
+def _last_per_device(fixes: np.ndarray) -> np.ndarray:
+    """Last fix of each device from an array sorted by (imei, time)."""
+    if not len(fixes):
+        return fixes
+    last = np.append(fixes['imei'][1:] != fixes['imei'][:-1], True)
+    return fixes[last]
+
+
+def _first_per_device(fixes: np.ndarray) -> np.ndarray:
+    """First fix of each device from an array sorted by (imei, time)."""
+    if not len(fixes):
+        return fixes
+    first = np.insert(fixes['imei'][1:] != fixes['imei'][:-1], 0, True)
+    return fixes[first]
+
+
+def next_keyframe(keyframe: np.ndarray, deltas: np.ndarray, duration: int,
+                  max_age: int) -> np.ndarray:
+    """
+    Keyframe at the end of an interval.
+
+    Args:
+        keyframe: Keyframe at the start of the interval
+        deltas: Fixes reported during the interval
+        duration: Interval length in seconds
+        max_age: Devices whose last fix is older than this are dropped
+
+    Returns:
+        Last fix of each device, with times relative to the end of the interval
+    """
+    latest = _last_per_device(_by_device(np.concatenate([keyframe, deltas])))
+    latest['time'] -= duration
+    return latest[latest['time'] >= -max_age]
+
+
+def fleet_state(start: datetime, keyframe: np.ndarray, fixes: np.ndarray, at: datetime,
+                max_gap: float) -> List[Dict[str, Any]]:
+    """
+    Position of every device at ``at``.
+
+    Each device is placed at its last fix at or before ``at``, linearly
+    interpolated towards its next fix when both are at most ``max_gap``
+    seconds apart.
+
+    Args:
+        start: Start of the interval containing ``at``
+        keyframe: Keyframe of that interval
+        fixes: Fixes from ``start`` on (the interval's deltas, optionally
+            followed by the next interval's), times relative to ``start``
+
+    Returns:
+        Dicts with imei, latitude, longitude, speed, course, fix_time and
+        interpolated, sorted by imei
+    """
+    offset = (at - start).total_seconds()
+    combined = _by_device(np.concatenate([keyframe, fixes]))
+    before = combined['time'] <= offset
+    previous = _last_per_device(combined[before])
+    following = _first_per_device(combined[~before])
+
+    latitude = previous['latitude'] / 1e6
+    longitude = previous['longitude'] / 1e6
+    speed = previous['speed'] / 10.0
+    course = previous['course'] / 10.0
+    interpolated = np.zeros(len(previous), dtype=bool)
+
+    if len(following) and len(previous):
+        position = np.minimum(np.searchsorted(following['imei'], previous['imei']), len(following) - 1)
+        after = following[position]
+        span = after['time'].astype(np.float64) - previous['time']
+        interpolated = (after['imei'] == previous['imei']) & (span <= max_gap)
+        fraction = np.where(interpolated, (offset - previous['time']) / np.where(span > 0, span, 1), 0.0)
+        latitude = latitude + fraction * (after['latitude'] / 1e6 - latitude)
+        longitude = longitude + fraction * (after['longitude'] / 1e6 - longitude)
+        speed = speed + fraction * (after['speed'] / 10.0 - speed)
+        turn = (after['course'] / 10.0 - course + 180) % 360 - 180
+        course = (course + fraction * turn) % 360
+
+    origin = start.timestamp()
+    return [
+        {
+            'imei': imei,
+            'latitude': round(lat, 6),
+            'longitude': round(lon, 6),
+            'speed': round(spd, 1),
+            'course': round(crs, 1),
+            'fix_time': datetime.fromtimestamp(origin + time, tz=dt_timezone.utc).isoformat(),
+            'interpolated': interp,
+        }
+        for imei, lat, lon, spd, crs, time, interp in zip(
+            previous['imei'].tolist(), latitude.tolist(), longitude.tolist(), speed.tolist(),
+            course.tolist(), previous['time'].tolist(), interpolated.tolist()
+        )
+    ]
+
+
+class FleetPlaybackService:
+    """Maintains ``FleetKeyframe`` rows and answers fleet-at-time queries."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = dict(DEFAULT_PLAYBACK_CONFIG)
+        self.config.update(getattr(settings, 'GPS_PLAYBACK', {}) or {})
+        if config:
+            self.config.update(config)
+
+    def interval_start(self, timestamp: datetime) -> datetime:
+        """Start of the interval containing ``timestamp``."""
+        interval = self.config['interval']
+        epoch = int(timestamp.timestamp()) // interval * interval
+        return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+
+    # ------------------------------------------------------------------
+    # Incremental maintenance
+    # ------------------------------------------------------------------
+
+    def update(self) -> Dict[str, Any]:
+        """
+        Build the intervals that are due and rebuild those touched by late fixes.
+
+        Returns:
+            Summary with the number of intervals built and rows pruned
+        """
+        interval = self.config['interval']
+        now = timezone.now()
+        oldest = self.interval_start(now - timedelta(days=self.config['retention_days']))
+
+        source, _ = RollupWatermark.objects.get_or_create(name=SOURCE_WATERMARK)
+        timeline, _ = RollupWatermark.objects.get_or_create(name=TIMELINE_WATERMARK)
+        if timeline.resume_at is None:
+            # First run: history comes from the backfill, only newer ids are late fixes
+            timeline.resume_at = self.interval_start(now - timedelta(seconds=self.config['backfill']))
+            source.last_id = GPSEvent.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+            source.gaps = []
+
+        earliest = self._advance_source(source, now.timestamp())
+        if earliest is not None:
+            timeline.resume_at = min(timeline.resume_at, self.interval_start(earliest))
+        timeline.resume_at = max(timeline.resume_at, oldest)
+
+        built = 0
+        ready = now - timedelta(seconds=self.config['lag'] + interval)
+        while built < self.config['max_intervals'] and timeline.resume_at <= ready:
+            self.build_interval(timeline.resume_at)
+            timeline.resume_at += timedelta(seconds=interval)
+            built += 1
+
+        with transaction.atomic():
+            source.save(update_fields=['last_id', 'gaps', 'updated_at'])
+            timeline.save(update_fields=['resume_at', 'updated_at'])
+
+        pruned, _ = FleetKeyframe.objects.filter(timestamp__lt=oldest).delete()
+        return {'intervals': built, 'pruned': pruned}
+
+    def _advance_source(self, source: RollupWatermark, now: float) -> Optional[datetime]:
+        """
+        Move the id watermark past the new events and recheck its skipped ids.
+
+        Returns:
+            Earliest timestamp of the playback fixes found, None if there are none
+        """
+        fix = ExpressionWrapper(
+            Q(type__in=self.config['event_types'], position__isnull=False), output_field=BooleanField()
+        )
+        events = GPSEvent.objects.annotate(fix=fix)
+        found = list(events.filter(gap_filter(source.gaps)).values_list('id', 'timestamp', 'fix')) \
+            if source.gaps else []
+        source.gaps = remaining_gaps(source.gaps, [row[0] for row in found], now,
+                                     self.config['gap_lag'], self.config['max_gaps'])
+        while True:
+            rows = list(
+                events.filter(id__gt=source.last_id).order_by('id')
+                .values_list('id', 'timestamp', 'fix')[:self.config['batch_size']]
+            )
+            if not rows:
+                break
+            source.gaps += find_gaps(source.last_id, [row[0] for row in rows], now)
+            source.last_id = rows[-1][0]
+            found += rows
+            if len(rows) < self.config['batch_size']:
+                break
+        if len(source.gaps) > self.config['max_gaps']:
+            source.gaps = remaining_gaps(source.gaps, [], now, self.config['gap_lag'], self.config['max_gaps'])
+        timestamps = [timestamp for _, timestamp, is_fix in found if is_fix]
+        return min(timestamps) if timestamps else None
+
+    def build_interval(self, start: datetime) -> FleetKeyframe:
+        """(Re)build the row of the interval starting at ``start``."""
+        interval = self.config['interval']
+        previous = FleetKeyframe.objects.filter(
+            timestamp=start - timedelta(seconds=interval), duration=interval
+        ).values_list('keyframe', 'deltas').first()
+        if previous is not None:
+            keyframe = next_keyframe(unpack_fixes(previous[0]), unpack_fixes(previous[1]),
+                                     interval, self.config['max_age'])
+        else:
+            keyframe = self._last_fixes(start)
+
+        deltas = self._fixes(start, start + timedelta(seconds=interval))
+        row, _ = FleetKeyframe.objects.update_or_create(
+            timestamp=start,
+            defaults={
+                'duration': interval,
+                'device_count': len(keyframe),
+                'fix_count': len(deltas),
+                'keyframe': pack_fixes(keyframe),
+                'deltas': pack_fixes(deltas),
+            },
+        )
+        return row
+
+    def _fixes(self, start: datetime, end: datetime) -> np.ndarray:
+        with connection.cursor() as cursor:
+            cursor.execute(FIXES_SQL.format(table=GPSEvent._meta.db_table),
+                           {'start': start, 'end': end, 'types': list(self.config['event_types'])})
+            return to_fixes(cursor.fetchall(), start.timestamp())
+
+    def _last_fixes(self, start: datetime) -> np.ndarray:
+        """Keyframe computed from the raw events, when there is no previous row."""
+        since = start - timedelta(seconds=self.config['max_age'])
+        with connection.cursor() as cursor:
+            cursor.execute(LAST_FIXES_SQL.format(table=GPSEvent._meta.db_table),
+                           {'since': since, 'start': start, 'types': list(self.config['event_types'])})
+            return to_fixes(cursor.fetchall(), start.timestamp())
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def state_at(self, at: datetime, imeis: Optional[Iterable[int]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Fleet state at ``at`` from at most two keyframe rows (one query).
+
+        Args:
+            at: Timestamp to play back
+            imeis: Restrict the result to these devices
+
+        Returns:
+            ``{'timestamp', 'keyframe', 'devices'}`` or None when the
+            timeline has not been built for ``at``
+        """
+        rows = list(
+            FleetKeyframe.objects
+            .filter(timestamp__lte=at + timedelta(seconds=self.config['interval']))
+            .order_by('-timestamp')
+            .values('timestamp', 'duration', 'keyframe', 'deltas')[:2]
+        )
+        current = next((row for row in rows
+                        if row['timestamp'] <= at < row['timestamp'] + timedelta(seconds=row['duration'])),
+                       None)
+        if current is None:
+            return None
+
+        keyframe = unpack_fixes(current['keyframe'])
+        fixes = [unpack_fixes(current['deltas'])]
+        end = current['timestamp'] + timedelta(seconds=current['duration'])
+        for row in rows:
+            if row['timestamp'] == end:
+                following = unpack_fixes(row['deltas'])
+                following['time'] += current['duration']
+                fixes.append(following)
+        fixes = np.concatenate(fixes)
+
+        if imeis is not None:
+            imeis = np.fromiter(imeis, dtype=np.int64)
+            keyframe = keyframe[np.isin(keyframe['imei'], imeis)]
+            fixes = fixes[np.isin(fixes['imei'], imeis)]
+
+        return {
+            'timestamp': at,
+            'keyframe': current['timestamp'],
+            'devices': fleet_state(current['timestamp'], keyframe, fixes, at, self.config['max_gap']),
+        }
+
+
+fleet_playback_service = FleetPlaybackService()
@@ -0,0 +1,193 @@
+"""
+Bounded per-device buffer of recent fixes.
+
+The ingest pipeline appends every fix here so trail and realtime queries for
+the recent window can be answered without touching the event tables. Fixes
+live in a Redis sorted set per device (score = epoch seconds, member = packed
+binary record); when Redis is not available an in-process store is used.
+
+Each device also has a "complete from" marker: the buffer is guaranteed to
+hold every ingested fix from that instant on. Callers read older parts of a
+window from SQL. The marker moves up to the fix being written whenever the
+device's sorted set is new (first fix, expiry or eviction) or a previous fix
+of the device could not be written to Redis, so fixes lost in an outage are
+read from SQL instead of silently missing.
+"""
+import bisect
+import struct
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+from skyguard.apps.gps.services.redis_client import get_redis_client
+
+RecentFix = namedtuple('RecentFix', ['timestamp', 'latitude', 'longitude', 'speed', 'course'])
+
+RECORD = struct.Struct('<dddff')  # epoch, lat, lon, speed, course
+
+DEFAULT_RECENT_FIXES_CONFIG = {
+    'max_points': 8640,    # 24 h at 10 s reporting
+    'max_age_hours': 24,
+}
+
+
+def _epoch(value: datetime) -> float:
+    return value.timestamp()
+
+
+def _from_epoch(value: float) -> datetime:
+    return datetime.fromtimestamp(value, dt_timezone.utc)
+
+
+def _unpack(member: bytes) -> RecentFix:
+    ts, lat, lon, speed, course = RECORD.unpack(member)
+    return RecentFix(_from_epoch(ts), lat, lon, speed, course)
+
+
+class RedisRecentFixStore:
+    """Recent fixes kept in one Redis sorted set per device."""
+
+    KEY = 'gps:recent:{imei}'
+    MARKER_KEY = 'gps:recent:{imei}:since'
+
+    def __init__(self, max_points: int, max_age: float):
+        self.max_points = max_points
+        self.max_age = max_age
+        self.ttl = int(max_age) + 3600
+        # Devices with fixes that never reached Redis from this process
+        self.missed: Set[int] = set()
+
+    def add(self, client, imei: int, record: Tuple[float, float, float, float, float]) -> None:
+        key = self.KEY.format(imei=imei)
+        marker_key = self.MARKER_KEY.format(imei=imei)
+        pipe = client.pipeline(transaction=False)
+        pipe.exists(key)
+        pipe.zadd(key, {RECORD.pack(*record): record[0]})
+        pipe.zremrangebyscore(key, '-inf', time.time() - self.max_age)
+        pipe.zremrangebyrank(key, 0, -(self.max_points + 1))
+        pipe.set(marker_key, record[0], nx=True)
+        pipe.expire(key, self.ttl)
+        pipe.expire(marker_key, self.ttl)
+        try:
+            existed = pipe.execute()[0]
+        except Exception:
+            self.missed.add(imei)
+            raise
+        if not existed or imei in self.missed:
+            # The buffer (re)starts with this fix: anything older is only in SQL
+            client.set(marker_key, record[0], ex=self.ttl)
+            self.missed.discard(imei)
+
+    def window(self, client, imei: int, start: float,
+               end: Optional[float]) -> Tuple[List[RecentFix], Optional[float]]:
+        key = self.KEY.format(imei=imei)
+        pipe = client.pipeline(transaction=False)
+        pipe.zrangebyscore(key, start, '+inf' if end is None else end)
+        pipe.get(self.MARKER_KEY.format(imei=imei))
+        pipe.zcard(key)
+        pipe.zrange(key, 0, 0, withscores=True)
+        members, marker, size, oldest = pipe.execute()
+        if marker is None:
+            return [], None
+        complete_from = max(float(marker), time.time() - self.max_age)
+        if size >= self.max_points and oldest:
+            complete_from = max(complete_from, oldest[0][1])
+        return [_unpack(member) for member in members], complete_from
+
+    def clear(self, client, imei: int) -> None:
+        client.delete(self.KEY.format(imei=imei), self.MARKER_KEY.format(imei=imei))
+
+
+class LocalRecentFixStore:
+    """In-process equivalent of ``RedisRecentFixStore``."""
+
+    def __init__(self, max_points: int, max_age: float):
+        self.max_points = max_points
+        self.max_age = max_age
+        self._points: Dict[int, List[Tuple[float, float, float, float, float]]] = {}
+        self._markers: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, client, imei: int, record: Tuple[float, float, float, float, float]) -> None:
+        with self._lock:
+            points = self._points.setdefault(imei, [])
+            bisect.insort(points, record)
+            cutoff = bisect.bisect_left(points, (time.time() - self.max_age,))
+            excess = len(points) - cutoff - self.max_points
+            del points[:cutoff + max(0, excess)]
+            self._markers.setdefault(imei, record[0])
+
+    def window(self, client, imei: int, start: float,
+               end: Optional[float]) -> Tuple[List[RecentFix], Optional[float]]:
+        with self._lock:
+            points = list(self._points.get(imei, ()))
+            marker = self._markers.get(imei)
+        if marker is None:
+            return [], None
+        complete_from = max(marker, time.time() - self.max_age)
+        if len(points) >= self.max_points:
+            complete_from = max(complete_from, points[0][0])
+        lo = bisect.bisect_left(points, (start,))
+        hi = len(points) if end is None else bisect.bisect_right(points, (end, float('inf')))
+        return [RecentFix(_from_epoch(p[0]), *p[1:]) for p in points[lo:hi]], complete_from
+
+    def clear(self, client, imei: int) -> None:
+        with self._lock:
+            self._points.pop(imei, None)
+            self._markers.pop(imei, None)
+
+
+class RecentFixBuffer:
+    """Facade that stores recent fixes in Redis, or in-process as a fallback."""
+
+    def __init__(self, config: Optional[Dict[str, float]] = None):
+        self.config = dict(DEFAULT_RECENT_FIXES_CONFIG)
+        self.config.update(getattr(settings, 'GPS_RECENT_FIXES', {}) or {})
+        if config:
+            self.config.update(config)
+        max_points = int(self.config['max_points'])
+        max_age = float(self.config['max_age_hours']) * 3600
+        self.redis_store = RedisRecentFixStore(max_points, max_age)
+        self.local_store = LocalRecentFixStore(max_points, max_age)
+
+    def _store(self):
+        client = get_redis_client()
+        return (self.redis_store, client) if client is not None else (self.local_store, None)
+
+    def add(self, imei: int, timestamp: datetime, latitude: float, longitude: float,
+            speed: float = 0.0, course: float = 0.0) -> None:
+        """Append a fix to the device buffer, trimming by count and age."""
+        store, client = self._store()
+        if client is None:
+            self.redis_store.missed.add(int(imei))
+        store.add(client, int(imei), (_epoch(timestamp), float(latitude), float(longitude),
+                                      float(speed or 0), float(course or 0)))
+
+    def get_window(self, imei: int, start: datetime,
+                   end: Optional[datetime] = None) -> Tuple[List[RecentFix], Optional[datetime]]:
+        """
+        Fixes of a device between ``start`` and ``end`` (inclusive), oldest first.
+
+        Returns:
+            Tuple of (fixes, complete_from). Every fix ingested at or after
+            ``complete_from`` is in the buffer; anything older must be read
+            from the database. ``complete_from`` is ``None`` when the buffer
+            holds nothing for the device.
+        """
+        store, client = self._store()
+        fixes, complete_from = store.window(
+            client, int(imei), _epoch(start), None if end is None else _epoch(end)
+        )
+        return fixes, None if complete_from is None else _from_epoch(complete_from)
+
+    def clear(self, imei: int) -> None:
+        """Drop the buffer of a device."""
+        store, client = self._store()
+        store.clear(client, int(imei))
+
+
+recent_fix_buffer = RecentFixBuffer()
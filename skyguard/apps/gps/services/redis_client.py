@@ -0,0 +1,61 @@
+"""
+Shared Redis connection for GPS hot-path state.
+
+Components that keep per-device state in Redis (recent fixes, geofence state,
+etc.) get their client here. When Redis is not configured or not reachable
+``get_redis_client`` returns ``None`` and callers fall back to their
+in-process implementation, which is also what the test suite uses.
+"""
+import logging
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY_INTERVAL = 30  # seconds before retrying an unreachable server
+
+_client = None
+_last_failure = 0.0
+_lock = threading.Lock()
+
+
+def get_redis_client():
+    """
+    Return a shared ``redis.Redis`` client, or ``None`` if unavailable.
+
+    The URL is read from ``GPS_REDIS_URL``; setting it to ``None`` disables
+    Redis entirely.
+    """
+    global _client, _last_failure
+
+    if _client is not None:
+        return _client
+
+    url = getattr(settings, 'GPS_REDIS_URL', None)
+    if not url or time.monotonic() - _last_failure < RETRY_INTERVAL:
+        return None
+
+    with _lock:
+        if _client is not None:
+            return _client
+        try:
+            import redis
+            client = redis.Redis.from_url(url, socket_connect_timeout=2, socket_timeout=2)
+            client.ping()
+        except Exception as e:
+            _last_failure = time.monotonic()
+            logger.warning(f"Redis not available at {url}, using in-process fallback: {e}")
+            return None
+        _client = client
+        return _client
+
+
+def reset_redis_client(client: Optional[object] = None) -> None:
+    """Replace (or clear) the shared client. Mainly useful in tests."""
+    global _client, _last_failure
+    with _lock:
+        _client = client
+        _last_failure = 0.0
@@ -0,0 +1,412 @@
+"""
+Incremental telemetry rollups.
+
+New location, event and geofence-event rows are picked up from per-source id
+watermarks. Every (device, hour) bucket touched by those rows is recomputed
+from the raw tables in a single set-based query per source and upserted, so
+late or out-of-order data simply re-touches its bucket. Daily rollups are then
+rebuilt from the (at most 24) hourly rows of each touched day.
+
+Ids are allocated when a row is inserted but become visible when its
+transaction commits, so a row can appear below a watermark that has already
+passed it. Ids skipped when a watermark advances are kept as gaps and looked
+up again on every run until ``gap_lag`` seconds have passed.
+"""
+import bisect
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+
+from skyguard.apps.gps.models import (
+    GPSEvent, GPSLocation, GeoFenceEvent,
+    DeviceHourlyRollup, DeviceDailyRollup, RollupWatermark
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROLLUP_CONFIG = {
+    'batch_size': 50000,     # source rows read per batch
+    'max_batches': 20,       # batches per task run
+    'moving_speed': 3.0,     # km/h; slower samples do not count as moving time
+    'max_gap': 300,          # s; longer gaps between fixes are not moving time
+    'gap_lag': 600,          # s; how long skipped ids are looked up again
+    'max_gaps': 1000,        # skipped id ranges kept per source before merging them
+}
+
+ROLLUP_FIELDS = [
+    'distance', 'moving_seconds', 'max_speed', 'speed_sum', 'point_count',
+    'nonzero_speed_count', 'event_count', 'geofence_entries', 'geofence_exits',
+    'first_timestamp', 'last_timestamp', 'updated_at',
+]
+
+Bucket = Tuple[int, datetime]
+
+LOCATION_SQL = """
+    WITH touched(device_id, bucket) AS (
+        SELECT * FROM unnest(%(devices)s::bigint[], %(buckets)s::timestamptz[])
+    ),
+    pts AS (
+        SELECT l.device_id, l."timestamp", l.speed,
+               ST_DistanceSphere(l.position, LAG(l.position) OVER w) AS step,
+               EXTRACT(EPOCH FROM l."timestamp" - LAG(l."timestamp") OVER w) AS gap
+        FROM {table} l
+        WHERE EXISTS (
+            SELECT 1 FROM touched t
+            WHERE t.device_id = l.device_id
+              AND l."timestamp" >= t.bucket - interval '1 hour'
+              AND l."timestamp" < t.bucket + interval '1 hour'
+        )
+        WINDOW w AS (PARTITION BY l.device_id ORDER BY l."timestamp")
+    )
+    SELECT p.device_id, date_trunc('hour', p."timestamp") AS bucket,
+           COUNT(*),
+           COUNT(*) FILTER (WHERE p.speed > 0),
+           COALESCE(SUM(p.step), 0),
+           COALESCE(MAX(p.speed), 0),
+           COALESCE(SUM(p.speed), 0),
+           COALESCE(SUM(CASE WHEN p.speed >= %(moving_speed)s AND p.gap <= %(max_gap)s
+                             THEN p.gap ELSE 0 END), 0),
+           MIN(p."timestamp"),
+           MAX(p."timestamp")
+    FROM pts p
+    JOIN touched t ON t.device_id = p.device_id AND t.bucket = date_trunc('hour', p."timestamp")
+    GROUP BY 1, 2
+"""
+
+EVENT_SQL = """
+    WITH touched(device_id, bucket) AS (
+        SELECT * FROM unnest(%(devices)s::bigint[], %(buckets)s::timestamptz[])
+    )
+    SELECT e.device_id, t.bucket, COUNT(*)
+    FROM {table} e
+    JOIN touched t ON t.device_id = e.device_id
+     AND e."timestamp" >= t.bucket AND e."timestamp" < t.bucket + interval '1 hour'
+    GROUP BY 1, 2
+"""
+
+GEOFENCE_EVENT_SQL = """
+    WITH touched(device_id, bucket) AS (
+        SELECT * FROM unnest(%(devices)s::bigint[], %(buckets)s::timestamptz[])
+    )
+    SELECT e.device_id, t.bucket,
+           COUNT(*) FILTER (WHERE e.event_type = 'ENTRY'),
+           COUNT(*) FILTER (WHERE e.event_type = 'EXIT')
+    FROM {table} e
+    JOIN touched t ON t.device_id = e.device_id
+     AND e."timestamp" >= t.bucket AND e."timestamp" < t.bucket + interval '1 hour'
+    GROUP BY 1, 2
+"""
+
+
+def hour_bucket(timestamp: datetime) -> datetime:
+    """Truncate a timestamp to the start of its UTC hour."""
+    return timestamp.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def find_gaps(last_id: int, ids: Iterable[int], seen_at: float) -> List[list]:
+    """Id ranges ``[first, last, seen_at]`` missing between ``last_id`` and the sorted ``ids``."""
+    gaps = []
+    previous = last_id
+    for row_id in ids:
+        if row_id > previous + 1:
+            gaps.append([previous + 1, row_id - 1, seen_at])
+        previous = row_id
+    return gaps
+
+
+def remaining_gaps(gaps: List[list], found_ids: Iterable[int], now: float, lag: float,
+                   max_gaps: int) -> List[list]:
+    """
+    Gaps still to look up: ``found_ids`` are taken out and gaps older than ``lag`` dropped.
+
+    More than ``max_gaps`` ranges are merged into one spanning them all; that
+    only makes later lookups re-read rows already folded in.
+    """
+    found = sorted(found_ids)
+    remaining = []
+    for first, last, seen_at in gaps:
+        if now - seen_at >= lag:
+            continue
+        inside = found[bisect.bisect_left(found, first):bisect.bisect_right(found, last)]
+        remaining.extend(find_gaps(first - 1, inside + [last + 1], seen_at))
+    if len(remaining) > max_gaps:
+        remaining = [[remaining[0][0], remaining[-1][1], max(gap[2] for gap in remaining)]]
+    return remaining
+
+
+def gap_filter(gaps: List[list]) -> Q:
+    """Filter matching the ids of ``gaps``."""
+    query = Q()
+    for first, last, _ in gaps:
+        query |= Q(id__gte=first, id__lte=last)
+    return query
+
+
+class TelemetryRollupService:
+    """Maintains ``DeviceHourlyRollup``/``DeviceDailyRollup`` and reads from them."""
+
+    SOURCES = {
+        'location': GPSLocation,
+        'event': GPSEvent,
+        'geofence_event': GeoFenceEvent,
+    }
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = dict(DEFAULT_ROLLUP_CONFIG)
+        self.config.update(getattr(settings, 'GPS_ROLLUPS', {}) or {})
+        if config:
+            self.config.update(config)
+
+    # ------------------------------------------------------------------
+    # Incremental maintenance
+    # ------------------------------------------------------------------
+
+    def update(self) -> Dict[str, Any]:
+        """
+        Fold new source rows into the rollups.
+
+        Returns:
+            Summary with the number of hourly/daily buckets refreshed
+        """
+        hours = days = 0
+        for _ in range(self.config['max_batches']):
+            touched, watermarks = self._collect_touched_buckets()
+            if not watermarks:
+                break
+            with transaction.atomic():
+                hours += self.refresh_hourly(touched)
+                days += self.refresh_daily({(d, b.date()) for d, b in touched})
+                for watermark in watermarks:
+                    watermark.save(update_fields=['last_id', 'gaps', 'updated_at'])
+        return {'hourly_buckets': hours, 'daily_buckets': days}
+
+    def _collect_touched_buckets(self) -> Tuple[Set[Bucket], List[RollupWatermark]]:
+        """Read the next batch of each source past its watermark, and rows that filled its gaps."""
+        touched: Set[Bucket] = set()
+        changed = []
+        now = time.time()
+        for name, model in self.SOURCES.items():
+            watermark, _ = RollupWatermark.objects.get_or_create(name=name)
+            rows = list(
+                model.objects.filter(id__gt=watermark.last_id)
+                .order_by('id')
+                .values_list('id', 'device_id', 'timestamp')[:self.config['batch_size']]
+            )
+            late = list(
+                model.objects.filter(gap_filter(watermark.gaps)).values_list('id', 'device_id', 'timestamp')
+            ) if watermark.gaps else []
+
+            gaps = remaining_gaps(watermark.gaps, [row[0] for row in late], now,
+                                  self.config['gap_lag'], self.config['max_gaps'])
+            if rows:
+                gaps += find_gaps(watermark.last_id, [row[0] for row in rows], now)
+                watermark.last_id = rows[-1][0]
+            if not rows and gaps == watermark.gaps:
+                continue
+            touched.update((device_id, hour_bucket(ts)) for _, device_id, ts in rows + late)
+            watermark.gaps = gaps
+            changed.append(watermark)
+        return touched, changed
+
+    def refresh_hourly(self, buckets: Iterable[Bucket]) -> int:
+        """Recompute and upsert the given (device, hour) buckets."""
+        buckets = sorted(set(buckets))
+        if not buckets:
+            return 0
+
+        params = {
+            'devices': [device_id for device_id, _ in buckets],
+            'buckets': [bucket for _, bucket in buckets],
+            'moving_speed': self.config['moving_speed'],
+            'max_gap': self.config['max_gap'],
+        }
+        rollups = {
+            key: DeviceHourlyRollup(device_id=key[0], bucket=key[1]) for key in buckets
+        }
+
+        with connection.cursor() as cursor:
+            cursor.execute(LOCATION_SQL.format(table=GPSLocation._meta.db_table), params)
+            for device_id, bucket, points, nonzero, distance, max_speed, speed_sum, moving, first, last \
+                    in cursor.fetchall():
+                rollup = rollups.get((device_id, bucket))
+                if rollup is None:
+                    continue
+                rollup.point_count = points
+                rollup.nonzero_speed_count = nonzero
+                rollup.distance = float(distance)
+                rollup.max_speed = float(max_speed)
+                rollup.speed_sum = float(speed_sum)
+                rollup.moving_seconds = int(moving)
+                rollup.first_timestamp = first
+                rollup.last_timestamp = last
+
+            cursor.execute(EVENT_SQL.format(table=GPSEvent._meta.db_table), params)
+            for device_id, bucket, events in cursor.fetchall():
+                if (device_id, bucket) in rollups:
+                    rollups[(device_id, bucket)].event_count = events
+
+            cursor.execute(GEOFENCE_EVENT_SQL.format(table=GeoFenceEvent._meta.db_table), params)
+            for device_id, bucket, entries, exits in cursor.fetchall():
+                if (device_id, bucket) in rollups:
+                    rollups[(device_id, bucket)].geofence_entries = entries
+                    rollups[(device_id, bucket)].geofence_exits = exits
+
+        DeviceHourlyRollup.objects.bulk_create(
+            list(rollups.values()),
+            update_conflicts=True,
+            unique_fields=['device', 'bucket'],
+            update_fields=ROLLUP_FIELDS,
+            batch_size=1000,
+        )
+        return len(rollups)
+
+    def refresh_daily(self, days: Iterable[Tuple[int, Any]]) -> int:
+        """Rebuild the given (device, day) rollups from their hourly rows."""
+        days = set(days)
+        if not days:
+            return 0
+
+        device_ids = {device_id for device_id, _ in days}
+        first_day = min(day for _, day in days)
+        last_day = max(day for _, day in days)
+        start = datetime.combine(first_day, datetime.min.time(), tzinfo=dt_timezone.utc)
+        end = datetime.combine(last_day, datetime.min.time(), tzinfo=dt_timezone.utc) + timedelta(days=1)
+
+        aggregates = (
+            DeviceHourlyRollup.objects
+            .filter(device_id__in=device_ids, bucket__gte=start, bucket__lt=end)
+            .annotate(day=TruncDate('bucket', tzinfo=dt_timezone.utc))
+            .values('device_id', 'day')
+            .annotate(**self._sum_aggregates())
+        )
+
+        rollups = []
+        for row in aggregates:
+            if (row['device_id'], row['day']) not in days:
+                continue
+            rollups.append(DeviceDailyRollup(
+                device_id=row['device_id'],
+                day=row['day'],
+                distance=row['distance'] or 0,
+                moving_seconds=row['moving_seconds'] or 0,
+                max_speed=row['max_speed'] or 0,
+                speed_sum=row['speed_sum'] or 0,
+                point_count=row['point_count'] or 0,
+                nonzero_speed_count=row['nonzero_speed_count'] or 0,
+                event_count=row['event_count'] or 0,
+                geofence_entries=row['geofence_entries'] or 0,
+                geofence_exits=row['geofence_exits'] or 0,
+                first_timestamp=row['first_timestamp'],
+                last_timestamp=row['last_timestamp'],
+            ))
+
+        DeviceDailyRollup.objects.bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=['device', 'day'],
+            update_fields=ROLLUP_FIELDS,
+            batch_size=1000,
+        )
+        return len(rollups)
+
+    @staticmethod
+    def _sum_aggregates() -> Dict[str, Any]:
+        return {
+            'distance': Sum('distance'),
+            'moving_seconds': Sum('moving_seconds'),
+            'max_speed': Max('max_speed'),
+            'speed_sum': Sum('speed_sum'),
+            'point_count': Sum('point_count'),
+            'nonzero_speed_count': Sum('nonzero_speed_count'),
+            'event_count': Sum('event_count'),
+            'geofence_entries': Sum('geofence_entries'),
+            'geofence_exits': Sum('geofence_exits'),
+            'first_timestamp': Min('first_timestamp'),
+            'last_timestamp': Max('last_timestamp'),
+        }
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def summarize(self, device_ids: Iterable[int], start: datetime,
+                  end: datetime) -> Dict[int, Dict[str, Any]]:
+        """
+        Aggregate telemetry per device over ``[start, end)``.
+
+        Whole UTC days inside the range are read from the daily rollups and the
+        edges from the hourly rollups, so the cost is O(days + hours at edges)
+        rows per device. Buckets are included when they start inside the range.
+        """
+        device_ids = list(device_ids)
+        start_utc = start.astimezone(dt_timezone.utc)
+        end_utc = end.astimezone(dt_timezone.utc)
+        first_midnight = (start_utc + timedelta(days=1)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ) if start_utc.time() != datetime.min.time() else start_utc
+        last_midnight = end_utc.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        hourly = DeviceHourlyRollup.objects.filter(device_id__in=device_ids)
+        partials = []
+        if first_midnight < last_midnight:
+            partials.append(
+                DeviceDailyRollup.objects.filter(
+                    device_id__in=device_ids,
+                    day__gte=first_midnight.date(),
+                    day__lt=last_midnight.date(),
+                )
+            )
+            partials.append(hourly.filter(bucket__gte=start_utc, bucket__lt=first_midnight))
+            partials.append(hourly.filter(bucket__gte=last_midnight, bucket__lt=end_utc))
+        else:
+            partials.append(hourly.filter(bucket__gte=start_utc, bucket__lt=end_utc))
+
+        summary: Dict[int, Dict[str, Any]] = defaultdict(self._empty_summary)
+        for queryset in partials:
+            for row in queryset.values('device_id').annotate(**self._sum_aggregates()):
+                self._merge(summary[row['device_id']], row)
+
+        for device_id in device_ids:
+            totals = summary[device_id]
+            totals['avg_speed'] = (
+                totals['speed_sum'] / totals['point_count'] if totals['point_count'] else 0.0
+            )
+            totals['avg_nonzero_speed'] = (
+                totals['speed_sum'] / totals['nonzero_speed_count'] if totals['nonzero_speed_count'] else 0.0
+            )
+        return dict(summary)
+
+    def summarize_device(self, device_id: int, start: datetime, end: datetime) -> Dict[str, Any]:
+        """Aggregate telemetry for a single device over ``[start, end)``."""
+        return self.summarize([device_id], start, end)[device_id]
+
+    @staticmethod
+    def _empty_summary() -> Dict[str, Any]:
+        return {
+            'distance': 0.0, 'moving_seconds': 0, 'max_speed': 0.0, 'speed_sum': 0.0,
+            'point_count': 0, 'nonzero_speed_count': 0, 'event_count': 0, 'geofence_entries': 0, 'geofence_exits': 0,
+            'first_timestamp': None, 'last_timestamp': None,
+        }
+
+    @staticmethod
+    def _merge(totals: Dict[str, Any], row: Dict[str, Any]) -> None:
+        for field in ('distance', 'moving_seconds', 'speed_sum', 'point_count', 'nonzero_speed_count',
+                      'event_count', 'geofence_entries', 'geofence_exits'):
+            totals[field] += row[field] or 0
+        totals['max_speed'] = max(totals['max_speed'], row['max_speed'] or 0)
+        if row['first_timestamp'] and (
+                totals['first_timestamp'] is None or row['first_timestamp'] < totals['first_timestamp']):
+            totals['first_timestamp'] = row['first_timestamp']
+        if row['last_timestamp'] and (
+                totals['last_timestamp'] is None or row['last_timestamp'] > totals['last_timestamp']):
+            totals['last_timestamp'] = row['last_timestamp']
+
+
+telemetry_rollup_service = TelemetryRollupService()
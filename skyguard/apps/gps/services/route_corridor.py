@@ -0,0 +1,207 @@
+"""
+Route corridors built from the reference polylines (``Overlay``) of each route.
+
+For every route (``Overlay.base`` / ``GPSDevice.route``) the polylines are
+projected to local metres and kept as:
+
+* an STRtree over the individual segments, so the distance from a fix to
+  the route is a nearest-neighbour query (O(log n)) instead of a scan,
+* two prepared buffers ("corridors"): one of the route's full width and an
+  inner one ``hysteresis`` metres narrower, used as fast paths before any
+  distance is computed.
+
+Like the geofence index, the corridors are rebuilt lazily after
+``invalidate()``, which every process sees through a version number in the
+Django cache.
+"""
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, namedtuple
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import shapely
+from shapely import STRtree
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+VERSION_CACHE_KEY = 'gps:route_corridor:version'
+
+EARTH_RADIUS = 6371008.8  # metres
+
+DEFAULT_ROUTE_CORRIDOR_CONFIG = {
+    'width': 60.0,         # metres either side of the route polyline
+    'widths': {},          # per-route overrides {route: metres}
+    'hysteresis': 20.0,    # a vehicle must come this much closer to be back on route
+    'exit_fixes': 3,       # consecutive fixes outside before OFF_ROUTE
+    'return_fixes': 2,     # consecutive fixes inside the inner corridor before ON_ROUTE
+    'check_interval': 5.0,  # seconds between checks of the shared version
+}
+
+_Corridor = namedtuple('_Corridor', [
+    'route', 'width', 'inner_width', 'origin', 'segments', 'tree', 'outer', 'inner',
+])
+
+
+def get_corridor_config() -> dict:
+    """Return the corridor config merged with ``GPS_ROUTE_CORRIDOR``."""
+    config = dict(DEFAULT_ROUTE_CORRIDOR_CONFIG)
+    config.update(getattr(settings, 'GPS_ROUTE_CORRIDOR', {}) or {})
+    return config
+
+
+def project(longitudes, latitudes, origin: Tuple[float, float]):
+    """Equirectangular projection to metres around ``origin`` (lon, lat)."""
+    lon0, lat0 = origin
+    scale = math.cos(math.radians(lat0))
+    x = np.radians(np.asarray(longitudes, dtype=float) - lon0) * EARTH_RADIUS * scale
+    y = np.radians(np.asarray(latitudes, dtype=float) - lat0) * EARTH_RADIUS
+    return x, y
+
+
+class RouteCorridorIndex:
+    """Per-process segment index and buffered corridors of every route."""
+
+    def __init__(self, config: Optional[dict] = None):
+        self.config = get_corridor_config()
+        if config:
+            self.config.update(config)
+        self._corridors: Dict[int, _Corridor] = {}
+        self._dirty = True
+        self._version = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    # -- lifecycle -------------------------------------------------------
+
+    def invalidate(self, broadcast: bool = True) -> None:
+        """Mark the corridors stale here and, if ``broadcast``, in every process."""
+        self._dirty = True
+        if broadcast:
+            try:
+                cache.incr(VERSION_CACHE_KEY)
+            except ValueError:
+                cache.set(VERSION_CACHE_KEY, 1, None)
+            except Exception as e:
+                logger.warning(f"Could not broadcast route corridor invalidation: {e}")
+
+    def _shared_version(self):
+        try:
+            return cache.get(VERSION_CACHE_KEY, 0)
+        except Exception:
+            return self._version
+
+    def _current(self) -> Dict[int, _Corridor]:
+        now = time.monotonic()
+        if not self._dirty and now - self._last_check >= self.config['check_interval']:
+            self._last_check = now
+            if self._shared_version() != self._version:
+                self._dirty = True
+        if self._dirty:
+            with self._lock:
+                if self._dirty:
+                    self.load()
+        return self._corridors
+
+    def load(self) -> None:
+        """Rebuild the corridors from the ``Overlay`` polylines."""
+        from skyguard.apps.gps.models import Overlay
+
+        version = self._shared_version()
+        self.build(Overlay.objects.filter(base__isnull=False).values_list('base', 'geometry'))
+        self._version = version
+
+    def width_for(self, route: int) -> float:
+        """Corridor half-width of a route in metres."""
+        widths = self.config['widths']
+        return float(widths.get(route, widths.get(str(route), self.config['width'])))
+
+    def build(self, lines: Iterable[Tuple[int, object]]) -> None:
+        """
+        Replace the corridors.
+
+        Args:
+            lines: Iterable of (route, polyline) pairs; polylines are GEOS
+                ``LineString`` objects or sequences of (lon, lat)
+        """
+        coords_by_route = defaultdict(list)
+        for route, line in lines:
+            coords = np.asarray(getattr(line, 'coords', line), dtype=float).reshape(-1, 2)
+            if len(coords) >= 2:
+                coords_by_route[route].append(coords)
+
+        corridors = {}
+        for route, polylines in coords_by_route.items():
+            stacked = np.concatenate(polylines)
+            origin = (float(stacked[:, 0].mean()), float(stacked[:, 1].mean()))
+            starts, ends = [], []
+            for coords in polylines:
+                x, y = project(coords[:, 0], coords[:, 1], origin)
+                points = np.column_stack((x, y))
+                starts.append(points[:-1])
+                ends.append(points[1:])
+            starts, ends = np.concatenate(starts), np.concatenate(ends)
+            segments = shapely.linestrings(np.stack((starts, ends), axis=1))
+
+            width = self.width_for(route)
+            inner_width = max(width - float(self.config['hysteresis']), 0.0)
+            lines_union = shapely.multilinestrings(segments)
+            outer = shapely.buffer(lines_union, width)
+            inner = shapely.buffer(lines_union, inner_width)
+            shapely.prepare(outer)
+            shapely.prepare(inner)
+            corridors[route] = _Corridor(
+                route, width, inner_width, origin, segments, STRtree(segments), outer, inner
+            )
+
+        self._corridors = corridors
+        self._dirty = False
+        self._last_check = time.monotonic()
+        logger.debug(f"Route corridors loaded: {len(corridors)} routes")
+
+    # -- queries ---------------------------------------------------------
+
+    def get(self, route: Optional[int]) -> Optional[_Corridor]:
+        """Corridor of a route, ``None`` if the route has no polyline."""
+        if route is None:
+            return None
+        return self._current().get(route)
+
+    def distance(self, route: int, longitude: float, latitude: float) -> Optional[float]:
+        """Distance in metres from a point to the route (nearest segment)."""
+        corridor = self.get(route)
+        if corridor is None:
+            return None
+        x, y = project(longitude, latitude, corridor.origin)
+        point = shapely.points(float(x), float(y))
+        _, distances = corridor.tree.query_nearest(point, return_distance=True)
+        return float(distances[0])
+
+    def classify(self, route: int, longitude: float, latitude: float) -> Optional[Tuple[str, float]]:
+        """
+        Position of a point relative to a route corridor.
+
+        Returns:
+            Tuple of (zone, distance) where zone is 'inner' (inside the inner
+            corridor), 'edge' (inside the corridor, in the hysteresis band) or
+            'outside'; distance is ``None`` when a buffer answered without
+            computing it. ``None`` if the route has no corridor.
+        """
+        corridor = self.get(route)
+        if corridor is None:
+            return None
+        x, y = project(longitude, latitude, corridor.origin)
+        x, y = float(x), float(y)
+        if shapely.contains_xy(corridor.inner, x, y):
+            return 'inner', None
+        if shapely.contains_xy(corridor.outer, x, y):
+            return 'edge', None
+        _, distances = corridor.tree.query_nearest(shapely.points(x, y), return_distance=True)
+        return 'outside', float(distances[0])
+
+
+route_corridor_index = RouteCorridorIndex()
@@ -0,0 +1,269 @@
+"""
+Mapbox Vector Tiles for the fleet map.
+
+Tiles are built by PostGIS with ``ST_AsMVT``: each layer is an ordinary
+queryset (so the per-user filters are the ORM ones) whose rows carry an
+``ST_AsMVTGeom`` column, wrapped in ``SELECT ST_AsMVT(tile, ...)``. Only
+geometry touching the tile is read (a ``&&`` bounding box filter on the
+spatial index), it is simplified to about one screen pixel for the zoom,
+clipped to the tile plus ``buffer`` and quantized to the ``extent`` grid, so
+the client receives what it can draw and nothing more.
+
+Layers:
+
+- ``positions``: last known position of each active device
+- ``trails``: each device's track over the last ``trail_hours``, built
+  only from the fixes within ``trail_margin`` metres of the tile
+- ``geofences``: active geofences (the pre-simplified outline when stored)
+- ``overlays``: route overlays
+
+Tiles are cached per layer, user scope and tile. Geofence and overlay tiles
+carry a layer version that ``invalidate_tiles`` bumps when a fence or
+overlay changes; position and trail tiles simply expire after a few seconds.
+"""
+import math
+import time
+from datetime import timedelta, timezone as dt_timezone
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.db.models.functions import Transform
+from django.contrib.gis.geos import Polygon
+from django.contrib.postgres.aggregates.mixins import OrderableAggMixin
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Aggregate, BigIntegerField, F, Func, Q, Value
+from django.db.models.functions import Cast, Coalesce, Extract
+from django.utils import timezone
+
+from skyguard.apps.gps.services.trail import TRAIL_EVENT_TYPES
+
+MEDIA_TYPE = 'application/vnd.mapbox-vector-tile'
+
+# Half the width of the web-mercator square, in metres
+MERCATOR_HALF_WIDTH = 20037508.342789244
+
+# Length of a degree of latitude, in metres
+METRES_PER_DEGREE = 111320.0
+
+LAYERS = ('positions', 'trails', 'geofences', 'overlays')
+
+# Layers whose tiles are invalidated on change rather than left to expire
+VERSIONED_LAYERS = ('geofences', 'overlays')
+
+DEFAULT_TILE_CONFIG = {
+    'extent': 4096,        # tile coordinate grid
+    'buffer': 64,          # extent units kept around the tile so strokes join up
+    'pixels': 1.0,         # simplification tolerance in screen pixels (256 px tiles)
+    'max_zoom': 22,
+    'trail_hours': 2,      # window of the trails layer
+    'trail_margin': 2000,  # metres around the tile whose fixes build the trails
+    'max_age': 60,         # seconds clients may reuse a geofence or overlay tile
+    'layers': {
+        'positions': {'min_zoom': 0, 'cache_ttl': 5},
+        'trails': {'min_zoom': 10, 'cache_ttl': 30},
+        'geofences': {'min_zoom': 0, 'cache_ttl': 86400},
+        'overlays': {'min_zoom': 0, 'cache_ttl': 86400},
+    },
+}
+
+
+def get_tile_config() -> Dict[str, Any]:
+    """Tile settings merged over the defaults; ``layers`` is merged per layer."""
+    overrides = dict(getattr(settings, 'GPS_TILES', {}) or {})
+    layers = overrides.pop('layers', {}) or {}
+    config = dict(DEFAULT_TILE_CONFIG)
+    config.update(overrides)
+    config['layers'] = {
+        name: {**defaults, **layers.get(name, {})}
+        for name, defaults in DEFAULT_TILE_CONFIG['layers'].items()
+    }
+    return config
+
+
+def validate_tile(z: int, x: int, y: int, max_zoom: int = DEFAULT_TILE_CONFIG['max_zoom']) -> None:
+    """Raise ``ValueError`` unless ``z/x/y`` is an existing tile."""
+    if not 0 <= z <= max_zoom:
+        raise ValueError(f'Zoom must be between 0 and {max_zoom}')
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise ValueError(f'Tile {z}/{x}/{y} does not exist')
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Web-mercator ``(xmin, ymin, xmax, ymax)`` of an XYZ tile."""
+    size = 2 * MERCATOR_HALF_WIDTH / 2 ** z
+    xmin = -MERCATOR_HALF_WIDTH + x * size
+    ymax = MERCATOR_HALF_WIDTH - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def tile_lonlat_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """``(west, south, east, north)`` in degrees of an XYZ tile."""
+    n = 2 ** z
+
+    def latitude(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, latitude(y + 1), (x + 1) / n * 360 - 180, latitude(y)
+
+
+def buffered_lonlat_bounds(z: int, x: int, y: int, margin: float) -> Tuple[float, float, float, float]:
+    """``tile_lonlat_bounds`` grown by ``margin`` metres on every side, clamped to the globe."""
+    west, south, east, north = tile_lonlat_bounds(z, x, y)
+    dlat = margin / METRES_PER_DEGREE
+    dlon = dlat / max(math.cos(math.radians(max(abs(south), abs(north)))), 0.01)
+    return max(west - dlon, -180), max(south - dlat, -90), min(east + dlon, 180), min(north + dlat, 90)
+
+
+def simplify_tolerance(z: int, config: Optional[Dict[str, Any]] = None) -> float:
+    """Simplification tolerance in mercator metres: ``pixels`` of a 256 px tile at ``z``."""
+    config = config or get_tile_config()
+    return config['pixels'] * 2 * MERCATOR_HALF_WIDTH / 2 ** z / 256
+
+
+class OrderedMakeLine(OrderableAggMixin, Aggregate):
+    """``ST_MakeLine`` aggregate with ``ORDER BY``."""
+    function = 'ST_MakeLine'
+    template = '%(function)s(%(distinct)s%(expressions)s %(ordering)s)'
+    output_field = GeometryField(srid=4326)
+
+
+class AsMVTGeom(Func):
+    """``ST_AsMVTGeom``; the geometry is only read by ``ST_AsMVT``, never fetched."""
+    function = 'ST_AsMVTGeom'
+    output_field = GeometryField(srid=3857)
+
+    def select_format(self, compiler, sql, params):
+        return sql, params
+
+
+def _mvt_geometry(geometry, z: int, x: int, y: int, config: Dict[str, Any], simplify: bool = True) -> Func:
+    """``ST_AsMVTGeom`` of ``geometry`` for the tile, optionally simplified first."""
+    geometry = Transform(geometry, 3857)
+    if simplify:
+        geometry = Func(geometry, Value(simplify_tolerance(z, config)),
+                        function='ST_SimplifyPreserveTopology', output_field=GeometryField(srid=3857))
+    envelope = Polygon.from_bbox(tile_bounds(z, x, y))
+    envelope.srid = 3857
+    return AsMVTGeom(geometry, Value(envelope, output_field=GeometryField(srid=3857)),
+                     Value(config['extent']), Value(config['buffer']), Value(True))
+
+
+def layer_queryset(layer: str, user, z: int, x: int, y: int, config: Optional[Dict[str, Any]] = None):
+    """
+    Rows of one layer for one tile, as a ``values()`` queryset.
+
+    Every column but ``mvt_geom`` becomes a feature property. Staff see the
+    whole fleet; other users their own devices and overlays and the
+    geofences they own or are notified about.
+    """
+    from skyguard.apps.gps.models import GeoFence, GPSDevice, GPSEvent, Overlay
+
+    config = config or get_tile_config()
+    bbox = Polygon.from_bbox(tile_lonlat_bounds(z, x, y))
+    bbox.srid = 4326
+    staff = user.is_staff
+
+    if layer == 'positions':
+        queryset = GPSDevice.objects.filter(is_active=True, position__bboverlaps=bbox)
+        if not staff:
+            queryset = queryset.filter(owner=user)
+        return queryset.annotate(
+            # EXTRACT returns numeric on PostgreSQL 14+, which ST_AsMVT writes as a string
+            last_log_epoch=Cast(Extract('last_log', 'epoch', tzinfo=dt_timezone.utc), BigIntegerField()),
+            mvt_geom=_mvt_geometry(F('position'), z, x, y, config, simplify=False),
+        ).values('imei', 'name', 'speed', 'course', 'connection_status', 'last_log_epoch', 'mvt_geom')
+
+    if layer == 'trails':
+        # Only fixes near the tile are aggregated; a device that leaves the
+        # margin and comes back gets a straight segment between the visits.
+        since = timezone.now() - timedelta(hours=config['trail_hours'])
+        area = Polygon.from_bbox(buffered_lonlat_bounds(z, x, y, config['trail_margin']))
+        area.srid = 4326
+        queryset = GPSEvent.objects.filter(timestamp__gte=since, type__in=TRAIL_EVENT_TYPES,
+                                           position__bboverlaps=area, device__is_active=True)
+        if not staff:
+            queryset = queryset.filter(device__owner=user)
+        return queryset.order_by().values('device_id').annotate(
+            line=OrderedMakeLine('position', ordering='timestamp'),
+        ).filter(line__bboverlaps=bbox).annotate(
+            mvt_geom=_mvt_geometry(F('line'), z, x, y, config),
+        ).values('device_id', 'mvt_geom')
+
+    if layer == 'geofences':
+        queryset = GeoFence.objects.filter(is_active=True, geometry__bboverlaps=bbox)
+        if not staff:
+            queryset = queryset.filter(
+                Q(owner=user)
+                | Q(id__in=GeoFence.notify_owners.through.objects.filter(user=user).values('geofence_id'))
+            )
+        return queryset.annotate(
+            mvt_geom=_mvt_geometry(Coalesce('simplified_geometry', 'geometry'), z, x, y, config),
+        ).values('id', 'name', 'color', 'stroke_color', 'stroke_width', 'mvt_geom')
+
+    if layer == 'overlays':
+        queryset = Overlay.objects.filter(geometry__bboverlaps=bbox)
+        if not staff:
+            queryset = queryset.filter(owner=user)
+        return queryset.order_by().annotate(
+            mvt_geom=_mvt_geometry(F('geometry'), z, x, y, config),
+        ).values('id', 'name', 'base', 'mvt_geom')
+
+    raise ValueError(f'Unknown layer: {layer}')
+
+
+def tile_query(layer: str, user, z: int, x: int, y: int,
+               config: Optional[Dict[str, Any]] = None) -> Tuple[str, tuple]:
+    """SQL and parameters of the ``ST_AsMVT`` query for one layer tile."""
+    config = config or get_tile_config()
+    inner, params = layer_queryset(layer, user, z, x, y, config).query.sql_with_params()
+    sql = (f'SELECT ST_AsMVT(tile, %s, %s, %s) FROM ({inner}) AS tile '
+           f'WHERE tile.mvt_geom IS NOT NULL')
+    return sql, (layer, config['extent'], 'mvt_geom', *params)
+
+
+def tile_version(layer: str) -> int:
+    """Current cache version of a layer; ``0`` for layers that only expire."""
+    if layer not in VERSIONED_LAYERS:
+        return 0
+    return cache.get_or_set(f'gps:tile-version:{layer}', time.time_ns, None)
+
+
+def invalidate_tiles(*layers: str) -> None:
+    """Retire every cached tile of ``layers`` (all versioned layers by default)."""
+    for layer in layers or VERSIONED_LAYERS:
+        cache.set(f'gps:tile-version:{layer}', time.time_ns(), None)
+
+
+def tile_cache_key(layer: str, user, z: int, x: int, y: int) -> str:
+    """Cache key of a tile; staff share one scope, other users get their own."""
+    scope = 'staff' if user.is_staff else user.pk
+    return f'gps:tile:{layer}:{tile_version(layer)}:{scope}:{z}/{x}/{y}'
+
+
+def render_tile(layer: str, user, z: int, x: int, y: int) -> bytes:
+    """
+    The encoded tile, from the cache when possible.
+
+    Tiles below the layer's ``min_zoom`` are empty. Raises ``ValueError``
+    for unknown layers and tiles outside the zoom range.
+    """
+    config = get_tile_config()
+    if layer not in LAYERS:
+        raise ValueError(f'Unknown layer: {layer}')
+    validate_tile(z, x, y, config['max_zoom'])
+    layer_config = config['layers'][layer]
+    if z < layer_config['min_zoom']:
+        return b''
+
+    key = tile_cache_key(layer, user, z, x, y)
+    tile = cache.get(key)
+    if tile is None:
+        sql, params = tile_query(layer, user, z, x, y, config)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        tile = bytes(row[0]) if row and row[0] is not None else b''
+        cache.set(key, tile, layer_config['cache_ttl'])
+    return tile
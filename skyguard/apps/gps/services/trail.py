@@ -0,0 +1,158 @@
+"""
+Level-of-detail trails.
+
+Device trails are simplified server-side before they are sent to the map:
+points are projected to local metres and reduced with Douglas-Peucker (every
+dropped point lies within ``tolerance`` metres of the kept line) or
+Visvalingam-Whyatt (drops points whose triangle is smaller than
+``tolerance``²). The tolerance can be derived from the map zoom so a
+city-wide view gets a few hundred points instead of thousands.
+
+Simplified trails can be returned as a Google encoded polyline, the same
+format the legacy tracker produced with ``gpolyencode``, with parallel
+compact arrays for time and speed.
+"""
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+EARTH_RADIUS = 6371008.8  # metres
+
+# Event types that carry a position fix worth drawing on a trail
+TRAIL_EVENT_TYPES = ['LOCATION', 'TRACK']
+
+DEFAULT_TRAIL_CONFIG = {
+    'method': 'dp',           # 'dp' (Douglas-Peucker) or 'vw' (Visvalingam-Whyatt)
+    'pixels': 1.0,            # tolerance in screen pixels when derived from the zoom
+    'min_tolerance': 1.0,     # metres
+    'max_tolerance': 5000.0,  # metres
+    'cache_ttl': 30,          # seconds simplified trails are cached
+}
+
+
+def get_trail_config() -> Dict[str, Any]:
+    """Trail settings merged over the defaults."""
+    config = dict(DEFAULT_TRAIL_CONFIG)
+    config.update(getattr(settings, 'GPS_TRAIL', {}) or {})
+    return config
+
+
+def tolerance_for_zoom(zoom: float, latitude: float, config: Optional[Dict[str, Any]] = None) -> float:
+    """
+    Simplification tolerance in metres for a web-mercator zoom level.
+
+    One ``pixels`` worth of ground distance at ``latitude``, clamped to the
+    configured bounds.
+    """
+    config = config or get_trail_config()
+    metres_per_pixel = 2 * math.pi * EARTH_RADIUS / 256 * math.cos(math.radians(latitude)) / 2 ** zoom
+    return min(max(config['pixels'] * metres_per_pixel, config['min_tolerance']), config['max_tolerance'])
+
+
+def project(latitudes, longitudes) -> Tuple[np.ndarray, np.ndarray]:
+    """Equirectangular projection to metres around the mean latitude."""
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    scale = math.pi / 180 * EARTH_RADIUS
+    x = longitudes * scale * math.cos(math.radians(latitudes.mean())) if len(latitudes) else longitudes
+    return x, latitudes * scale
+
+
+def douglas_peucker(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Indices of the points kept by Douglas-Peucker.
+
+    Uses an explicit stack of ranges; the distances of each range to its
+    chord are computed in one vectorized pass.
+    """
+    n = len(x)
+    if n < 3:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        length = dx * dx + dy * dy
+        t = np.clip((px * dx + py * dy) / length, 0, 1) if length else 0.0
+        distances = np.hypot(px - t * dx, py - t * dy)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep)
+
+
+def visvalingam(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Indices of the points kept by Visvalingam-Whyatt.
+
+    Each round computes every triangle area at once and removes all local
+    minima below ``tolerance``²; areas of their neighbours are recomputed in
+    the next round.
+    """
+    threshold = tolerance * tolerance
+    kept = np.arange(len(x))
+    while len(kept) > 2:
+        kx, ky = x[kept], y[kept]
+        areas = 0.5 * np.abs(
+            (kx[:-2] - kx[2:]) * (ky[1:-1] - ky[:-2]) - (kx[:-2] - kx[1:-1]) * (ky[2:] - ky[:-2])
+        )
+        left = np.concatenate(([np.inf], areas[:-1]))
+        right = np.concatenate((areas[1:], [np.inf]))
+        remove = (areas < threshold) & (areas <= left) & (areas < right)
+        if not remove.any():
+            break
+        kept = kept[~np.concatenate(([False], remove, [False]))]
+    return kept
+
+
+def simplify(latitudes, longitudes, tolerance: float, method: Optional[str] = None) -> np.ndarray:
+    """
+    Indices of the trail points to keep.
+
+    Args:
+        tolerance: Metres
+        method: ``'dp'`` or ``'vw'``; defaults to the configured method
+    """
+    x, y = project(latitudes, longitudes)
+    if (method or get_trail_config()['method']) == 'vw':
+        return visvalingam(x, y, tolerance)
+    return douglas_peucker(x, y, tolerance)
+
+
+def encode_polyline(latitudes, longitudes, precision: int = 5) -> str:
+    """Encode coordinates with the Google polyline algorithm (vectorized)."""
+    coords = np.round(np.column_stack((latitudes, longitudes)) * 10 ** precision).astype(np.int64)
+    if not len(coords):
+        return ''
+    deltas = np.diff(coords, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    shifts = 5 * np.arange(7)
+    chunks = (values[:, None] >> shifts) & 0x1F
+    lengths = 1 + ((values[:, None] >> shifts[1:]) > 0).sum(axis=1)
+    chars = chunks + 63 + 0x20 * (np.arange(7) < (lengths - 1)[:, None])
+    return chars[np.arange(7) < lengths[:, None]].astype(np.uint8).tobytes().decode('ascii')
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[Tuple[float, float]]:
+    """Decode a Google encoded polyline into (latitude, longitude) pairs."""
+    values = []
+    result = shift = 0
+    for char in encoded:
+        chunk = ord(char) - 63
+        result |= (chunk & 0x1F) << shift
+        shift += 5
+        if chunk < 0x20:
+            values.append(~(result >> 1) if result & 1 else result >> 1)
+            result = shift = 0
+    coords = np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return [tuple(pair) for pair in coords.tolist()]
@@ -2,18 +2,35 @@
 Django signals for GPS tracking system.
 """
 import logging
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
-from .models import GPSDevice, GPSLocation, GPSEvent, GeoFence, GeoFenceEvent
+from .models import GPSDevice, GPSLocation, GPSEvent, GeoFence, GeoFenceEvent, Overlay
+from .response_cache import invalidate_tags
 from .tasks import process_geofence_detection
+from .services.geofence_dispatch import geofence_dispatcher
+from .services.geofence_geometry import prepare_geofence
+from .services.geofence_index import geofence_index
+from .services.latest_state import METADATA_FIELDS, latest_state_table, invalidate_device_metadata
+from .services.route_corridor import route_corridor_index
+from .services.tiles import invalidate_tiles
 
 logger = logging.getLogger(__name__)
 channel_layer = get_channel_layer()
 
+# Device attributes shown in the device lists. Saves that change none of them
+# (position, status and heartbeat updates) leave the cached lists alone; those
+# entries expire on their own short timeout instead.
+DEVICE_LIST_FIELDS = (
+    'name', 'serial', 'model', 'software_version', 'route', 'economico', 'owner_id', 'is_active',
+)
+
+# Fields compared on save: the listed ones and the cached device metadata
+TRACKED_DEVICE_FIELDS = tuple(dict.fromkeys(DEVICE_LIST_FIELDS + tuple(METADATA_FIELDS)))
+
 
 def get_safe_channel_layer():
     """Get channel layer safely."""
@@ -24,11 +41,26 @@ def get_safe_channel_layer():
         return None
 
 
+def invalidate_geofence_responses(fence_ids, user_ids=()):
+    """
+    Retire the cached geofence responses of everyone who sees the given fences.
+
+    That is each fence's owner and notified owners, plus ``user_ids`` (users
+    just added to or removed from a fence).
+    """
+    users = set(user_ids)
+    users.update(GeoFence.objects.filter(pk__in=fence_ids).values_list('owner_id', flat=True))
+    users.update(GeoFence.notify_owners.through.objects.filter(
+        geofence_id__in=fence_ids
+    ).values_list('user_id', flat=True))
+    invalidate_tags(*(f'geofences:user:{user}' for user in users))
+
+
 @receiver(post_save, sender=GPSDevice)
 def device_position_updated(sender, instance, created, **kwargs):
     """
     Signal fired when a GPS device position is updated.
-    Triggers geofence detection if the device has a position.
+    Marks the device for the next debounced geofence evaluation if it has a position.
     """
     # Skip if this is a new device creation
     if created:
@@ -44,14 +76,77 @@ def device_position_updated(sender, instance, created, **kwargs):
         return
     
     try:
-        # Trigger geofence detection asynchronously
-        process_geofence_detection.delay(instance.imei)
+        # Coalesced with other saves of the device until the next dispatch run
+        if not geofence_dispatcher.mark(instance.imei):
+            process_geofence_detection.delay(instance.imei)
         logger.debug(f"Queued geofence detection for device {instance.name} ({instance.imei})")
         
     except Exception as e:
         logger.error(f"Error queuing geofence detection for device {instance.imei}: {e}")
 
 
+@receiver(post_init, sender=GPSDevice)
+def remember_device_fields(sender, instance, **kwargs):
+    """Keep the loaded tracked fields so a later save can tell whether they changed."""
+    instance._saved_fields = _tracked_field_values(instance)
+
+
+_NOT_LOADED = object()
+
+
+def _tracked_field_values(instance):
+    # Read from __dict__ so deferred fields are not loaded just for this
+    return {name: instance.__dict__.get(name, _NOT_LOADED) for name in TRACKED_DEVICE_FIELDS}
+
+
+def changed_device_fields(instance, created, update_fields=None):
+    """
+    Names of the ``TRACKED_DEVICE_FIELDS`` a save just wrote with a new value.
+
+    All of them for a new device. With ``update_fields`` only the fields
+    written are considered. The instance's snapshot is advanced to the saved
+    values.
+    """
+    saved = getattr(instance, '_saved_fields', {})
+    current = _tracked_field_values(instance)
+    written = TRACKED_DEVICE_FIELDS
+    if update_fields is not None:
+        attnames = {field.attname for field in instance._meta.concrete_fields
+                    if field.name in update_fields}
+        written = [name for name in TRACKED_DEVICE_FIELDS if name in attnames]
+    changed = {name for name in written if created or current[name] != saved.get(name, _NOT_LOADED)}
+    instance._saved_fields = {**saved, **{name: current[name] for name in written}}
+    return changed
+
+
+@receiver(post_save, sender=GPSDevice)
+def sync_latest_state(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Mirror saved device state into the shared-memory latest-state table.
+    Covers heartbeats and status changes written outside the ingest pipeline.
+
+    The cached device metadata and device lists are invalidated only when
+    one of their attributes changed; position-only saves (every HTTP fix)
+    leave them in place.
+    """
+    changed = changed_device_fields(instance, created, update_fields)
+    if changed.intersection(METADATA_FIELDS):
+        invalidate_device_metadata()
+    if changed.intersection(DEVICE_LIST_FIELDS):
+        invalidate_tags('devices')
+    try:
+        latest_state_table.update_from_device(instance)
+    except Exception as e:
+        logger.error(f"Error updating latest state for device {instance.imei}: {e}")
+
+
+@receiver(post_delete, sender=GPSDevice)
+def device_deleted(sender, instance, **kwargs):
+    """Drop the cached device metadata and device lists when a device is removed."""
+    invalidate_device_metadata()
+    invalidate_tags('devices')
+
+
 @receiver(post_save, sender=GPSLocation)
 def location_created(sender, instance, created, **kwargs):
     """
@@ -73,7 +168,8 @@ def location_created(sender, instance, created, **kwargs):
         
         # Trigger geofence detection
         try:
-            process_geofence_detection.delay(device.imei)
+            if not geofence_dispatcher.mark(device.imei):
+                process_geofence_detection.delay(device.imei)
             logger.debug(f"Triggered geofence detection from location update for device {device.name}")
         except Exception as e:
             logger.error(f"Error triggering geofence detection from location: {e}")
@@ -88,6 +184,8 @@ def geofence_event_created(sender, instance, created, **kwargs):
     if not created:
         return
     
+    invalidate_tags(f'geofence-events:user:{instance.fence.owner_id}')
+    
     try:
         # Prepare event data for WebSocket broadcast
         event_data = {
@@ -128,11 +226,26 @@ def geofence_event_created(sender, instance, created, **kwargs):
         logger.error(f"Error broadcasting geofence event: {e}")
 
 
+@receiver(pre_save, sender=GeoFence)
+def prepare_geofence_geometry(sender, instance, update_fields=None, **kwargs):
+    """Derive bbox, simplified polygon and index parts from the geometry."""
+    if update_fields is not None and 'geometry' not in update_fields:
+        return
+    try:
+        prepare_geofence(instance)
+    except Exception as e:
+        logger.error(f"Error preparing geometry of geofence {instance.name}: {e}")
+
+
 @receiver(post_save, sender=GeoFence)
 def geofence_updated(sender, instance, created, **kwargs):
     """
     Signal fired when a geofence is created or updated.
     """
+    geofence_index.invalidate()
+    invalidate_tiles('geofences')
+    invalidate_geofence_responses([instance.pk])
+    
     if created:
         logger.info(f"New geofence created: {instance.name} by {instance.owner.username}")
         
@@ -174,6 +287,52 @@ def geofence_updated(sender, instance, created, **kwargs):
         logger.error(f"Error broadcasting geofence update: {e}")
 
 
+@receiver(pre_delete, sender=GeoFence)
+def geofence_deleting(sender, instance, **kwargs):
+    """Retire cached responses while the notified owners are still linked."""
+    invalidate_geofence_responses([instance.pk])
+
+
+@receiver(post_delete, sender=GeoFence)
+def geofence_deleted(sender, instance, **kwargs):
+    """Drop a deleted geofence from the in-memory index, the map tiles and the owner's cached lists."""
+    geofence_index.invalidate()
+    invalidate_tiles('geofences')
+    invalidate_tags(f'geofences:user:{instance.owner_id}')
+
+
+@receiver(m2m_changed, sender=GeoFence.devices.through)
+def geofence_devices_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Refresh index membership and cached lists when devices are (un)assigned to a geofence."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        geofence_index.invalidate()
+    if action in ('post_add', 'post_remove', 'pre_clear'):
+        if not reverse:
+            invalidate_geofence_responses([instance.pk])
+        else:
+            invalidate_geofence_responses(pk_set or instance.geofences.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=GeoFence.notify_owners.through)
+def geofence_notify_owners_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Notified owners see the geofence on their map tiles and in their lists."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_tiles('geofences')
+    if action in ('post_add', 'post_remove', 'pre_clear'):
+        if not reverse:
+            invalidate_geofence_responses([instance.pk], pk_set or ())
+        else:
+            invalidate_tags(f'geofences:user:{instance.pk}')
+
+
+@receiver(post_save, sender=Overlay)
+@receiver(post_delete, sender=Overlay)
+def overlay_changed(sender, instance, **kwargs):
+    """Rebuild route corridors and map tiles when a route polyline changes."""
+    route_corridor_index.invalidate()
+    invalidate_tiles('overlays')
+
+
 @receiver(pre_save, sender=GPSDevice)
 def device_status_change(sender, instance, **kwargs):
     """
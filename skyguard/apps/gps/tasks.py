@@ -4,6 +4,7 @@ Tareas de Celery para manejo automático de dispositivos GPS.
 
 import logging
 from datetime import timedelta
+from django.conf import settings
 from django.utils import timezone
 from django.db import models
 from django.db.models import Count, Avg, Q
@@ -413,43 +414,42 @@ def check_all_devices_geofences(self):
     """
     Verificar geocercas para todos los dispositivos activos.
     Esta tarea se ejecuta periódicamente para detectar eventos de geocercas.
+    
+    Los dispositivos se reparten en lotes (GPS_GEOFENCE_FLEET['chunk_size'])
+    que se evalúan en bloque por evaluate_geofence_chunk en los workers.
     """
     try:
         from skyguard.apps.gps.models import GPSDevice
-        
-        # Obtener todos los dispositivos activos con posición
-        active_devices = GPSDevice.objects.filter(
-            connection_status='ONLINE',
-            position__isnull=False
-        ).values_list('imei', flat=True)
+        from skyguard.apps.gps.services.geofence_index import geofence_index
+        
+        # Solo dispositivos activos con posición y con geocercas asignadas
+        assigned = geofence_index.assigned_devices()
+        active_devices = [
+            imei for imei in GPSDevice.objects.filter(
+                connection_status='ONLINE',
+                position__isnull=False
+            ).values_list('imei', flat=True).iterator()
+            if imei in assigned
+        ]
         
         if not active_devices:
             logger.info("No active devices found for geofence checking")
             return {'success': True, 'devices_processed': 0}
         
-        # Procesar cada dispositivo de forma asíncrona
-        results = []
-        for device_imei in active_devices:
-            try:
-                # Llamar a la tarea de procesamiento individual
-                result = process_geofence_detection.delay(device_imei)
-                results.append({
-                    'device_imei': device_imei,
-                    'task_id': result.id
-                })
-            except Exception as e:
-                logger.error(f"Error queuing geofence detection for device {device_imei}: {e}")
-                results.append({
-                    'device_imei': device_imei,
-                    'error': str(e)
-                })
+        chunk_size = getattr(settings, 'GPS_GEOFENCE_FLEET', {}).get('chunk_size', 2000)
+        chunks = [active_devices[i:i + chunk_size] for i in range(0, len(active_devices), chunk_size)]
         
-        logger.info(f"Queued geofence detection for {len(active_devices)} devices")
+        task_ids = []
+        for chunk in chunks:
+            task_ids.append(evaluate_geofence_chunk.delay(chunk).id)
+        
+        logger.info(f"Queued geofence evaluation for {len(active_devices)} devices in {len(chunks)} chunks")
         
         return {
             'success': True,
             'devices_processed': len(active_devices),
-            'results': results
+            'chunks': len(chunks),
+            'task_ids': task_ids
         }
         
     except Exception as error:
@@ -457,6 +457,160 @@ def check_all_devices_geofences(self):
         return {'success': False, 'error': str(error)}
 
 
+@shared_task(bind=True)
+def dispatch_dirty_geofence_devices(self):
+    """
+    Evaluar geocercas de los dispositivos que reportaron desde la última ejecución.
+    
+    Las señales marcan los dispositivos en un conjunto de Redis en lugar de
+    encolar una tarea por cada guardado; esta tarea vacía el conjunto y lo
+    reparte en lotes para evaluate_geofence_chunk. Cada dispositivo se evalúa
+    como máximo una vez por intervalo, sin importar su frecuencia de reporte.
+    Si un lote no se puede encolar, sus dispositivos y los de los lotes
+    restantes vuelven al conjunto para la siguiente ejecución.
+    """
+    try:
+        from skyguard.apps.gps.services.geofence_dispatch import geofence_dispatcher
+        
+        device_imeis = geofence_dispatcher.drain()
+        if not device_imeis:
+            return {'success': True, 'devices_processed': 0}
+        
+        chunk_size = getattr(settings, 'GPS_GEOFENCE_FLEET', {}).get('chunk_size', 2000)
+        chunks = [device_imeis[i:i + chunk_size] for i in range(0, len(device_imeis), chunk_size)]
+        
+        task_ids = []
+        for index, chunk in enumerate(chunks):
+            try:
+                task_ids.append(evaluate_geofence_chunk.delay(chunk).id)
+            except Exception:
+                geofence_dispatcher.requeue(imei for pending in chunks[index:] for imei in pending)
+                raise
+        
+        logger.debug(f"Queued geofence evaluation for {len(device_imeis)} dirty devices in {len(chunks)} chunks")
+        
+        return {
+            'success': True,
+            'devices_processed': len(device_imeis),
+            'chunks': len(chunks),
+            'task_ids': task_ids
+        }
+        
+    except Exception as error:
+        logger.error(f"Error in dispatch_dirty_geofence_devices: {error}")
+        return {'success': False, 'error': str(error)}
+
+
+@shared_task(bind=True)
+def evaluate_geofence_chunk(self, device_imeis):
+    """
+    Evaluar geocercas de un lote de dispositivos en una sola pasada.
+    
+    Args:
+        device_imeis (list): IMEIs del lote
+    """
+    try:
+        from skyguard.apps.gps.services.geofence_fleet import fleet_geofence_evaluator
+        
+        result = fleet_geofence_evaluator.evaluate(device_imeis)
+        
+        logger.info(
+            f"Evaluated geofences for {result['devices_checked']} devices: "
+            f"{result['transitions']} transitions"
+        )
+        
+        return {
+            'success': True,
+            'devices_checked': result['devices_checked'],
+            'events_generated': len(result['events'])
+        }
+        
+    except Exception as error:
+        logger.error(f"Error evaluating geofence chunk: {error}")
+        return {'success': False, 'error': str(error)}
+
+
+@shared_task(bind=True)
+def populate_geofence_devices(self, geofence_id):
+    """
+    Estado inicial de los dispositivos asignados a una geocerca nueva o editada.
+
+    El progreso se publica como estado PROGRESS (meta: processed/total) para
+    que la API pueda consultarlo con el id de la tarea.
+
+    Args:
+        geofence_id (int): ID de la geocerca
+    """
+    try:
+        from skyguard.apps.gps.services.geofence_fleet import fleet_geofence_evaluator
+
+        def report(processed, total):
+            if self.request.id:
+                self.update_state(state='PROGRESS', meta={'processed': processed, 'total': total})
+
+        chunk_size = getattr(settings, 'GPS_GEOFENCE_FLEET', {}).get('populate_chunk_size', 500)
+        result = fleet_geofence_evaluator.populate(geofence_id, chunk_size=chunk_size, progress=report)
+
+        logger.info(
+            f"Populated geofence {geofence_id}: {result['devices_checked']} devices, "
+            f"{result['devices_inside']} inside"
+        )
+
+        return {'success': True, 'geofence_id': geofence_id, **result}
+
+    except Exception as error:
+        logger.error(f"Error populating geofence {geofence_id}: {error}")
+        return {'success': False, 'error': str(error)}
+
+
+@shared_task(bind=True)
+def process_geofence_transitions(self, event_ids):
+    """
+    Notificar y difundir eventos de geocerca ya guardados por el pipeline de ingesta.
+    
+    Args:
+        event_ids (list): IDs de GeoFenceEvent en orden de detección
+    """
+    try:
+        from skyguard.apps.gps.models import GeoFenceEvent
+        from skyguard.apps.gps.services.geofence_manager import advanced_geofence_manager
+        from skyguard.apps.gps.services.geofence_state import GeofenceState, geofence_state_cache
+        
+        events = list(
+            GeoFenceEvent.objects.filter(id__in=event_ids)
+            .select_related('device', 'fence__owner')
+            .order_by('timestamp', 'id')
+        )
+        cached = geofence_state_cache.get_many({event.device_id for event in events})
+        # Estado anterior a cada evento (para tiempo de permanencia y cooldown)
+        priors = geofence_state_cache.states_before(events)
+        
+        processed = 0
+        for event in events:
+            current = cached.setdefault(event.device_id, {}).get(event.fence_id)
+            prior = priors[event.id]
+            states = {event.fence_id: GeofenceState(
+                inside=prior.inside,
+                since=prior.since,
+                last_notified=current.last_notified if current else None
+            )}
+            try:
+                advanced_geofence_manager._handle_geofence_event(
+                    event.device, event.fence, event, states
+                )
+                # El cooldown aplica también a eventos posteriores del mismo lote
+                cached[event.device_id][event.fence_id] = states[event.fence_id]
+                processed += 1
+            except Exception as e:
+                logger.error(f"Error handling geofence event {event.id}: {e}")
+        
+        return {'success': True, 'events_processed': processed}
+        
+    except Exception as error:
+        logger.error(f"Error processing geofence transitions: {error}")
+        return {'success': False, 'error': str(error)}
+
+
 @shared_task(bind=True)
 def cleanup_old_geofence_events(self, days_old=30):
     """
@@ -587,7 +741,7 @@ def send_geofence_daily_report(self, user_id=None):
     """
     try:
         from django.contrib.auth.models import User
-        from skyguard.apps.gps.models import GeoFence, GeoFenceEvent
+        from skyguard.apps.gps.models import GeoFence, GeoFenceEvent, DeviceDailyRollup
         from skyguard.apps.gps.notifications import geofence_notification_service
         from datetime import timedelta
         
@@ -618,28 +772,49 @@ def send_geofence_daily_report(self, user_id=None):
                     timestamp__gte=yesterday
                 ).select_related('fence', 'device')
                 
+                # Eventos por geocerca en una sola consulta agrupada
+                fence_counts = events_yesterday.values('fence__name').annotate(
+                    total=Count('id'),
+                    entries=Count('id', filter=Q(event_type='ENTRY')),
+                    exits=Count('id', filter=Q(event_type='EXIT'))
+                )
+                
                 # Preparar datos del reporte
                 report_data = {
                     'user': user,
                     'date': yesterday.date(),
                     'total_geofences': user_geofences.count(),
                     'active_geofences': user_geofences.filter(is_active=True).count(),
-                    'total_events': events_yesterday.count(),
-                    'entry_events': events_yesterday.filter(event_type='ENTRY').count(),
-                    'exit_events': events_yesterday.filter(event_type='EXIT').count(),
+                    'total_events': 0,
+                    'entry_events': 0,
+                    'exit_events': 0,
                     'events_by_geofence': {},
-                    'events_by_device': {}
+                    'events_by_device': {},
+                    'activity_by_device': {}
                 }
                 
-                # Agrupar eventos por geocerca
-                for geofence in user_geofences:
-                    geofence_events = events_yesterday.filter(fence=geofence)
-                    if geofence_events.exists():
-                        report_data['events_by_geofence'][geofence.name] = {
-                            'total': geofence_events.count(),
-                            'entries': geofence_events.filter(event_type='ENTRY').count(),
-                            'exits': geofence_events.filter(event_type='EXIT').count()
-                        }
+                for fence_data in fence_counts:
+                    report_data['events_by_geofence'][fence_data['fence__name']] = {
+                        'total': fence_data['total'],
+                        'entries': fence_data['entries'],
+                        'exits': fence_data['exits']
+                    }
+                    report_data['total_events'] += fence_data['total']
+                    report_data['entry_events'] += fence_data['entries']
+                    report_data['exit_events'] += fence_data['exits']
+                
+                # Actividad diaria de los dispositivos desde los rollups
+                daily_rollups = DeviceDailyRollup.objects.filter(
+                    day=yesterday.date(),
+                    device__geofences__owner=user
+                ).distinct().values('device__name', 'distance', 'moving_seconds', 'point_count')
+                
+                for rollup in daily_rollups:
+                    report_data['activity_by_device'][rollup['device__name']] = {
+                        'distance_km': round(rollup['distance'] / 1000.0, 2),
+                        'moving_hours': round(rollup['moving_seconds'] / 3600.0, 2),
+                        'points': rollup['point_count']
+                    }
                 
                 # Agrupar eventos por dispositivo
                 device_events = events_yesterday.values('device__name').annotate(
@@ -673,4 +848,50 @@ def send_geofence_daily_report(self, user_id=None):
         
     except Exception as error:
         logger.error(f"Error sending daily geofence reports: {error}")
-        return {'success': False, 'error': str(error)} 
\ No newline at end of file
+        return {'success': False, 'error': str(error)}
+
+
+@shared_task(bind=True)
+def update_telemetry_rollups(self):
+    """
+    Actualiza incrementalmente los rollups horarios y diarios de telemetría
+    a partir de las marcas de agua de ubicaciones, eventos y eventos de geocercas.
+    """
+    try:
+        from skyguard.apps.gps.services.rollups import telemetry_rollup_service
+        
+        result = telemetry_rollup_service.update()
+        
+        logger.info(
+            f"Telemetry rollups updated: {result['hourly_buckets']} hourly, "
+            f"{result['daily_buckets']} daily buckets"
+        )
+        
+        return {'success': True, **result}
+        
+    except Exception as error:
+        logger.error(f"Error updating telemetry rollups: {error}")
+        return {'success': False, 'error': str(error)}
+
+
+@shared_task(bind=True)
+def update_fleet_playback(self):
+    """
+    Construye los keyframes de reproducción de flota pendientes y reconstruye
+    los intervalos afectados por posiciones recibidas con retraso.
+    """
+    try:
+        from skyguard.apps.gps.services.playback import fleet_playback_service
+        
+        result = fleet_playback_service.update()
+        
+        logger.info(
+            f"Fleet playback updated: {result['intervals']} intervals built, "
+            f"{result['pruned']} pruned"
+        )
+        
+        return {'success': True, **result}
+        
+    except Exception as error:
+        logger.error(f"Error updating fleet playback: {error}")
+        return {'success': False, 'error': str(error)}
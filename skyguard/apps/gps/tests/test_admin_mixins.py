@@ -0,0 +1,75 @@
+"""
+Unit tests for the telemetry admin helpers.
+"""
+from datetime import date, datetime
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+from django.core.paginator import EmptyPage
+from django.test import SimpleTestCase
+
+from skyguard.apps.gps.admin_mixins import date_buckets, next_bucket
+from skyguard.apps.gps.models import GPSLocation
+from skyguard.apps.gps.pagination import EstimatedCountPaginator
+
+MEXICO_CITY = ZoneInfo('America/Mexico_City')
+
+
+class DateBucketTest(SimpleTestCase):
+    """Test cases for the date hierarchy buckets."""
+
+    def test_years_and_months(self):
+        """Buckets start on the first of the year or month and cover the range."""
+        first, last = date(2022, 11, 15), date(2024, 2, 3)
+        self.assertEqual(list(date_buckets(first, last, 'year')),
+                         [date(2022, 1, 1), date(2023, 1, 1), date(2024, 1, 1)])
+        months = list(date_buckets(first, last, 'month'))
+        self.assertEqual(len(months), 16)
+        self.assertEqual(months[1:3], [date(2022, 12, 1), date(2023, 1, 1)])
+
+    def test_days_are_local_midnights(self):
+        """Datetime buckets keep their time zone and start at midnight."""
+        first = datetime(2024, 3, 30, 18, 5, tzinfo=MEXICO_CITY)
+        last = datetime(2024, 4, 1, 6, 0, tzinfo=MEXICO_CITY)
+        days = list(date_buckets(first, last, 'day'))
+        self.assertEqual([day.day for day in days], [30, 31, 1])
+        self.assertTrue(all(day.hour == 0 and day.tzinfo is MEXICO_CITY for day in days))
+        self.assertEqual(next_bucket(days[-1], 'month').month, 5)
+
+
+class EstimatedCountPaginatorTest(SimpleTestCase):
+    """Test cases for EstimatedCountPaginator."""
+
+    def test_lists_are_counted(self):
+        """Object lists that are not querysets are counted exactly."""
+        paginator = EstimatedCountPaginator(list(range(95)), 10)
+        self.assertEqual(paginator.count, 95)
+        self.assertEqual(paginator.num_pages, 10)
+
+    @patch('skyguard.apps.gps.pagination.estimate_count', return_value=20000)
+    def test_only_unfiltered_querysets_are_estimated(self, estimate):
+        """Filtered querysets are counted exactly whatever the planner thinks."""
+        paginator = EstimatedCountPaginator(GPSLocation.objects.order_by('id'), 100)
+        self.assertEqual(paginator.count, 20000)
+        self.assertTrue(paginator.estimated)
+
+        filtered = GPSLocation.objects.filter(device_id=1).order_by('id')
+        with patch.object(type(filtered), 'count', autospec=True, return_value=3) as count:
+            paginator = EstimatedCountPaginator(filtered, 100)
+            self.assertEqual(paginator.count, 3)
+        count.assert_called_once_with(filtered)
+        self.assertFalse(paginator.estimated)
+        estimate.assert_called_once()
+
+    @patch('skyguard.apps.gps.pagination.estimate_count', return_value=20000)
+    def test_pages_past_the_estimate(self, estimate):
+        """A stale estimate does not turn the real last pages into a 404."""
+        paginator = EstimatedCountPaginator(GPSLocation.objects.order_by('id'), 100)
+        page = paginator.page(250)
+        self.assertEqual((page.object_list.query.low_mark, page.object_list.query.high_mark), (24900, 25000))
+        with self.assertRaises(EmptyPage):
+            paginator.page(0)
+        with patch.object(type(page), '__len__', return_value=100):
+            self.assertTrue(page.has_next())
+        with patch.object(type(page), '__len__', return_value=40):
+            self.assertFalse(page.has_next())
@@ -0,0 +1,101 @@
+"""
+Unit tests for the compact track format.
+"""
+from datetime import datetime, timezone as dt_timezone
+from unittest.mock import MagicMock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from skyguard.apps.core.services import LocationService
+from skyguard.apps.gps.renderers import CompactTrackRenderer
+from skyguard.apps.gps.services.compact import (
+    decode_track, decode_varints, encode_track, encode_varints, unzigzag, zigzag
+)
+
+
+class VarintTest(SimpleTestCase):
+    """Test cases for zigzag and varint coding."""
+
+    def test_zigzag(self):
+        """Small magnitudes map to small unsigned values."""
+        values = np.array([0, -1, 1, -2, 2, -(2 ** 62), 2 ** 62])
+        self.assertEqual(zigzag(values)[:5].tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(unzigzag(zigzag(values)).tolist(), values.tolist())
+
+    def test_varints(self):
+        """Varints follow LEB128 and round-trip up to 64 bits."""
+        self.assertEqual(encode_varints([1, 127, 128, 300]), b'\x01\x7f\x80\x01\xac\x02')
+        values = [0, 1, 2 ** 35, 2 ** 64 - 1]
+        self.assertEqual(decode_varints(encode_varints(values)).tolist(), values)
+        self.assertEqual(encode_varints([]), b'')
+        with self.assertRaises(ValueError):
+            decode_varints(b'\x80')
+
+
+class CompactTrackTest(SimpleTestCase):
+    """Test cases for encode_track/decode_track."""
+
+    def test_round_trip(self):
+        """Tracks decode to the input at the format's precision."""
+        rng = np.random.default_rng(9)
+        count = 500
+        time = 1704067200 + np.cumsum(rng.integers(5, 15, count))
+        latitude = 19.4 + np.cumsum(rng.normal(0, 1e-4, count))
+        longitude = -99.1 + np.cumsum(rng.normal(0, 1e-4, count))
+        speed = rng.uniform(0, 120, count)
+        course = rng.uniform(0, 360, count)
+
+        data = encode_track(time, latitude, longitude, speed, course)
+        self.assertLess(len(data), count * 12)
+        track = decode_track(data)
+        self.assertEqual(track['time'].tolist(), time.tolist())
+        np.testing.assert_allclose(track['latitude'], latitude, atol=5e-7)
+        np.testing.assert_allclose(track['longitude'], longitude, atol=5e-7)
+        np.testing.assert_allclose(track['speed'], speed, atol=0.05)
+        np.testing.assert_allclose(track['course'], course, atol=0.05)
+
+    def test_empty_and_missing_columns(self):
+        """Empty tracks and tracks without speed/course are valid."""
+        self.assertEqual(len(decode_track(encode_track([], [], []))['time']), 0)
+        track = decode_track(encode_track([10, 20], [1.5, 1.6], [2.5, 2.4]))
+        self.assertEqual(track['speed'].tolist(), [0, 0])
+
+    def test_invalid_data(self):
+        """Foreign or truncated payloads are rejected."""
+        with self.assertRaises(ValueError):
+            decode_track(b'{"history": []}')
+        with self.assertRaises(ValueError):
+            decode_track(encode_track([10, 20], [1.5, 1.6], [2.5, 2.4])[:-3])
+
+    def test_renderer(self):
+        """The renderer passes encoded tracks through and falls back to JSON."""
+        renderer = CompactTrackRenderer()
+        self.assertEqual(renderer.render(b'SGT1\x00'), b'SGT1\x00')
+        self.assertEqual(renderer.render({'error': 'x'}), b'{"error":"x"}')
+
+
+class LocationServiceTrackTest(SimpleTestCase):
+    """Test cases for the compact track of the core location service."""
+
+    def test_track_in_time_order(self):
+        """Locations are read as an ascending queryset and encoded."""
+        start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        end = datetime(2024, 1, 2, tzinfo=dt_timezone.utc)
+        locations = MagicMock()
+        locations.filter.return_value = locations
+        locations.order_by.return_value.annotate.return_value.values_list.return_value = [
+            (start, 19.4, -99.1, 10.0, 90.0), (end, 19.5, -99.2, None, None),
+        ]
+        service = LocationService(MagicMock())
+        service.GPSLocation = MagicMock()
+        service.GPSLocation.objects.filter.return_value = locations
+
+        track = decode_track(service.get_device_track(1, start, end))
+
+        service.GPSLocation.objects.filter.assert_called_once_with(device__imei=1)
+        locations.filter.assert_any_call(timestamp__gte=start)
+        locations.filter.assert_any_call(timestamp__lte=end)
+        locations.order_by.assert_called_once_with('timestamp')
+        self.assertEqual(track['time'].tolist(), [start.timestamp(), end.timestamp()])
+        self.assertEqual(track['latitude'].tolist(), [19.4, 19.5])
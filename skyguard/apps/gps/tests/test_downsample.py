@@ -0,0 +1,70 @@
+"""
+Unit tests for LTTB downsampling.
+"""
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from skyguard.apps.gps.services.downsample import lttb, lttb_multi, parse_max_points
+
+
+def reference_lttb(x, y, max_points):
+    """Straightforward loop implementation to check the vectorized one against."""
+    n = len(x)
+    every = (n - 2) / (max_points - 2)
+    selected, a = [0], 0
+    for i in range(max_points - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        if i == max_points - 3:
+            next_start, next_end = n - 1, n
+        cx = sum(x[next_start:next_end]) / (next_end - next_start)
+        cy = sum(y[next_start:next_end]) / (next_end - next_start)
+        areas = [abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a])) for j in range(start, end)]
+        a = start + areas.index(max(areas))
+        selected.append(a)
+    return selected + [n - 1]
+
+
+class LTTBTest(SimpleTestCase):
+    """Test cases for lttb and lttb_multi."""
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.x = np.arange(5000, dtype=np.float64) * 1.5
+        self.y = np.sin(self.x / 300) * 40 + rng.normal(0, 2, len(self.x))
+
+    def test_matches_reference(self):
+        """Selections match the textbook algorithm and keep the endpoints."""
+        for max_points in (3, 10, 137, 1000):
+            kept = lttb(self.x, self.y, max_points)
+            self.assertEqual(kept.tolist(), reference_lttb(self.x.tolist(), self.y.tolist(), max_points))
+            self.assertEqual(len(kept), max_points)
+
+    def test_keeps_spikes(self):
+        """A single outlier survives heavy downsampling."""
+        self.y[2345] = 500
+        self.assertIn(2345, lttb(self.x, self.y, 50))
+
+    def test_short_series(self):
+        """Series no longer than max_points are returned whole."""
+        self.assertEqual(lttb([1, 2, 3], [4, 5, 6], 10).tolist(), [0, 1, 2])
+        self.assertEqual(lttb(self.x, self.y, 2).tolist(), [0, len(self.x) - 1])
+
+    def test_multi(self):
+        """Several series share the budget and keep each one's extremes."""
+        other = -self.y
+        other[10] = 900
+        kept = lttb_multi(self.x, [self.y, other], 100)
+        self.assertLessEqual(len(kept), 100)
+        self.assertIn(10, kept)
+        self.assertTrue(np.all(np.diff(kept) > 0))
+
+    @override_settings(GPS_DOWNSAMPLE={'max_points_limit': 500})
+    def test_parse_max_points(self):
+        """The parameter is optional, validated and capped."""
+        self.assertIsNone(parse_max_points(None))
+        self.assertEqual(parse_max_points('', 1000), 1000)
+        self.assertEqual(parse_max_points('600'), 500)
+        for value in ('2', 'many'):
+            with self.assertRaises(ValueError):
+                parse_max_points(value)
@@ -0,0 +1,62 @@
+"""
+Unit tests for streaming history exports.
+"""
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+
+from skyguard.apps.gps.services.export import EXPORT_SOURCES, csv_chunks, geojson_chunks, ndjson_chunks
+
+TIMESTAMP = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class ExportWriterTest(SimpleTestCase):
+    """Test cases for the CSV, NDJSON and GeoJSON chunk writers."""
+
+    def setUp(self):
+        """Set up location rows in the ``locations`` column order."""
+        self.columns = EXPORT_SOURCES['locations'].columns
+        self.rows = [
+            (TIMESTAMP, 19.4 + i / 1000, -99.1, 30.0 + i, 90.0, 2240.0, 8, 5.0, 1.1)
+            for i in range(300)
+        ]
+
+    def test_csv(self):
+        """CSV has a header and one line per row, split into bounded chunks."""
+        chunks = list(csv_chunks(iter(self.rows), header=self.columns, buffer_size=1024))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) < 1024 + 200 for chunk in chunks))
+        lines = ''.join(chunks).splitlines()
+        self.assertEqual(lines[0], 'timestamp,latitude,longitude,speed,course,altitude,satellites,accuracy,hdop')
+        self.assertEqual(lines[1], '2024-01-01 12:00:00+00:00,19.4,-99.1,30.0,90.0,2240.0,8,5.0,1.1')
+        self.assertEqual(len(lines), 301)
+
+    def test_csv_keeps_str_values(self):
+        """CSV values are written as ``str()`` like the report CSVs always were."""
+        line = ''.join(csv_chunks([(TIMESTAMP, Decimal('1.50'), None)]))
+        self.assertEqual(line, '2024-01-01 12:00:00+00:00,1.50,\r\n')
+
+    def test_ndjson(self):
+        """NDJSON has one object per line with plain values."""
+        lines = ''.join(ndjson_chunks(iter(self.rows), self.columns, buffer_size=1024)).splitlines()
+        self.assertEqual(len(lines), 300)
+        self.assertEqual(json.loads(lines[0])['timestamp'], '2024-01-01T12:00:00+00:00')
+
+    def test_geojson(self):
+        """GeoJSON is a FeatureCollection of points; missing positions become null geometry."""
+        rows = self.rows[:2] + [(TIMESTAMP, None, None, 0.0, 0.0, 0.0, 0, 0.0, None)]
+        collection = json.loads(''.join(geojson_chunks(iter(rows), self.columns, buffer_size=64)))
+        self.assertEqual(collection['type'], 'FeatureCollection')
+        self.assertEqual(collection['features'][0]['geometry']['coordinates'], [-99.1, 19.4])
+        self.assertNotIn('latitude', collection['features'][0]['properties'])
+        self.assertIsNone(collection['features'][2]['geometry'])
+
+    def test_sources_without_position(self):
+        """Sensor logs export their own columns and Decimal values as numbers."""
+        columns = EXPORT_SOURCES['pressure'].columns
+        self.assertEqual(columns, ('timestamp', 'sensor', 'psi1', 'psi2'))
+        line = ''.join(ndjson_chunks([(TIMESTAMP, 'A1', Decimal('1.5'), Decimal('2'))], columns))
+        self.assertEqual(json.loads(line)['psi1'], 1.5)
+        self.assertEqual(json.loads(''.join(geojson_chunks([], columns))), {'type': 'FeatureCollection', 'features': []})
@@ -0,0 +1,111 @@
+"""
+Unit tests for the values()-based serializers and the orjson renderer.
+"""
+import json
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from unittest.mock import patch
+
+import numpy as np
+from django.contrib.gis.geos import Point
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+
+from skyguard.apps.gps.fast_serializers import (
+    FastGeoFenceEventSerializer, FastGeoFenceSerializer, compile_mapper, point
+)
+from skyguard.apps.gps.json_encoding import dumps_text
+from skyguard.apps.gps.models import GeoFence, GPSDevice
+from skyguard.apps.gps.renderers import ORJSONRenderer
+from skyguard.apps.gps.serializers import GPSDeviceSerializer
+
+TIMESTAMP = datetime(2024, 1, 1, 12, 0, 0, 250000, tzinfo=timezone.utc)
+
+
+class CompileMapperTest(SimpleTestCase):
+    """Test cases for compile_mapper."""
+
+    def test_columns_and_mapping(self):
+        """Columns are collected once, in order, and nested specs are built."""
+        columns, mapper = compile_mapper({
+            'id': 'id',
+            'position': (point, 'lat', 'lon'),
+            'summary': {'id': 'id', 'label': (str.upper, 'name')},
+        })
+        self.assertEqual(columns, ('id', 'lat', 'lon', 'name'))
+        self.assertEqual(mapper((7, 19.4, -99.1, 'gate')), {
+            'id': 7,
+            'position': {'latitude': 19.4, 'longitude': -99.1},
+            'summary': {'id': 7, 'label': 'GATE'},
+        })
+        self.assertIsNone(mapper((7, None, None, 'gate'))['position'])
+
+    def test_event_rows(self):
+        """Event rows carry the keys the frontend reads."""
+        values = {
+            'id': 3, 'fence_id': 2, 'fence__name': 'Depot', 'device_id': 860000000000001,
+            'device__name': 'Unit 1', 'event_type': 'ENTRY', 'event_latitude': 19.4,
+            'event_longitude': -99.1, 'timestamp': TIMESTAMP, 'created_at': TIMESTAMP,
+        }
+        row = tuple(values[column] for column in FastGeoFenceEventSerializer.columns)
+        event, = FastGeoFenceEventSerializer.serialize([row])
+        self.assertEqual(event['geofence_id'], 2)
+        self.assertEqual(event['device_name'], 'Unit 1')
+        self.assertEqual(event['fence'], {'id': 2, 'name': 'Depot'})
+        self.assertEqual(event['position_coordinates'], [19.4, -99.1])
+
+    def test_geofence_rows(self):
+        """Geofence rows get the parsed ring, devices and notified owners."""
+        values = dict.fromkeys(FastGeoFenceSerializer.columns)
+        values.update(id=5, name='Depot', owner_id=None,
+                      map_geojson='{"type":"Polygon","coordinates":[[[1,2],[3,4],[5,6],[1,2]]]}')
+        row = tuple(values[column] for column in FastGeoFenceSerializer.columns)
+        fence, = FastGeoFenceSerializer.serialize([row], devices={5: [{'imei': 1}]}, notify_owners={})
+        self.assertEqual(fence['geometry'], {'type': 'polygon', 'coordinates': [[1, 2], [3, 4], [5, 6], [1, 2]]})
+        self.assertIs(fence['geometry_coordinates'], fence['geometry']['coordinates'])
+        self.assertIsNone(fence['owner'])
+        self.assertEqual(fence['devices'], [{'imei': 1}])
+        self.assertEqual(fence['notify_owners'], [])
+
+    def test_geofence_devices_keep_serializer_shape(self):
+        """Nested devices are rendered by GPSDeviceSerializer, position included."""
+        device = GPSDevice(imei=860000000000001, name='Unit 1', position=Point(-99.1, 19.4, srid=4326))
+        with patch.object(GeoFence.devices.through.objects, 'filter') as pairs, \
+                patch.object(GPSDevice.objects, 'filter') as devices:
+            pairs.return_value.values_list.return_value = [(5, device.imei), (6, device.imei)]
+            devices.return_value.only.return_value = [device]
+            grouped = FastGeoFenceSerializer.devices_by_fence([5, 6])
+        self.assertEqual(grouped[5], [GPSDeviceSerializer(device).data])
+        self.assertEqual(grouped[6], grouped[5])
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    """Test cases for ORJSONRenderer."""
+
+    def test_matches_json_renderer(self):
+        """Output decodes to the same value as the stock renderer's."""
+        data = {
+            'timestamp': TIMESTAMP,
+            'amount': Decimal('12.50'),
+            'hourly': {7: 3, 8: 5},
+            'speeds': np.array([1.5, 2.5]),
+            'name': 'Estación Norte',
+            'empty': None,
+        }
+        expected = json.loads(JSONRenderer().render(data))
+        self.assertEqual(json.loads(ORJSONRenderer().render(data)), expected)
+        self.assertEqual(expected['timestamp'], '2024-01-01T12:00:00.250000Z')
+
+    def test_datetime_format(self):
+        """Datetimes are written exactly as DRF's encoder writes them."""
+        for value in (TIMESTAMP, TIMESTAMP.replace(microsecond=0), TIMESTAMP.replace(microsecond=123),
+                      TIMESTAMP.astimezone(timezone(timedelta(hours=-6))), TIMESTAMP.replace(tzinfo=None)):
+            self.assertEqual(ORJSONRenderer().render([value]), JSONRenderer().render([value]))
+
+    def test_indent_and_none(self):
+        """Indentation follows the media type and ``None`` renders nothing."""
+        renderer = ORJSONRenderer()
+        self.assertEqual(renderer.render(None), b'')
+        self.assertIn(b'\n  "a"', renderer.render({'a': 1}, 'application/json; indent=4'))
+        self.assertEqual(dumps_text({'a': [1, 2]}), '{"a":[1,2]}')
@@ -0,0 +1,80 @@
+"""
+Unit tests for the debounced geofence dispatcher.
+"""
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase, override_settings
+
+from skyguard.apps.gps.services.geofence_dispatch import GeofenceDispatcher
+from skyguard.apps.gps.services.redis_client import reset_redis_client
+from skyguard.apps.gps.tasks import check_all_devices_geofences, dispatch_dirty_geofence_devices
+
+
+class SetClient:
+    """The Redis set commands the dispatcher uses."""
+
+    def __init__(self):
+        self.sets = {}
+
+    def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(str(member).encode() for member in members)
+
+    def scard(self, key):
+        return len(self.sets.get(key, ()))
+
+    def spop(self, key, count):
+        members = self.sets.get(key, set())
+        return [members.pop() for _ in range(min(count, len(members)))]
+
+
+class GeofenceDispatcherTest(SimpleTestCase):
+    """Test cases for GeofenceDispatcher."""
+
+    def tearDown(self):
+        reset_redis_client()
+
+    def test_marks_coalesce(self):
+        """Repeated marks of a device between drains yield it once."""
+        reset_redis_client(SetClient())
+        dispatcher = GeofenceDispatcher()
+        for imei in (862104020000002, 862104020000001, 862104020000002, 862104020000002):
+            self.assertTrue(dispatcher.mark(imei))
+        self.assertEqual(dispatcher.drain(), [862104020000001, 862104020000002])
+        self.assertEqual(dispatcher.drain(), [])
+
+    @override_settings(GPS_GEOFENCE_FLEET={'chunk_size': 2})
+    def test_failed_enqueue_requeues(self):
+        """Devices of the batches that could not be queued are drained again on the next run."""
+        reset_redis_client(SetClient())
+        dispatcher = GeofenceDispatcher()
+        for imei in range(1, 6):
+            dispatcher.mark(imei)
+        delay = MagicMock(side_effect=[MagicMock(id='a'), ConnectionError('broker down')])
+        with patch('skyguard.apps.gps.tasks.evaluate_geofence_chunk.delay', delay):
+            result = dispatch_dirty_geofence_devices.apply().result
+        self.assertFalse(result['success'])
+        self.assertEqual(delay.call_args_list[0].args, ([1, 2],))
+        self.assertEqual(dispatcher.drain(), [3, 4, 5])
+
+    def test_full_fleet_failure_leaves_dirty_set(self):
+        """A failed full-fleet enqueue reports the error and leaves the dirty set alone."""
+        reset_redis_client(SetClient())
+        dispatcher = GeofenceDispatcher()
+        dispatcher.mark(9)
+        delay = MagicMock(side_effect=ConnectionError('broker down'))
+        with patch('skyguard.apps.gps.services.geofence_index.geofence_index.assigned_devices',
+                   return_value={1, 2}), \
+                patch('skyguard.apps.gps.models.GPSDevice.objects') as devices, \
+                patch('skyguard.apps.gps.tasks.evaluate_geofence_chunk.delay', delay):
+            devices.filter.return_value.values_list.return_value.iterator.return_value = iter([1, 2, 3])
+            result = check_all_devices_geofences.apply().result
+        self.assertEqual(result, {'success': False, 'error': 'broker down'})
+        self.assertEqual(delay.call_args.args, ([1, 2],))
+        self.assertEqual(dispatcher.drain(), [9])
+
+    def test_without_redis(self):
+        """Without Redis the caller is told to dispatch the device itself."""
+        dispatcher = GeofenceDispatcher()
+        with self.settings(GPS_REDIS_URL=None):
+            self.assertFalse(dispatcher.mark(862104020000001))
+            self.assertEqual(dispatcher.drain(), [])
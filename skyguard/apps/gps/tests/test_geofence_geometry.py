@@ -0,0 +1,108 @@
+"""
+Unit tests for geofence geometry preprocessing.
+"""
+import math
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import shapely
+from django.contrib.gis.geos import Polygon
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase
+
+from skyguard.apps.gps.models import GeoFence
+from skyguard.apps.gps.serializers import GeoFenceSerializer
+from skyguard.apps.gps.services.geofence_geometry import (
+    check_vertex_budget, in_bounds, prepare_geofence, simplify_geometry, subdivide
+)
+from skyguard.apps.gps.services.geofence_index import GeofenceIndex
+
+
+def circle(vertices, radius=1.0, x=0.0, y=0.0):
+    """Polygon approximating a circle, with a little noise on the radius."""
+    angles = np.linspace(0, 2 * math.pi, vertices, endpoint=False)
+    radii = radius * (1 + 0.0001 * np.sin(angles * 37))
+    ring = [(x + r * math.cos(a), y + r * math.sin(a)) for a, r in zip(angles, radii)]
+    return Polygon(ring + [ring[0]], srid=4326)
+
+
+class GeofenceGeometryTest(SimpleTestCase):
+    """Test cases for bbox, simplification, subdivision and the vertex budget."""
+
+    def test_vertex_budget(self):
+        """Polygons over the budget are rejected."""
+        check_vertex_budget(circle(100), max_vertices=200)
+        with self.assertRaises(ValidationError):
+            check_vertex_budget(circle(300), max_vertices=200)
+
+    def test_simplify_keeps_shape(self):
+        """Simplification drops vertices but keeps the polygon close to the original."""
+        original = circle(2000)
+        simplified = simplify_geometry(original, 0.001)
+        self.assertIsInstance(simplified, Polygon)
+        self.assertLess(simplified.num_coords, original.num_coords)
+        self.assertAlmostEqual(simplified.area, original.area, places=2)
+
+    def test_subdivide_covers_polygon(self):
+        """Parts respect the vertex limit and add up to the original polygon."""
+        original = circle(2000)
+        parts = subdivide(original, 64)
+        self.assertGreater(len(parts), 1)
+        self.assertTrue(all(shapely.get_num_coordinates(part) <= 64 for part in parts))
+        self.assertAlmostEqual(sum(part.area for part in parts), original.area, places=9)
+
+    def test_prepare_geofence(self):
+        """Derived fields are filled from the geometry."""
+        fence = SimpleNamespace(geometry=circle(500, x=10, y=20))
+        prepare_geofence(fence)
+        self.assertAlmostEqual(fence.min_lon, 9.0, places=3)
+        self.assertAlmostEqual(fence.max_lat, 21.0, places=3)
+        self.assertEqual(fence.vertex_count, 501)
+        self.assertLessEqual(fence.simplified_geometry.num_coords, 501)
+        self.assertGreater(len(fence.index_parts), 1)
+        self.assertTrue(in_bounds(fence, 10.5, 20.5))
+        self.assertFalse(in_bounds(fence, 12.0, 20.5))
+
+    def test_serializer_returns_original_polygon(self):
+        """Edit forms get the original polygon, map lists the simplified one."""
+        fence = GeoFence(geometry=circle(500))
+        with self.settings(GPS_GEOFENCE_GEOMETRY={'simplify_tolerance': 0.001}):
+            prepare_geofence(fence)
+        self.assertEqual(len(GeoFenceSerializer().get_geometry_coordinates(fence)), 501)
+        simplified = GeoFenceSerializer(context={'map_geometry': True}).get_geometry_coordinates(fence)
+        self.assertEqual(len(simplified), fence.simplified_geometry.num_coords)
+        self.assertLess(len(simplified), 501)
+
+
+@patch('skyguard.apps.gps.services.geofence_index.cache')
+class SubdividedIndexTest(SimpleTestCase):
+    """Containment against subdivided fences matches the original polygon."""
+
+    def setUp(self):
+        self.geometry = circle(3000)
+        fence = SimpleNamespace(id=1, geometry=self.geometry)
+        prepare_geofence(fence)
+        self.index = GeofenceIndex(check_interval=3600)
+        self.index.build([fence], [(1, 100)])
+
+    def test_matches_original(self, cache):
+        """Random points get the same answer as the full polygon."""
+        rng = np.random.default_rng(7)
+        xs, ys = rng.uniform(-1.2, 1.2, 500), rng.uniform(-1.2, 1.2, 500)
+        expected = shapely.contains_xy(shapely.from_wkb(bytes(self.geometry.wkb)), xs, ys)
+        point_idx, fence_ids = self.index.containing_many(xs, ys)
+        self.assertEqual(set(point_idx.tolist()), set(np.flatnonzero(expected).tolist()))
+        self.assertEqual(set(fence_ids.tolist()), {1})
+        for x, y, inside in zip(xs[:50], ys[:50], expected[:50]):
+            self.assertEqual(self.index.contains(1, x, y), inside)
+
+    def test_points_on_cuts_are_inside(self, cache):
+        """The cuts made by the subdivision are not boundaries of the fence."""
+        self.assertEqual(self.index.containing(0.0, 0.0), {1})
+        self.assertTrue(self.index.contains(1, 0.0, 0.0))
+
+    def test_crossings_ignore_cuts(self, cache):
+        """A segment through the fence only crosses its real boundary."""
+        fractions = self.index.crossings(-2.0, 0.0, 2.0, 0.0)[1]
+        self.assertEqual(len(fractions), 2)
@@ -0,0 +1,114 @@
+"""
+Unit tests for the in-memory geofence index and fleet evaluation.
+"""
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import numpy as np
+from django.contrib.gis.geos import Point, Polygon
+from django.test import SimpleTestCase
+
+from skyguard.apps.gps.services.geofence_fleet import FleetGeofenceEvaluator
+from skyguard.apps.gps.services.geofence_index import GeofenceIndex
+from skyguard.apps.gps.services.geofence_state import GeofenceState
+
+
+def square(fence_id, x, y, size=1.0):
+    return SimpleNamespace(id=fence_id, geometry=Polygon.from_bbox((x, y, x + size, y + size)))
+
+
+@patch('skyguard.apps.gps.services.geofence_index.cache')
+class GeofenceIndexTest(SimpleTestCase):
+    """Test cases for point-in-fence lookups and membership sets."""
+
+    def setUp(self):
+        """Set up an index with two overlapping squares and a distant one."""
+        self.index = GeofenceIndex(check_interval=3600)
+        self.index.build(
+            [square(1, 0, 0), square(2, 0.5, 0.5), square(3, 10, 10)],
+            [(1, 100), (2, 100), (3, 100), (1, 200)],
+        )
+
+    def test_containing(self, cache):
+        """All fences that contain the point are returned."""
+        self.assertEqual(self.index.containing(0.75, 0.75), {1, 2})
+        self.assertEqual(self.index.containing(0.25, 0.25), {1})
+        self.assertEqual(self.index.containing(5.0, 5.0), set())
+
+    def test_evaluate_only_assigned_fences(self, cache):
+        """Evaluation covers just the fences the device is assigned to."""
+        self.assertEqual(self.index.evaluate(100, 0.75, 0.75), {1: True, 2: True, 3: False})
+        self.assertEqual(self.index.evaluate(200, 0.75, 0.75), {1: True})
+        self.assertEqual(self.index.evaluate(300, 0.75, 0.75), {})
+
+    def test_membership_sets(self, cache):
+        """Fence and device membership lookups are symmetric."""
+        self.assertEqual(self.index.devices_for_fence(1), {100, 200})
+        self.assertEqual([f.id for f in self.index.fences_for_device(200)], [1])
+
+    def test_invalidate_triggers_reload(self, cache):
+        """After invalidation the next query reloads the index."""
+        with patch.object(self.index, 'load') as load:
+            self.index.invalidate()
+            self.index.containing(0.5, 0.5)
+            load.assert_called_once()
+            cache.incr.assert_called_once()
+
+    def test_empty_index(self, cache):
+        """An index without fences answers every query with nothing."""
+        index = GeofenceIndex(check_interval=3600)
+        index.build([], [])
+        self.assertEqual(index.containing(0.0, 0.0), set())
+
+
+@patch('skyguard.apps.gps.services.geofence_index.cache')
+class FleetGeofenceEvaluatorTest(SimpleTestCase):
+    """Test cases for set-based transition detection."""
+
+    def setUp(self):
+        """Set up an index with two fences and three devices."""
+        self.index = GeofenceIndex(check_interval=3600)
+        self.index.build([square(1, 0, 0), square(2, 10, 10)], [(1, 100), (2, 100), (1, 200), (1, 300)])
+        self.evaluator = FleetGeofenceEvaluator(index=self.index, state_cache=Mock(), manager=Mock())
+
+    def test_containing_many(self, cache):
+        """Point/fence pairs are returned for every containing fence."""
+        point_idx, fence_ids = self.index.containing_many(np.array([0.5, 10.5, 5.0]), np.array([0.5, 10.5, 5.0]))
+        self.assertEqual(sorted(zip(point_idx.tolist(), fence_ids.tolist())), [(0, 1), (1, 2)])
+
+    def test_find_transitions(self, cache):
+        """Only state changes become transitions; unknown outside pairs become state."""
+        now = time.time()
+        states = {
+            100: {1: GeofenceState(inside=False, since=now - 600), 2: GeofenceState(inside=False, since=now - 600)},
+            200: {1: GeofenceState(inside=True, since=now - 600)},
+        }
+        transitions, new_states = self.evaluator.find_transitions(
+            np.array([100, 200, 300]), np.array([0.5, 5.0, 5.0]), np.array([0.5, 5.0, 5.0]), states, now
+        )
+        self.assertEqual(
+            sorted((t.imei, t.fence_id, t.event_type) for t in transitions),
+            [(100, 1, 'ENTRY'), (200, 1, 'EXIT')]
+        )
+        self.assertEqual(new_states, {300: {1: GeofenceState(inside=False)}})
+
+    @patch('skyguard.apps.gps.services.geofence_fleet.GPSDevice')
+    @patch('skyguard.apps.gps.services.geofence_fleet.GeoFence')
+    def test_populate(self, geofence_model, device_model, cache):
+        """Devices inside get an ENTRY in batches, the rest are stored as outside."""
+        fence = square(1, 0, 0)
+        geofence_model.objects.select_related.return_value.get.return_value = fence
+        rows = [(100, Point(0.5, 0.5), True), (200, Point(5, 5), False), (300, Point(0.2, 0.2), True)]
+        device_model.objects.filter.return_value.annotate.return_value.values_list.return_value = rows
+        self.evaluator.state_cache.get_many.return_value = {100: {}, 200: {}, 300: {}}
+        progress = []
+
+        with patch.object(self.evaluator, 'emit') as emit:
+            result = self.evaluator.populate(1, chunk_size=1, progress=lambda *args: progress.append(args))
+
+        self.assertEqual(result, {'devices_checked': 3, 'devices_inside': 2, 'transitions': 2})
+        self.assertEqual(emit.call_count, 2)
+        self.assertEqual([t.imei for call in emit.call_args_list for t in call.args[0]], [100, 300])
+        self.evaluator.state_cache.set_many.assert_called_once_with({200: {1: GeofenceState(inside=False)}})
+        self.assertEqual(progress, [(0, 3), (1, 3), (2, 3), (3, 3)])
@@ -0,0 +1,122 @@
+"""
+Unit tests for the geofence state cache and the transitions it drives.
+"""
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from django.test import SimpleTestCase
+
+from skyguard.apps.gps.services.geofence_manager import AdvancedGeofenceManager
+from skyguard.apps.gps.services.geofence_state import GeofenceState, GeofenceStateCache
+
+
+@patch('skyguard.apps.gps.services.geofence_state.get_redis_client', return_value=None)
+class GeofenceStateCacheTest(SimpleTestCase):
+    """Test cases for the in-process state store."""
+
+    def setUp(self):
+        """Set up a cache whose cold-start load returns one known state."""
+        self.cache = GeofenceStateCache()
+        self.cache.load_from_database = Mock(return_value={5: GeofenceState(inside=True, since=100.0)})
+
+    def test_cold_start_loads_once(self, _):
+        """The database is read only the first time a device is seen."""
+        self.assertEqual(self.cache.get_states(1), {5: GeofenceState(inside=True, since=100.0)})
+        self.cache.get_states(1)
+        self.cache.load_from_database.assert_called_once_with(1)
+
+    def test_set_states_merges(self, _):
+        """Updated fences are merged into the stored states."""
+        self.cache.get_states(1)
+        self.cache.set_states(1, {6: GeofenceState(inside=False)})
+        self.assertEqual(set(self.cache.get_states(1)), {5, 6})
+
+    def test_set_if_newer(self, _):
+        """A late event does not overwrite a newer transition but keeps its notification time."""
+        self.cache.set_if_newer(1, 5, GeofenceState(inside=False, since=50.0, last_notified=60.0))
+        self.assertEqual(self.cache.get_states(1)[5], GeofenceState(inside=True, since=100.0, last_notified=60.0))
+        self.cache.set_if_newer(1, 5, GeofenceState(inside=False, since=150.0))
+        self.assertEqual(self.cache.get_states(1)[5], GeofenceState(inside=False, since=150.0))
+
+    @patch('skyguard.apps.gps.models.GeoFenceEvent')
+    def test_states_before(self, events, _):
+        """Each event gets the state left by the event before it, in two queries."""
+        start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        at = [start + timedelta(minutes=minutes) for minutes in range(4)]
+        before = [(1, 7, 5, 'ENTRY', at[0])]
+        window = [(3, 7, 5, 'ENTRY', at[2]), (2, 7, 5, 'EXIT', at[1]), (4, 8, 5, 'ENTRY', at[3])]
+        events.objects.filter.return_value.order_by.return_value.distinct.return_value.values_list.return_value = before
+        events.objects.filter.return_value.values_list.return_value = window
+        batch = [SimpleNamespace(id=row[0], device_id=row[1], fence_id=row[2], timestamp=row[4]) for row in window]
+
+        states = self.cache.states_before(batch)
+
+        self.assertEqual(states, {
+            2: GeofenceState(inside=True, since=at[0].timestamp()),
+            3: GeofenceState(inside=False, since=at[1].timestamp()),
+            4: GeofenceState(inside=False),
+        })
+        self.assertEqual(events.objects.filter.call_count, 2)
+
+    def test_serialization_roundtrip(self, _):
+        """States survive the string encoding used in Redis."""
+        state = GeofenceState(inside=True, since=1.5, last_notified=2.5)
+        self.assertEqual(GeofenceState.loads(state.dumps()), state)
+
+
+class GeofenceTransitionTest(SimpleTestCase):
+    """Test cases for entry/exit decisions taken from cached state."""
+
+    def setUp(self):
+        """Set up a manager whose event generation is mocked out."""
+        with patch('skyguard.apps.gps.services.geofence_manager.get_channel_layer', return_value=None):
+            self.manager = AdvancedGeofenceManager()
+        self.manager._generate_enhanced_geofence_event = Mock(return_value={'event': True})
+        self.device = Mock(imei=1)
+        self.fence = Mock(id=5)
+        patcher = patch('skyguard.apps.gps.services.geofence_manager.geofence_state_cache')
+        self.state_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def check(self, is_inside, states):
+        return self.manager._check_single_geofence_enhanced(self.device, self.fence, is_inside, states)
+
+    def test_first_sighting_inside_is_entry(self):
+        """A device first seen inside a fence generates an ENTRY."""
+        self.check(True, {})
+        self.manager._generate_enhanced_geofence_event.assert_called_once_with(
+            self.device, self.fence, 'ENTRY', {}
+        )
+
+    def test_first_sighting_outside_records_state(self):
+        """A device first seen outside only records its state."""
+        states = {}
+        self.assertIsNone(self.check(False, states))
+        self.assertEqual(states[5], GeofenceState(inside=False))
+        self.state_cache.set_states.assert_called_once()
+
+    def test_exit_after_interval(self):
+        """Leaving a fence after the hysteresis interval generates an EXIT."""
+        states = {5: GeofenceState(inside=True, since=time.time() - 600)}
+        self.check(False, states)
+        self.assertEqual(self.manager._generate_enhanced_geofence_event.call_args[0][2], 'EXIT')
+
+    def test_hysteresis_suppresses_flapping(self):
+        """A transition right after the previous one is ignored."""
+        states = {5: GeofenceState(inside=True, since=time.time() - 5)}
+        self.assertIsNone(self.check(False, states))
+        self.manager._generate_enhanced_geofence_event.assert_not_called()
+
+    def test_no_change_no_event(self):
+        """Staying inside does not generate anything."""
+        states = {5: GeofenceState(inside=True, since=time.time() - 600)}
+        self.assertIsNone(self.check(True, states))
+
+    def test_cooldown(self):
+        """Notifications are suppressed within the fence cooldown."""
+        fence = Mock(notification_cooldown=300)
+        self.assertTrue(self.manager._is_in_cooldown(fence, GeofenceState(True, last_notified=time.time() - 10)))
+        self.assertFalse(self.manager._is_in_cooldown(fence, GeofenceState(True, last_notified=time.time() - 900)))
+        self.assertFalse(self.manager._is_in_cooldown(fence, GeofenceState(True)))
@@ -0,0 +1,70 @@
+"""
+Unit tests for server-side heatmap aggregation.
+"""
+import numpy as np
+from django.test import SimpleTestCase
+
+from skyguard.apps.gps.services.heatmap import (
+    HeatmapAccumulator, cell_centers, get_heatmap_config, grid_cells
+)
+from skyguard.apps.gps.services.tiles import tile_lonlat_bounds
+
+
+def fixes(*rows):
+    """Columns of ``(device, epoch, latitude, longitude, speed)`` rows."""
+    return [np.array(column, dtype=np.float64) for column in zip(*rows)]
+
+
+class GridTest(SimpleTestCase):
+    """Test cases for the heatmap grid."""
+
+    def test_cells_are_map_tiles(self):
+        """Cells are the XYZ tiles of the resolution zoom, centres inside them."""
+        cell, = grid_cells([19.4326], [-99.1332], 16)
+        x, y = divmod(int(cell), 2 ** 16)
+        west, south, east, north = tile_lonlat_bounds(16, x, y)
+        self.assertTrue(west <= -99.1332 < east and south <= 19.4326 < north)
+        (latitude,), (longitude,) = cell_centers([cell], 16)
+        self.assertAlmostEqual(latitude, (south + north) / 2, places=4)
+        self.assertAlmostEqual(longitude, (west + east) / 2)
+
+
+class HeatmapAccumulatorTest(SimpleTestCase):
+    """Test cases for HeatmapAccumulator."""
+
+    A, B = (19.4326, -99.1332), (19.5, -99.2)
+
+    def test_fixes_and_speeding(self):
+        """Samples are counted per cell, speeding only above the limit."""
+        rows = [(1, 0, *self.A, 10), (1, 10, *self.A, 95), (2, 0, *self.B, 120)]
+        counts = HeatmapAccumulator(16, 'fixes')
+        counts.add(*fixes(*rows[:2]))
+        counts.add(*fixes(*rows[2:]))
+        cells, values = counts.result()
+        self.assertEqual(dict(zip(cells.tolist(), values.tolist())), {
+            grid_cells(*zip(self.A), 16)[0]: 2, grid_cells(*zip(self.B), 16)[0]: 1,
+        })
+        self.assertEqual(counts.samples, 3)
+
+        speeding = HeatmapAccumulator(16, 'speeding', speed_limit=100)
+        speeding.add(*fixes(*rows))
+        self.assertEqual(speeding.result()[1].tolist(), [1.0])
+
+    def test_dwell_across_chunks(self):
+        """Stopped time runs to the next fix of the same device, even in the next chunk."""
+        max_gap = get_heatmap_config()['max_gap']
+        dwell = HeatmapAccumulator(16, 'dwell')
+        dwell.add(*fixes((1, 0, *self.A, 0), (1, 60, *self.A, 0)))
+        dwell.add(*fixes(
+            (1, 90, *self.B, 40),                 # moving: no dwell
+            (1, 100, *self.B, 0),
+            (1, 100 + max_gap + 1, *self.B, 0),   # gap too long
+            (2, 0, *self.B, 0),
+            (2, 20, *self.B, 0),
+        ))
+        cells, values = dwell.result()
+        by_cell = dict(zip(cells.tolist(), values.tolist()))
+        self.assertEqual(by_cell, {
+            grid_cells(*zip(self.A), 16)[0]: 90, grid_cells(*zip(self.B), 16)[0]: 20,
+        })
+        self.assertEqual(dwell.samples, 7)
@@ -0,0 +1,123 @@
+"""
+Unit tests for the shared-memory latest-state table.
+"""
+import os
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.gis.geos import Point
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from skyguard.apps.gps.services.latest_state import LatestStateTable
+
+
+class LatestStateTableTest(SimpleTestCase):
+    """Test cases for the memory-mapped latest-state table."""
+
+    def setUp(self):
+        """Set up a small table in a temporary file."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'state.bin')
+        patcher = patch.object(LatestStateTable, '_device_rows', return_value=[])
+        self.device_rows = patcher.start()  # no database in these tests
+        self.addCleanup(patcher.stop)
+        self.table = self.make_table()
+
+    def tearDown(self):
+        self.table.close()
+        self.tmpdir.cleanup()
+
+    def make_table(self, capacity=4):
+        return LatestStateTable(path=self.path, capacity=capacity)
+
+    def test_update_and_read(self):
+        """Written fields come back in the snapshot."""
+        now = timezone.now()
+        self.table.update(123, latitude=19.4, longitude=-99.1, speed=42.5,
+                          fix_time=now, heartbeat_time=now, status='ONLINE')
+        state = self.table.get_states()[123]
+        self.assertEqual((state.latitude, state.longitude, state.speed), (19.4, -99.1, 42.5))
+        self.assertEqual(state.status, 'ONLINE')
+        self.assertTrue(state.has_fix)
+        self.assertAlmostEqual(state.fix_time.timestamp(), now.timestamp(), places=5)
+
+    def test_partial_update_keeps_fields(self):
+        """Fields passed as None keep their previous value."""
+        self.table.update(1, latitude=10.0, longitude=20.0, status='ONLINE')
+        self.table.update(1, heartbeat_time=timezone.now(), status='SLEEPING')
+        state = self.table.get_states()[1]
+        self.assertEqual((state.latitude, state.longitude), (10.0, 20.0))
+        self.assertEqual(state.status, 'SLEEPING')
+
+    def test_shared_between_instances(self):
+        """A second mapping of the same file sees the writes of the first."""
+        self.table.update(7, latitude=1.0, longitude=2.0)
+        reader = self.make_table(capacity=100)
+        try:
+            self.assertEqual(reader.get_states()[7].latitude, 1.0)
+            reader.update(8, latitude=3.0, longitude=4.0)
+            self.assertEqual(sorted(self.table.get_states()), [7, 8])
+        finally:
+            reader.close()
+
+    def test_filter_by_imei(self):
+        """The snapshot can be restricted to a set of devices."""
+        for imei in (1, 2, 3):
+            self.table.update(imei, latitude=0.0, longitude=0.0)
+        self.assertEqual(sorted(self.table.get_states([1, 3])), [1, 3])
+
+    def test_torn_slot_is_skipped(self):
+        """A slot left mid-write (odd sequence) is not returned."""
+        self.table.update(1, latitude=1.0, longitude=1.0)
+        self.table.update(2, latitude=2.0, longitude=2.0)
+        self.table._slots['seq'][0] += 1
+        self.assertEqual(list(self.table.get_states()), [2])
+
+    def test_full_table_ignores_new_devices(self):
+        """Devices beyond the capacity are dropped instead of raising."""
+        for imei in range(1, 7):
+            self.table.update(imei, latitude=0.0, longitude=0.0,
+                              heartbeat_time=timezone.now() - timedelta(seconds=imei))
+        self.assertEqual(self.table.count, 4)
+        self.assertEqual(sorted(self.table.get_states()), [1, 2, 3, 4])
+
+    def test_reconcile_adds_stored_devices(self):
+        """Devices only known to the database are listed with their stored state."""
+        stored = timezone.now() - timedelta(days=3)
+        self.table.update(1, latitude=1.0, longitude=1.0, fix_time=timezone.now())
+        self.device_rows.return_value = [
+            (2, Point(-99.1, 19.4), 12.25, 90.5, 0, stored, stored, 'OFFLINE'),
+        ]
+        states = self.table.get_states()
+        self.assertEqual(sorted(states), [1, 2])
+        self.assertEqual((states[2].latitude, states[2].speed, states[2].course), (19.4, 12.25, 90.5))
+        self.device_rows.assert_called_once_with(None)
+
+    def test_reconcile_keeps_newer_state(self):
+        """Stored rows only replace what is older in the table."""
+        now = timezone.now()
+        self.table.update(1, latitude=1.0, longitude=1.0, fix_time=now, heartbeat_time=now - timedelta(minutes=5),
+                          status='SLEEPING')
+        self.table.reconcile([(1, Point(2.0, 2.0), 0, 0, 0, now - timedelta(minutes=1), now, 'ONLINE')])
+        state = self.table.get_states()[1]
+        self.assertEqual(state.latitude, 1.0)
+        self.assertEqual(state.status, 'ONLINE')
+
+    def test_reconcile_interval(self):
+        """Later reconciles are rate limited and only read recently updated rows."""
+        self.table.get_states()
+        self.table.get_states()
+        self.assertEqual(self.device_rows.call_count, 1)
+        self.table._header['reconciled_at'] -= 60
+        self.table.get_states()
+        since = self.device_rows.call_args[0][0]
+        self.assertLess(since, timezone.now() - timedelta(seconds=59))
+
+    def test_old_layout_is_recreated(self):
+        """A file with another layout is replaced instead of failing."""
+        with open(self.path, 'wb') as handle:
+            handle.write(b'SKYLST01' + bytes(1024))
+        self.table.update(1, latitude=1.0, longitude=1.0)
+        self.assertEqual(list(self.table.get_states()), [1])
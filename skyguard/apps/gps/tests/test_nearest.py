@@ -0,0 +1,109 @@
+"""
+Unit tests for the nearest-device KD-tree index.
+"""
+import os
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
+
+import numpy as np
+from django.contrib.gis.geos import Point
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from skyguard.apps.gps.services.latest_state import (
+    FLAG_HAS_FIX, SLOT_DTYPE, STATUS_CODES, STATUS_SHIFT, LatestStateTable
+)
+from skyguard.apps.gps.services.nearest import (
+    KDTree, NearestDeviceIndex, chord_to_metres, metres_to_chord, to_unit_vectors
+)
+
+METRE = 1 / 111195.0  # degrees of latitude per metre
+LATITUDE = 19.4
+
+
+class KDTreeTest(SimpleTestCase):
+    """Test cases comparing the KD-tree against brute force."""
+
+    def setUp(self):
+        """Set up 2000 random points around Mexico City."""
+        rng = np.random.default_rng(7)
+        self.points = to_unit_vectors(rng.uniform(19.2, 19.6, 2000), rng.uniform(-99.3, -98.9, 2000))
+        self.tree = KDTree(self.points, leaf_size=8)
+        self.query = to_unit_vectors([LATITUDE], [-99.1])[0]
+        self.distances = np.linalg.norm(self.points - self.query, axis=1)
+
+    def test_query(self):
+        """The k nearest points match brute force, sorted by distance."""
+        dists, idx = self.tree.query(self.query, 15)
+        expected = np.argsort(self.distances)[:15]
+        self.assertEqual(idx.tolist(), expected.tolist())
+        np.testing.assert_allclose(dists, self.distances[expected])
+
+    def test_query_radius(self):
+        """Radius queries return exactly the points inside the radius."""
+        radius = metres_to_chord(3000)
+        dists, idx = self.tree.query_radius(self.query, radius)
+        self.assertEqual(sorted(idx.tolist()), np.flatnonzero(self.distances <= radius).tolist())
+        self.assertTrue(np.all(np.diff(dists) >= 0))
+
+    def test_chord_conversion(self):
+        """Chord lengths round-trip to metres."""
+        self.assertAlmostEqual(chord_to_metres(metres_to_chord(1234.5)), 1234.5, places=3)
+
+
+class NearestDeviceIndexTest(SimpleTestCase):
+    """Test cases for device searches over a latest-state snapshot."""
+
+    def setUp(self):
+        """Set up five devices north of a point, 100 m apart, one without a fix."""
+        rows = np.zeros(5, dtype=SLOT_DTYPE)
+        rows['imei'] = [1, 2, 3, 4, 5]
+        rows['longitude'] = -99.1
+        rows['latitude'] = LATITUDE + np.array([100, 200, 300, 400, 500]) * METRE
+        rows['flags'] = FLAG_HAS_FIX | (STATUS_CODES['ONLINE'] << STATUS_SHIFT)
+        rows['flags'][1] = STATUS_CODES['ONLINE'] << STATUS_SHIFT
+        rows['flags'][2] = FLAG_HAS_FIX | (STATUS_CODES['OFFLINE'] << STATUS_SHIFT)
+        self.index = NearestDeviceIndex(config={'max_age': float('inf')})
+        self.index.build(rows)
+
+    def test_nearest(self):
+        """Devices come back nearest first with distances in metres."""
+        results = self.index.nearest(LATITUDE, -99.1, k=2)
+        self.assertEqual([r['imei'] for r in results], [1, 3])
+        self.assertAlmostEqual(results[0]['distance'], 100, delta=1)
+        self.assertEqual(results[1]['status'], 'OFFLINE')
+
+    def test_nearest_with_predicate(self):
+        """The search widens until enough devices pass the predicate."""
+        results = self.index.nearest(LATITUDE, -99.1, k=2, predicate=lambda r: r['status'] == 'ONLINE')
+        self.assertEqual([r['imei'] for r in results], [1, 4])
+
+    def test_max_distance(self):
+        """Devices beyond max_distance are ignored."""
+        self.assertEqual([r['imei'] for r in self.index.nearest(LATITUDE, -99.1, k=5, max_distance=350)],
+                         [1, 3])
+
+    def test_within(self):
+        """Radius searches return every device inside the radius."""
+        self.assertEqual([r['imei'] for r in self.index.within(LATITUDE, -99.1, 450)], [1, 3, 4])
+        self.assertEqual([r['imei'] for r in self.index.within(LATITUDE, -99.1, 450, limit=1)], [1])
+
+
+class NearestOverLatestStateTest(SimpleTestCase):
+    """Test cases for searches over the shared-memory table."""
+
+    def test_device_only_in_database(self):
+        """Devices that have not reported since the table was created are found too."""
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        table = LatestStateTable(path=os.path.join(tmpdir.name, 'state.bin'), capacity=8)
+        self.addCleanup(table.close)
+        table.update(1, latitude=LATITUDE + 200 * METRE, longitude=-99.1, fix_time=timezone.now(), status='ONLINE')
+        stored = timezone.now() - timedelta(days=2)
+        rows = [(2, Point(-99.1, LATITUDE + 100 * METRE), 0, 0, 0, stored, stored, 'OFFLINE')]
+
+        with patch.object(LatestStateTable, '_device_rows', return_value=rows):
+            results = NearestDeviceIndex(table=table).nearest(LATITUDE, -99.1, k=2)
+
+        self.assertEqual([(r['imei'], r['status']) for r in results], [(2, 'OFFLINE'), (1, 'ONLINE')])
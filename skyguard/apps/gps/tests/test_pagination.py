@@ -0,0 +1,191 @@
+"""
+Unit tests for keyset pagination.
+"""
+import operator
+from datetime import datetime, timedelta, timezone
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+from django.db.models import Q
+from django.test import SimpleTestCase
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from skyguard.apps.gps.pagination import KeysetPagination, decode_cursor, encode_cursor, keyset_filter
+from skyguard.apps.gps.views import DeviceEventsView, DeviceHistoryView
+
+TIMESTAMP = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+LOOKUPS = {'lt': operator.lt, 'lte': operator.le, 'gt': operator.gt, 'gte': operator.ge}
+
+
+class ListQuerySet:
+    """Just enough of a queryset to page through a list of rows."""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def _matches(self, row, condition):
+        if isinstance(condition, tuple):
+            name, _, lookup = condition[0].partition('__')
+            return LOOKUPS.get(lookup, operator.eq)(getattr(row, name), condition[1])
+        results = [self._matches(row, child) for child in condition.children]
+        matched = all(results) if condition.connector == Q.AND else any(results)
+        return not matched if condition.negated else matched
+
+    def filter(self, condition):
+        return ListQuerySet(row for row in self.rows if self._matches(row, condition))
+
+    def order_by(self, *fields):
+        rows = list(self.rows)
+        for field in reversed(fields):
+            rows.sort(key=operator.attrgetter(field.lstrip('-')), reverse=field.startswith('-'))
+        return ListQuerySet(rows)
+
+    def count(self):
+        return len(self.rows)
+
+    def __getitem__(self, item):
+        return self.rows[item]
+
+
+class CursorTest(SimpleTestCase):
+    """Test cases for cursor encoding and the keyset condition."""
+
+    def test_round_trip(self):
+        """Cursors are opaque and decode to the same position."""
+        cursor = encode_cursor([TIMESTAMP, 42], reverse=True)
+        self.assertNotIn('2024', cursor)
+        self.assertEqual(decode_cursor(cursor), ([TIMESTAMP, 42], True))
+
+    def test_invalid(self):
+        """Garbage cursors are rejected."""
+        for cursor in ('', 'not-a-cursor', encode_cursor([])[:-2]):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def test_keyset_filter(self):
+        """Descending order selects rows strictly before the position."""
+        condition = keyset_filter(('-timestamp', '-id'), [TIMESTAMP, 5])
+        rows = ListQuerySet([
+            SimpleNamespace(timestamp=TIMESTAMP + timedelta(seconds=1), id=1),
+            SimpleNamespace(timestamp=TIMESTAMP, id=6),
+            SimpleNamespace(timestamp=TIMESTAMP, id=5),
+            SimpleNamespace(timestamp=TIMESTAMP, id=4),
+            SimpleNamespace(timestamp=TIMESTAMP - timedelta(seconds=1), id=9),
+        ])
+        self.assertEqual([row.id for row in rows.filter(condition).rows], [4, 9])
+
+
+class KeysetPaginationTest(SimpleTestCase):
+    """Test cases for KeysetPagination."""
+
+    def setUp(self):
+        """Set up 25 rows with runs of equal timestamps."""
+        self.queryset = ListQuerySet(
+            SimpleNamespace(timestamp=TIMESTAMP + timedelta(seconds=i // 4), id=i) for i in range(25)
+        )
+        self.factory = APIRequestFactory()
+
+    def _page(self, url):
+        paginator = KeysetPagination()
+        paginator.page_size = 10
+        page = paginator.paginate_queryset(self.queryset, Request(self.factory.get(url)))
+        response = paginator.get_paginated_response([row.id for row in page])
+        return response.data
+
+    @staticmethod
+    def _path(link):
+        parsed = urlparse(link)
+        return f'{parsed.path}?{parsed.query}'
+
+    def test_walks_forward_and_back(self):
+        """Pages cover every row once, newest first, and previous links return."""
+        first = self._page('/events/')
+        self.assertEqual(first['results'], list(range(24, 14, -1)))
+        self.assertIsNone(first['previous'])
+        self.assertIsNone(first['count'])
+
+        second = self._page(self._path(first['next']))
+        self.assertEqual(second['results'], list(range(14, 4, -1)))
+        third = self._page(self._path(second['next']))
+        self.assertEqual(third['results'], [4, 3, 2, 1, 0])
+        self.assertIsNone(third['next'])
+
+        back = self._page(self._path(third['previous']))
+        self.assertEqual(back['results'], second['results'])
+        self.assertEqual(self._page(self._path(back['previous']))['results'], first['results'])
+
+    def test_count_and_page_size(self):
+        """Counting is opt-in and page sizes are capped."""
+        data = self._page('/events/?count=exact&page_size=5000')
+        self.assertEqual(data['count'], 25)
+        self.assertEqual(len(data['results']), 25)
+        cursor = parse_qs(urlparse(self._page('/events/')['next']).query)['cursor'][0]
+        self.assertEqual(decode_cursor(cursor)[0], [TIMESTAMP + timedelta(seconds=3), 15])
+
+    def test_invalid_cursor(self):
+        """Invalid cursors are a 404, like DRF's CursorPagination."""
+        with self.assertRaises(NotFound):
+            self._page('/events/?cursor=bogus')
+        with self.assertRaises(NotFound):
+            self._page(f'/events/?cursor={encode_cursor([15])}')
+
+
+@patch('skyguard.apps.gps.views.GPSDeviceRepository')
+class DeviceHistoryPaginationTest(SimpleTestCase):
+    """Test cases for the keyset pages of the device history and events views."""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.rows = ListQuerySet(
+            SimpleNamespace(id=i, type='TRACK', timestamp=TIMESTAMP + timedelta(seconds=i), position=None,
+                            speed=0, course=0, altitude=0, odometer=0)
+            for i in range(25)
+        )
+
+    def _get(self, view, url):
+        response = view.as_view()(self.factory.get(url), imei=1)
+        return response.status_code, json.loads(response.content)
+
+    def test_events_newest_first(self, repository):
+        """Events are paged newest first and the next link continues after the page."""
+        repository.return_value.get_device_events.return_value = self.rows
+        status, first = self._get(DeviceEventsView, '/devices/1/events/?page_size=10')
+        self.assertEqual(status, 200)
+        self.assertEqual([event['timestamp'] for event in first['events']][:2],
+                         [(TIMESTAMP + timedelta(seconds=24)).isoformat().replace('+00:00', 'Z'),
+                          (TIMESTAMP + timedelta(seconds=23)).isoformat().replace('+00:00', 'Z')])
+        self.assertEqual(len(first['events']), 10)
+        self.assertIsNone(first['previous'])
+
+        status, second = self._get(DeviceEventsView, urlparse(first['next'])._replace(scheme='', netloc='').geturl())
+        self.assertEqual(len(second['events']), 10)
+        self.assertLess(second['events'][0]['timestamp'], first['events'][-1]['timestamp'])
+
+    def test_history_oldest_first(self, repository):
+        """History is paged oldest first; max_points returns the downsampled history whole."""
+        location = {'position': SimpleNamespace(x=-99.1, y=19.4), 'satellites': 8, 'accuracy': 5, 'hdop': 1.0,
+                    'pdop': 1.5, 'fix_quality': 1, 'fix_type': '3D'}
+        for row in self.rows.rows:
+            row.__dict__.update(location)
+        repository.return_value.get_device_locations.return_value = self.rows
+        status, page = self._get(DeviceHistoryView, '/devices/1/history/?page_size=20')
+        self.assertEqual(status, 200)
+        self.assertEqual(len(page['history']), 20)
+        self.assertEqual(page['history'][0]['timestamp'], TIMESTAMP.isoformat().replace('+00:00', 'Z'))
+        self.assertIsNotNone(page['next'])
+
+        with patch('skyguard.apps.gps.views.GPSService.get_device_history', return_value=[]) as history:
+            status, data = self._get(DeviceHistoryView, '/devices/1/history/?max_points=10')
+        self.assertEqual(data, {'history': []})
+        self.assertNotIn('paginate', history.call_args.kwargs)
+
+    def test_invalid_cursor(self, repository):
+        """An invalid cursor is a client error."""
+        repository.return_value.get_device_events.return_value = self.rows
+        status, data = self._get(DeviceEventsView, '/devices/1/events/?cursor=bogus')
+        self.assertEqual(status, 400)
+        self.assertIn('Invalid cursor', data['error'])
@@ -0,0 +1,331 @@
+"""
+Unit tests for the GPS ingest pipeline.
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from django.contrib.gis.geos import Polygon
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from skyguard.apps.gps.models import GPSDevice
+from skyguard.apps.gps.pipeline import Fix, GeofenceStage, IngestPipeline, OdometerStage, haversine_distance
+from skyguard.apps.gps.pipeline.base import DeviceStateBuffer
+from skyguard.apps.gps.pipeline.recent import RecentFixStage
+from skyguard.apps.gps.services.geofence_index import GeofenceIndex
+from skyguard.apps.gps.services.geofence_state import GeofenceState
+from skyguard.apps.gps.services.redis_client import reset_redis_client
+
+
+class HaversineTest(SimpleTestCase):
+    """Test cases for the haversine distance helper."""
+
+    def test_one_degree_of_latitude(self):
+        """One degree of latitude is about 111.2 km."""
+        self.assertAlmostEqual(haversine_distance(0, 0, 1, 0), 111195, delta=10)
+
+    def test_same_point(self):
+        """Distance between identical points is zero."""
+        self.assertEqual(haversine_distance(19.4, -99.1, 19.4, -99.1), 0)
+
+
+class KeyValueClient:
+    """The Redis string commands and optimistic transactions the odometer uses."""
+
+    def __init__(self):
+        self.values = {}
+        self.versions = {}
+        self.before_commit = None  # called once between WATCH and EXEC, to simulate a race
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def pipeline(self):
+        return KeyValuePipeline(self)
+
+
+class KeyValuePipeline:
+    def __init__(self, client):
+        self.client = client
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def watch(self, key):
+        self.watched = (key, self.client.versions.get(key, 0))
+
+    def unwatch(self):
+        pass
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def multi(self):
+        self.queued = []
+
+    def set(self, key, value, ex=None):
+        self.queued.append((key, value))
+
+    def execute(self):
+        from redis.exceptions import WatchError
+
+        race, self.client.before_commit = self.client.before_commit, None
+        if race:
+            race()
+        key, version = self.watched
+        if self.client.versions.get(key, 0) != version:
+            raise WatchError()
+        for key, value in self.queued:
+            self.client.set(key, value)
+
+
+class OdometerStageTest(SimpleTestCase):
+    """Test cases for the incremental odometer stage."""
+
+    def setUp(self):
+        """Set up a stage and a device seeded with an odometer value."""
+        self.stage = OdometerStage()
+        self.device = Mock(odometer=1000.0)
+        self.start = timezone.make_aware(datetime(2024, 1, 1, 12, 0, 0))
+
+    def fix(self, seconds, latitude, longitude=-99.0, **kwargs):
+        return Fix(imei=1, timestamp=self.start + timedelta(seconds=seconds),
+                   latitude=latitude, longitude=longitude, **kwargs)
+
+    def test_first_fix_seeds_from_device(self):
+        """The first fix of a device starts from the stored odometer."""
+        fix = self.fix(0, 19.0, speed=40)
+        self.stage.process(fix, self.device)
+        self.assertEqual(fix.odometer, 1000.0)
+
+    def test_accumulates_distance(self):
+        """Consecutive moving fixes add their haversine distance."""
+        self.stage.process(self.fix(0, 19.0, speed=40), self.device)
+        fix = self.fix(60, 19.005, speed=40)
+        self.stage.process(fix, self.device)
+        expected = 1000.0 + haversine_distance(19.0, -99.0, 19.005, -99.0)
+        self.assertAlmostEqual(fix.odometer, expected)
+        self.assertAlmostEqual(self.stage.get_odometer(1), expected)
+
+    def test_filters_stationary_jitter(self):
+        """Small drift while parked does not move the odometer."""
+        self.stage.process(self.fix(0, 19.0, speed=0), self.device)
+        fix = self.fix(60, 19.0001, speed=0)
+        self.stage.process(fix, self.device)
+        self.assertEqual(fix.odometer, 1000.0)
+
+    def test_filters_bad_hdop(self):
+        """Fixes with a poor HDOP are ignored."""
+        self.stage.process(self.fix(0, 19.0, speed=40), self.device)
+        fix = self.fix(60, 19.005, speed=40, hdop=12.0)
+        self.stage.process(fix, self.device)
+        self.assertEqual(fix.odometer, 1000.0)
+
+    def test_filters_implausible_jump(self):
+        """A jump implying an impossible speed is treated as an outlier."""
+        self.stage.process(self.fix(0, 19.0, speed=40), self.device)
+        fix = self.fix(10, 20.0, speed=40)
+        self.stage.process(fix, self.device)
+        self.assertEqual(fix.odometer, 1000.0)
+
+    def test_ignores_out_of_order_fix(self):
+        """A fix older than the previous one is not counted."""
+        self.stage.process(self.fix(60, 19.0, speed=40), self.device)
+        fix = self.fix(0, 19.005, speed=40)
+        self.stage.process(fix, self.device)
+        self.assertEqual(fix.odometer, 1000.0)
+
+    def test_workers_share_state_through_redis(self):
+        """Fixes of one device handled by different processes continue the same odometer."""
+        client = KeyValueClient()
+        reset_redis_client(client)
+        self.addCleanup(reset_redis_client)
+        worker_a, worker_b = OdometerStage(), OdometerStage()
+
+        worker_a.process(self.fix(0, 19.0, speed=40), self.device)
+        worker_b.process(self.fix(60, 19.005, speed=40), Mock(odometer=0))
+        fix = self.fix(120, 19.01, speed=40)
+        worker_a.process(fix, self.device)
+
+        expected = 1000.0 + haversine_distance(19.0, -99.0, 19.01, -99.0)
+        self.assertAlmostEqual(fix.odometer, expected)
+        self.assertAlmostEqual(worker_b.get_odometer(1), expected)
+
+    def test_concurrent_update_is_retried(self):
+        """A fix committed by another process meanwhile is measured against, not overwritten."""
+        client = KeyValueClient()
+        reset_redis_client(client)
+        self.addCleanup(reset_redis_client)
+        worker_a, worker_b = OdometerStage(), OdometerStage()
+        worker_a.process(self.fix(0, 19.0, speed=40), self.device)
+
+        client.before_commit = lambda: worker_b.process(self.fix(60, 19.005, speed=40), self.device)
+        fix = self.fix(120, 19.01, speed=40)
+        worker_a.process(fix, self.device)
+
+        expected = 1000.0 + haversine_distance(19.0, -99.0, 19.01, -99.0)
+        self.assertAlmostEqual(fix.odometer, expected)
+        self.assertAlmostEqual(worker_a.get_odometer(1), expected)
+
+
+class IngestPipelineTest(SimpleTestCase):
+    """Test cases for the pipeline runner."""
+
+    def test_runs_stages_and_buffers_state(self):
+        """Each fix goes through every stage and into the state buffer."""
+        stage = Mock()
+        buffer = Mock()
+        pipeline = IngestPipeline(stages=[stage], state_buffer=buffer)
+        fix = Fix(imei=1, timestamp=timezone.now(), latitude=19.0, longitude=-99.0)
+
+        pipeline.process(fix)
+
+        stage.process.assert_called_once_with(fix, None)
+        buffer.add.assert_called_once_with(fix)
+
+    def test_failing_stage_does_not_block(self):
+        """A stage raising an exception is skipped."""
+        broken = Mock()
+        broken.process.side_effect = RuntimeError('boom')
+        after = Mock()
+        pipeline = IngestPipeline(stages=[broken, after], state_buffer=Mock())
+        fix = Fix(imei=1, timestamp=timezone.now(), latitude=19.0, longitude=-99.0)
+
+        pipeline.process(fix)
+
+        after.process.assert_called_once_with(fix, None)
+
+
+class RecentFixStageTest(SimpleTestCase):
+    """Test cases for RecentFixStage."""
+
+    def test_only_trail_fixes(self):
+        """Fixes not stored as trail events do not reach the buffer."""
+        buffer = Mock()
+        stage = RecentFixStage(buffer)
+        now = timezone.now()
+        stage.process(Fix(imei=1, timestamp=now, latitude=19.0, longitude=-99.0, trail=False))
+        stage.process(Fix(imei=1, timestamp=now, latitude=19.0, longitude=-99.0, speed=40))
+        buffer.add.assert_called_once_with(1, now, 19.0, -99.0, 40, 0)
+
+
+class DeviceStateBufferTest(SimpleTestCase):
+    """Test cases for the batched device state writer."""
+
+    def test_write_guards_and_odometer(self):
+        """Only older rows are updated, and a missing odometer is not written as 0."""
+        now = timezone.now()
+        fixes = [
+            Fix(imei=1, timestamp=now, latitude=19.0, longitude=-99.0, odometer=1500.0),
+            Fix(imei=2, timestamp=now, latitude=19.1, longitude=-99.1),
+        ]
+        model = Mock(side_effect=lambda imei: SimpleNamespace(imei=imei))
+        queryset = model.objects.filter.return_value
+        queryset.bulk_update.return_value = 1
+
+        self.assertEqual(DeviceStateBuffer(batch_size=10)._write(model, fixes), 2)
+
+        guard = str(GPSDevice.objects.filter(model.objects.filter.call_args.args[0]).query)
+        self.assertIn('"last_log" IS NULL OR', guard)
+        self.assertIn('"last_log" < (CASE WHEN "gps_gpsdevice"."imei" = 1', guard)
+        (with_odometer, fields), (without_odometer, other_fields) = [
+            call.args for call in queryset.bulk_update.call_args_list
+        ]
+        self.assertEqual([d.odometer for d in with_odometer], [1500.0])
+        self.assertIn('odometer', fields)
+        self.assertEqual([d.imei for d in without_odometer], [2])
+        self.assertNotIn('odometer', other_fields)
+
+
+@patch('skyguard.apps.gps.services.geofence_index.cache')
+class GeofenceStageTest(SimpleTestCase):
+    """Test cases for streaming geofence detection."""
+
+    def setUp(self):
+        """Set up a stage over one unit-square fence assigned to device 1."""
+        index = GeofenceIndex(check_interval=3600)
+        index.build([SimpleNamespace(id=7, geometry=Polygon.from_bbox((0, 0, 1, 1)))], [(7, 1)])
+        self.state_cache = Mock()
+        self.state_cache.get_states.return_value = {7: GeofenceState(inside=False, since=0.0)}
+        self.stage = GeofenceStage(index=index, state_cache=self.state_cache,
+                                   config={'batch_size': 1000, 'flush_interval': 3600})
+        self.start = timezone.make_aware(datetime(2024, 1, 1, 12, 0, 0))
+
+    def fix(self, seconds, longitude, latitude):
+        return Fix(imei=1, timestamp=self.start + timedelta(seconds=seconds),
+                   latitude=latitude, longitude=longitude)
+
+    def test_entry_on_arrival(self, cache):
+        """A fix inside the fence produces an ENTRY."""
+        self.stage.process(self.fix(0, 0.5, 0.5))
+        self.assertEqual([e['event_type'] for e in self.stage._pending_events], ['ENTRY'])
+
+    def test_crossing_between_samples(self, cache):
+        """Passing through the fence between two fixes produces ENTRY and EXIT."""
+        self.stage.process(self.fix(0, -1.0, 0.5))
+        self.stage.process(self.fix(300, 2.0, 0.5))
+        events = self.stage._pending_events
+        self.assertEqual([e['event_type'] for e in events], ['ENTRY', 'EXIT'])
+        self.assertEqual(events[0]['timestamp'], self.start + timedelta(seconds=100))
+        self.assertAlmostEqual(events[1]['longitude'], 1.0)
+
+    def test_no_change_skips_state_lookup(self, cache):
+        """Fixes that stay outside without crossing do not touch the state cache."""
+        self.stage.process(self.fix(0, -1.0, 0.5))
+        self.stage.process(self.fix(60, -2.0, 0.5))
+        self.state_cache.get_states.assert_called_once()
+
+    def test_quick_crossings_are_not_debounced(self, cache):
+        """Crossings of fixes seconds apart are all recorded and later fixes still checked."""
+        for seconds, longitude in ((0, -1.0), (10, 2.0), (20, 3.0), (600, 4.0)):
+            self.stage.process(self.fix(seconds, longitude, 0.5))
+        self.stage.process(self.fix(630, 0.5, 0.5))
+        self.stage.process(self.fix(640, 2.0, 0.5))
+        self.assertEqual([e['event_type'] for e in self.stage._pending_events], ['ENTRY', 'EXIT', 'ENTRY', 'EXIT'])
+
+    def test_debounced_fix_is_checked_again(self, cache):
+        """A change ignored by the debounce is recorded by a later fix."""
+        self.state_cache.get_states.return_value = {
+            7: GeofenceState(inside=True, since=self.start.timestamp())
+        }
+        self.stage.process(self.fix(10, 2.0, 0.5))
+        self.stage.process(self.fix(20, 3.0, 0.5))
+        self.assertEqual(self.stage._pending_events, [])
+        self.stage.process(self.fix(40, 3.5, 0.5))
+        self.assertEqual([e['event_type'] for e in self.stage._pending_events], ['EXIT'])
+
+    @patch('skyguard.apps.gps.tasks.process_geofence_transitions')
+    @patch('skyguard.apps.gps.models.GeoFenceEvent.objects')
+    def test_pending_event_written_after_interval(self, events, transitions, cache):
+        """A buffered transition is written once the interval passes, with no further transitions."""
+        with patch('skyguard.apps.gps.pipeline.geofence.time.monotonic', return_value=0.0):
+            self.stage = GeofenceStage(index=self.stage.index, state_cache=self.state_cache,
+                                       config={'batch_size': 1000, 'flush_interval': 5})
+            self.stage.process(self.fix(0, 0.5, 0.5))
+        events.bulk_create.assert_not_called()
+
+        with patch('skyguard.apps.gps.pipeline.geofence.time.monotonic', return_value=10.0):
+            # Still inside: the early return path
+            self.stage.process(self.fix(60, 0.6, 0.5))
+        events.bulk_create.assert_called_once()
+        self.state_cache.set_many.assert_called_once()
+        self.assertEqual(self.stage._pending_events, [])
+
+        with patch('skyguard.apps.gps.pipeline.geofence.time.monotonic', return_value=10.0):
+            self.stage.process(self.fix(120, 2.0, 0.5))
+        with patch('skyguard.apps.gps.pipeline.geofence.time.monotonic', return_value=20.0):
+            # No fix at all: the periodic flush of the pipeline
+            IngestPipeline(stages=[self.stage], state_buffer=Mock()).flush_if_due()
+        self.assertEqual(events.bulk_create.call_count, 2)
@@ -0,0 +1,134 @@
+"""
+Unit tests for fleet playback keyframes.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase
+
+from skyguard.apps.gps.services.playback import (
+    FleetPlaybackService, fleet_state, next_keyframe, pack_fixes, to_fixes, unpack_fixes
+)
+
+START = datetime(2024, 1, 1, 12, 0, tzinfo=dt_timezone.utc)
+ORIGIN = START.timestamp()
+
+
+def fixes(*rows):
+    """Fixes from (imei, seconds from START, latitude, longitude, speed, course)."""
+    return to_fixes([(imei, ORIGIN + t, lat, lon, speed, course)
+                     for imei, t, lat, lon, speed, course in rows], ORIGIN)
+
+
+class FixEncodingTest(SimpleTestCase):
+    """Test cases for the packed fix format."""
+
+    def test_round_trip(self):
+        """Packed fixes decode to the same values at microdegree precision."""
+        packed = unpack_fixes(pack_fixes(fixes((860000000000001, 30, 19.4326071, -99.1332, 42.37, 359.96))))
+        self.assertEqual(packed['imei'][0], 860000000000001)
+        self.assertEqual(packed['time'][0], 30)
+        self.assertEqual(packed['latitude'][0], 19432607)
+        self.assertEqual(packed['longitude'][0], -99133200)
+        self.assertEqual(packed['speed'][0], 424)
+        self.assertEqual(packed['course'][0], 0)
+
+    def test_empty(self):
+        """Empty rows and blobs decode to empty arrays."""
+        self.assertEqual(len(unpack_fixes(pack_fixes(fixes()))), 0)
+        self.assertEqual(len(unpack_fixes(b'')), 0)
+
+
+class KeyframeTest(SimpleTestCase):
+    """Test cases for keyframe chaining and fleet state."""
+
+    def test_next_keyframe(self):
+        """The next keyframe keeps the last fix per device and drops silent devices."""
+        keyframe = fixes((1, -50, 19.0, -99.0, 0, 0), (2, -5000, 19.0, -99.0, 0, 0))
+        deltas = fixes((1, 100, 19.1, -99.0, 0, 0), (1, 500, 19.2, -99.0, 0, 0), (3, 20, 19.3, -99.0, 0, 0))
+        result = next_keyframe(keyframe, deltas, 600, max_age=3600)
+        self.assertEqual(result['imei'].tolist(), [1, 3])
+        self.assertEqual(result['time'].tolist(), [-100, -580])
+        self.assertEqual(result['latitude'].tolist(), [19200000, 19300000])
+
+    def test_interpolation(self):
+        """Positions are interpolated between the surrounding fixes."""
+        keyframe = fixes((1, -10, 19.0, -99.0, 20, 350))
+        deltas = fixes((1, 90, 19.1, -99.2, 40, 10))
+        state = fleet_state(START, keyframe, deltas, START + timedelta(seconds=40), max_gap=300)
+        self.assertEqual(len(state), 1)
+        self.assertTrue(state[0]['interpolated'])
+        self.assertAlmostEqual(state[0]['latitude'], 19.05)
+        self.assertAlmostEqual(state[0]['longitude'], -99.1)
+        self.assertAlmostEqual(state[0]['speed'], 30.0)
+        self.assertAlmostEqual(state[0]['course'], 0.0)
+        self.assertEqual(state[0]['fix_time'], (START - timedelta(seconds=10)).isoformat())
+
+    def test_gaps_and_unseen_devices(self):
+        """Long gaps hold the last fix; devices first seen later are absent."""
+        keyframe = fixes((1, -400, 19.0, -99.0, 0, 0))
+        deltas = fixes((1, 100, 19.1, -99.0, 0, 0), (2, 200, 19.5, -99.5, 0, 0))
+        state = fleet_state(START, keyframe, deltas, START + timedelta(seconds=50), max_gap=300)
+        self.assertEqual([device['imei'] for device in state], [1])
+        self.assertFalse(state[0]['interpolated'])
+        self.assertAlmostEqual(state[0]['latitude'], 19.0)
+
+
+@patch('skyguard.apps.gps.services.playback.FleetKeyframe')
+@patch('skyguard.apps.gps.services.playback.timezone.now', return_value=START)
+class UpdateTest(SimpleTestCase):
+    """Test cases for the incremental timeline maintenance."""
+
+    def setUp(self):
+        self.source = MagicMock(last_id=0, gaps=[])
+        self.timeline = MagicMock(resume_at=None)
+        self.rows = []
+        self.late = []
+        events = MagicMock()
+        events.aggregate.return_value = {'last_id': 500}
+
+        def rows(*args, **kwargs):
+            queryset = MagicMock()
+            if args:  # the gap lookup
+                queryset.values_list.return_value = self.late
+            else:
+                new = [row for row in self.rows if row[0] > kwargs['id__gt']]
+                queryset.order_by.return_value.values_list.return_value.__getitem__.return_value = new
+            return queryset
+
+        events.annotate.return_value.filter.side_effect = rows
+        patch('skyguard.apps.gps.services.playback.GPSEvent').start().objects = events
+        patch('skyguard.apps.gps.services.playback.transaction').start()
+        watermarks = patch('skyguard.apps.gps.services.playback.RollupWatermark').start()
+        self.addCleanup(patch.stopall)
+        watermarks.objects.get_or_create.side_effect = lambda name: (
+            self.source if name == 'playback_events' else self.timeline, False
+        )
+        self.service = FleetPlaybackService({'interval': 600, 'lag': 120, 'backfill': 3600, 'max_intervals': 100})
+        self.service.build_interval = MagicMock()
+
+    def test_first_run_backfills_window(self, now, keyframes):
+        """The first run builds the backfill window and starts at the newest event id."""
+        keyframes.objects.filter.return_value.delete.return_value = (0, {})
+        self.rows = [(400, START - timedelta(days=3), True)]
+        self.service.update()
+        self.assertEqual(self.service.build_interval.call_args_list[0][0][0], START - timedelta(hours=1))
+        self.assertEqual(self.service.build_interval.call_count, 5)
+        self.assertEqual(self.source.last_id, 500)
+        self.assertEqual(self.timeline.resume_at, START - timedelta(minutes=10))
+
+    def test_late_rows_rewind(self, now, keyframes):
+        """Rows committed after the watermark passed their id still rewind the timeline."""
+        keyframes.objects.filter.return_value.delete.return_value = (0, {})
+        self.source.last_id = 10
+        self.timeline.resume_at = START - timedelta(minutes=10)
+        self.rows = [(11, START - timedelta(minutes=12), True), (13, START - timedelta(minutes=11), False)]
+        self.service.update()
+        self.assertEqual(self.source.last_id, 13)
+        self.assertEqual([gap[:2] for gap in self.source.gaps], [[12, 12]])
+        self.assertEqual(self.service.build_interval.call_count, 1)
+
+        self.late = [(12, START - timedelta(hours=2), True)]
+        self.service.update()
+        self.assertEqual(self.source.gaps, [])
+        self.assertEqual(self.service.build_interval.call_args_list[1][0][0], START - timedelta(hours=2))
@@ -0,0 +1,194 @@
+"""
+Unit tests for the recent-fix buffer.
+"""
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from skyguard.apps.gps.services.recent_fixes import RecentFixBuffer
+
+
+@patch('skyguard.apps.gps.services.recent_fixes.get_redis_client', return_value=None)
+class LocalRecentFixBufferTest(SimpleTestCase):
+    """Test cases for the in-process recent-fix store."""
+
+    def setUp(self):
+        """Set up a small buffer and a reference time."""
+        self.buffer = RecentFixBuffer({'max_points': 5, 'max_age_hours': 1})
+        self.now = timezone.now()
+
+    def add(self, minutes_ago, latitude=19.0):
+        self.buffer.add(1, self.now - timedelta(minutes=minutes_ago), latitude, -99.0, 40, 90)
+
+    def test_empty_buffer(self, _):
+        """A device never seen has no fixes and no complete-from marker."""
+        fixes, complete_from = self.buffer.get_window(1, self.now - timedelta(hours=1))
+        self.assertEqual(fixes, [])
+        self.assertIsNone(complete_from)
+
+    def test_window_sorted_and_bounded(self, _):
+        """Out-of-order fixes come back sorted and limited to the window."""
+        for minutes in (10, 30, 20, 5):
+            self.add(minutes)
+        fixes, _ = self.buffer.get_window(1, self.now - timedelta(minutes=25),
+                                          self.now - timedelta(minutes=8))
+        self.assertEqual([f.timestamp for f in fixes],
+                         [self.now - timedelta(minutes=20), self.now - timedelta(minutes=10)])
+
+    def test_complete_from_is_first_fix(self, _):
+        """The buffer is complete from the first fix it received."""
+        self.add(30)
+        self.add(10)
+        _, complete_from = self.buffer.get_window(1, self.now - timedelta(hours=1))
+        self.assertAlmostEqual(complete_from.timestamp(),
+                               (self.now - timedelta(minutes=30)).timestamp(), places=3)
+
+    def test_trims_to_max_points(self, _):
+        """Only the newest ``max_points`` fixes are kept once full."""
+        for minutes in range(10, 0, -1):
+            self.add(minutes)
+        fixes, complete_from = self.buffer.get_window(1, self.now - timedelta(hours=1))
+        self.assertEqual(len(fixes), 5)
+        self.assertEqual(complete_from, fixes[0].timestamp)
+
+    def test_drops_fixes_older_than_max_age(self, _):
+        """Fixes beyond the age limit are discarded."""
+        self.add(90)
+        self.add(5)
+        fixes, complete_from = self.buffer.get_window(1, self.now - timedelta(hours=2))
+        self.assertEqual(len(fixes), 1)
+        self.assertGreater(complete_from, self.now - timedelta(minutes=61))
+
+
+class SortedSetClient:
+    """In-memory stand-in for the Redis commands the recent-fix store uses."""
+
+    def __init__(self):
+        self.zsets = {}
+        self.strings = {}
+        self.fail = False
+
+    def pipeline(self, transaction=True):
+        return SortedSetPipeline(self)
+
+    def exists(self, key):
+        return int(key in self.zsets or key in self.strings)
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zremrangebyscore(self, key, low, high):
+        members = self.zsets.get(key, {})
+        for member, score in list(members.items()):
+            if score <= high:
+                del members[member]
+
+    def zremrangebyrank(self, key, start, stop):
+        ordered = self._ordered(key)
+        for member, _ in ordered[:max(0, len(ordered) + stop + 1)]:
+            del self.zsets[key][member]
+
+    def zrangebyscore(self, key, low, high):
+        high = float('inf') if high == '+inf' else high
+        return [member for member, score in self._ordered(key) if low <= score <= high]
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def zrange(self, key, start, stop, withscores=False):
+        return self._ordered(key)[start:stop + 1]
+
+    def set(self, key, value, nx=False, ex=None):
+        if not (nx and key in self.strings):
+            self.strings[key] = str(value).encode()
+
+    def get(self, key):
+        return self.strings.get(key)
+
+    def expire(self, key, seconds):
+        pass
+
+    def delete(self, *keys):
+        for key in keys:
+            self.zsets.pop(key, None)
+            self.strings.pop(key, None)
+
+    def _ordered(self, key):
+        return sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1])
+
+
+class SortedSetPipeline:
+    """Queues calls and runs them on ``execute``."""
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        if self.client.fail:
+            raise ConnectionError('redis down')
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class RedisRecentFixBufferTest(SimpleTestCase):
+    """Test cases for the Redis recent-fix store and its complete-from marker."""
+
+    def setUp(self):
+        """Set up a buffer over the in-memory client."""
+        self.client = SortedSetClient()
+        patcher = patch('skyguard.apps.gps.services.recent_fixes.get_redis_client', return_value=self.client)
+        self.get_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.buffer = RecentFixBuffer({'max_points': 5, 'max_age_hours': 1})
+        self.now = timezone.now()
+
+    def add(self, minutes_ago):
+        self.buffer.add(1, self.now - timedelta(minutes=minutes_ago), 19.0, -99.0, 40, 90)
+
+    def complete_from(self):
+        fixes, complete_from = self.buffer.get_window(1, self.now - timedelta(hours=1))
+        return [round((self.now - f.timestamp).total_seconds() / 60) for f in fixes], complete_from
+
+    def test_window_and_marker(self):
+        """Fixes come back sorted and complete from the first one."""
+        for minutes in (30, 10, 20):
+            self.add(minutes)
+        minutes, complete_from = self.complete_from()
+        self.assertEqual(minutes, [30, 20, 10])
+        self.assertAlmostEqual(complete_from.timestamp(), (self.now - timedelta(minutes=30)).timestamp(), places=3)
+
+    def test_marker_moves_after_failed_write(self):
+        """A fix that never reached Redis moves the marker to the next stored fix."""
+        self.add(30)
+        self.client.fail = True
+        with self.assertRaises(ConnectionError):
+            self.add(20)
+        self.client.fail = False
+        self.add(10)
+        minutes, complete_from = self.complete_from()
+        self.assertEqual(minutes, [30, 10])
+        self.assertAlmostEqual(complete_from.timestamp(), (self.now - timedelta(minutes=10)).timestamp(), places=3)
+
+    def test_marker_moves_after_fallback(self):
+        """Fixes kept in-process while Redis was unreachable count as missed."""
+        self.add(30)
+        self.get_client.return_value = None
+        self.add(20)
+        self.get_client.return_value = self.client
+        self.add(10)
+        _, complete_from = self.complete_from()
+        self.assertAlmostEqual(complete_from.timestamp(), (self.now - timedelta(minutes=10)).timestamp(), places=3)
+
+    def test_marker_moves_after_eviction(self):
+        """When the fixes are evicted but the marker is not, the buffer restarts."""
+        self.add(30)
+        self.client.zsets.clear()
+        self.add(10)
+        minutes, complete_from = self.complete_from()
+        self.assertEqual(minutes, [10])
+        self.assertAlmostEqual(complete_from.timestamp(), (self.now - timedelta(minutes=10)).timestamp(), places=3)
@@ -0,0 +1,104 @@
+"""
+Unit tests for the tagged response cache.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from skyguard.apps.gps.response_cache import (
+    cache_response, etag_matches, invalidate_tags, response_cache
+)
+
+calls = []
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([AllowAny])
+@cache_response('test-fences', tags=('fences:user:{user}', 'fence:{pk}'))
+def fence_view(request, pk):
+    calls.append(request.method)
+    if request.GET.get('fail'):
+        return Response({'error': 'bad'}, status=400)
+    return Response({'pk': pk, 'user': request.user.pk, 'calls': len(calls)})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ResponseCacheTest(SimpleTestCase):
+    """Test cases for ResponseCache and the cache_response decorator."""
+
+    def setUp(self):
+        cache.clear()
+        calls.clear()
+        self.factory = APIRequestFactory()
+
+    def get(self, user_id=3, pk=1, etag=None, **params):
+        request = self.factory.get('/fences/', params, **({'HTTP_IF_NONE_MATCH': etag} if etag else {}))
+        force_authenticate(request, user=User(id=user_id))
+        return fence_view(request, pk=pk)
+
+    def test_fetch_and_invalidate(self):
+        """Entries are rebuilt only after one of their tags is invalidated."""
+        build = iter(range(10)).__next__
+        first = response_cache.fetch('counter', 3, {'a': 1}, ('x', 'y'), build)
+        self.assertEqual(response_cache.fetch('counter', 3, {'a': 1}, ('x', 'y'), build).data, first.data)
+        self.assertNotEqual(response_cache.fetch('counter', 4, {'a': 1}, ('x', 'y'), build).data, first.data)
+        invalidate_tags('z')
+        self.assertEqual(response_cache.fetch('counter', 3, {'a': 1}, ('x', 'y'), build).etag, first.etag)
+        invalidate_tags('y')
+        again = response_cache.fetch('counter', 3, {'a': 1}, ('x', 'y'), build)
+        self.assertNotEqual(again.data, first.data)
+        self.assertNotEqual(again.etag, first.etag)
+
+    def test_decorator_caches_per_user_and_params(self):
+        """GET responses are served from the cache per user, parameters and tags."""
+        first = self.get()
+        self.assertEqual(first.data['calls'], 1)
+        self.assertIn('private', first['Cache-Control'])
+        self.assertEqual(self.get()['ETag'], first['ETag'])
+        self.assertEqual(self.get().data['calls'], 1)
+        self.assertEqual(self.get(user_id=4).data['calls'], 2)
+        self.assertEqual(self.get(pk=2).data['calls'], 3)
+        self.assertEqual(self.get(page=2).data['calls'], 4)
+
+        invalidate_tags('fence:1')
+        self.assertEqual(self.get().data['calls'], 5)
+        invalidate_tags('fences:user:4')
+        self.assertEqual(self.get().data['calls'], 5)
+        self.assertEqual(self.get(user_id=4).data['calls'], 6)
+
+    def test_not_modified(self):
+        """A matching If-None-Match gets a 304 without running the view."""
+        etag = self.get()['ETag']
+        response = self.get(etag=f'"other", {etag}')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.get(etag='"other"').status_code, 200)
+
+    def test_only_successful_gets(self):
+        """Errors and other methods bypass the cache."""
+        self.get(fail=1)
+        self.get(fail=1)
+        request = self.factory.post('/fences/')
+        force_authenticate(request, user=User(id=3))
+        fence_view(request, pk=1)
+        fence_view(request, pk=1)
+        self.assertEqual(calls, ['GET', 'GET', 'POST', 'POST'])
+
+    @override_settings(GPS_RESPONSE_CACHE={'enabled': False})
+    def test_disabled(self):
+        """Every request runs the view when the cache is disabled."""
+        self.get()
+        self.assertEqual(self.get().data['calls'], 2)
+
+    def test_etag_matches(self):
+        """ETags compare weakly and ``*`` matches anything."""
+        request = self.factory.get('/', HTTP_IF_NONE_MATCH='"abc"')
+        self.assertTrue(etag_matches(request, 'W/"abc"'))
+        self.assertFalse(etag_matches(request, 'W/"abd"'))
+        self.assertTrue(etag_matches(self.factory.get('/', HTTP_IF_NONE_MATCH='*'), 'W/"abc"'))
+        self.assertFalse(etag_matches(self.factory.get('/'), 'W/"abc"'))
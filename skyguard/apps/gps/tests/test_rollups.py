@@ -0,0 +1,150 @@
+"""
+Unit tests for the incremental telemetry rollups.
+"""
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase
+
+from skyguard.apps.gps.services.rollups import (
+    TelemetryRollupService, find_gaps, hour_bucket, remaining_gaps
+)
+
+UTC = dt_timezone.utc
+
+
+def rollup_row(device_id, **values):
+    """A row of ``values('device_id').annotate(...)`` over rollups."""
+    row = dict(TelemetryRollupService._empty_summary(), device_id=device_id)
+    row.update(values)
+    return row
+
+
+class BucketTest(SimpleTestCase):
+    """Test cases for hour bucketing."""
+
+    def test_hour_bucket_is_utc(self):
+        """Timestamps in any zone land in the UTC hour that contains them."""
+        local = datetime(2024, 3, 1, 0, 59, 59, tzinfo=dt_timezone(timedelta(hours=-6)))
+        self.assertEqual(hour_bucket(local), datetime(2024, 3, 1, 6, tzinfo=UTC))
+
+
+class GapTest(SimpleTestCase):
+    """Test cases for the skipped-id bookkeeping of the watermarks."""
+
+    def test_find_gaps(self):
+        """Ids skipped while reading are recorded as ranges."""
+        self.assertEqual(find_gaps(10, [11, 12, 15, 20], 100.0), [[13, 14, 100.0], [16, 19, 100.0]])
+        self.assertEqual(find_gaps(10, [11, 12], 100.0), [])
+
+    def test_remaining_gaps(self):
+        """Found ids split their gap, expired gaps are dropped, too many are merged."""
+        gaps = [[13, 19, 100.0], [30, 30, 50.0]]
+        self.assertEqual(remaining_gaps(gaps, [13, 16], 120.0, 60, 10), [[14, 15, 100.0], [17, 19, 100.0]])
+        self.assertEqual(remaining_gaps(gaps, [], 160.0, 60, 10), [])
+        self.assertEqual(remaining_gaps(gaps, [16], 120.0, 600, 2), [[13, 30, 100.0]])
+
+
+class WatermarkTest(SimpleTestCase):
+    """Test cases for reading new and late source rows."""
+
+    def setUp(self):
+        self.hour = datetime(2024, 3, 1, 12, tzinfo=UTC)
+        self.rows = [(11, 1, self.hour), (14, 2, self.hour)]
+        self.late = [(12, 3, self.hour - timedelta(hours=5))]
+        model = MagicMock()
+
+        def rows(*args, **kwargs):
+            queryset = MagicMock()
+            if args:  # the gap lookup
+                queryset.values_list.return_value = self.late
+            else:
+                new = [row for row in self.rows if row[0] > kwargs['id__gt']]
+                queryset.order_by.return_value.values_list.return_value.__getitem__.return_value = new
+            return queryset
+
+        model.objects.filter.side_effect = rows
+        self.service = TelemetryRollupService()
+        self.service.SOURCES = {'location': model}
+        self.watermark = MagicMock(last_id=10, gaps=[])
+
+    def collect(self):
+        with patch('skyguard.apps.gps.services.rollups.RollupWatermark') as watermarks:
+            watermarks.objects.get_or_create.return_value = (self.watermark, False)
+            return self.service._collect_touched_buckets()
+
+    def test_late_rows_are_picked_up(self):
+        """A row committed after the watermark passed its id is folded in on the next run."""
+        touched, changed = self.collect()
+        self.assertEqual(touched, {(1, self.hour), (2, self.hour)})
+        self.assertEqual(self.watermark.last_id, 14)
+        self.assertEqual([gap[:2] for gap in self.watermark.gaps], [[12, 13]])
+
+        touched, changed = self.collect()
+        self.assertEqual(touched, {(3, self.hour - timedelta(hours=5))})
+        self.assertEqual(changed, [self.watermark])
+        self.assertEqual([gap[:2] for gap in self.watermark.gaps], [[13, 13]])
+
+    def test_nothing_new(self):
+        """Without new rows or gaps nothing is touched or saved."""
+        self.rows = []
+        self.assertEqual(self.collect(), (set(), []))
+
+
+@patch('skyguard.apps.gps.services.rollups.DeviceDailyRollup')
+@patch('skyguard.apps.gps.services.rollups.DeviceHourlyRollup')
+class SummarizeTest(SimpleTestCase):
+    """Test cases for re-aggregating rollups over a range."""
+
+    def test_days_and_edge_hours(self, hourly, daily):
+        """Whole days come from daily rows, the edges from hourly rows, and are merged."""
+        ranges = []
+
+        def queryset(rows):
+            result = MagicMock()
+            result.values.return_value.annotate.return_value = rows
+            return result
+
+        def hourly_range(**kwargs):
+            ranges.append(('hourly', kwargs['bucket__gte'], kwargs['bucket__lt']))
+            start = kwargs['bucket__gte']
+            return queryset([rollup_row(
+                7, distance=100.0, point_count=2, nonzero_speed_count=1, speed_sum=30.0, max_speed=30.0,
+                first_timestamp=start, last_timestamp=start + timedelta(minutes=30),
+            )])
+
+        def daily_range(**kwargs):
+            ranges.append(('daily', kwargs['day__gte'], kwargs['day__lt']))
+            return queryset([rollup_row(7, distance=1000.0, point_count=8, nonzero_speed_count=4,
+                                        speed_sum=200.0, max_speed=90.0)])
+
+        hourly.objects.filter.return_value.filter.side_effect = hourly_range
+        daily.objects.filter.side_effect = daily_range
+
+        start = datetime(2024, 3, 1, 22, 30, tzinfo=UTC)
+        end = datetime(2024, 3, 3, 2, tzinfo=UTC)
+        summary = TelemetryRollupService().summarize_device(7, start, end)
+
+        self.assertEqual(ranges, [
+            ('daily', date(2024, 3, 2), date(2024, 3, 3)),
+            ('hourly', start, datetime(2024, 3, 2, tzinfo=UTC)),
+            ('hourly', datetime(2024, 3, 3, tzinfo=UTC), end),
+        ])
+        self.assertEqual(summary['distance'], 1200.0)
+        self.assertEqual(summary['point_count'], 12)
+        self.assertEqual(summary['max_speed'], 90.0)
+        self.assertAlmostEqual(summary['avg_speed'], 260.0 / 12)
+        self.assertAlmostEqual(summary['avg_nonzero_speed'], 260.0 / 6)
+        self.assertEqual(summary['first_timestamp'], start)
+        self.assertEqual(summary['last_timestamp'], datetime(2024, 3, 3, 0, 30, tzinfo=UTC))
+
+    def test_within_one_day(self, hourly, daily):
+        """A range inside one day reads only hourly rows."""
+        hourly.objects.filter.return_value.filter.return_value.values.return_value.annotate.return_value = []
+        start = datetime(2024, 3, 1, 8, tzinfo=UTC)
+        summary = TelemetryRollupService().summarize_device(7, start, start + timedelta(hours=3))
+        hourly.objects.filter.return_value.filter.assert_called_once_with(
+            bucket__gte=start, bucket__lt=start + timedelta(hours=3)
+        )
+        daily.objects.filter.assert_not_called()
+        self.assertEqual(summary['point_count'], 0)
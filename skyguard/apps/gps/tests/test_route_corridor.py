@@ -0,0 +1,102 @@
+"""
+Unit tests for route corridors and off-route detection.
+"""
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from django.contrib.gis.geos import LineString
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from skyguard.apps.gps.pipeline import Fix, RouteCorridorStage
+from skyguard.apps.gps.services.route_corridor import RouteCorridorIndex
+
+METRE = 1 / 111195.0  # degrees of latitude per metre
+LATITUDE = 19.4
+
+
+@patch('skyguard.apps.gps.services.route_corridor.cache')
+class RouteCorridorIndexTest(SimpleTestCase):
+    """Test cases for corridor distances and zones."""
+
+    def setUp(self):
+        """Set up route 96 along a parallel and route 4 with a wider corridor."""
+        self.index = RouteCorridorIndex(config={'width': 60.0, 'hysteresis': 20.0, 'widths': {4: 200.0}})
+        self.index.build([
+            (96, LineString((-99.2, LATITUDE), (-99.15, LATITUDE), (-99.1, LATITUDE))),
+            (4, [(-99.2, LATITUDE), (-99.1, LATITUDE)]),
+        ])
+
+    def test_distance(self, cache):
+        """Distance to the route is measured in metres to the nearest segment."""
+        self.assertAlmostEqual(self.index.distance(96, -99.15, LATITUDE + 100 * METRE), 100, delta=1)
+        self.assertIsNone(self.index.distance(1, -99.15, LATITUDE))
+
+    def test_classify(self, cache):
+        """Points fall in the inner corridor, the hysteresis band or outside."""
+        self.assertEqual(self.index.classify(96, -99.15, LATITUDE + 10 * METRE), ('inner', None))
+        self.assertEqual(self.index.classify(96, -99.15, LATITUDE + 50 * METRE), ('edge', None))
+        zone, distance = self.index.classify(96, -99.15, LATITUDE + 100 * METRE)
+        self.assertEqual(zone, 'outside')
+        self.assertAlmostEqual(distance, 100, delta=1)
+
+    def test_per_route_width(self, cache):
+        """Route overrides widen the corridor."""
+        self.assertEqual(self.index.classify(4, -99.15, LATITUDE + 100 * METRE), ('inner', None))
+
+
+@patch('skyguard.apps.gps.services.route_corridor.cache')
+class RouteCorridorStageTest(SimpleTestCase):
+    """Test cases for OFF_ROUTE / ON_ROUTE hysteresis."""
+
+    def setUp(self):
+        """Set up a stage for a device on route 96."""
+        index = RouteCorridorIndex(config={'exit_fixes': 2, 'return_fixes': 2})
+        index.build([(96, [(-99.2, LATITUDE), (-99.1, LATITUDE)])])
+        self.stage = RouteCorridorStage(index=index, metadata=lambda: {1: {'route': 96}},
+                                        flush_interval=3600)
+        self.start = timezone.make_aware(datetime(2024, 1, 1, 12, 0, 0))
+        self.seconds = 0
+
+    def feed(self, *offsets):
+        for offset in offsets:
+            self.seconds += 10
+            self.stage.process(Fix(imei=1, timestamp=self.start + timedelta(seconds=self.seconds),
+                                   latitude=LATITUDE + offset * METRE, longitude=-99.15))
+        return [(item['type'], round(item['distance'])) for item in self.stage._pending]
+
+    def test_single_outlier_is_ignored(self, cache):
+        """One fix outside the corridor does not raise an event."""
+        self.assertEqual(self.feed(0, 150, 0, 150, 0), [])
+
+    def test_off_and_back_on_route(self, cache):
+        """Consecutive fixes outside go off route; returning needs the inner corridor."""
+        self.assertEqual(self.feed(0, 150, 200), [('OFF_ROUTE', 200)])
+        # The hysteresis band (40-60 m) keeps the vehicle off route
+        self.assertEqual(len(self.feed(50, 50, 50)), 1)
+        self.assertEqual(self.feed(10, 5)[-1], ('ON_ROUTE', 5))
+
+    def test_devices_without_route_are_skipped(self, cache):
+        """Fixes of devices without a route or corridor produce nothing."""
+        self.stage.metadata = lambda: {1: {'route': None}}
+        self.assertEqual(self.feed(500, 500, 500), [])
+
+    @patch('skyguard.apps.gps.models.GPSEvent')
+    def test_flush_bulk_creates_events(self, event_model, cache):
+        """Pending events are written in one bulk insert."""
+        self.feed(150, 150)
+        self.stage.flush()
+        event_model.objects.bulk_create.assert_called_once()
+        self.assertEqual(len(event_model.objects.bulk_create.call_args.args[0]), 1)
+        self.assertEqual(self.stage._pending, [])
+
+    @patch('skyguard.apps.gps.models.GPSEvent')
+    def test_pending_event_written_after_interval(self, event_model, cache):
+        """A queued event is written by the next fix once the interval passes, even an uneventful one."""
+        self.stage.flush_interval = 5
+        self.feed(150, 150)
+        event_model.objects.bulk_create.assert_not_called()
+        self.stage._last_flush -= 10
+        self.feed(150)
+        event_model.objects.bulk_create.assert_called_once()
+        self.assertEqual(self.stage._pending, [])
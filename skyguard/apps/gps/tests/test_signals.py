@@ -0,0 +1,68 @@
+"""
+Unit tests for the GPS device signal handlers.
+"""
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from skyguard.apps.gps import signals
+from skyguard.apps.gps.models import GPSDevice
+
+
+@patch.object(signals.latest_state_table, 'update_from_device')
+@patch.object(signals, 'invalidate_device_metadata')
+@patch.object(signals, 'invalidate_tags')
+class SyncLatestStateTest(SimpleTestCase):
+    """Test cases for the cache invalidation done on device saves."""
+
+    def make_device(self):
+        return GPSDevice(imei=862170010000001, name='Unidad 7', route=92, economico=7)
+
+    def test_position_only_save_keeps_device_list(self, invalidate_tags, invalidate_metadata, update):
+        """Saving a new position does not invalidate the cached device list."""
+        device = self.make_device()
+        device.speed = 42
+        signals.sync_latest_state(GPSDevice, device, created=False)
+        signals.sync_latest_state(GPSDevice, device, created=False, update_fields={'position', 'last_log'})
+        invalidate_tags.assert_not_called()
+        invalidate_metadata.assert_not_called()
+        self.assertEqual(update.call_count, 2)
+
+    def test_listed_field_change_invalidates_device_list(self, invalidate_tags, invalidate_metadata, update):
+        """Changing a listed attribute invalidates the list once."""
+        device = self.make_device()
+        device.name = 'Unidad 8'
+        signals.sync_latest_state(GPSDevice, device, created=False)
+        invalidate_tags.assert_called_once_with('devices')
+
+        invalidate_tags.reset_mock()
+        signals.sync_latest_state(GPSDevice, device, created=False)
+        invalidate_tags.assert_not_called()
+
+    def test_metadata_change_invalidates_metadata(self, invalidate_tags, invalidate_metadata, update):
+        """Changing a metadata field of an existing device drops the cached metadata."""
+        device = self.make_device()
+        device.is_active = False
+        signals.sync_latest_state(GPSDevice, device, created=False)
+        invalidate_metadata.assert_called_once_with()
+
+        invalidate_metadata.reset_mock()
+        device.serial = 12  # listed, but not part of the metadata
+        signals.sync_latest_state(GPSDevice, device, created=False)
+        invalidate_metadata.assert_not_called()
+        self.assertEqual(invalidate_tags.call_count, 2)
+
+    def test_update_fields_limit_the_comparison(self, invalidate_tags, invalidate_metadata, update):
+        """Fields not written by the save are not treated as changed."""
+        device = self.make_device()
+        device.route = 112
+        signals.sync_latest_state(GPSDevice, device, created=False, update_fields={'speed'})
+        invalidate_tags.assert_not_called()
+        signals.sync_latest_state(GPSDevice, device, created=False, update_fields={'route'})
+        invalidate_tags.assert_called_once_with('devices')
+
+    def test_created_invalidates(self, invalidate_tags, invalidate_metadata, update):
+        """A new device invalidates the lists and the metadata."""
+        signals.sync_latest_state(GPSDevice, self.make_device(), created=True)
+        invalidate_tags.assert_called_once_with('devices')
+        invalidate_metadata.assert_called_once_with()
@@ -0,0 +1,106 @@
+"""
+Unit tests for the vector tile helpers.
+"""
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from skyguard.apps.gps.services.tiles import (
+    MERCATOR_HALF_WIDTH, buffered_lonlat_bounds, get_tile_config, invalidate_tiles, render_tile,
+    simplify_tolerance, tile_bounds, tile_cache_key, tile_lonlat_bounds, tile_query, validate_tile
+)
+
+STAFF = SimpleNamespace(pk=1, is_staff=True)
+USER = SimpleNamespace(pk=7, is_staff=False)
+
+
+class TileGeometryTest(SimpleTestCase):
+    """Test cases for tile bounds and tolerances."""
+
+    def test_bounds(self):
+        """Zoom 0 covers the mercator square; tiles split it top-down."""
+        self.assertEqual(tile_bounds(0, 0, 0), (-MERCATOR_HALF_WIDTH, -MERCATOR_HALF_WIDTH,
+                                                 MERCATOR_HALF_WIDTH, MERCATOR_HALF_WIDTH))
+        xmin, ymin, xmax, ymax = tile_bounds(1, 1, 0)
+        self.assertEqual((xmin, ymin), (0, 0))
+        west, south, east, north = tile_lonlat_bounds(1, 1, 0)
+        self.assertEqual((west, east), (0, 180))
+        self.assertAlmostEqual(south, 0)
+        self.assertAlmostEqual(north, 85.0511287798)
+
+    def test_buffered_bounds(self):
+        """The margin is in metres on the ground and stays on the globe."""
+        west, south, east, north = tile_lonlat_bounds(12, 900, 1800)
+        buffered = buffered_lonlat_bounds(12, 900, 1800, 1113.2)
+        self.assertAlmostEqual(buffered[1], south - 0.01)
+        self.assertAlmostEqual(buffered[3], north + 0.01)
+        self.assertGreater(buffered[2] - east, 0.01)
+        self.assertEqual(buffered_lonlat_bounds(0, 0, 0, 5000)[::2], (-180, 180))
+
+    def test_validate(self):
+        """Tiles outside the zoom range or the grid are rejected."""
+        validate_tile(3, 7, 7)
+        for z, x, y in ((3, 8, 0), (3, 0, -1), (23, 0, 0), (-1, 0, 0)):
+            with self.assertRaises(ValueError):
+                validate_tile(z, x, y)
+
+    def test_tolerance_halves_per_zoom(self):
+        """The simplification tolerance is one 256 px pixel at each zoom."""
+        config = get_tile_config()
+        self.assertAlmostEqual(simplify_tolerance(0, config), 2 * MERCATOR_HALF_WIDTH / 256)
+        self.assertAlmostEqual(simplify_tolerance(12, config), simplify_tolerance(11, config) / 2)
+
+    @override_settings(GPS_TILES={'extent': 512, 'layers': {'trails': {'min_zoom': 14}}})
+    def test_config_merges_layers(self):
+        """Layer overrides keep the other layer defaults."""
+        config = get_tile_config()
+        self.assertEqual(config['extent'], 512)
+        self.assertEqual(config['layers']['trails'], {'min_zoom': 14, 'cache_ttl': 30})
+        self.assertEqual(config['layers']['positions']['cache_ttl'], 5)
+
+
+class TileQueryTest(SimpleTestCase):
+    """Test cases for the layer SQL."""
+
+    def test_trails_read_only_fixes_near_the_tile(self):
+        """Fixes are filtered on the buffered tile before the lines are aggregated."""
+        sql, params = tile_query('trails', STAFF, 12, 900, 1800)
+        where = sql[sql.index(' WHERE '):sql.index(' GROUP BY ')]
+        self.assertIn('"gps_gpsevent"."position" &&', where)
+
+    def test_epochs_are_integers(self):
+        """Epoch properties are cast so ST_AsMVT writes them as numbers."""
+        sql, params = tile_query('positions', STAFF, 12, 900, 1800)
+        self.assertRegex(sql, r'EXTRACT\(EPOCH FROM .*\)::bigint AS "last_log_epoch"')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TileCacheTest(SimpleTestCase):
+    """Test cases for tile cache keys and invalidation."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_scopes(self):
+        """Staff share tiles; other users get their own."""
+        self.assertEqual(tile_cache_key('overlays', STAFF, 3, 1, 2),
+                         tile_cache_key('overlays', SimpleNamespace(pk=2, is_staff=True), 3, 1, 2))
+        self.assertNotEqual(tile_cache_key('overlays', STAFF, 3, 1, 2), tile_cache_key('overlays', USER, 3, 1, 2))
+
+    def test_invalidation(self):
+        """Invalidating a layer changes its keys and leaves the others alone."""
+        fences, overlays = tile_cache_key('geofences', USER, 5, 1, 1), tile_cache_key('overlays', USER, 5, 1, 1)
+        positions = tile_cache_key('positions', USER, 5, 1, 1)
+        invalidate_tiles('geofences')
+        self.assertNotEqual(tile_cache_key('geofences', USER, 5, 1, 1), fences)
+        self.assertEqual(tile_cache_key('overlays', USER, 5, 1, 1), overlays)
+        self.assertEqual(tile_cache_key('positions', USER, 5, 1, 1), positions)
+
+    def test_render_checks(self):
+        """Unknown layers are rejected and tiles below the layer's zoom are empty."""
+        with self.assertRaises(ValueError):
+            render_tile('vehicles', USER, 0, 0, 0)
+        self.assertEqual(render_tile('trails', USER, 4, 0, 0), b'')
+        cache.set(tile_cache_key('overlays', USER, 4, 0, 0), b'\x1a\x02')
+        self.assertEqual(render_tile('overlays', USER, 4, 0, 0), b'\x1a\x02')
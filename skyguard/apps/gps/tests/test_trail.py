@@ -0,0 +1,71 @@
+"""
+Unit tests for trail simplification and polyline encoding.
+"""
+import numpy as np
+from django.test import SimpleTestCase
+
+from skyguard.apps.gps.services.trail import (
+    decode_polyline, douglas_peucker, encode_polyline, project, simplify, tolerance_for_zoom, visvalingam
+)
+
+METRE = 1 / 111195.0  # degrees of latitude per metre
+LATITUDE = 19.4
+
+
+class SimplifyTest(SimpleTestCase):
+    """Test cases for Douglas-Peucker and Visvalingam-Whyatt."""
+
+    def setUp(self):
+        """Set up a noisy 1000-point trail with a 500 m detour in the middle."""
+        rng = np.random.default_rng(3)
+        self.longitudes = np.linspace(-99.2, -99.1, 1000)
+        offsets = rng.normal(0, 2, 1000)
+        offsets[480:520] += 500
+        self.latitudes = LATITUDE + offsets * METRE
+
+    def test_douglas_peucker_error_bound(self):
+        """Every dropped point lies within the tolerance of the kept line."""
+        x, y = project(self.latitudes, self.longitudes)
+        keep = douglas_peucker(x, y, 20.0)
+        self.assertLess(len(keep), 50)
+        self.assertEqual((keep[0], keep[-1]), (0, 999))
+        # Interpolate the simplified line at every original x
+        error = np.abs(np.interp(x, x[keep], y[keep]) - y)
+        self.assertLess(error[~np.isin(np.arange(1000), keep)].max(), 20.0 * 1.01)
+
+    def test_visvalingam(self):
+        """Visvalingam keeps the endpoints and the detour corners."""
+        x, y = project(self.latitudes, self.longitudes)
+        keep = visvalingam(x, y, 20.0)
+        self.assertLess(len(keep), 100)
+        self.assertEqual((keep[0], keep[-1]), (0, 999))
+        self.assertGreater(y[keep].max() - y[keep].min(), 450)
+
+    def test_simplify_short_trails(self):
+        """Trails of fewer than three points are returned as is."""
+        self.assertEqual(simplify([LATITUDE, LATITUDE], [-99.1, -99.2], 10.0).tolist(), [0, 1])
+        self.assertEqual(simplify([], [], 10.0, method='vw').tolist(), [])
+
+    def test_tolerance_for_zoom(self):
+        """Each zoom level halves the tolerance, within bounds."""
+        self.assertAlmostEqual(tolerance_for_zoom(12, LATITUDE) * 2, tolerance_for_zoom(11, LATITUDE))
+        self.assertEqual(tolerance_for_zoom(22, LATITUDE), 1.0)
+
+
+class PolylineTest(SimpleTestCase):
+    """Test cases for Google encoded polylines."""
+
+    def test_reference_encoding(self):
+        """Matches the example from the polyline algorithm documentation."""
+        latitudes, longitudes = [38.5, 40.7, 43.252], [-120.2, -120.95, -126.453]
+        self.assertEqual(encode_polyline(latitudes, longitudes), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+
+    def test_round_trip(self):
+        """Decoding returns the coordinates rounded to 1e-5 degrees."""
+        rng = np.random.default_rng(5)
+        latitudes = rng.uniform(-89, 89, 200)
+        longitudes = rng.uniform(-179, 179, 200)
+        decoded = np.array(decode_polyline(encode_polyline(latitudes, longitudes)))
+        np.testing.assert_allclose(decoded[:, 0], latitudes, atol=6e-6)
+        np.testing.assert_allclose(decoded[:, 1], longitudes, atol=6e-6)
+        self.assertEqual(encode_polyline([], []), '')
@@ -36,6 +36,8 @@ urlpatterns = [
     
     # Device history endpoint (class-based view)
     path('devices/<int:imei>/history/', views.DeviceHistoryView.as_view(), name='device_history'),
+    path('devices/<int:imei>/export/<str:source>/', views.export_device_history, name='export_device_history'),
+    path('devices/<int:imei>/pressure/', views.get_device_pressure, name='device_pressure'),
     
     # Device events endpoint
     path('devices/<int:imei>/events/', views.DeviceEventsView.as_view(), name='device_events'),
@@ -58,7 +60,11 @@ urlpatterns = [
     
     # Real-time position endpoints
     path('positions/real-time/', views.get_real_time_positions, name='real_time_positions'),
+    path('positions/nearest/', views.get_nearest_devices, name='nearest_devices'),
+    path('positions/playback/', views.get_fleet_playback, name='fleet_playback'),
+    path('positions/heatmap/', views.get_fleet_heatmap, name='fleet_heatmap'),
     path('devices/<int:imei>/trail/', views.get_device_trail, name='device_trail'),
+    path('tiles/<str:layer>/<int:z>/<int:x>/<int:y>.mvt', views.get_vector_tile, name='vector_tile'),
     
     # Vehicle endpoints
     path('vehicles/', vehicle_views.vehicle_list, name='vehicle_list'),
@@ -8,23 +8,46 @@ from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.views import View
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
 from django.contrib.auth.models import User
 from .serializers import UserSerializer
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.contrib.gis.geos import Point
 from django.core.exceptions import ValidationError
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
 import logging
+from itertools import groupby
+from operator import itemgetter
+import numpy as np
 
+from skyguard.apps.gps.fast_serializers import FastDeviceSerializer
+from skyguard.apps.gps.pagination import KeysetPagination
+from skyguard.apps.gps.response_cache import cache_response
 from skyguard.apps.gps.services import GPSService
+from skyguard.apps.gps.services.compact import MEDIA_TYPE as COMPACT_TRACK_MEDIA_TYPE
 from skyguard.apps.gps.services.connection import DeviceConnectionService
+from skyguard.apps.gps.services.downsample import get_downsample_config, lttb_multi, parse_max_points
+from skyguard.apps.gps.services.export import EXPORT_FORMATS, EXPORT_SOURCES, streaming_export_response
+from skyguard.apps.gps.services.heatmap import build_heatmap, get_heatmap_config
+from skyguard.apps.gps.services.latest_state import latest_state_table, get_device_metadata
+from skyguard.apps.gps.services.nearest import database_nearest, database_within, nearest_device_index
+from skyguard.apps.gps.services.playback import fleet_playback_service
+from skyguard.apps.gps.services.recent_fixes import recent_fix_buffer
+from skyguard.apps.gps.services.tiles import VERSIONED_LAYERS, get_tile_config, render_tile
+from skyguard.apps.gps.services.trail import (
+    TRAIL_EVENT_TYPES, encode_polyline, get_trail_config, simplify, tolerance_for_zoom
+)
+from skyguard.apps.gps.renderers import EXPORT_RENDERERS, VectorTileRenderer
 from skyguard.apps.gps.repositories import GPSDeviceRepository
 from skyguard.apps.gps.protocols import GPSProtocolHandler
-from skyguard.apps.gps.models import GPSDevice, GPSEvent, NetworkEvent, DeviceSession
+from skyguard.apps.gps.models import GPSDevice, GPSEvent, NetworkEvent, DeviceSession, PressureWeightLog
 from skyguard.core.exceptions import (
     DeviceNotFoundError,
     InvalidLocationDataError,
@@ -34,6 +57,45 @@ from skyguard.core.exceptions import (
 logger = logging.getLogger(__name__)
 
 
+class LocationHistoryPagination(KeysetPagination):
+    """Keyset pagination for location history, oldest first."""
+    ordering = ('timestamp', 'id')
+    page_size = 1000
+    max_page_size = 10000
+
+
+class DeviceEventPagination(KeysetPagination):
+    """Keyset pagination for device events, newest first."""
+
+
+def keyset_json_response(paginator: KeysetPagination, key: str, data: list) -> JsonResponse:
+    """JSON page of ``data`` under ``key`` with the count and cursor links of ``paginator``."""
+    return JsonResponse({
+        key: data,
+        'count': paginator.count,
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+    })
+
+
+def location_history_response(service: GPSService, request, imei, start_time, end_time,
+                              max_points=None) -> JsonResponse:
+    """
+    JSON location history of a device.
+
+    Downsampled history (``max_points``) is bounded and returned whole;
+    otherwise it is paged by ``LocationHistoryPagination``.
+    """
+    if max_points:
+        return JsonResponse({'history': service.get_device_history(imei, start_time, end_time, max_points)})
+    paginator = LocationHistoryPagination()
+    history = service.get_device_history(
+        imei, start_time, end_time,
+        paginate=lambda locations: paginator.paginate_queryset(locations, Request(request)),
+    )
+    return keyset_json_response(paginator, 'history', history)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def process_location(request):
@@ -205,24 +267,36 @@ def get_device_history(request, imei):
         imei: Device IMEI
         
     Returns:
-        JSON response with location history
+        JSON response with a page of location history (``cursor`` and
+        ``page_size``, see ``LocationHistoryPagination``), a compact binary
+        track (``services.compact``) with ``format=compact``, or a streamed
+        ``csv``/``ndjson``/``geojson`` export (``services.export``).
+        ``max_points`` downsamples the JSON history (LTTB on speed) and
+        returns it unpaged.
     """
     try:
         # Get time range from request
         start_time = request.GET.get('start_time')
         end_time = request.GET.get('end_time')
+        max_points = parse_max_points(request.GET.get('max_points'))
         
         # Create service and repository
         repository = GPSDeviceRepository()
         service = GPSService(repository)
         
-        # Get device history
-        history = service.get_device_history(imei, start_time, end_time)
+        if request.GET.get('format') == 'compact':
+            return HttpResponse(service.get_device_track(imei, start_time, end_time),
+                                content_type=COMPACT_TRACK_MEDIA_TYPE)
+        if request.GET.get('format') in EXPORT_FORMATS:
+            if not repository.get_device(imei):
+                raise DeviceNotFoundError(f'Device not found: {imei}')
+            return streaming_export_response('locations', request.GET['format'], imei, start_time, end_time)
         
-        return JsonResponse({'history': history})
+        # Get device history
+        return location_history_response(service, request, imei, start_time, end_time, max_points)
     except DeviceNotFoundError as e:
         return JsonResponse({'error': str(e)}, status=404)
-    except InvalidLocationDataError as e:
+    except (InvalidLocationDataError, ValueError) as e:
         return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -267,7 +341,12 @@ class DeviceHistoryView(View):
     """View for retrieving device history."""
     
     def get(self, request, imei: int):
-        """Get device history."""
+        """
+        Get device history (``format=compact``, ``csv``, ``ndjson`` or ``geojson`` for exports).
+
+        The JSON history is paged like ``get_device_history``; ``max_points``
+        downsamples it (LTTB on speed) instead.
+        """
         try:
             # Get device
             repository = GPSDeviceRepository()
@@ -281,9 +360,16 @@ class DeviceHistoryView(View):
             
             # Get history
             service = GPSService(repository)
-            history = service.get_device_history(imei, start_time, end_time)
-            
-            return JsonResponse({'history': history})
+            if request.GET.get('format') == 'compact':
+                return HttpResponse(service.get_device_track(imei, start_time, end_time),
+                                    content_type=COMPACT_TRACK_MEDIA_TYPE)
+            if request.GET.get('format') in EXPORT_FORMATS:
+                return streaming_export_response('locations', request.GET['format'], device.imei,
+                                                 start_time, end_time)
+            return location_history_response(service, request, imei, start_time, end_time,
+                                             parse_max_points(request.GET.get('max_points')))
+        except (InvalidLocationDataError, ValueError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
@@ -293,7 +379,7 @@ class DeviceEventsView(View):
     """View for retrieving device events."""
     
     def get(self, request, imei: int):
-        """Get device events."""
+        """Get device events, newest first, a page at a time (``DeviceEventPagination``)."""
         try:
             # Get device
             repository = GPSDeviceRepository()
@@ -306,9 +392,15 @@ class DeviceEventsView(View):
             
             # Get events
             service = GPSService(repository)
-            events = service.get_device_events(imei, event_type)
+            paginator = DeviceEventPagination()
+            events = service.get_device_events(
+                imei, event_type,
+                paginate=lambda queryset: paginator.paginate_queryset(queryset, Request(request)),
+            )
             
-            return JsonResponse({'events': events})
+            return keyset_json_response(paginator, 'events', events)
+        except InvalidEventDataError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
@@ -528,20 +620,33 @@ def get_devices_activity_status(request):
         timeout_minutes = int(request.GET.get('timeout', 1))  # Default 1 minuto
         timeout_time = timezone.now() - timedelta(minutes=timeout_minutes)
         
-        # Obtener todos los dispositivos activos
-        devices = GPSDevice.objects.filter(is_active=True).order_by('imei')
+        # Obtener todos los dispositivos activos; posición y heartbeat salen
+        # de la tabla de estado compartida, no de la geometría en BD
+        devices = GPSDevice.objects.filter(is_active=True).order_by('imei').values(
+            'imei', 'name', 'connection_status', 'last_heartbeat', 'current_ip',
+            'current_port', 'total_connections', 'speed', 'updated_at'
+        )
+        states = latest_state_table.get_states()
+        now = timezone.now()
         
         devices_status = []
         stats = {'online': 0, 'offline': 0, 'total': 0}
         
         for device in devices:
+            state = states.get(device['imei'])
+            last_heartbeat = device['last_heartbeat']
+            if state and state.heartbeat_time and (
+                last_heartbeat is None or state.heartbeat_time > last_heartbeat
+            ):
+                last_heartbeat = state.heartbeat_time
+            
             # Determinar el estado real basado en heartbeat
             is_really_online = False
             heartbeat_age = None
             
-            if device.last_heartbeat:
-                heartbeat_age = (timezone.now() - device.last_heartbeat).total_seconds()
-                is_really_online = device.last_heartbeat >= timeout_time
+            if last_heartbeat:
+                heartbeat_age = (now - last_heartbeat).total_seconds()
+                is_really_online = last_heartbeat >= timeout_time
             
             # Actualizar estadísticas
             stats['total'] += 1
@@ -551,25 +656,25 @@ def get_devices_activity_status(request):
                 stats['offline'] += 1
             
             # Si el estado en BD no coincide con el estado real, marcarlo para actualización
-            needs_update = (device.connection_status == 'ONLINE') != is_really_online
+            needs_update = (device['connection_status'] == 'ONLINE') != is_really_online
             
             device_info = {
-                'imei': device.imei,
-                'name': device.name,
-                'connection_status_db': device.connection_status,
+                'imei': device['imei'],
+                'name': device['name'],
+                'connection_status_db': device['connection_status'],
                 'connection_status_real': 'ONLINE' if is_really_online else 'OFFLINE',
                 'needs_update': needs_update,
-                'last_heartbeat': device.last_heartbeat.isoformat() if device.last_heartbeat else None,
+                'last_heartbeat': last_heartbeat.isoformat() if last_heartbeat else None,
                 'heartbeat_age_seconds': heartbeat_age,
-                'current_ip': device.current_ip,
-                'current_port': device.current_port,
-                'total_connections': device.total_connections,
+                'current_ip': device['current_ip'],
+                'current_port': device['current_port'],
+                'total_connections': device['total_connections'],
                 'position': {
-                    'latitude': device.position.y,
-                    'longitude': device.position.x
-                } if device.position else None,
-                'speed': device.speed,
-                'last_update': device.updated_at.isoformat() if device.updated_at else None
+                    'latitude': state.latitude,
+                    'longitude': state.longitude
+                } if state and state.has_fix else None,
+                'speed': state.speed if state else device['speed'],
+                'last_update': device['updated_at'].isoformat() if device['updated_at'] else None
             }
             
             devices_status.append(device_info)
@@ -591,26 +696,27 @@ def get_devices_activity_status(request):
 def get_real_time_positions(request):
     """Get real-time positions of all devices."""
     try:
-        repository = GPSDeviceRepository()
-        devices = repository.get_all_devices()
+        metadata = get_device_metadata()
+        states = latest_state_table.get_states()
         
         positions = []
-        for device in devices:
-            if device.position and device.is_online:
+        for imei, info in metadata.items():
+            state = states.get(imei)
+            if state and state.has_fix and state.status == 'ONLINE':
                 positions.append({
-                    'imei': device.imei,
-                    'name': device.name,
+                    'imei': imei,
+                    'name': info['name'],
                     'position': {
-                        'latitude': device.position.y,
-                        'longitude': device.position.x
+                        'latitude': state.latitude,
+                        'longitude': state.longitude
                     },
-                    'speed': device.speed,
-                    'course': device.course,
-                    'altitude': device.altitude,
-                    'last_update': device.last_heartbeat.isoformat() if device.last_heartbeat else None,
-                    'connection_status': device.connection_status,
-                    'route': device.route,
-                    'economico': device.economico
+                    'speed': state.speed,
+                    'course': state.course,
+                    'altitude': state.altitude,
+                    'last_update': state.heartbeat_time.isoformat() if state.heartbeat_time else None,
+                    'connection_status': state.status,
+                    'route': info['route'],
+                    'economico': info['economico']
                 })
         
         return Response({'positions': positions})
@@ -618,12 +724,282 @@ def get_real_time_positions(request):
         return Response({'error': str(e)}, status=500)
 
 
+MAX_NEAREST_RESULTS = 500
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_nearest_devices(request):
+    """
+    Devices closest to a point, or within a radius of it.
+
+    Query params: ``lat``, ``lon`` (required); ``k`` (default 10);
+    ``radius`` in metres (returns every device within it, nearest first);
+    ``route``, ``status`` and, for staff, ``owner`` filters; ``source``
+    ``memory`` (default, KD-tree over the latest-state table) or
+    ``database`` (PostGIS KNN).
+    """
+    try:
+        latitude = float(request.GET['lat'])
+        longitude = float(request.GET['lon'])
+        k = min(max(int(request.GET.get('k', 10)), 1), MAX_NEAREST_RESULTS)
+        radius = request.GET.get('radius')
+        radius = float(radius) if radius else None
+        route = request.GET.get('route')
+        route = int(route) if route else None
+    except (KeyError, ValueError):
+        return Response({'error': 'lat and lon are required; k, radius and route must be numbers'},
+                        status=400)
+
+    status_filter = request.GET.get('status')
+    owner_id = request.user.id
+    if request.user.is_staff:
+        owner_id = request.GET.get('owner')
+        owner_id = int(owner_id) if owner_id and owner_id.isdigit() else None
+
+    try:
+        if request.GET.get('source') == 'database':
+            devices = GPSDevice.objects.all()
+            if owner_id is not None:
+                devices = devices.filter(owner_id=owner_id)
+            if route is not None:
+                devices = devices.filter(route=route)
+            if status_filter:
+                devices = devices.filter(connection_status=status_filter)
+            if radius is not None:
+                results = database_within(devices, latitude, longitude, radius, limit=MAX_NEAREST_RESULTS)
+            else:
+                results = database_nearest(devices, latitude, longitude, k)
+        else:
+            metadata = get_device_metadata()
+
+            def predicate(result):
+                info = metadata.get(result['imei'])
+                return (info is not None and
+                        (owner_id is None or info['owner_id'] == owner_id) and
+                        (route is None or info['route'] == route) and
+                        (not status_filter or result['status'] == status_filter))
+
+            if radius is not None:
+                results = nearest_device_index.within(latitude, longitude, radius, predicate,
+                                                      limit=MAX_NEAREST_RESULTS)
+            else:
+                results = nearest_device_index.nearest(latitude, longitude, k, predicate)
+
+        metadata = get_device_metadata()
+        for result in results:
+            info = metadata.get(result['imei'], {})
+            result['name'] = info.get('name')
+            result['route'] = info.get('route')
+            result['economico'] = info.get('economico')
+
+        return Response({'count': len(results), 'devices': results})
+    except Exception as e:
+        logger.error(f'Error searching nearest devices: {str(e)}', exc_info=True)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_fleet_heatmap(request):
+    """
+    Density heatmap of one day of fixes, aggregated server-side.
+
+    Query params: ``date`` (ISO date, today by default), ``route``,
+    ``resolution`` (grid zoom level), ``metric`` (``fixes``, ``dwell`` or
+    ``speeding``) and ``speed_limit`` (km/h, for ``speeding``); staff may
+    pass ``owner``. Cells are ``[latitude, longitude, value]`` at the cell
+    centres.
+    """
+    try:
+        day = request.GET.get('date')
+        day = datetime.strptime(day, '%Y-%m-%d').date() if day else timezone.localdate()
+        route = request.GET.get('route')
+        route = int(route) if route else None
+        resolution = int(request.GET.get('resolution') or get_heatmap_config()['default_resolution'])
+        speed_limit = request.GET.get('speed_limit')
+        speed_limit = float(speed_limit) if speed_limit else None
+    except ValueError:
+        return Response({'error': 'date must be YYYY-MM-DD; route, resolution and speed_limit numbers'},
+                        status=400)
+
+    owner_id = request.user.id
+    if request.user.is_staff:
+        owner_id = request.GET.get('owner')
+        owner_id = int(owner_id) if owner_id and owner_id.isdigit() else None
+
+    try:
+        return Response(build_heatmap(owner_id, route, day, resolution,
+                                      request.GET.get('metric', 'fixes'), speed_limit))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f'Error building heatmap: {str(e)}', exc_info=True)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_fleet_playback(request):
+    """
+    Position of every device at a past timestamp, for fleet playback.
+
+    Query params: ``at`` (ISO timestamp, required); ``devices``
+    (comma-separated IMEIs) and, for staff, ``owner`` filters. Positions are
+    interpolated between fixes from the precomputed fleet keyframes.
+    """
+    try:
+        at = datetime.fromisoformat(request.GET['at'])
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+        imeis = request.GET.get('devices')
+        imeis = {int(imei) for imei in imeis.split(',') if imei.strip()} if imeis else None
+    except (KeyError, ValueError):
+        return Response({'error': 'at must be an ISO timestamp; devices a comma-separated IMEI list'},
+                        status=400)
+
+    owner_id = request.user.id
+    if request.user.is_staff:
+        owner_id = request.GET.get('owner')
+        owner_id = int(owner_id) if owner_id and owner_id.isdigit() else None
+
+    try:
+        metadata = get_device_metadata()
+        if owner_id is not None:
+            allowed = {imei for imei, info in metadata.items() if info['owner_id'] == owner_id}
+            imeis = allowed if imeis is None else imeis & allowed
+
+        state = fleet_playback_service.state_at(at, imeis)
+        if state is None:
+            return Response({'error': 'Playback is not available for this timestamp'}, status=404)
+
+        for device in state['devices']:
+            info = metadata.get(device['imei'], {})
+            device['name'] = info.get('name')
+            device['route'] = info.get('route')
+            device['economico'] = info.get('economico')
+
+        return Response({
+            'timestamp': state['timestamp'].isoformat(),
+            'keyframe': state['keyframe'].isoformat(),
+            'count': len(state['devices']),
+            'devices': state['devices'],
+        })
+    except Exception as e:
+        logger.error(f'Error playing back fleet: {str(e)}', exc_info=True)
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([*api_settings.DEFAULT_RENDERER_CLASSES, *EXPORT_RENDERERS])
+def export_device_history(request, imei, source):
+    """
+    Stream one device's history as a download.
+
+    ``source`` is ``locations``, ``events``, ``pressure`` or ``alarms``. The
+    format (``csv``, ``ndjson`` or ``geojson``; CSV by default) comes from
+    ``format=`` or the Accept header. ``start_time``/``end_time`` bound the
+    range; rows are streamed from a server-side cursor, so memory stays
+    constant whatever its length.
+    """
+    if source not in EXPORT_SOURCES:
+        return Response({'error': f'Unknown source: {source}'}, status=404)
+    
+    devices = GPSDevice.objects.filter(imei=imei)
+    if not request.user.is_staff:
+        devices = devices.filter(owner=request.user)
+    if not devices.exists():
+        return Response({'error': 'Device not found'}, status=404)
+    
+    export_format = request.accepted_renderer.format
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'csv'
+    return streaming_export_response(source, export_format, imei,
+                                     request.GET.get('start_time'), request.GET.get('end_time'))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_device_pressure(request, imei):
+    """
+    PSI series of a device's pressure sensors, for charts.
+
+    ``start_time``/``end_time`` bound the range and ``sensor`` selects one
+    sensor. Each sensor's psi1/psi2 series is downsampled with LTTB to about
+    ``max_points`` points (``GPS_DOWNSAMPLE['max_points']`` by default), so
+    the payload size does not depend on the range.
+    """
+    try:
+        max_points = parse_max_points(request.GET.get('max_points'), get_downsample_config()['max_points'])
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+    devices = GPSDevice.objects.filter(imei=imei)
+    if not request.user.is_staff:
+        devices = devices.filter(owner=request.user)
+    if not devices.exists():
+        return Response({'error': 'Device not found'}, status=404)
+
+    logs = PressureWeightLog.objects.filter(device_id=imei)
+    if request.GET.get('start_time'):
+        logs = logs.filter(date__gte=request.GET['start_time'])
+    if request.GET.get('end_time'):
+        logs = logs.filter(date__lte=request.GET['end_time'])
+    if request.GET.get('sensor'):
+        logs = logs.filter(sensor=request.GET['sensor'])
+
+    try:
+        sensors = []
+        rows = logs.order_by('sensor', 'date').values_list('sensor', 'date', 'psi1', 'psi2')
+        for sensor, group in groupby(rows.iterator(), key=itemgetter(0)):
+            _, dates, psi1, psi2 = zip(*group)
+            psi1 = np.asarray(psi1, dtype=np.float64)
+            psi2 = np.asarray(psi2, dtype=np.float64)
+            keep = lttb_multi([date.timestamp() for date in dates], [psi1, psi2], max_points)
+            sensors.append({
+                'sensor': sensor,
+                'original_points': len(dates),
+                'points': len(keep),
+                'timestamps': [dates[i] for i in keep.tolist()],
+                'psi1': psi1[keep].tolist(),
+                'psi2': psi2[keep].tolist(),
+            })
+        return Response({'device_imei': imei, 'max_points': max_points, 'sensors': sensors})
+    except Exception as e:
+        logger.error(f'Error reading pressure series: {str(e)}', exc_info=True)
+        return Response({'error': str(e)}, status=500)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_device_trail(request, imei):
-    """Get device position trail for the last period."""
+    """
+    Get device position trail for the last period.
+
+    The recent part of the window is served from the per-device recent-fix
+    buffer; only the part older than the buffer is read from the database.
+    ``since`` (ISO timestamp) narrows the window for incremental polling.
+
+    ``zoom`` (map zoom level) or ``tolerance`` (metres) simplify the trail
+    server-side (``method`` ``dp`` or ``vw``); ``encoding=polyline`` returns a
+    Google encoded polyline with parallel ``times`` (seconds from ``start``)
+    and ``speeds`` arrays. Simplified and encoded trails are cached per
+    device, window and tolerance.
+    """
     try:
-        hours = int(request.GET.get('hours', 24))
+        try:
+            hours = int(request.GET.get('hours', 24))
+            zoom = request.GET.get('zoom')
+            zoom = float(zoom) if zoom else None
+            tolerance = request.GET.get('tolerance')
+            tolerance = float(tolerance) if tolerance else None
+            since = request.GET.get('since')
+            since = datetime.fromisoformat(since) if since else None
+        except ValueError as e:
+            return Response({'error': f'Invalid parameter: {e}'}, status=400)
+        method = request.GET.get('method')
+        encoding = request.GET.get('encoding')
         
         # Get device
         repository = GPSDeviceRepository()
@@ -631,28 +1007,40 @@ def get_device_trail(request, imei):
         if not device:
             return Response({'error': 'Device not found'}, status=404)
         
-        # Get trail from events/history
-        from skyguard.apps.gps.models import GPSEvent
-        from django.utils import timezone
-        from datetime import timedelta
+        detailed = zoom is None and tolerance is None and encoding != 'polyline'
+        end_time = None
+        if not detailed:
+            # Align the window end so repeated map requests share a cache entry
+            ttl = get_trail_config()['cache_ttl']
+            end_time = datetime.fromtimestamp(int(timezone.now().timestamp()) // ttl * ttl, tz=dt_timezone.utc)
         
-        start_time = timezone.now() - timedelta(hours=hours)
-        events = GPSEvent.objects.filter(
-            device=device,
-            timestamp__gte=start_time,
-            event_type='LOCATION'
-        ).order_by('timestamp')
-        
-        trail = []
-        for event in events:
-            if event.position:
-                trail.append({
-                    'latitude': event.position.y,
-                    'longitude': event.position.x,
-                    'speed': event.speed,
-                    'timestamp': event.timestamp.isoformat(),
-                    'course': event.course
-                })
+        start_time = (end_time or timezone.now()) - timedelta(hours=hours)
+        if since:
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            start_time = max(start_time, since)
+        
+        if not detailed:
+            cache_key = (f'gps:trail:{device.imei}:{start_time.timestamp():.0f}:{end_time.timestamp():.0f}:'
+                         f'{zoom}:{tolerance}:{method}:{encoding}')
+            data = cache.get(cache_key)
+            if data is None:
+                data = _simplified_trail(_load_trail(device, start_time, end_time),
+                                         zoom, tolerance, method, encoding)
+                data.update({'device_imei': imei, 'device_name': device.name, 'hours': hours})
+                cache.set(cache_key, data, ttl)
+            return Response(data)
+        
+        trail = [
+            {
+                'latitude': latitude,
+                'longitude': longitude,
+                'speed': speed,
+                'timestamp': timestamp.isoformat(),
+                'course': course
+            }
+            for latitude, longitude, speed, course, timestamp in _load_trail(device, start_time)
+        ]
         
         return Response({
             'device_imei': imei,
@@ -664,10 +1052,105 @@ def get_device_trail(request, imei):
         return Response({'error': str(e)}, status=500)
 
 
+def _load_trail(device, start_time, end_time=None):
+    """Trail points as (latitude, longitude, speed, course, timestamp) tuples."""
+    fixes, complete_from = recent_fix_buffer.get_window(device.imei, start_time)
+    
+    points = []
+    if complete_from is None or complete_from > start_time:
+        # Part of the window predates the buffer: read it from history
+        events = GPSEvent.objects.filter(
+            device=device,
+            timestamp__gte=start_time,
+            type__in=TRAIL_EVENT_TYPES,
+            position__isnull=False
+        )
+        if complete_from is not None:
+            events = events.filter(timestamp__lt=complete_from)
+        if end_time is not None:
+            events = events.filter(timestamp__lt=end_time)
+        for position, speed, course, timestamp in events.order_by('timestamp').values_list(
+            'position', 'speed', 'course', 'timestamp'
+        ):
+            points.append((position.y, position.x, speed, course, timestamp))
+    
+    for fix in fixes:
+        if complete_from is not None and fix.timestamp < complete_from:
+            continue
+        if end_time is not None and fix.timestamp >= end_time:
+            break
+        points.append((fix.latitude, fix.longitude, fix.speed, fix.course, fix.timestamp))
+    return points
+
+
+def _simplified_trail(points, zoom, tolerance, method, encoding):
+    """Simplify trail points and serialize them as dicts or an encoded polyline."""
+    latitudes = np.array([point[0] for point in points], dtype=np.float64)
+    longitudes = np.array([point[1] for point in points], dtype=np.float64)
+    if tolerance is None and zoom is not None and len(points):
+        tolerance = tolerance_for_zoom(zoom, float(latitudes.mean()))
+    keep = simplify(latitudes, longitudes, tolerance, method) if tolerance else np.arange(len(points))
+    
+    data = {'tolerance': tolerance, 'original_points': len(points), 'points': len(keep)}
+    if encoding == 'polyline':
+        epochs = np.array([point[4].timestamp() for point in points], dtype=np.float64)[keep]
+        speeds = np.array([point[2] or 0 for point in points], dtype=np.float64)[keep]
+        start = int(epochs[0]) if len(epochs) else None
+        data.update({
+            'polyline': encode_polyline(latitudes[keep], longitudes[keep]),
+            'start': start,
+            'times': (epochs - (start or 0)).astype(np.int64).tolist(),
+            'speeds': np.round(speeds).astype(np.int64).tolist(),
+        })
+    else:
+        data['trail'] = [
+            {
+                'latitude': latitude,
+                'longitude': longitude,
+                'speed': speed,
+                'timestamp': timestamp.isoformat(),
+                'course': course
+            }
+            for latitude, longitude, speed, course, timestamp in (points[i] for i in keep.tolist())
+        ]
+    return data
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([VectorTileRenderer])
+def get_vector_tile(request, layer, z, x, y):
+    """
+    Mapbox Vector Tile of one map layer.
+
+    ``layer`` is ``positions``, ``trails``, ``geofences`` or ``overlays``;
+    the tile holds the features the user may see, clipped and generalized
+    for the zoom. Empty tiles are a 204.
+    """
+    try:
+        tile = render_tile(layer, request.user, z, x, y)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=404)
+
+    config = get_tile_config()
+    max_age = config['layers'][layer]['cache_ttl']
+    if layer in VERSIONED_LAYERS:
+        max_age = min(max_age, config['max_age'])
+    response = Response(tile, status=200 if tile else 204)
+    patch_cache_control(response, private=True, max_age=max_age)
+    return response
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@cache_response('devices', tags=('devices',), per_user=False, timeout=15)
 def list_devices(request):
-    """Get all GPS devices or create a new one."""
+    """
+    Get all GPS devices or create a new one. The list is served from the response cache.
+
+    Only changes to the listed device attributes invalidate the entry; positions
+    and connection status may lag by up to the 15 second timeout.
+    """
     if request.method == 'POST':
         try:
             imei = request.data.get('imei')
@@ -703,43 +1186,8 @@ def list_devices(request):
     
     # GET method
     try:
-        repository = GPSDeviceRepository()
-        devices = repository.get_all_devices()
-        
-        devices_data = []
-        for device in devices:
-            try:
-                device_data = {
-                    'imei': device.imei,
-                    'name': device.name,
-                    'serial': device.serial,
-                    'model': device.model,
-                    'software_version': device.software_version,
-                    'route': device.route,
-                    'economico': device.economico,
-                    'position': {
-                        'latitude': device.position.y,
-                        'longitude': device.position.x
-                    } if device.position else None,
-                    'speed': device.speed,
-                    'course': device.course,
-                    'altitude': device.altitude,
-                    'odometer': device.odometer,
-                    'connection_status': device.connection_status,
-                    'current_ip': device.current_ip,
-                    'current_port': device.current_port,
-                    'last_connection': device.last_connection.isoformat() if device.last_connection else None,
-                    'last_heartbeat': device.last_heartbeat.isoformat() if device.last_heartbeat else None,
-                    'total_connections': device.total_connections,
-                    'created_at': device.created_at.isoformat() if device.created_at else None,
-                    'updated_at': device.updated_at.isoformat() if device.updated_at else None
-                }
-                devices_data.append(device_data)
-            except Exception as device_error:
-                print(f"Error serializing device {device.imei}: {device_error}")
-                continue
-        
-        return Response({'devices': devices_data})
+        devices = FastDeviceSerializer.rows(GPSDevice.objects.all())
+        return Response({'devices': FastDeviceSerializer.serialize(devices)})
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
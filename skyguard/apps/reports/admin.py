@@ -5,6 +5,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
+from skyguard.apps.gps.admin_mixins import TelemetryAdminMixin
 from .models import (
     ReportTemplate, ReportExecution, TicketReport, 
     StatisticsReport, PeopleCountReport, AlarmReport
@@ -70,13 +71,14 @@ class ReportExecutionAdmin(admin.ModelAdmin):
 
 
 @admin.register(TicketReport)
-class TicketReportAdmin(admin.ModelAdmin):
+class TicketReportAdmin(TelemetryAdminMixin, admin.ModelAdmin):
     """Admin for ticket reports."""
     list_display = ['device', 'driver_name', 'total_amount', 'received_amount', 'difference', 'report_date']
     list_filter = ['report_date', 'device__route']
     search_fields = ['device__name', 'driver_name']
     readonly_fields = ['created_at']
     ordering = ['-report_date']
+    date_hierarchy = 'report_date'
     
     fieldsets = (
         ('Report Information', {
@@ -92,13 +94,14 @@ class TicketReportAdmin(admin.ModelAdmin):
 
 
 @admin.register(StatisticsReport)
-class StatisticsReportAdmin(admin.ModelAdmin):
+class StatisticsReportAdmin(TelemetryAdminMixin, admin.ModelAdmin):
     """Admin for statistics reports."""
     list_display = ['device', 'report_date', 'total_distance', 'total_passengers', 'average_speed', 'operating_hours']
     list_filter = ['report_date', 'device__route']
     search_fields = ['device__name']
     readonly_fields = ['created_at']
     ordering = ['-report_date']
+    date_hierarchy = 'report_date'
     
     fieldsets = (
         ('Report Information', {
@@ -114,13 +117,14 @@ class StatisticsReportAdmin(admin.ModelAdmin):
 
 
 @admin.register(PeopleCountReport)
-class PeopleCountReportAdmin(admin.ModelAdmin):
+class PeopleCountReportAdmin(TelemetryAdminMixin, admin.ModelAdmin):
     """Admin for people count reports."""
     list_display = ['device', 'report_date', 'total_people', 'peak_hour', 'peak_count']
     list_filter = ['report_date', 'device__route']
     search_fields = ['device__name']
     readonly_fields = ['created_at']
     ordering = ['-report_date']
+    date_hierarchy = 'report_date'
     
     fieldsets = (
         ('Report Information', {
@@ -136,13 +140,14 @@ class PeopleCountReportAdmin(admin.ModelAdmin):
 
 
 @admin.register(AlarmReport)
-class AlarmReportAdmin(admin.ModelAdmin):
+class AlarmReportAdmin(TelemetryAdminMixin, admin.ModelAdmin):
     """Admin for alarm reports."""
     list_display = ['device', 'report_date', 'total_alarms', 'critical_alarms', 'warning_alarms']
     list_filter = ['report_date', 'device__route']
     search_fields = ['device__name']
     readonly_fields = ['created_at']
     ordering = ['-report_date']
+    date_hierarchy = 'report_date'
     
     fieldsets = (
         ('Report Information', {
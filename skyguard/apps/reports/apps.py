@@ -8,4 +8,8 @@ class ReportsConfig(AppConfig):
     """Reports application configuration."""
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'skyguard.apps.reports'
-    verbose_name = 'Reports' 
\ No newline at end of file
+    verbose_name = 'Reports'
+
+    def ready(self):
+        """Register signal handlers."""
+        import skyguard.apps.reports.signals  # noqa
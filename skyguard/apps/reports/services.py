@@ -2,15 +2,14 @@
 Report generation services.
 Migrated from legacy django14 system to modern architecture.
 """
-import csv
 import json
 import os
 from datetime import datetime, timedelta, time, date
 from decimal import Decimal
 from io import StringIO, BytesIO
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, Iterable, List, Any, Optional, Tuple
 from django.db.models import Avg, Max, Min, Sum, Count, Q
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.contrib.auth.models import User
@@ -27,7 +26,9 @@ import reportlab.rl_config
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 
-from skyguard.apps.gps.models import GPSDevice, GPSEvent, GPSLocation, PressureWeightLog, IOEvent, GSMEvent
+from skyguard.apps.gps.models import GPSDevice, GPSEvent, PressureWeightLog, IOEvent, GSMEvent
+from skyguard.apps.gps.services.export import csv_chunks
+from skyguard.apps.gps.services.rollups import telemetry_rollup_service
 from .models import (
     ReportTemplate, ReportExecution, TicketReport, 
     StatisticsReport, PeopleCountReport, AlarmReport
@@ -155,15 +156,10 @@ class ReportGenerator:
         doc.build(story)
         return response
     
-    def generate_csv(self, data: List[List], filename: str) -> HttpResponse:
-        """Generate CSV report."""
-        response = HttpResponse(content_type='text/csv')
+    def generate_csv(self, data: Iterable[List], filename: str) -> StreamingHttpResponse:
+        """Generate CSV report, streamed in chunks as ``data`` (a list or a generator) is consumed."""
+        response = StreamingHttpResponse(csv_chunks(data), content_type='text/csv')
         response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
-        
-        writer = csv.writer(response)
-        for row in data:
-            writer.writerow(row)
-        
         return response
 
 
@@ -180,16 +176,26 @@ class TicketReportGenerator(ReportGenerator):
             event_type='TICKET'
         ).order_by('timestamp')
         
-        # Prepare data
-        data = [
-            ['Reporte de Tickets'],
-            ['Ticket', 'Unidad', 'Chofer', 'Hora', 'Vueltas', 'Inicio', 'Fin', 'Duración', 'Pasaje', 'Ord', 'Pref', 'Sistema', 'Liq', 'Diferencia']
-        ]
+        data = self._ticket_rows(device, events)
+        title = f"Tickets.{device.name}.{start_date.strftime('%Y.%m.%d')}"
+        filename = f"Tickets.{device.name}.{start_date.strftime('%Y.%m.%d')}"
+        
+        if format == 'pdf':
+            return self.generate_pdf(list(data), title, filename)
+        elif format == 'csv':
+            return self.generate_csv(data, filename)
+        else:
+            raise ValueError(f"Unsupported format: {format}")
+    
+    def _ticket_rows(self, device: GPSDevice, events) -> Iterable[List]:
+        """Report rows, produced while the events are read."""
+        yield ['Reporte de Tickets']
+        yield ['Ticket', 'Unidad', 'Chofer', 'Hora', 'Vueltas', 'Inicio', 'Fin', 'Duración', 'Pasaje', 'Ord', 'Pref', 'Sistema', 'Liq', 'Diferencia']
         
         total_amount = Decimal('0.00')
         total_received = Decimal('0.00')
         
-        for event in events:
+        for event in events.iterator():
             ticket_data = event.raw_data.get('ticket_data', {})
             driver_name = ticket_data.get('driver_name', 'N/A')
             amount = Decimal(str(ticket_data.get('amount', 0)))
@@ -199,7 +205,7 @@ class TicketReportGenerator(ReportGenerator):
             total_amount += amount
             total_received += received
             
-            data.append([
+            yield [
                 event.timestamp.strftime('%Y-%m-%d'),
                 device.name,
                 driver_name,
@@ -214,25 +220,15 @@ class TicketReportGenerator(ReportGenerator):
                 ticket_data.get('system_amount', 0),
                 f"${received:.2f}",
                 f"${difference:.2f}"
-            ])
+            ]
         
         # Add totals row
-        data.append([
+        yield [
             'TOTALES', '', '', '', '', '', '', '', 
             f"${total_amount:.2f}", '', '', '', 
             f"${total_received:.2f}", 
             f"${total_amount - total_received:.2f}"
-        ])
-        
-        title = f"Tickets.{device.name}.{start_date.strftime('%Y.%m.%d')}"
-        filename = f"Tickets.{device.name}.{start_date.strftime('%Y.%m.%d')}"
-        
-        if format == 'pdf':
-            return self.generate_pdf(data, title, filename)
-        elif format == 'csv':
-            return self.generate_csv(data, filename)
-        else:
-            raise ValueError(f"Unsupported format: {format}")
+        ]
 
 
 class StatisticsReportGenerator(ReportGenerator):
@@ -241,16 +237,18 @@ class StatisticsReportGenerator(ReportGenerator):
     def generate_statistics_report(self, device: GPSDevice, start_date: datetime, 
                                  end_date: datetime, format: str = 'pdf') -> HttpResponse:
         """Generate statistics report for a device."""
-        # Get location data
-        locations = GPSLocation.objects.filter(
-            device=device,
-            timestamp__range=(start_date, end_date)
-        ).order_by('timestamp')
+        # Read pre-aggregated telemetry instead of scanning raw locations
+        summary = telemetry_rollup_service.summarize_device(device.imei, start_date, end_date)
         
         # Calculate statistics
-        total_distance = self._calculate_total_distance(locations)
-        average_speed = self._calculate_average_speed(locations)
-        operating_hours = self._calculate_operating_hours(locations)
+        total_distance = summary['distance'] / 1000.0  # km
+        # Same definitions as before the rollups: speed averaged over the fixes
+        # with a speed, hours from the first to the last fix
+        average_speed = summary['avg_nonzero_speed']
+        operating_hours = (
+            (summary['last_timestamp'] - summary['first_timestamp']).total_seconds() / 3600.0
+            if summary['first_timestamp'] else 0.0
+        )
         
         # Get people count data
         people_count = self._get_people_count(device, start_date, end_date)
@@ -280,41 +278,6 @@ class StatisticsReportGenerator(ReportGenerator):
         else:
             raise ValueError(f"Unsupported format: {format}")
     
-    def _calculate_total_distance(self, locations) -> float:
-        """Calculate total distance from location data."""
-        if len(locations) < 2:
-            return 0.0
-        
-        total_distance = 0.0
-        for i in range(1, len(locations)):
-            prev_loc = locations[i-1]
-            curr_loc = locations[i]
-            distance = self._haversine_distance(
-                prev_loc.position.y, prev_loc.position.x,
-                curr_loc.position.y, curr_loc.position.x
-            )
-            total_distance += distance
-        
-        return total_distance
-    
-    def _calculate_average_speed(self, locations) -> float:
-        """Calculate average speed from location data."""
-        if not locations:
-            return 0.0
-        
-        speeds = [loc.speed for loc in locations if loc.speed]
-        return sum(speeds) / len(speeds) if speeds else 0.0
-    
-    def _calculate_operating_hours(self, locations) -> float:
-        """Calculate operating hours from location data."""
-        if not locations:
-            return 0.0
-        
-        start_time = locations.first().timestamp
-        end_time = locations.last().timestamp
-        duration = end_time - start_time
-        return duration.total_seconds() / 3600.0
-    
     def _get_people_count(self, device, start_date, end_date) -> Dict[str, int]:
         """Get people count statistics."""
         logs = PressureWeightLog.objects.filter(
@@ -333,21 +296,6 @@ class StatisticsReportGenerator(ReportGenerator):
             'baj_del': baj_del,
             'baj_tra': baj_tra
         }
-    
-    def _haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Calculate distance between two points using Haversine formula."""
-        from math import radians, cos, sin, asin, sqrt
-        
-        # Convert to radians
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-        
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * asin(sqrt(a))
-        r = 6371  # Radius of earth in kilometers
-        return c * r
 
 
 class PeopleCountReportGenerator(ReportGenerator):
@@ -362,44 +310,42 @@ class PeopleCountReportGenerator(ReportGenerator):
             timestamp__range=(start_date, end_date)
         ).order_by('timestamp')
         
-        # Prepare data
-        data = [
-            [f'Conteo de Personas - {device.name}'],
-            ['Fecha', 'Hora', 'Sensor', 'Subidas', 'Bajadas', 'Total']
-        ]
+        data = self._people_count_rows(device, logs)
+        title = f"Conteo de Personas - {device.name} ({start_date.date()} - {end_date.date()})"
+        filename = f"people_count_{device.imei}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}"
+        
+        if format == 'pdf':
+            return self.generate_pdf(list(data), title, filename)
+        elif format == 'csv':
+            return self.generate_csv(data, filename)
+        else:
+            raise ValueError(f"Unsupported format: {format}")
+    
+    def _people_count_rows(self, device: GPSDevice, logs) -> Iterable[List]:
+        """Report rows, produced while the logs are read."""
+        yield [f'Conteo de Personas - {device.name}']
+        yield ['Fecha', 'Hora', 'Sensor', 'Subidas', 'Bajadas', 'Total']
         
         total_in = 0
         total_out = 0
         
-        for log in logs:
+        for log in logs.iterator():
             in_count = log.psi1 if log.psi1 else 0
             out_count = log.psi2 if log.psi2 else 0
             total_in += in_count
             total_out += out_count
             
-            data.append([
+            yield [
                 log.timestamp.strftime('%Y-%m-%d'),
                 log.timestamp.strftime('%H:%M:%S'),
                 log.sensor,
                 in_count,
                 out_count,
                 in_count + out_count
-            ])
+            ]
         
         # Add totals
-        data.append([
-            'TOTALES', '', '', total_in, total_out, total_in + total_out
-        ])
-        
-        title = f"Conteo de Personas - {device.name} ({start_date.date()} - {end_date.date()})"
-        filename = f"people_count_{device.imei}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}"
-        
-        if format == 'pdf':
-            return self.generate_pdf(data, title, filename)
-        elif format == 'csv':
-            return self.generate_csv(data, filename)
-        else:
-            raise ValueError(f"Unsupported format: {format}")
+        yield ['TOTALES', '', '', total_in, total_out, total_in + total_out]
 
 
 class AlarmReportGenerator(ReportGenerator):
@@ -415,17 +361,27 @@ class AlarmReportGenerator(ReportGenerator):
             event_type__in=['ALARM', 'WARNING', 'CRITICAL']
         ).order_by('timestamp')
         
-        # Prepare data
-        data = [
-            [f'Alarmas del dia: {start_date.strftime("%A %d. %B %Y")}'],
-            ['Unidad', 'Sensor', 'ID', 'Duración', 'Hora', 'Tipo']
-        ]
+        data = self._alarm_rows(device, events, start_date)
+        title = f"Alarmas - {device.name} ({start_date.date()})"
+        filename = f"alarm_report_{device.imei}_{start_date.strftime('%Y%m%d')}"
+        
+        if format == 'pdf':
+            return self.generate_pdf(list(data), title, filename)
+        elif format == 'csv':
+            return self.generate_csv(data, filename)
+        else:
+            raise ValueError(f"Unsupported format: {format}")
+    
+    def _alarm_rows(self, device: GPSDevice, events, start_date: datetime) -> Iterable[List]:
+        """Report rows, produced while the events are read."""
+        yield [f'Alarmas del dia: {start_date.strftime("%A %d. %B %Y")}']
+        yield ['Unidad', 'Sensor', 'ID', 'Duración', 'Hora', 'Tipo']
         
         total_alarms = 0
         critical_alarms = 0
         warning_alarms = 0
         
-        for event in events:
+        for event in events.iterator():
             alarm_data = event.raw_data.get('alarm_data', {})
             sensor = alarm_data.get('sensor', 'N/A')
             alarm_id = alarm_data.get('alarm_id', 'N/A')
@@ -438,38 +394,20 @@ class AlarmReportGenerator(ReportGenerator):
             elif alarm_type == 'WARNING':
                 warning_alarms += 1
             
-            data.append([
+            yield [
                 device.name,
                 sensor,
                 alarm_id,
                 duration,
                 event.timestamp.strftime('%H:%M:%S'),
                 alarm_type
-            ])
+            ]
         
         # Add summary
-        data.append([
-            'RESUMEN', '', '', '', '', ''
-        ])
-        data.append([
-            'Total Alarmas', total_alarms, '', '', '', ''
-        ])
-        data.append([
-            'Alarmas Críticas', critical_alarms, '', '', '', ''
-        ])
-        data.append([
-            'Alarmas de Advertencia', warning_alarms, '', '', '', ''
-        ])
-        
-        title = f"Alarmas - {device.name} ({start_date.date()})"
-        filename = f"alarm_report_{device.imei}_{start_date.strftime('%Y%m%d')}"
-        
-        if format == 'pdf':
-            return self.generate_pdf(data, title, filename)
-        elif format == 'csv':
-            return self.generate_csv(data, filename)
-        else:
-            raise ValueError(f"Unsupported format: {format}")
+        yield ['RESUMEN', '', '', '', '', '']
+        yield ['Total Alarmas', total_alarms, '', '', '', '']
+        yield ['Alarmas Críticas', critical_alarms, '', '', '', '']
+        yield ['Alarmas de Advertencia', warning_alarms, '', '', '', '']
 
 
 class RouteReportGenerator(ReportGenerator):
@@ -481,11 +419,21 @@ class RouteReportGenerator(ReportGenerator):
         # Get devices for the route
         devices = GPSDevice.objects.filter(route=route_number)
         
-        # Prepare data
-        data = [
-            [f'Conteo de Personas - {find_choice(route_number)} - {report_date.strftime("%A %d. %B %Y")}'],
-            ['Unidad', 'Sensor', 'Subidas', 'Bajadas', 'Total', 'Diferencia']
-        ]
+        data = self._route_people_rows(route_number, report_date, devices)
+        title = f"Conteo de Personas - {find_choice(route_number)} - {report_date.strftime('%Y.%m.%d')}"
+        filename = f"people_count_route_{route_number}_{report_date.strftime('%Y%m%d')}"
+        
+        if format == 'pdf':
+            return self.generate_pdf(list(data), title, filename)
+        elif format == 'csv':
+            return self.generate_csv(data, filename)
+        else:
+            raise ValueError(f"Unsupported format: {format}")
+    
+    def _route_people_rows(self, route_number: int, report_date: date, devices) -> Iterable[List]:
+        """Report rows, produced one device at a time."""
+        yield [f'Conteo de Personas - {find_choice(route_number)} - {report_date.strftime("%A %d. %B %Y")}']
+        yield ['Unidad', 'Sensor', 'Subidas', 'Bajadas', 'Total', 'Diferencia']
         
         total_up = 0
         total_down = 0
@@ -506,29 +454,17 @@ class RouteReportGenerator(ReportGenerator):
             total_up += device_up
             total_down += device_down
             
-            data.append([
+            yield [
                 device.name,
                 'Sensor Principal',
                 device_up,
                 device_down,
                 device_up + device_down,
                 abs(device_up - device_down)
-            ])
+            ]
         
         # Add totals
-        data.append([
-            'TOTALES', '', total_up, total_down, total_up + total_down, abs(total_up - total_down)
-        ])
-        
-        title = f"Conteo de Personas - {find_choice(route_number)} - {report_date.strftime('%Y.%m.%d')}"
-        filename = f"people_count_route_{route_number}_{report_date.strftime('%Y%m%d')}"
-        
-        if format == 'pdf':
-            return self.generate_pdf(data, title, filename)
-        elif format == 'csv':
-            return self.generate_csv(data, filename)
-        else:
-            raise ValueError(f"Unsupported format: {format}")
+        yield ['TOTALES', '', total_up, total_down, total_up + total_down, abs(total_up - total_down)]
 
 
 class ReportService:
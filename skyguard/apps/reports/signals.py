@@ -0,0 +1,15 @@
+"""
+Signal handlers for the reports application.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from skyguard.apps.gps.response_cache import invalidate_tags
+from .models import ReportExecution
+
+
+@receiver(post_save, sender=ReportExecution)
+@receiver(post_delete, sender=ReportExecution)
+def report_execution_changed(sender, instance, **kwargs):
+    """Retire the cached report dashboards."""
+    invalidate_tags('reports')
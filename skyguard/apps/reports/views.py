@@ -22,6 +22,7 @@ from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 
 from skyguard.apps.gps.models import GPSDevice, GPSEvent, GPSLocation, PressureWeightLog
+from skyguard.apps.gps.response_cache import conditional_response, response_cache
 from .models import (
     ReportTemplate, ReportExecution, TicketReport, 
     StatisticsReport, PeopleCountReport, AlarmReport
@@ -127,13 +128,25 @@ class AlarmReportForm(ReportForm):
 
 @login_required
 def report_dashboard(request):
-    """Dashboard for reports."""
-    context = {
-        'total_devices': GPSDevice.objects.count(),
-        'total_reports': ReportExecution.objects.count(),
-        'recent_reports': ReportExecution.objects.filter(
-            executed_by=request.user
-        ).order_by('-created_at')[:5],
+    """Dashboard for reports. The counts and recent reports come from the response cache."""
+    entry = response_cache.fetch(
+        'reports:dashboard', request.user.pk, {}, ('devices', 'reports'),
+        lambda: {
+            'total_devices': GPSDevice.objects.count(),
+            'total_reports': ReportExecution.objects.count(),
+            'recent_reports': list(ReportExecution.objects.filter(
+                executed_by=request.user
+            ).order_by('-created_at')[:5]),
+        },
+    )
+    return conditional_response(
+        request, entry, lambda data: render(request, 'reports/dashboard.html', {**data, **_dashboard_links()})
+    )
+
+
+def _dashboard_links():
+    """Report entries shown on the dashboard."""
+    return {
         'available_reports': [
             {
                 'name': 'Reporte de Tickets',
@@ -167,7 +180,6 @@ def report_dashboard(request):
             }
         ]
     }
-    return render(request, 'reports/dashboard.html', context)
 
 
 @login_required
@@ -0,0 +1,19 @@
+"""
+Signal handlers for the subsidies application.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from skyguard.apps.gps.response_cache import invalidate_tags
+from .models import DailyLog, Driver, SubsidyReport
+
+
+@receiver(post_save, sender=Driver)
+@receiver(post_delete, sender=Driver)
+@receiver(post_save, sender=DailyLog)
+@receiver(post_delete, sender=DailyLog)
+@receiver(post_save, sender=SubsidyReport)
+@receiver(post_delete, sender=SubsidyReport)
+def dashboard_data_changed(sender, instance, **kwargs):
+    """Retire the cached subsidies dashboard."""
+    invalidate_tags('subsidies')
@@ -20,6 +20,7 @@ from django.utils import timezone
 from django.core.paginator import Paginator
 from django.template.loader import render_to_string
 
+from skyguard.apps.gps.response_cache import conditional_response, response_cache
 from .models import (
     Driver, DailyLog, CashReceipt, TimeSheetCapture, 
     SubsidyRoute, SubsidyReport, EconomicMapping
@@ -29,32 +30,39 @@ from .services import SubsidyService, TimeSheetGenerator, SubsidyReportGenerator
 
 @login_required
 def subsidies_dashboard(request):
-    """Main subsidies dashboard."""
+    """Main subsidies dashboard. Nothing on it is per user, so all users share one cache entry."""
     service = SubsidyService(request.user)
     
-    # Get statistics
-    total_drivers = Driver.objects.filter(active=True).count()
-    total_routes = len(service.get_available_routes())
-    today_logs = DailyLog.objects.filter(start__date=timezone.now().date()).count()
-    this_month_reports = SubsidyReport.objects.filter(
-        created_at__month=timezone.now().month,
-        created_at__year=timezone.now().year
-    ).count()
-    
-    # Get recent activities
-    recent_logs = DailyLog.objects.select_related('driver').order_by('-created_at')[:5]
-    recent_reports = SubsidyReport.objects.select_related('route').order_by('-created_at')[:5]
-    
-    context = {
-        'total_drivers': total_drivers,
-        'total_routes': total_routes,
-        'today_logs': today_logs,
-        'this_month_reports': this_month_reports,
-        'recent_logs': recent_logs,
-        'recent_reports': recent_reports,
-    }
-    
-    return render(request, 'subsidies/dashboard.html', context)
+    def build():
+        # Get statistics
+        total_drivers = Driver.objects.filter(active=True).count()
+        total_routes = len(service.get_available_routes())
+        today_logs = DailyLog.objects.filter(start__date=timezone.now().date()).count()
+        this_month_reports = SubsidyReport.objects.filter(
+            created_at__month=timezone.now().month,
+            created_at__year=timezone.now().year
+        ).count()
+        
+        # Get recent activities
+        recent_logs = list(DailyLog.objects.select_related('driver').order_by('-created_at')[:5])
+        recent_reports = list(SubsidyReport.objects.select_related('route').order_by('-created_at')[:5])
+        
+        return {
+            'total_drivers': total_drivers,
+            'total_routes': total_routes,
+            'today_logs': today_logs,
+            'this_month_reports': this_month_reports,
+            'recent_logs': recent_logs,
+            'recent_reports': recent_reports,
+        }
+    
+    # The day is part of the key so "today" counts roll over at midnight
+    entry = response_cache.fetch(
+        'subsidies:dashboard', 'all', {'day': timezone.localdate().isoformat()}, ('subsidies',), build
+    )
+    return conditional_response(
+        request, entry, lambda context: render(request, 'subsidies/dashboard.html', context)
+    )
 
 
 @login_required
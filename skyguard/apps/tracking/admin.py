@@ -3,6 +3,7 @@ Admin configuration for the tracking application.
 """
 from django.contrib import admin
 from django.contrib.gis.admin import GISModelAdmin
+from skyguard.apps.gps.admin_mixins import TelemetryAdminMixin
 from .models import (
     TrackingSession, TrackingPoint, TrackingEvent, TrackingConfig,
     Alert, Geofence, Route, RoutePoint
@@ -32,13 +33,15 @@ class TrackingSessionAdmin(admin.ModelAdmin):
 
 
 @admin.register(TrackingPoint)
-class TrackingPointAdmin(GISModelAdmin):
+class TrackingPointAdmin(TelemetryAdminMixin, GISModelAdmin):
     """Admin for TrackingPoint model."""
     list_display = ('id', 'session', 'timestamp', 'speed', 'course', 'altitude', 'accuracy')
     list_filter = ('timestamp', 'session__status')
     search_fields = ('session__session_id', 'session__device__name')
     readonly_fields = ('timestamp',)
     ordering = ('-timestamp',)
+    date_hierarchy = 'timestamp'
+    raw_id_fields = ('session',)
     
     fieldsets = (
         ('Point Information', {
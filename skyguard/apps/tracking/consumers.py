@@ -10,8 +10,8 @@ from django.contrib.auth.models import AnonymousUser
 from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django.contrib.auth import get_user_model
-from django.core.serializers.json import DjangoJSONEncoder
 
+from skyguard.apps.gps.json_encoding import dumps_text
 from .models import DeviceSession, TrackingSession, Alert, Geofence
 from .services import TrackingService, AlertService, GeofenceService
 
@@ -164,7 +164,7 @@ class TrackingRealtimeConsumer(AsyncWebsocketConsumer):
         """Send tracking update to WebSocket."""
         session_id = event['session_id']
         if str(session_id) in self.subscribed_sessions:
-            await self.send(text_data=json.dumps({
+            await self.send(text_data=dumps_text({
                 'type': 'tracking_update',
                 'session_id': session_id,
                 'device_imei': event['device_imei'],
@@ -175,11 +175,11 @@ class TrackingRealtimeConsumer(AsyncWebsocketConsumer):
                 'status': event['status'],
                 'distance': event.get('distance'),
                 'duration': event.get('duration')
-            }, cls=DjangoJSONEncoder))
+            }))
     
     async def alert_notification(self, event):
         """Send alert notification to WebSocket."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'alert',
             'alert_id': event['alert_id'],
             'device_imei': event['device_imei'],
@@ -189,11 +189,11 @@ class TrackingRealtimeConsumer(AsyncWebsocketConsumer):
             'timestamp': event['timestamp'],
             'severity': event.get('severity', 'medium'),
             'acknowledged': event.get('acknowledged', False)
-        }, cls=DjangoJSONEncoder))
+        }))
     
     async def geofence_event(self, event):
         """Send geofence event to WebSocket."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'geofence_event',
             'geofence_id': event['geofence_id'],
             'device_imei': event['device_imei'],
@@ -201,20 +201,20 @@ class TrackingRealtimeConsumer(AsyncWebsocketConsumer):
             'geofence_name': event['geofence_name'],
             'position': event.get('position'),
             'timestamp': event['timestamp']
-        }, cls=DjangoJSONEncoder))
+        }))
     
     async def session_status_change(self, event):
         """Send session status change to WebSocket."""
         session_id = event['session_id']
         if str(session_id) in self.subscribed_sessions:
-            await self.send(text_data=json.dumps({
+            await self.send(text_data=dumps_text({
                 'type': 'session_status_change',
                 'session_id': session_id,
                 'status': event['status'],
                 'timestamp': event['timestamp'],
                 'duration': event.get('duration'),
                 'distance': event.get('distance')
-            }, cls=DjangoJSONEncoder))
+            }))
     
     # Helper methods
     @database_sync_to_async
@@ -276,14 +276,14 @@ class TrackingRealtimeConsumer(AsyncWebsocketConsumer):
                 'distance': session.distance
             })
         
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'session_list',
             'sessions': session_data
-        }, cls=DjangoJSONEncoder))
+        }))
     
     async def send_session_update(self, session):
         """Send session update to client."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'session_update',
             'session': {
                 'id': session.id,
@@ -294,18 +294,18 @@ class TrackingRealtimeConsumer(AsyncWebsocketConsumer):
                 'duration': session.duration,
                 'distance': session.distance
             }
-        }, cls=DjangoJSONEncoder))
+        }))
     
     async def send_success(self, message):
         """Send success message."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'success',
             'message': message
         }))
     
     async def send_error(self, message):
         """Send error message."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'error',
             'message': message
         }))
@@ -379,17 +379,17 @@ class AlertConsumer(AsyncWebsocketConsumer):
     
     async def alert_created(self, event):
         """Send new alert to WebSocket."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'new_alert',
             'alert': event['alert']
-        }, cls=DjangoJSONEncoder))
+        }))
     
     async def alert_updated(self, event):
         """Send alert update to WebSocket."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'alert_updated',
             'alert': event['alert']
-        }, cls=DjangoJSONEncoder))
+        }))
     
     @database_sync_to_async
     def get_user_from_token(self, token):
@@ -438,10 +438,10 @@ class AlertConsumer(AsyncWebsocketConsumer):
                 'acknowledged_at': alert.acknowledged_at.isoformat() if alert.acknowledged_at else None
             })
         
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'alerts_list',
             'alerts': alert_data
-        }, cls=DjangoJSONEncoder))
+        }))
     
     async def send_unacknowledged_alerts(self):
         """Send unacknowledged alerts to client."""
@@ -456,21 +456,21 @@ class AlertConsumer(AsyncWebsocketConsumer):
                 'created_at': alert.created_at.isoformat()
             })
         
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'unacknowledged_alerts',
             'alerts': alert_data
-        }, cls=DjangoJSONEncoder))
+        }))
     
     async def send_success(self, message):
         """Send success message."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'success',
             'message': message
         }))
     
     async def send_error(self, message):
         """Send error message."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'error',
             'message': message
         }))
@@ -532,7 +532,7 @@ class GeofenceConsumer(AsyncWebsocketConsumer):
     
     async def geofence_event(self, event):
         """Send geofence event to WebSocket."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'geofence_event',
             'geofence_id': event['geofence_id'],
             'device_imei': event['device_imei'],
@@ -540,7 +540,7 @@ class GeofenceConsumer(AsyncWebsocketConsumer):
             'geofence_name': event['geofence_name'],
             'position': event.get('position'),
             'timestamp': event['timestamp']
-        }, cls=DjangoJSONEncoder))
+        }))
     
     @database_sync_to_async
     def get_user_from_token(self, token):
@@ -573,14 +573,14 @@ class GeofenceConsumer(AsyncWebsocketConsumer):
                 'created_at': geofence.created_at.isoformat()
             })
         
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'geofences_list',
             'geofences': geofence_data
-        }, cls=DjangoJSONEncoder))
+        }))
     
     async def send_error(self, message):
         """Send error message."""
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps_text({
             'type': 'error',
             'message': message
         })) 
\ No newline at end of file
@@ -8,6 +8,7 @@ from asgiref.sync import async_to_sync
 from datetime import datetime
 import logging
 
+from skyguard.apps.gps.response_cache import invalidate_tags
 from .models import DeviceSession, TrackingSession, Alert, Geofence
 
 logger = logging.getLogger(__name__)
@@ -120,6 +121,13 @@ def broadcast_alert_notification(sender, instance, created, **kwargs):
                 logger.error(f"Error broadcasting alert notification: {e}")
 
 
+@receiver(post_save, sender=Geofence)
+@receiver(post_delete, sender=Geofence)
+def geofence_changed(sender, instance, **kwargs):
+    """Retire the cached geofence list."""
+    invalidate_tags('tracking-geofences')
+
+
 @receiver(post_save, sender=Geofence)
 def broadcast_geofence_update(sender, instance, created, **kwargs):
     """Broadcast geofence updates via WebSocket."""
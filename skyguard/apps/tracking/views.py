@@ -11,10 +11,11 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404
 from django.contrib.gis.geos import Point
 from django.utils import timezone
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.settings import api_settings
 
 from .models import (
     TrackingSession, TrackingPoint, TrackingEvent, TrackingConfig,
@@ -22,6 +23,9 @@ from .models import (
 )
 from .services import TrackingService, AlertService, GeofenceService, RouteService
 from skyguard.apps.gps.models import GPSDevice
+from skyguard.apps.gps.renderers import CompactTrackRenderer
+from skyguard.apps.gps.response_cache import cache_response
+from skyguard.apps.gps.services.compact import encode_track, track_columns
 
 
 @api_view(['GET'])
@@ -254,8 +258,9 @@ def add_tracking_point(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([*api_settings.DEFAULT_RENDERER_CLASSES, CompactTrackRenderer])
 def get_session_points(request, session_id):
-    """Get tracking points for a session."""
+    """Get tracking points for a session (``format=compact`` for a binary track)."""
     try:
         session = get_object_or_404(TrackingSession, session_id=session_id, user=request.user)
         
@@ -265,6 +270,9 @@ def get_session_points(request, session_id):
         tracking_service = TrackingService(request.user)
         points = tracking_service.get_session_points(session, start_time, end_time)
         
+        if request.accepted_renderer.format == 'compact':
+            return Response(encode_track(**track_columns(points)))
+        
         points_data = []
         for point in points:
             points_data.append({
@@ -527,8 +535,9 @@ def get_user_alerts(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cache_response('tracking-geofences', tags=('tracking-geofences',), per_user=False)
 def get_user_geofences(request):
-    """Get geofences for the current user."""
+    """Get geofences for the current user (every active geofence, so one shared cache entry)."""
     try:
         geofence_service = GeofenceService(request.user)
         geofences = geofence_service.get_user_geofences()
@@ -58,6 +58,12 @@ app.conf.beat_schedule = {
         'schedule': crontab(minute='*/2'),  # Cada 2 minutos
     },
     
+    # Evaluar geocercas de los dispositivos que reportaron posición
+    'dispatch-dirty-geofence-devices': {
+        'task': 'skyguard.apps.gps.tasks.dispatch_dirty_geofence_devices',
+        'schedule': 5.0,  # Cada 5 segundos
+    },
+    
     # Limpiar eventos de geocercas antiguos diariamente a las 3:00 AM
     'cleanup-old-geofence-events': {
         'task': 'skyguard.apps.gps.tasks.cleanup_old_geofence_events',
@@ -76,6 +82,22 @@ app.conf.beat_schedule = {
         'task': 'skyguard.apps.gps.tasks.send_geofence_daily_report',
         'schedule': crontab(hour=8, minute=0),  # Diario a las 8:00 AM
     },
+    
+    # === ROLLUPS DE TELEMETRÍA ===
+    
+    # Actualizar rollups horarios/diarios cada 5 minutos
+    'update-telemetry-rollups': {
+        'task': 'skyguard.apps.gps.tasks.update_telemetry_rollups',
+        'schedule': crontab(minute='*/5'),  # Cada 5 minutos
+    },
+    
+    # === REPRODUCCIÓN DE FLOTA ===
+    
+    # Construir keyframes de reproducción cada 5 minutos
+    'update-fleet-playback': {
+        'task': 'skyguard.apps.gps.tasks.update_fleet_playback',
+        'schedule': crontab(minute='*/5'),  # Cada 5 minutos
+    },
 }
 
 # Configuración adicional
@@ -76,6 +76,10 @@ CELERY_TASK_ROUTES = {
     'skyguard.apps.gps.tasks.*': {'queue': 'gps_tasks'},
     'skyguard.apps.gps.tasks.process_geofence_detection': {'queue': 'geofence_tasks'},
     'skyguard.apps.gps.tasks.check_all_devices_geofences': {'queue': 'geofence_tasks'},
+    'skyguard.apps.gps.tasks.dispatch_dirty_geofence_devices': {'queue': 'geofence_tasks'},
+    'skyguard.apps.gps.tasks.evaluate_geofence_chunk': {'queue': 'geofence_tasks'},
+    'skyguard.apps.gps.tasks.process_geofence_transitions': {'queue': 'geofence_tasks'},
+    'skyguard.apps.gps.tasks.populate_geofence_devices': {'queue': 'geofence_tasks'},
 }
 
 # Configuración de retry
@@ -96,6 +100,15 @@ CELERY_TASK_ANNOTATIONS = {
         'rate_limit': '200/m', # Máximo 200 por minuto (alta frecuencia para dispositivos individuales)
         'time_limit': 60,      # 1 minuto máximo
     },
+    'skyguard.apps.gps.tasks.dispatch_dirty_geofence_devices': {
+        'time_limit': 30,      # Solo vacía el conjunto y encola lotes
+    },
+    'skyguard.apps.gps.tasks.evaluate_geofence_chunk': {
+        'time_limit': 120,     # 2 minutos máximo por lote
+    },
+    'skyguard.apps.gps.tasks.populate_geofence_devices': {
+        'time_limit': 600,     # 10 minutos máximo (flotas grandes)
+    },
     'skyguard.apps.gps.tasks.cleanup_old_geofence_events': {
         'rate_limit': '1/d',   # Máximo 1 por día
         'time_limit': 1800,    # 30 minutos máximo
@@ -58,8 +58,9 @@ class ILocationService(Protocol):
         """Process location data for a device."""
         ...
     
-    def get_device_history(self, imei: int, start_time: Any, end_time: Any) -> List[dict]:
-        """Get location history for a device."""
+    def get_device_history(self, imei: int, start_time: Any, end_time: Any,
+                           max_points: Optional[int] = None) -> List[dict]:
+        """Get location history for a device, optionally downsampled to ``max_points``."""
         ...
 
 
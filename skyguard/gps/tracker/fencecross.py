@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Track vs. geofence crossings computed over whole tracks at once.
+#
+# The ticket/round reports used to call GEOS ``contains`` once per
+# (point, fence) pair.  Here the track is handled as NumPy arrays and
+# point-in-polygon is evaluated for all points of a fence in one
+# vectorized even-odd (ray casting) pass.
+
+import numpy as np
+
+# Points handled per ray casting pass (bounds the points x edges matrix)
+CHUNK = 4096
+
+
+def fence_rings(fence):
+	"""Return the rings of a GEOS polygon as (N,2) float arrays."""
+	return [np.asarray(ring, dtype = float) for ring in fence.coords]
+
+
+def points_in_rings(xs, ys, rings):
+	"""
+	Even-odd containment of many points in a polygon given by its rings
+	(exterior and holes).  Returns a boolean array parallel to xs/ys.
+	"""
+	inside = np.zeros(len(xs), dtype = bool)
+	if not len(xs) or not rings:
+		return inside
+	exterior = rings[0]
+	minx, miny = exterior.min(axis = 0)
+	maxx, maxy = exterior.max(axis = 0)
+	cand = np.flatnonzero((xs >= minx) & (xs <= maxx) & (ys >= miny) & (ys <= maxy))
+	if not len(cand):
+		return inside
+
+	edges = np.concatenate([np.column_stack((r[:-1], r[1:])) for r in rings if len(r) > 1])
+	x1, y1, x2, y2 = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+	# Horizontal edges never straddle a ray; avoid dividing by zero
+	dy = np.where(y2 == y1, 1.0, y2 - y1)
+	for start in range(0, len(cand), CHUNK):
+		idx = cand[start:start + CHUNK]
+		px = xs[idx][:, None]
+		py = ys[idx][:, None]
+		straddle = (y1 > py) != (y2 > py)
+		xcross = x1 + (py - y1) * (x2 - x1) / dy
+		hits = straddle & (px < xcross)
+		inside[idx] = (hits.sum(axis = 1) % 2) == 1
+	return inside
+
+
+def fence_transitions(xs, ys, fences):
+	"""
+	In/out transitions of a track against a list of fences.
+
+	xs, ys: longitudes/latitudes of the track, ordered by time.
+	fences: GEOS polygons (or lists of rings as returned by fence_rings).
+
+	Returns a list of (point_index, fence_index, inside) tuples ordered by
+	point and, for the same point, by fence, i.e. the same order the old
+	per-point/per-fence loop produced.  The state at the first point is the
+	reference and never produces a transition.
+	"""
+	xs = np.asarray(xs, dtype = float)
+	ys = np.asarray(ys, dtype = float)
+	if len(xs) < 2 or not len(fences):
+		return []
+	pidx = []
+	fidx = []
+	state = []
+	for n, fence in enumerate(fences):
+		rings = fence if isinstance(fence, list) else fence_rings(fence)
+		inside = points_in_rings(xs, ys, rings)
+		changes = np.flatnonzero(inside[1:] != inside[:-1]) + 1
+		pidx.append(changes)
+		fidx.append(np.full(len(changes), n, dtype = np.int64))
+		state.append(inside[changes])
+	pidx = np.concatenate(pidx)
+	fidx = np.concatenate(fidx)
+	state = np.concatenate(state)
+	order = np.lexsort((fidx, pidx))
+	return list(zip(pidx[order].tolist(), fidx[order].tolist(), state[order].tolist()))
+
+
+def track_fence_events(events, fences, names = False):
+	"""
+	Geofence in/out events of a TRACK queryset, as used by the round reports.
+
+	Each event is dict(time, dir) and, with names = True, also desc/name.
+	"""
+	rows = list(events.values_list('date', 'position'))
+	if not rows:
+		return []
+	fences = list(fences)
+	times = [r[0] for r in rows]
+	xs = np.fromiter((r[1].x for r in rows), dtype = float, count = len(rows))
+	ys = np.fromiter((r[1].y for r in rows), dtype = float, count = len(rows))
+	gf_evs = []
+	for p, f, wh in fence_transitions(xs, ys, [i.fence for i in fences]):
+		ev = dict(time = times[p], dir = "in" if wh else "out")
+		if names:
+			name = fences[f].name
+			ev['desc'] = ("->" if wh else "<-") + name
+			ev['name'] = name
+		gf_evs.append(ev)
+	return gf_evs
@@ -28,6 +28,7 @@ from reportlab.lib.styles import ParagraphStyle
 from django import forms
 from django.forms import widgets
 from models import *
+from fencecross import track_fence_events
 from views import getPeopleCount,TicketView, dayRangeX
 
 import datetime
@@ -146,20 +147,7 @@ class TicketCapture(FormView):
 	def get_basegfevents(self,range):
 		events = Event.objects.filter(imei = self.dev, date__range = range, type = 'TRACK').order_by("date")
 		fences = GeoFence.objects.filter(base = self.dev.ruta)
-		gf_evs=[]
-		if events:
-			for i in fences:
-				i.where = i.fence.contains(events[0].position)
-			for p in events:
-				for i in fences:
-					wh = i.fence.contains(p.position)
-					if i.where != wh:
-						i.where = wh
-						if wh:
-							gf_evs.append(dict(time = p.date, dir ="in"))
-						else:
-							gf_evs.append(dict(time = p.date, dir ="out"))
-		return gf_evs
+		return track_fence_events(events, fences)
 
 	def get_pTimes(self,gf_evs,range):
 		times = []
@@ -4,6 +4,7 @@ from django.http import Http404, HttpResponse, HttpResponseRedirect, HttpRespons
 from django.shortcuts import render_to_response,get_object_or_404, get_list_or_404
 from django.db.models import Avg, Max, Min, Q
 from models import *
+from fencecross import track_fence_events
 from django.contrib.auth.decorators import login_required
 from datetime import timedelta,time,datetime,date
 from django.utils import simplejson
@@ -822,20 +823,7 @@ class TicketView(ListView):
 	def get_basegfevents(self,range):
 		events = Event.objects.filter(imei = self.dev, date__range = range, type = 'TRACK').order_by("date")
 		fences = GeoFence.objects.filter(base = self.dev.ruta)
-		gf_evs=[]
-		if events:
-			for i in fences:
-				i.where = i.fence.contains(events[0].position)
-			for p in events:
-				for i in fences:
-					wh = i.fence.contains(p.position)
-					if i.where != wh:
-						i.where = wh
-						if wh:
-							gf_evs.append(dict(time = p.date, dir ="in"))
-						else:
-							gf_evs.append(dict(time = p.date, dir ="out"))
-		return gf_evs
+		return track_fence_events(events, fences)
 
 	def get_pTimes(self,gf_evs,range):
 		times = []
@@ -1336,20 +1324,7 @@ class TrackerDetailView(ListView):
 			self.fences = GeoFence.objects.filter(q,owner = self.dev.owner)
 			fences = self.fences
 		evs = self.object_list.filter(type = "TRACK")
-		gf_evs = []
-		if evs:
-			for i in fences:
-				i.where = i.fence.contains(evs[0].position)
-			for p in evs:
-				for i in fences:
-					wh = i.fence.contains(p.position)
-					if i.where != wh:
-						i.where = wh
-						if wh:
-							gf_evs.append(dict(time = p.date, desc = "->"+i.name,name = i.name, dir ="in"))
-						else:
-							gf_evs.append(dict(time = p.date, desc = "<-"+i.name,name = i.name, dir ="out"))
-		return gf_evs
+		return track_fence_events(evs, fences, names = True)
 
 	def get_peopleTimes(self):
 		if self.dev.ruta and self.cals:
@@ -220,7 +220,7 @@ REST_FRAMEWORK = {
         'user': '1000/day'
     },
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'skyguard.apps.gps.renderers.ORJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
@@ -287,6 +287,159 @@ GPS_DEVICE_TOKEN = os.environ.get('GPS_DEVICE_TOKEN', 'your-secure-token-here')
 GPS_UPDATE_INTERVAL = 60  # seconds
 GPS_MAX_RETRIES = 3
 GPS_TIMEOUT = 30  # seconds 
+
+# GPS ingest pipeline (skyguard.apps.gps.pipeline)
+GPS_INGEST_PIPELINE = {
+    'stages': [
+        'skyguard.apps.gps.pipeline.odometer.OdometerStage',
+        'skyguard.apps.gps.pipeline.recent.RecentFixStage',
+        'skyguard.apps.gps.pipeline.latest_state.LatestStateStage',
+        'skyguard.apps.gps.pipeline.geofence.GeofenceStage',
+        'skyguard.apps.gps.pipeline.route_corridor.RouteCorridorStage',
+    ],
+    'state_batch_size': 200,      # devices per bulk_update
+    'state_flush_interval': 5.0,  # seconds between device-state flushes
+    'periodic_flush_interval': 1.0,  # seconds between checks for due buffers while idle
+}
+
+# Redis used for GPS hot-path state (recent fixes, etc.); None disables it
+GPS_REDIS_URL = os.environ.get('GPS_REDIS_URL', 'redis://localhost:6379/5')
+
+# Per-device recent-fix buffer (skyguard.apps.gps.services.recent_fixes)
+GPS_RECENT_FIXES = {
+    'max_points': 8640,   # per device
+    'max_age_hours': 24,
+}
+
+# Host-local shared-memory latest-state table (skyguard.apps.gps.services.latest_state)
+GPS_LATEST_STATE = {
+    'path': os.environ.get('GPS_LATEST_STATE_PATH', '/dev/shm/skyguard-latest-state.bin'),
+    'capacity': 65536,    # device slots (72 bytes each)
+    'reconcile_interval': 30,  # seconds between catch-ups with GPSDevice rows
+    'metadata_ttl': 60,   # seconds
+}
+
+# Geofence geometry preprocessing on save (skyguard.apps.gps.services.geofence_geometry)
+GPS_GEOFENCE_GEOMETRY = {
+    'max_vertices': 1000,           # vertex budget of a geofence polygon
+    'simplify_tolerance': 0.00005,  # degrees (~5 m) for the polygon sent to maps
+    'subdivide_max_vertices': 64,   # vertices per indexed part
+}
+
+# Fleet playback keyframes (skyguard.apps.gps.services.playback)
+GPS_PLAYBACK = {
+    'interval': 600,       # seconds per keyframe
+    'lag': 120,            # seconds before an interval is built
+    'max_gap': 300,        # seconds; larger gaps are not interpolated
+    'max_age': 86400,      # seconds a silent device stays in the keyframes
+    'retention_days': 30,
+}
+
+# Streaming history exports (skyguard.apps.gps.services.export)
+GPS_EXPORT = {
+    'chunk_size': 2000,      # rows per server-side cursor fetch
+    'buffer_size': 65536,    # characters per streamed chunk
+}
+
+# Level-of-detail trails (skyguard.apps.gps.services.trail)
+GPS_TRAIL = {
+    'method': 'dp',          # 'dp' (Douglas-Peucker) or 'vw' (Visvalingam-Whyatt)
+    'pixels': 1.0,           # tolerance in screen pixels for zoom-based requests
+    'cache_ttl': 30,         # seconds simplified trails are cached
+}
+
+# Chart downsampling (skyguard.apps.gps.services.downsample)
+GPS_DOWNSAMPLE = {
+    'max_points': 1000,          # default points per series of the chart endpoints
+    'max_points_limit': 10000,
+}
+
+# Nearest-vehicle search (skyguard.apps.gps.services.nearest)
+GPS_NEAREST = {
+    'max_age': 2.0,   # seconds the KD-tree over the latest-state table is reused
+    'leaf_size': 32,  # points per KD-tree leaf
+}
+
+# Server-side heatmaps (skyguard.apps.gps.services.heatmap)
+GPS_HEATMAP = {
+    'default_resolution': 16,   # grid zoom level; cells are about 600 m at 16
+    'speed_limit': 80.0,        # km/h; default threshold of the speeding metric
+    'chunk_size': 20000,        # rows per server-side cursor fetch
+    'cache_ttl': 7 * 86400,     # seconds past days are cached
+    'today_cache_ttl': 300,     # seconds the current day is cached
+}
+
+# Mapbox Vector Tiles (skyguard.apps.gps.services.tiles)
+GPS_TILES = {
+    'extent': 4096,        # tile coordinate grid
+    'buffer': 64,          # extent units kept around each tile
+    'pixels': 1.0,         # simplification tolerance in screen pixels
+    'trail_hours': 2,      # window of the trails layer
+    'trail_margin': 2000,  # metres around each tile whose fixes build the trails
+    'layers': {
+        'positions': {'min_zoom': 0, 'cache_ttl': 5},
+        'trails': {'min_zoom': 10, 'cache_ttl': 30},
+        'geofences': {'min_zoom': 0, 'cache_ttl': 86400},
+        'overlays': {'min_zoom': 0, 'cache_ttl': 86400},
+    },
+}
+
+# Tagged response cache of hot read endpoints (skyguard.apps.gps.response_cache)
+GPS_RESPONSE_CACHE = {
+    'enabled': True,
+    'timeout': 300,       # seconds an entry lives without being invalidated
+}
+
+# In-memory geofence index (skyguard.apps.gps.services.geofence_index)
+GPS_GEOFENCE_INDEX = {
+    'check_interval': 5.0,  # seconds between checks for changes made by other processes
+}
+
+# Fleet-wide geofence evaluation (skyguard.apps.gps.services.geofence_fleet)
+GPS_GEOFENCE_FLEET = {
+    'chunk_size': 2000,          # devices per evaluate_geofence_chunk task
+    'populate_chunk_size': 500,  # initial ENTRY events inserted per batch on fence create/edit
+}
+
+# Streaming geofence detection in the ingest pipeline (skyguard.apps.gps.pipeline.geofence)
+GPS_GEOFENCE_STREAM = {
+    'batch_size': 100,      # transitions per bulk insert
+    'flush_interval': 1.0,  # seconds
+}
+
+# Device/geofence inside-outside state (skyguard.apps.gps.services.geofence_state)
+GPS_GEOFENCE_STATE = {
+    'ttl': 7 * 24 * 3600,  # seconds; expired states are reloaded from GeoFenceEvent
+}
+
+# Route corridors / off-route detection (skyguard.apps.gps.services.route_corridor)
+GPS_ROUTE_CORRIDOR = {
+    'width': 60.0,       # metres either side of the route polyline
+    'widths': {},        # per-route overrides, e.g. {96: 100.0}
+    'hysteresis': 20.0,  # metres closer a vehicle must come to be back on route
+    'exit_fixes': 3,     # consecutive fixes outside before OFF_ROUTE
+    'return_fixes': 2,   # consecutive fixes inside before ON_ROUTE
+}
+
+# Telemetry rollups (skyguard.apps.gps.services.rollups)
+GPS_ROLLUPS = {
+    'batch_size': 50000,   # source rows per batch
+    'max_batches': 20,     # batches per task run
+    'moving_speed': 3.0,   # km/h
+    'max_gap': 300,        # seconds
+    'gap_lag': 600,        # seconds skipped source ids are looked up again
+    'max_gaps': 1000,
+}
+
+# Odometer jitter filtering
+GPS_ODOMETER = {
+    'max_hdop': 5.0,
+    'stationary_speed': 3.0,    # km/h
+    'stationary_radius': 30.0,  # meters
+    'min_distance': 5.0,        # meters
+    'max_speed': 250.0,         # km/h
+    'state_ttl': 7 * 24 * 3600,  # seconds a device's previous fix is kept in Redis
+}
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
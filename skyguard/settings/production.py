@@ -96,6 +96,9 @@ CHANNEL_LAYERS = {
 # Celery Configuration for Background Tasks
 CELERY_BROKER_URL = f'{REDIS_URL}/3'
 CELERY_RESULT_BACKEND = f'{REDIS_URL}/4'
+
+# GPS hot-path state (recent fixes, etc.)
+GPS_REDIS_URL = os.environ.get('GPS_REDIS_URL', f'{REDIS_URL}/5')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'